@@ -0,0 +1,487 @@
+"""
+Backends - Abstração da plataforma (janelas, input, processos) e do relógio
+
+O ``ActivityMonitor`` não chama o Windows diretamente: ele usa um
+``PlatformBackend`` e um relógio. No Windows o backend é o ``Win32Backend``;
+em outros sistemas (testes, benchmarks, simulação) usa-se o
+``SimulatedBackend``, dirigido por um modelo de usuário determinístico sob
+um ``VirtualClock`` que avança instantaneamente.
+
+No modo de captura por eventos o backend também fornece um ``EventSource``:
+notificações de troca da janela em primeiro plano e de título, com o
+instante (monotônico) em que aconteceram. No Windows vêm do
+``SetWinEventHook``; na simulação, do próprio modelo de usuário.
+"""
+import queue
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+
+class SystemClock:
+    """Relógio real"""
+
+    is_virtual = False
+
+    def now(self):
+        return datetime.now()
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Relógio simulado: ``sleep`` apenas avança o tempo, sem esperar.
+
+    Com ``speed`` (ex.: 1000), cada ``sleep`` também espera ``segundos / speed``
+    de tempo real, para rodar em velocidade acelerada mas limitada.
+    """
+
+    is_virtual = True
+
+    def __init__(self, start=None, speed=None):
+        self.start = start or datetime(2026, 1, 5, 8, 0, 0)
+        self.speed = speed
+        self.elapsed = 0.0
+        self.on_sleep = None  # Chamado após cada sleep (ex.: condição de parada)
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def time(self):
+        return self.start.timestamp() + self.elapsed
+
+    def monotonic(self):
+        return self.elapsed
+
+    def advance(self, seconds):
+        self.elapsed += max(0.0, seconds)
+
+    def sleep(self, seconds):
+        if self.speed:
+            time.sleep(max(0.0, seconds) / self.speed)
+        self.advance(seconds)
+        if self.on_sleep:
+            self.on_sleep(self)
+
+
+class PlatformBackend:
+    """Interface das chamadas de plataforma usadas pelo monitor"""
+
+    def get_foreground_window(self):
+        """Handle da janela em primeiro plano (0 se nenhuma)"""
+        raise NotImplementedError
+
+    def get_window_title(self, hwnd):
+        raise NotImplementedError
+
+    def get_window_pid(self, hwnd):
+        raise NotImplementedError
+
+    def enum_windows(self):
+        """Handles das janelas visíveis"""
+        raise NotImplementedError
+
+    def get_idle_seconds(self):
+        """Segundos desde o último input (mouse/teclado)"""
+        raise NotImplementedError
+
+    def get_process_name(self, pid, hwnd=None):
+        """Nome do executável (None se o processo não existe ou o acesso é negado)
+
+        ``hwnd`` é a janela de onde veio o PID; com ela o backend pode evitar
+        conferir de novo um processo já visto com essa janela.
+        """
+        raise NotImplementedError
+
+    def create_event_source(self, clock):
+        """Fonte de notificações de janela (None: a plataforma só permite amostragem)"""
+        return None
+
+
+# Notificação de janela: kind 'foreground' (nova janela em primeiro plano) ou
+# 'title' (título da janela em primeiro plano mudou); at no relógio monotônico
+WindowEvent = namedtuple('WindowEvent', ['kind', 'hwnd', 'at'])
+
+
+class EventSource:
+    """Fonte de notificações de janela consumida pelo loop do monitor.
+
+    As notificações chegam de outra thread (``post``) e o loop do monitor as
+    recebe em ``wait``, que substitui o ``sleep`` entre as tarefas: dorme até
+    o próximo prazo ou até a primeira notificação. Notificações de título só
+    valem para a janela em primeiro plano.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self.received = 0
+
+    def start(self):
+        """Começa a receber notificações (lança exceção se não for possível)"""
+
+    def stop(self):
+        self.wake()
+
+    def post(self, kind, hwnd, at):
+        self.received += 1
+        self._queue.put(WindowEvent(kind, hwnd, at))
+
+    def wake(self):
+        """Acorda o loop que está em ``wait`` (ex.: para encerrar)"""
+        self._queue.put(None)
+
+    def wait(self, timeout):
+        """Espera até ``timeout`` segundos; retorna as notificações pendentes (talvez nenhuma)"""
+        try:
+            event = self._queue.get(timeout=max(0.0, timeout))
+        except queue.Empty:
+            return []
+        events = [event]
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [event for event in events if event is not None]
+
+
+def create_backend():
+    """Backend da plataforma atual"""
+    if sys.platform == 'win32':
+        from win32_backend import Win32Backend
+        return Win32Backend()
+    raise RuntimeError(
+        f"Plataforma {sys.platform} não suportada: use SimulatedBackend para rodar fora do Windows"
+    )
+
+
+# ----------------------------------------------------------------------
+# Simulação
+# ----------------------------------------------------------------------
+
+class SimulatedDesktop:
+    """Estado da área de trabalho simulada: janelas, foco e último input"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.windows = {}  # hwnd -> {'pid', 'executable', 'title'}
+        self.foreground = 0
+        self.last_input = clock.monotonic()
+        self._next_hwnd = 0x10000
+        self._next_pid = 1000
+        self._pids = {}  # executável -> pid (uma instância por aplicativo)
+
+    def open_window(self, executable, title, focus=True):
+        pid = self._pids.get(executable)
+        if pid is None:
+            self._next_pid += 4
+            pid = self._pids[executable] = self._next_pid
+        self._next_hwnd += 2
+        hwnd = self._next_hwnd
+        self.windows[hwnd] = {'pid': pid, 'executable': executable, 'title': title}
+        if focus:
+            self.foreground = hwnd
+        return hwnd
+
+    def close_window(self, hwnd):
+        window = self.windows.pop(hwnd, None)
+        if window and not any(w['pid'] == window['pid'] for w in self.windows.values()):
+            self._pids.pop(window['executable'], None)
+        if self.foreground == hwnd:
+            self.foreground = next(reversed(self.windows), 0) if self.windows else 0
+
+    def focus(self, hwnd):
+        if hwnd in self.windows:
+            self.foreground = hwnd
+
+    def set_title(self, hwnd, title):
+        if hwnd in self.windows:
+            self.windows[hwnd]['title'] = title
+
+    def touch_input(self, at=None):
+        self.last_input = self.clock.monotonic() if at is None else at
+
+
+class ScriptedUserModel:
+    """Modelo de usuário roteirizado.
+
+    ``script`` é uma lista de ``(segundos, ação, *args)`` em ordem:
+
+    - ``('open', executável, título)``: abre e foca uma janela
+    - ``('focus', executável)`` / ``('title', executável, título)`` / ``('close', executável)``
+    - ``('idle',)``: o usuário para de usar mouse/teclado
+    - ``('active',)``: o usuário volta (input contínuo até o próximo ``idle``)
+    """
+
+    def __init__(self, script):
+        self.script = sorted(script, key=lambda step: step[0])
+        self._index = 0
+        self._active = True
+
+    def next_change(self):
+        """Instante (monotônico) do próximo passo do roteiro (None se acabou)"""
+        return self.script[self._index][0] if self._index < len(self.script) else None
+
+    def _find(self, desktop, executable):
+        for hwnd, window in desktop.windows.items():
+            if window['executable'] == executable:
+                return hwnd
+        return None
+
+    def advance(self, desktop, now):
+        while self._index < len(self.script) and self.script[self._index][0] <= now:
+            at, action, *args = self.script[self._index]
+            self._index += 1
+            if self._active:
+                desktop.touch_input(at)
+            if action == 'open':
+                desktop.open_window(args[0], args[1])
+            elif action == 'focus':
+                desktop.focus(self._find(desktop, args[0]))
+            elif action == 'title':
+                desktop.set_title(self._find(desktop, args[0]), args[1])
+            elif action == 'close':
+                desktop.close_window(self._find(desktop, args[0]))
+            elif action == 'idle':
+                self._active = False
+            elif action == 'active':
+                self._active = True
+                desktop.touch_input(at)
+        if self._active:
+            desktop.touch_input(now)
+
+
+# Catálogo padrão do modelo aleatório: (executável, títulos, muda título com frequência)
+DEFAULT_APPS = [
+    ('chrome.exe', ['GitHub - Google Chrome', 'Caixa de entrada ({n}) - Gmail - Google Chrome',
+                    'Jira - Google Chrome', 'Stack Overflow - Google Chrome',
+                    '({n}) WhatsApp - Google Chrome'], True),
+    ('OUTLOOK.EXE', ['Caixa de Entrada - Outlook', 'Calendário - Outlook'], True),
+    ('EXCEL.EXE', ['Relatorio_Mensal.xlsx - Excel', 'Orcamento 2026.xlsx - Excel'], False),
+    ('WINWORD.EXE', ['Proposta Comercial.docx - Word'], False),
+    ('Code.exe', ['monitor.py - pcmon - Visual Studio Code', 'main.py - pcmon - Visual Studio Code',
+                  '● main.py - pcmon - Visual Studio Code'], True),
+    ('Teams.exe', ['({n}) Chat | Microsoft Teams', 'Reunião diária | Microsoft Teams'], True),
+    ('explorer.exe', ['Downloads', 'Documentos'], False),
+    ('notepad.exe', ['notas.txt - Bloco de Notas'], False),
+    ('AcroRd32.exe', ['contrato.pdf - Adobe Acrobat Reader'], False),
+    ('mstsc.exe', ['srv-erp - Conexão de Área de Trabalho Remota'], False),
+]
+
+
+class RandomUserModel:
+    """Modelo de usuário aleatório, porém determinístico pela ``seed``.
+
+    Alterna o foco entre as janelas abertas (média ``mean_focus_seconds``),
+    muda títulos dos aplicativos "dinâmicos", abre e fecha janelas e faz
+    pausas sem input (média a cada ``mean_break_interval`` segundos, com
+    duração entre ``break_range``).
+    """
+
+    def __init__(self, seed=0, initial_windows=12, apps=None, mean_focus_seconds=45.0,
+                 mean_title_seconds=30.0, mean_open_close_seconds=600.0,
+                 mean_break_interval=3000.0, break_range=(120.0, 1200.0)):
+        self.random = random.Random(seed)
+        self.apps = apps or DEFAULT_APPS
+        self.initial_windows = initial_windows
+        self.mean_focus_seconds = mean_focus_seconds
+        self.mean_title_seconds = mean_title_seconds
+        self.mean_open_close_seconds = mean_open_close_seconds
+        self.mean_break_interval = mean_break_interval
+        self.break_range = break_range
+        self._initialized = False
+        self._now = 0.0
+        self._on_break_until = None
+        self._next = {}
+
+    def _exp(self, mean):
+        return self.random.expovariate(1.0 / mean)
+
+    def _pick_title(self, titles):
+        # "{n}": contador de não lidas que muda a cada troca de título
+        title = self.random.choice(titles)
+        return title.format(n=self.random.randint(1, 30)) if '{n}' in title else title
+
+    def _open_random(self, desktop, focus):
+        executable, titles, _ = self.random.choice(self.apps)
+        desktop.open_window(executable, self._pick_title(titles), focus=focus)
+
+    def _initialize(self, desktop, now):
+        for _ in range(self.initial_windows):
+            self._open_random(desktop, focus=True)
+        self._now = now
+        self._next = {
+            'focus': now + self._exp(self.mean_focus_seconds),
+            'title': now + self._exp(self.mean_title_seconds),
+            'open_close': now + self._exp(self.mean_open_close_seconds),
+            'break': now + self._exp(self.mean_break_interval),
+        }
+        self._initialized = True
+
+    def next_change(self):
+        """Instante (monotônico) do próximo evento do modelo (None antes da primeira chamada)"""
+        return min(self._next.values()) if self._initialized else None
+
+    def advance(self, desktop, now):
+        if not self._initialized:
+            self._initialize(desktop, now)
+
+        while True:
+            kind, at = min(self._next.items(), key=lambda item: item[1])
+            if at > now:
+                break
+            self._now = at
+            self._handle(desktop, kind, at)
+
+        if self._on_break_until is None:
+            desktop.touch_input(now)
+
+    def _handle(self, desktop, kind, at):
+        on_break = self._on_break_until is not None
+
+        if kind == 'break':
+            if on_break:
+                # Fim da pausa: volta a usar o computador
+                self._on_break_until = None
+                desktop.touch_input(at)
+                self._next['break'] = at + self._exp(self.mean_break_interval)
+            else:
+                desktop.touch_input(at)
+                duration = self.random.uniform(*self.break_range)
+                self._on_break_until = at + duration
+                self._next['break'] = at + duration
+            return
+
+        if on_break:
+            # Durante a pausa nada muda na tela
+            self._next[kind] = self._on_break_until + self._exp(self._mean_for(kind))
+            return
+
+        desktop.touch_input(at)
+        handles = list(desktop.windows)
+        if kind == 'focus' and handles:
+            desktop.focus(self.random.choice(handles))
+        elif kind == 'title' and desktop.foreground in desktop.windows:
+            window = desktop.windows[desktop.foreground]
+            for executable, titles, dynamic in self.apps:
+                if executable == window['executable'] and dynamic:
+                    desktop.set_title(desktop.foreground, self._pick_title(titles))
+        elif kind == 'open_close':
+            if handles and (len(handles) > self.initial_windows or self.random.random() < 0.5):
+                desktop.close_window(self.random.choice(handles))
+            else:
+                self._open_random(desktop, focus=True)
+        self._next[kind] = at + self._exp(self._mean_for(kind))
+
+    def _mean_for(self, kind):
+        return {
+            'focus': self.mean_focus_seconds,
+            'title': self.mean_title_seconds,
+            'open_close': self.mean_open_close_seconds,
+        }[kind]
+
+
+class SimulatedBackend(PlatformBackend):
+    """Backend simulado: o modelo de usuário altera a área de trabalho conforme o relógio"""
+
+    def __init__(self, clock, user_model=None, drop_events=0):
+        self.clock = clock
+        self.desktop = SimulatedDesktop(clock)
+        self.user_model = user_model or RandomUserModel()
+        self.drop_events = drop_events  # Fonte de eventos perde 1 notificação a cada N
+        self.calls = 0
+
+    def _sync(self):
+        self.calls += 1
+        self.user_model.advance(self.desktop, self.clock.monotonic())
+
+    def get_foreground_window(self):
+        self._sync()
+        return self.desktop.foreground
+
+    def get_window_title(self, hwnd):
+        window = self.desktop.windows.get(hwnd)
+        return window['title'] if window else ''
+
+    def get_window_pid(self, hwnd):
+        window = self.desktop.windows.get(hwnd)
+        return window['pid'] if window else 0
+
+    def enum_windows(self):
+        self._sync()
+        return list(self.desktop.windows)
+
+    def get_idle_seconds(self):
+        self._sync()
+        return max(0.0, self.clock.monotonic() - self.desktop.last_input)
+
+    def get_process_name(self, pid, hwnd=None):
+        for window in self.desktop.windows.values():
+            if window['pid'] == pid:
+                return window['executable']
+        return None
+
+    def create_event_source(self, clock):
+        return SimulatedEventSource(self, clock, drop_every=self.drop_events)
+
+
+class SimulatedEventSource(EventSource):
+    """Notificações geradas pelo modelo de usuário do ``SimulatedBackend``.
+
+    Em vez de esperar outra thread, ``wait`` avança o relógio até o próximo
+    evento do modelo (ou até o ``timeout``) e compara o primeiro plano e o
+    título com os anteriores: cada mudança vira uma notificação com o
+    instante exato em que o modelo a fez.
+    """
+
+    def __init__(self, backend, clock, drop_every=0):
+        super().__init__()
+        self.backend = backend
+        self.clock = clock
+        self.drop_every = drop_every  # Descarta 1 de cada N (exercita a amostragem de segurança)
+        self.missed = 0
+        self._foreground = None
+        self._title = None
+
+    def start(self):
+        self._changes()
+
+    def wait(self, timeout):
+        pending = super().wait(0)
+        if pending:
+            return pending
+        now = self.clock.monotonic()
+        next_change = self.backend.user_model.next_change()
+        if next_change is not None and next_change < now + timeout:
+            self.clock.sleep(max(0.0, next_change - now))
+        else:
+            self.clock.sleep(timeout)
+        return self._changes()
+
+    def _changes(self):
+        # Avança o modelo sem contar como chamada do monitor ao backend
+        desktop = self.backend.desktop
+        self.backend.user_model.advance(desktop, self.clock.monotonic())
+        foreground = desktop.foreground
+        window = desktop.windows.get(foreground)
+        title = window['title'] if window else None
+        events = []
+        if foreground != self._foreground:
+            events.append(WindowEvent('foreground', foreground, self.clock.monotonic()))
+        elif title != self._title:
+            events.append(WindowEvent('title', foreground, self.clock.monotonic()))
+        self._foreground, self._title = foreground, title
+        self.received += len(events)
+        if events and self.drop_every and self.received % self.drop_every == 0:
+            self.missed += len(events)
+            return []
+        return events
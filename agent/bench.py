@@ -0,0 +1,499 @@
+"""
+Bench - Microbenchmarks dos caminhos quentes do agent, com orçamento de desempenho
+
+Mede, por operação, o tempo (melhor de várias repetições) e a memória (pico
+transitório e bytes retidos, via tracemalloc) do trabalho feito a cada ciclo
+do monitor:
+
+- ``strftime``: formatação dos timestamps dos eventos;
+- ``activity_data`` / ``send_activity``: montagem do dicionário da atividade
+  e do payload do evento (com enqueue);
+- ``poll_active_window``: um ciclo de 2 s sem troca de janela;
+- ``enumerate[N]``: lista de janelas com consulta de processo (``ProcessCache``
+  sobre processos reais, como no ``Win32Backend``);
+- ``snapshot_delta[N]``: diff do snapshot com um título alterado;
+- ``snapshot_json[N]`` / ``snapshot_wire[N]``: serialização de uma baseline
+  completa no lote (só JSON / ``Transport.encode`` com gzip);
+- ``import[main]``: ``import main`` em um interpretador novo (a partida do
+  executável). Falha também se algum módulo de ``DEFERRED_MODULES`` (rede,
+  processos) voltar a ser importado na partida.
+
+N é o número de janelas abertas (10, 100 e 1000 por padrão). Roda em qualquer
+sistema: as janelas vêm de um backend falso (``BenchBackend``).
+
+Os resultados são comparados com ``bench_baseline.json``. Cada benchmark tem
+um orçamento de tempo e de memória (gravados com a baseline, editáveis); se
+algum estourar, o comando termina com erro. Os tempos são normalizados por
+uma carga de calibração, para que uma baseline gravada em outra máquina
+continue valendo.
+
+Uso:
+    python bench.py                      # compara com a baseline (código 1 se estourar)
+    python bench.py --record             # grava nova baseline e orçamentos
+    python bench.py --filter enumerate --windows 10,1000
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import psutil
+
+from backends import DEFAULT_APPS, PlatformBackend, VirtualClock
+from config import Config
+from monitor import ActivityMonitor
+from process_cache import ProcessCache
+
+WINDOW_COUNTS = (10, 100, 1000)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+# Orçamento gravado com a baseline: tempo é mais ruidoso que memória
+TIME_BUDGET = 1.5
+MEMORY_BUDGET = 1.25
+MEMORY_SLACK = 1024  # Bytes de folga (operações pequenas variam alguns blocos)
+STABLE_PROCESS_AGE = 60  # Segundos
+RECORD_PASSES = 3  # A baseline é a mediana de várias passadas, não a mais sortuda
+CONFIRM_RUNS = 2  # Remedições antes de declarar um estouro (ruído não se repete; regressão sim)
+IMPORT_MODULES = ('main',)
+IMPORT_RUNS = 7
+# Carregados só no primeiro envio / primeira coleta, nunca no import do agent
+DEFERRED_MODULES = ('requests', 'urllib3', 'charset_normalizer', 'idna', 'certifi', 'ssl',
+                    'http.client', 'psutil')
+AGENT_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_SCRIPT = '''
+import json, sys, time, tracemalloc
+preloaded = set(sys.modules)  # O site do ambiente pode ter carregado algo antes
+if sys.argv[2] == 'memory':
+    tracemalloc.start()
+started = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'seconds': elapsed,
+    'peak_bytes': tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0,
+    'deferred': [name for name in json.loads(sys.argv[3]) if name in sys.modules and name not in preloaded],
+}))
+'''
+
+
+def _stable_pids(min_age=STABLE_PROCESS_AGE):
+    """PIDs de processos que já rodam há algum tempo: um processo que termina
+    no meio da medição faria cada consulta cair no psutil (ruído, não regressão)"""
+    cutoff = time.time() - min_age
+    pids = []
+    for process in psutil.process_iter(['create_time']):
+        if (process.info['create_time'] or cutoff) < cutoff:
+            pids.append(process.pid)
+    return pids
+
+
+class BenchBackend(PlatformBackend):
+    """N janelas fixas, com PIDs de processos reais consultados pelo ``ProcessCache``"""
+
+    def __init__(self, windows, process_cache=None):
+        self.process_cache = process_cache or ProcessCache()
+        pids = [pid for pid in _stable_pids() if self.process_cache.name(pid)] or [os.getpid()]
+        self.windows = {}
+        for i in range(windows):
+            _, titles, _ = DEFAULT_APPS[i % len(DEFAULT_APPS)]
+            title = titles[i % len(titles)].format(n=i % 30 + 1)
+            self.windows[0x10000 + i * 2] = {'pid': pids[i % len(pids)], 'title': f"{title} #{i}"}
+        self.foreground = next(iter(self.windows))
+
+    def get_foreground_window(self):
+        return self.foreground
+
+    def get_window_title(self, hwnd):
+        window = self.windows.get(hwnd)
+        return window['title'] if window else ''
+
+    def get_window_pid(self, hwnd):
+        window = self.windows.get(hwnd)
+        return window['pid'] if window else 0
+
+    def enum_windows(self):
+        # Mesmo custo do Win32Backend: remove do cache os processos que terminaram
+        self.process_cache.prune()
+        return list(self.windows)
+
+    def get_idle_seconds(self):
+        return 0.0
+
+    def get_process_name(self, pid, hwnd=None):
+        return self.process_cache.name(pid, hwnd)
+
+
+def _create_monitor(windows):
+    monitor = ActivityMonitor(
+        backend=BenchBackend(windows),
+        clock=VirtualClock(),
+        config=Config(api_url='http://127.0.0.1:9'),
+        persist_state=False,
+        background_upload=False
+    )
+    monitor.uploader.queue.maxsize = sys.maxsize  # Sem descartes: a fila é esvaziada entre as medições
+    return monitor
+
+
+def _drain(monitor):
+    return lambda: monitor.uploader.queue.take(sys.maxsize)
+
+
+# ----------------------------------------------------------------------
+# Casos: cada um retorna (operação, reset entre medições ou None)
+# ----------------------------------------------------------------------
+def case_strftime(_):
+    now = datetime(2026, 1, 5, 10, 30, 15, 123456)
+    return lambda: now.strftime('%Y-%m-%d %H:%M:%S'), None
+
+
+def case_strftime_us(_):
+    now = datetime(2026, 1, 5, 10, 30, 15, 123456)
+    return lambda: now.strftime('%Y-%m-%d %H:%M:%S.%f'), None
+
+
+def _current_activity(monitor):
+    monitor.poll_active_window()
+    return monitor.last_activity
+
+
+def case_activity_data(_):
+    monitor = _create_monitor(WINDOW_COUNTS[0])
+    activity = _current_activity(monitor)
+    end_time = monitor.clock.now()
+    return lambda: monitor._build_activity_data(activity, end_time, 42.0), None
+
+
+def case_send_activity(_):
+    monitor = _create_monitor(WINDOW_COUNTS[0])
+    activity_data = monitor._build_activity_data(_current_activity(monitor), monitor.clock.now(), 42.0)
+    return lambda: monitor.send_activity(activity_data, is_checkpoint=True), _drain(monitor)
+
+
+def case_poll_active_window(_):
+    monitor = _create_monitor(WINDOW_COUNTS[0])
+    monitor.poll_active_window()
+    return monitor.poll_active_window, _drain(monitor)
+
+
+def case_enumerate(windows):
+    monitor = _create_monitor(windows)
+    return monitor.get_all_open_windows, None
+
+
+def case_snapshot_delta(windows):
+    monitor = _create_monitor(windows)
+    listed = monitor.get_all_open_windows()
+    encoder = monitor.snapshot_encoder
+    encoder.encode(listed)
+    edited = [dict(window) for window in listed]
+    titles = (edited[-1]['window_title'], edited[-1]['window_title'] + ' *')
+    state = {'flip': 0}
+
+    def operation():
+        state['flip'] ^= 1
+        edited[-1]['window_title'] = titles[state['flip']]
+        return encoder.encode(edited)
+
+    return operation, None
+
+
+def _snapshot_batch(monitor):
+    snapshot = monitor.snapshot_encoder.encode(monitor.get_all_open_windows())
+    return {
+        'session_id': monitor.uploader.session_id,
+        'hostname': monitor.hostname,
+        'username': monitor.username,
+        'events': [{'id': 'bench-1', 'type': 'windows_snapshot', 'data': {
+            'timestamp': monitor.clock.now().strftime('%Y-%m-%d %H:%M:%S'), **snapshot}}],
+    }
+
+
+def case_snapshot_json(windows):
+    payload = _snapshot_batch(_create_monitor(windows))
+    return lambda: json.dumps(payload, separators=(',', ':')).encode('utf-8'), None
+
+
+def case_snapshot_wire(windows):
+    monitor = _create_monitor(windows)
+    payload = _snapshot_batch(monitor)
+    return lambda: monitor.transport.encode(payload), None
+
+
+# (nome, caso, varia com o número de janelas)
+CASES = [
+    ('strftime', case_strftime, False),
+    ('strftime_us', case_strftime_us, False),
+    ('activity_data', case_activity_data, False),
+    ('send_activity', case_send_activity, False),
+    ('poll_active_window', case_poll_active_window, False),
+    ('enumerate', case_enumerate, True),
+    ('snapshot_delta', case_snapshot_delta, True),
+    ('snapshot_json', case_snapshot_json, True),
+    ('snapshot_wire', case_snapshot_wire, True),
+]
+
+
+# ----------------------------------------------------------------------
+# Medição
+# ----------------------------------------------------------------------
+def _timed_loops(operation, loops):
+    started = time.perf_counter()
+    for _ in range(loops):
+        operation()
+    return time.perf_counter() - started
+
+
+def measure(operation, reset=None, min_time=0.05, repeat=5, alloc_runs=20):
+    """Tempo por operação (µs, melhor repetição) e memória (tracemalloc) por operação"""
+    operation()  # Aquecimento (caches, primeira baseline etc.)
+    loops = 1
+    while _timed_loops(operation, loops) < min_time:
+        loops *= 2
+        if reset:
+            reset()
+
+    gc_enabled = gc.isenabled()
+    gc.disable()  # Coletas no meio da medição só adicionam ruído
+    try:
+        times = []
+        for _ in range(repeat):
+            if reset:
+                reset()
+            times.append(_timed_loops(operation, loops) / loops)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    if reset:
+        reset()
+    tracemalloc.start()
+    try:
+        operation()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        operation()
+        peak = tracemalloc.get_traced_memory()[1] - before
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(alloc_runs):
+            operation()
+        retained = (tracemalloc.get_traced_memory()[0] - before) / alloc_runs
+    finally:
+        tracemalloc.stop()
+        if reset:
+            reset()
+
+    times.sort()
+    return {
+        'us': times[0] * 1e6,
+        'median_us': times[len(times) // 2] * 1e6,
+        'peak_bytes': max(0, peak),
+        'retained_bytes': max(0.0, retained),
+        'loops': loops,
+    }
+
+
+def _import_run(module, mode):
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SCRIPT, module, mode, json.dumps(DEFERRED_MODULES)],
+        cwd=AGENT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output)
+
+
+def measure_import(module, runs=IMPORT_RUNS):
+    """Tempo (µs) do import em interpretadores novos e pico de memória do import"""
+    _import_run(module, 'time')  # Aquecimento (.pyc e cache de disco)
+    measured = [_import_run(module, 'time') for _ in range(runs)]
+    times = sorted(run['seconds'] for run in measured)
+    return {
+        'us': times[0] * 1e6,
+        'median_us': times[len(times) // 2] * 1e6,
+        'peak_bytes': _import_run(module, 'memory')['peak_bytes'],
+        'retained_bytes': 0.0,
+        'loops': runs,
+        'deferred_loaded': sorted(set().union(*(run['deferred'] for run in measured))),
+    }
+
+
+def calibrate():
+    """Carga fixa de Python puro (µs): normaliza os tempos entre máquinas"""
+    payload = {f"key{i}": [i, str(i), {'n': i * 1.5}] for i in range(50)}
+    now = datetime(2026, 1, 5, 10, 30, 15)
+
+    def workload():
+        json.dumps(payload)
+        for _ in range(20):
+            now.strftime('%Y-%m-%d %H:%M:%S')
+        sorted(payload, reverse=True)
+
+    return measure(workload, min_time=0.1, repeat=7, alloc_runs=1)['us']
+
+
+def run_benchmarks(window_counts=WINDOW_COUNTS, name_filter=None, min_time=0.05, log=None, only=None):
+    """Roda os casos e retorna {"nome[N]": medição}"""
+    results = {}
+    for name, case, per_windows in CASES:
+        if name_filter and not any(part in name for part in name_filter):
+            continue
+        for windows in (window_counts if per_windows else (None,)):
+            key = f"{name}[{windows}]" if per_windows else name
+            if only is not None and key not in only:
+                continue
+            operation, reset = case(windows)
+            results[key] = measure(operation, reset, min_time=min_time)
+            if log:
+                log(key, results[key])
+    for module in IMPORT_MODULES:
+        key = f"import[{module}]"
+        if (name_filter and not any(part in key for part in name_filter)) or (only is not None and key not in only):
+            continue
+        results[key] = measure_import(module)
+        if log:
+            log(key, results[key])
+    return results
+
+
+def median_results(passes):
+    """Mediana, por benchmark, de várias passadas de ``run_benchmarks``"""
+    merged = {}
+    for key in passes[0]:
+        values = sorted((results[key] for results in passes), key=lambda result: result['us'])
+        merged[key] = values[len(values) // 2]
+    return merged
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def record_baseline(results, calibration_us, path=BASELINE_PATH):
+    """Grava a baseline com orçamentos (baseline x fator), mantendo os casos não medidos agora"""
+    baseline = load_baseline(path) or {'benchmarks': {}}
+    scale = calibration_us / baseline['calibration_us'] if baseline.get('calibration_us') else 1.0
+    # Casos antigos continuam valendo, convertidos para a calibração desta máquina
+    for entry in baseline['benchmarks'].values():
+        entry['us'] *= scale
+        entry['budget_us'] *= scale
+    for key, result in results.items():
+        baseline['benchmarks'][key] = {
+            'us': round(result['us'], 3),
+            'budget_us': round(result['us'] * TIME_BUDGET, 3),
+            'peak_bytes': result['peak_bytes'],
+            'budget_peak_bytes': int(result['peak_bytes'] * MEMORY_BUDGET + MEMORY_SLACK),
+        }
+    baseline.update({
+        'calibration_us': round(calibration_us, 3),
+        'recorded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(terse=True),
+        'benchmarks': dict(sorted(baseline['benchmarks'].items())),
+    })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+
+
+def check_budgets(results, baseline, calibration_us):
+    """Compara com a baseline; retorna (linhas do relatório, lista de estouros)"""
+    scale = calibration_us / baseline['calibration_us'] if baseline and baseline.get('calibration_us') else 1.0
+    rows, failures = [], []
+    for key, result in results.items():
+        entry = (baseline or {}).get('benchmarks', {}).get(key)
+        row = {'key': key, **result, 'scale': scale}
+        if result.get('deferred_loaded'):
+            failures.append(f"{key}: importa na partida {', '.join(result['deferred_loaded'])} "
+                            f"(devem carregar só no primeiro uso)")
+        if entry:
+            row['baseline_us'] = entry['us'] * scale
+            row['budget_us'] = entry['budget_us'] * scale
+            row['budget_peak_bytes'] = entry['budget_peak_bytes']
+            if result['us'] > row['budget_us']:
+                failures.append(f"{key}: {result['us']:.2f} µs/op > orçamento {row['budget_us']:.2f} µs/op")
+            if result['peak_bytes'] > entry['budget_peak_bytes']:
+                failures.append(f"{key}: pico de {result['peak_bytes']} bytes/op > orçamento "
+                                f"{entry['budget_peak_bytes']} bytes/op")
+        rows.append(row)
+    return rows, failures
+
+
+def print_report(rows, scale):
+    print(f"{'benchmark':28}{'µs/op':>11}{'baseline':>11}{'Δ':>8}{'orçamento':>11}"
+          f"{'pico KB':>10}{'retido B':>10}")
+    for row in rows:
+        baseline = row.get('baseline_us')
+        change = f"{(row['us'] / baseline - 1) * 100:+.0f}%" if baseline else '-'
+        status = ''
+        if 'budget_us' in row and (row['us'] > row['budget_us'] or row['peak_bytes'] > row['budget_peak_bytes']):
+            status = '  ESTOUROU'
+        if row.get('deferred_loaded'):
+            status += '  IMPORTS NA PARTIDA'
+        baseline_text = f"{baseline:.2f}" if baseline else '-'
+        budget_text = f"{row['budget_us']:.2f}" if 'budget_us' in row else '-'
+        print(f"{row['key']:28}{row['us']:>11.2f}{baseline_text:>11}{change:>8}"
+              f"{budget_text:>11}{row['peak_bytes'] / 1024:>10.1f}"
+              f"{row['retained_bytes']:>10.0f}{status}")
+    print(f"(tempos da baseline ajustados pela calibração: x{scale:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks do agent com orçamento de desempenho')
+    parser.add_argument('--record', action='store_true', help='Grava a baseline e os orçamentos')
+    parser.add_argument('--filter', action='append', help='Só os benchmarks cujo nome contém o texto')
+    parser.add_argument('--windows', default=','.join(map(str, WINDOW_COUNTS)),
+                        help='Números de janelas abertas (ex.: 10,100,1000)')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Segundos mínimos por repetição')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Arquivo da baseline')
+    parser.add_argument('--json', action='store_true', help='Resultado em JSON')
+    args = parser.parse_args()
+
+    window_counts = tuple(int(value) for value in args.windows.split(',') if value)
+    calibration_us = calibrate()
+
+    def log(key, result):
+        if not args.json:
+            print(f"  {key}: {result['us']:.2f} µs/op", file=sys.stderr)
+
+    if args.record:
+        passes = [run_benchmarks(window_counts, args.filter, args.min_time, log) for _ in range(RECORD_PASSES)]
+        results = median_results(passes)
+        record_baseline(results, calibration_us, args.baseline)
+        print(f"Baseline gravada em {args.baseline} ({len(results)} benchmarks, calibração {calibration_us:.1f} µs)")
+        return
+
+    results = run_benchmarks(window_counts, args.filter, args.min_time, log)
+    baseline = load_baseline(args.baseline)
+    rows, failures = check_budgets(results, baseline, calibration_us)
+    for _ in range(CONFIRM_RUNS):
+        if not failures:
+            break
+        # Remede só os que estouraram e fica com a melhor medição de cada um
+        suspects = {failure.split(':')[0] for failure in failures}
+        retry = run_benchmarks(window_counts, args.filter, args.min_time, log, only=suspects)
+        for key, result in retry.items():
+            results[key] = min(results[key], result, key=lambda measured: measured['us'])
+        rows, failures = check_budgets(results, baseline, calibration_us)
+    if args.json:
+        print(json.dumps({'calibration_us': calibration_us, 'results': rows, 'failures': failures}, indent=2))
+    else:
+        print_report(rows, rows[0]['scale'] if rows else 1.0)
+        if baseline is None:
+            print(f"Sem baseline em {args.baseline}: grave uma com --record")
+    if failures:
+        print("\nORÇAMENTO DE DESEMPENHO ESTOURADO:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
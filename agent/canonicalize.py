@@ -0,0 +1,196 @@
+"""
+Canonicalize - Título canônico da janela para identificar a atividade
+
+Títulos com contadores de não lidas, timers, porcentagens de progresso ou
+marcadores de "modificado" (ex.: "(3) Inbox", "47% – Downloading",
+"● main.py") mudam a cada poucos segundos. Se o título bruto fizer parte da
+chave da atividade, cada mudança vira uma atividade nova (e um POST). O
+título canônico remove essas partes: a chave fica estável e o registro
+continua guardando o último título bruto.
+
+Regras: lista de ``[padrão, substituição]`` (regex), aplicadas em ordem. As
+regras padrão valem para todos os executáveis; no config.json é possível
+acrescentar regras por executável (``"*"`` vale para todos)::
+
+    {
+      "title_rules": {
+        "chrome.exe": [["^\\\\[\\\\d+\\\\] ", ""]],
+        "*": [["\\\\s+- Rascunho$", ""]]
+      }
+    }
+
+Uso (relatório de redução sobre um trace gravado):
+    python canonicalize.py dia.trace.gz
+"""
+import argparse
+import json
+import logging
+import re
+from collections import OrderedDict
+
+# Regras padrão (todos os executáveis)
+DEFAULT_RULES = [
+    # Contador de não lidas no início: "(3) Inbox", "(99+) WhatsApp", "[2] Chat"
+    (r'^\s*[(\[]\d+\+?[)\]]\s*', ''),
+    # Contador no fim ou antes do nome do aplicativo: "Caixa de Entrada (12)",
+    # "Inbox (12) - Gmail"
+    (r'\s*[(\[]\d+\+?[)\]]\s*$', ''),
+    (r'\s[(\[]\d+\+?[)\]](?=\s[-–|])', ''),
+    # Marcadores de documento modificado: "● main.py", "*notas.txt", "notas.txt*"
+    (r'^\s*[●•*]\s*', ''),
+    (r'(?<=\S)\s?[●•*](?=\s[-–|]|\s*$)', ''),
+    # Progresso: "47% – Downloading", "Copiando - 12,5 %", "(80%) Build"; o
+    # prefixo/sufixo sai inteiro, com o separador, e no meio só o número
+    (r'^\s*[(\[]?\d{1,3}(?:[.,]\d+)?\s?%[)\]]?\s*(?:[-–|:]\s*)?', ''),
+    (r'\s*(?:[-–|:]\s*)?[(\[]?\b\d{1,3}(?:[.,]\d+)?\s?%[)\]]?\s*$', ''),
+    (r'\s?\b\d{1,3}(?:[.,]\d+)?\s?%', ''),
+    # Timers e relógios: "01:23", "1:02:03"
+    (r'\b\d{1,2}:\d{2}(?::\d{2})?\b', '#:#'),
+    # Espaços repetidos deixados pelas substituições
+    (r'\s{2,}', ' '),
+]
+
+CACHE_SIZE = 2048
+
+
+def compile_rules(rules):
+    """Compila ``[(padrão, substituição), ...]``; regras inválidas são ignoradas (com log)"""
+    compiled = []
+    for rule in rules or []:
+        try:
+            pattern, replacement = rule
+            compiled.append((re.compile(pattern), replacement))
+        except (TypeError, ValueError, re.error) as e:
+            logging.error(f"Regra de título inválida {rule!r}: {str(e)}")
+    return compiled
+
+
+class TitleCanonicalizer:
+    """Aplica as regras padrão e as do executável (``rules``: executável -> regras)"""
+
+    def __init__(self, rules=None, use_defaults=True):
+        self._default = compile_rules(DEFAULT_RULES) if use_defaults else []
+        self._by_executable = {}
+        for executable, executable_rules in (rules or {}).items():
+            key = executable.lower()
+            self._by_executable[key] = self._by_executable.get(key, []) + compile_rules(executable_rules)
+        self._cache = OrderedDict()  # LRU: (executável, título) -> título canônico
+        self.hits = 0
+        self.misses = 0
+
+    def _rules_for(self, executable):
+        specific = self._by_executable.get((executable or '').lower(), [])
+        return specific + self._by_executable.get('*', []) + self._default
+
+    def canonicalize(self, executable, title):
+        """Título canônico (estável) de ``title``; vazio vira o título original"""
+        if not title:
+            return title
+        key = (executable, title)
+        canonical = self._cache.get(key)
+        if canonical is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return canonical
+
+        self.misses += 1
+        canonical = title
+        for pattern, replacement in self._rules_for(executable):
+            canonical = pattern.sub(replacement, canonical)
+        canonical = canonical.strip() or title
+
+        self._cache[key] = canonical
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return canonical
+
+    def key(self, executable, title):
+        """Chave da atividade: executável + título canônico"""
+        return f"{executable}_{self.canonicalize(executable, title)}"
+
+
+def measure_trace(path, canonicalizer, min_duration=1.0):
+    """Conta as atividades que o monitor criaria num trace, com e sem canonicalização.
+
+    Percorre a janela em primeiro plano amostra a amostra e conta as trocas
+    de chave (cada troca fecha uma atividade e abre outra, ou seja, um
+    INSERT). Atividades com menos de ``min_duration`` segundos não são
+    enviadas pelo monitor e não entram na contagem.
+    """
+    from tracefile import read_trace
+
+    header, samples = read_trace(path)
+    windows = {}
+    counters = {}
+    collapsed = {}
+
+    def count(name, key, t):
+        state = counters.setdefault(name, {'key': None, 'since': 0.0, 'activities': 0})
+        if key != state['key']:
+            if state['key'] is not None and t - state['since'] >= min_duration:
+                state['activities'] += 1
+            state['key'] = key
+            state['since'] = t
+
+    t = 0.0
+    for t, foreground, _, changes in samples:
+        if changes:
+            for hwnd, _, executable, title, _ in changes['upsert']:
+                windows[hwnd] = (executable, title)
+            for hwnd in changes['remove']:
+                windows.pop(hwnd, None)
+        if foreground not in windows:
+            continue
+        executable, title = windows[foreground]
+        if not title:
+            continue
+        canonical = canonicalizer.canonicalize(executable, title)
+        if canonical != title:
+            collapsed.setdefault((executable, canonical), set()).add(title)
+        count('raw', f"{executable}_{title}", t)
+        count('canonical', f"{executable}_{canonical}", t)
+
+    for name in counters:
+        count(name, None, t)  # Fecha a última atividade
+
+    raw = counters.get('raw', {}).get('activities', 0)
+    canonical = counters.get('canonical', {}).get('activities', 0)
+    return {
+        'hours': (samples[-1][0] / 3600) if samples else 0.0,
+        'samples': len(samples),
+        'raw_activities': raw,
+        'canonical_activities': canonical,
+        'reduction': (1 - canonical / raw) if raw else 0.0,
+        'collapsed': sorted(
+            ((executable, canonical_title, len(titles)) for (executable, canonical_title), titles in collapsed.items()),
+            key=lambda item: -item[2]
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Redução de atividades pela canonicalização de títulos')
+    parser.add_argument('trace', help='Arquivo de trace (.trace.gz)')
+    parser.add_argument('--config', help='config.json com "title_rules" adicionais')
+    parser.add_argument('--no-defaults', action='store_true', help='Não aplicar as regras padrão')
+    parser.add_argument('--top', type=int, default=10, help='Títulos canônicos mais agrupados a listar')
+    args = parser.parse_args()
+
+    rules = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            rules = json.load(f).get('title_rules', {})
+
+    canonicalizer = TitleCanonicalizer(rules, use_defaults=not args.no_defaults)
+    result = measure_trace(args.trace, canonicalizer)
+
+    print(f"Trace: {result['hours']:.1f}h, {result['samples']} amostras")
+    print(f"Atividades com título bruto:    {result['raw_activities']}")
+    print(f"Atividades com título canônico: {result['canonical_activities']} "
+          f"({result['reduction'] * 100:.1f}% a menos)")
+    for executable, canonical_title, variants in result['collapsed'][:args.top]:
+        print(f"  {executable}: {canonical_title!r} <- {variants} títulos")
+
+
+if __name__ == '__main__':
+    main()
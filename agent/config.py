@@ -4,13 +4,88 @@ Configuração do monitor
 import json
 import os
 
+
+def get_data_dir():
+    """Retorna o diretório de dados do agent (svch), ou None se nenhum for gravável"""
+    # Lista de diretórios para tentar (do mais específico ao mais genérico)
+    possible_dirs = [
+        os.path.join(os.environ.get('LOCALAPPDATA', ''), 'svch'),
+        os.path.join(os.environ.get('APPDATA', ''), 'svch'),
+        os.path.join(os.path.expanduser('~'), '.svch'),
+        os.path.join(os.environ.get('TEMP', ''), 'svch'),
+    ]
+    
+    # Tenta cada diretório até conseguir criar um arquivo nele
+    for data_dir in possible_dirs:
+        if not data_dir or data_dir.startswith(os.sep):  # Skip se vazio ou inválido
+            continue
+            
+        try:
+            os.makedirs(data_dir, exist_ok=True)
+            test_file = os.path.join(data_dir, 'monitor.log')
+            
+            # Testa se consegue escrever no diretório
+            with open(test_file, 'a') as f:
+                f.write('')
+            
+            return data_dir
+        except (PermissionError, OSError):
+            continue
+    
+    return None
+
+
+DEFAULT_API_URL = 'http://pcmon.uniware.net.br:8090'
+
+
 class Config:
-    def __init__(self):
-        # Tenta carregar do arquivo de configuração
-        self.API_URL = self._load_api_url()
+    def __init__(self, api_url=None, title_rules=None, wire_format=None, startup_spread=None, capture_mode=None):
+        file_config = self._load_file()
+        # URL explícita (simulação/testes) ou carregada do arquivo de configuração
+        self.API_URL = api_url or self._load_api_url(file_config)
+        # Regras extras de canonicalização de títulos, por executável (ver canonicalize.py)
+        if title_rules is None:
+            title_rules = (file_config or {}).get('title_rules', {})
+        self.TITLE_RULES = title_rules if isinstance(title_rules, dict) else {}
+        # Formato dos envios: 'json' ou 'msgpack' (usado só se o servidor aceitar; ver wire.py)
+        self.WIRE_FORMAT = wire_format or (file_config or {}).get('wire_format', 'json')
+        # Intervalos base das tarefas (segundos), substituindo os padrões do monitor:
+        # {"windows_snapshot": 10, "mouse_activity": 60, "checkpoint": 60, ...}
+        intervals = (file_config or {}).get('intervals', {})
+        self.INTERVALS = {
+            name: float(value) for name, value in (intervals if isinstance(intervals, dict) else {}).items()
+            if isinstance(value, (int, float)) and value > 0
+        }
+        # Atraso aleatório (0 a N segundos) do primeiro envio e das tarefas
+        # periódicas, para computadores ligados juntos não enviarem juntos
+        if startup_spread is None:
+            startup_spread = self._number(file_config, 'startup_spread', 60)
+        self.STARTUP_SPREAD = startup_spread
+        # Consulta periódica às dicas de taxa do servidor (0 desativa; ver hints.py)
+        self.CONFIG_INTERVAL = self._number(file_config, 'config_interval', 900)
+        self.MAX_BATCH_SIZE = int(self._number(file_config, 'max_batch_size', 50)) or 50
+        # Métricas do agent: gravação de metrics.json e heartbeat para o servidor (0 desativa; ver metrics.py)
+        self.METRICS_INTERVAL = self._number(file_config, 'metrics_interval', 60)
+        self.HEARTBEAT_INTERVAL = self._number(file_config, 'heartbeat_interval', 900)
+        # Janela ativa: 'events' (notificações do sistema, com amostragem de segurança a cada
+        # event_poll_interval segundos) ou 'poll' (amostragem a cada 2 s); ver backends.EventSource
+        self.CAPTURE_MODE = capture_mode or (file_config or {}).get('capture_mode', 'events')
+        self.EVENT_POLL_INTERVAL = self._number(file_config, 'event_poll_interval', 30) or 30
+        # Log: rotação por tamanho e supressão de erros repetidos (0 desativa a supressão; ver log_queue.py)
+        self.LOG_MAX_BYTES = int(self._number(file_config, 'log_max_bytes', 2 * 1024 * 1024)) or 2 * 1024 * 1024
+        self.LOG_BACKUPS = int(self._number(file_config, 'log_backups', 3))
+        self.LOG_DEDUP_INTERVAL = self._number(file_config, 'log_dedup_interval', 60)
     
-    def _load_api_url(self):
-        """Carrega URL da API do arquivo de configuração"""
+    @staticmethod
+    def _number(file_config, key, default):
+        """Valor numérico não negativo do config.json (ou o padrão)"""
+        value = (file_config or {}).get(key, default)
+        if not isinstance(value, (int, float)) or value < 0:
+            return default
+        return value
+    
+    def _load_file(self):
+        """Carrega o primeiro config.json válido (ou None)"""
         # Lista de possíveis locais para o config.json (em ordem de prioridade)
         possible_paths = [
             # 1. Mesmo diretório do executável
@@ -29,9 +104,16 @@ class Config:
                 try:
                     with open(config_path, 'r') as f:
                         config = json.load(f)
-                        return config.get('api_url', 'http://pcmon.uniware.net.br:8090')
+                    if isinstance(config, dict):
+                        return config
                 except Exception:
                     continue
+        return None
+    
+    def _load_api_url(self, file_config):
+        """Carrega URL da API do arquivo de configuração"""
+        if file_config is not None:
+            return file_config.get('api_url', DEFAULT_API_URL)
         
         # Fallback: variável de ambiente ou padrão
-        return os.environ.get('API_URL', 'http://pcmon.uniware.net.br:8090')
+        return os.environ.get('API_URL', DEFAULT_API_URL)
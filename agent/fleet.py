@@ -0,0 +1,384 @@
+"""
+Fleet - Gerador de carga: milhares de agents simulados contra a API
+
+Cada agent é um ``ActivityMonitor`` de verdade (mesma montagem de payloads,
+lotes, presença, snapshots delta e checkpoints), com janelas e input do
+``SimulatedBackend`` (um ``RandomUserModel`` por agent) e relógio real: janela
+ativa a cada 2s, snapshots a cada 10s, checkpoints a cada 60s etc. Um único
+loop roda os schedulers de todos os agents; os envios HTTP vão para um pool
+de threads que compartilha o pool de conexões.
+
+Perfis de entrada (``--profile``):
+
+- ``burst[:S]``: todos ligam o computador às 8:00, dentro de S segundos
+  (padrão 30); o espalhamento dos envios fica por conta do ``startup_spread``
+  do agent (``--startup-spread 0`` mostra a frota sem ele);
+- ``linear:S``: os agents entram um a um ao longo de S segundos;
+- ``steps:N:S``: N degraus iguais, um a cada S segundos.
+
+Ao final mostra vazão (requisições e eventos por segundo, pico em 1s e 10s),
+latência p50/p95/p99 e taxa de erros por rota, latência dos eventos (do
+enqueue à confirmação) e o atraso do próprio gerador — se ele passar de
+alguns segundos, a máquina não dá conta de tantos agents e os números
+subestimam a carga.
+
+Uso:
+    python fleet.py --target stand-in --agents 1000 --duration 600
+    python fleet.py --url http://localhost:8090 --agents 3000 --profile burst --duration 900
+    python fleet.py --target collector --agents 2000 --profile linear:300 --duration 900
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backends import RandomUserModel, SimulatedBackend, SystemClock
+from config import Config
+from monitor import ActivityMonitor
+from transport import Transport
+
+BURST_WINDOW = 30.0  # Segundos em que a frota liga o computador no perfil burst
+TIMELINE_BUCKET = 60  # Segundos por linha da linha do tempo do relatório
+
+
+def start_offsets(profile, agents, rng):
+    """Instante de entrada (segundos desde o início) de cada agent, conforme o perfil"""
+    name, _, args = profile.partition(':')
+    params = [float(value) for value in args.split(':')] if args else []
+    if name == 'burst':
+        window = params[0] if params else BURST_WINDOW
+        return sorted(rng.uniform(0, window) for _ in range(agents))
+    if name == 'linear' and len(params) == 1:
+        return [i * params[0] / agents for i in range(agents)]
+    if name == 'steps' and len(params) == 2:
+        steps, interval = max(1, int(params[0])), params[1]
+        per_step = -(-agents // steps)
+        return [(i // per_step) * interval for i in range(agents)]
+    raise ValueError(f"Perfil inválido: {profile} (use burst[:S], linear:S ou steps:N:S)")
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class FleetStats:
+    """Métricas da frota, alimentadas pelas threads de envio"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started_at = clock()
+        self._lock = threading.Lock()
+        self.endpoints = defaultdict(lambda: {'requests': 0, 'errors': 0, 'statuses': defaultdict(int),
+                                              'latencies': []})
+        self.per_second = defaultdict(lambda: [0, 0])  # segundo -> [requisições, erros]
+        self.events = defaultdict(int)
+        self.event_latencies = []
+
+    def on_request(self, endpoint, latency, status):
+        error = status is None or status >= 400
+        second = int(self.clock() - self.started_at)
+        with self._lock:
+            counters = self.endpoints[endpoint]
+            counters['requests'] += 1
+            counters['errors'] += error
+            counters['statuses']['erro de conexão' if status is None else status] += 1
+            counters['latencies'].append(latency)
+            bucket = self.per_second[second]
+            bucket[0] += 1
+            bucket[1] += error
+
+    def on_delivered(self, event, latency):
+        with self._lock:
+            self.events[event['type']] += 1
+            if latency is not None:
+                self.event_latencies.append(latency)
+
+    def peak(self, window, until):
+        """Maior média de requisições/s em uma janela de ``window`` segundos, antes de ``until``"""
+        with self._lock:
+            counts = {second: bucket[0] for second, bucket in self.per_second.items() if second < until}
+        if not counts:
+            return 0.0
+        running = best = 0
+        for second in range(max(counts) + 1):
+            running += counts.get(second, 0) - counts.get(second - window, 0)
+            best = max(best, running)
+        return best / window
+
+
+class FleetAgent:
+    __slots__ = ('index', 'start_at', 'monitor', 'future')
+
+    def __init__(self, index, start_at):
+        self.index = index
+        self.start_at = start_at
+        self.monitor = None
+        self.future = None  # Envio em andamento no pool
+
+
+class Fleet:
+    """N agents simulados, com entrada escalonada conforme o perfil"""
+
+    def __init__(self, api_url, agents=100, profile='burst', workers=32, startup_spread=None,
+                 seed=0, wire_format='json', timeout=10):
+        self.api_url = api_url.rstrip('/')
+        self.profile = profile
+        self.seed = seed
+        self.wire_format = wire_format
+        self.timeout = timeout
+        # Amostragem: o loop da frota chama run_pending e não espera notificações de janela
+        self.config = Config(api_url=self.api_url, wire_format=wire_format, startup_spread=startup_spread,
+                             capture_mode='poll')
+        self.clock = SystemClock()
+        rng = random.Random(seed)
+        self.agents = [FleetAgent(i, offset) for i, offset in enumerate(start_offsets(profile, agents, rng))]
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fleet')
+        # Uma sessão (pool de conexões) para todos os agents: cada thread do pool usa uma conexão
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.stats = None
+        self.lag = []  # Atraso do loop em relação ao prazo de cada agent
+
+    def _create_monitor(self, agent):
+        transport = Transport(self.api_url, timeout=self.timeout, wire_format=self.wire_format,
+                              session=self.session)
+        transport.on_request = self.stats.on_request
+        monitor = ActivityMonitor(
+            backend=SimulatedBackend(self.clock, RandomUserModel(seed=self.seed * 100003 + agent.index)),
+            clock=self.clock,
+            config=self.config,
+            persist_state=False,
+            background_upload=False,
+            transport=transport,
+            hostname=f"FLEET-{agent.index:05d}",
+            username=f"usuario{agent.index:05d}"
+        )
+        monitor.uploader.on_delivered = self.stats.on_delivered
+        monitor.prepare()
+        # Envio fora do loop: a tarefa só despacha para o pool quando há o que enviar
+        monitor.scheduler.cancel('upload')
+        monitor.scheduler.add('upload', lambda: self._dispatch(agent), 1)
+        return monitor
+
+    def _dispatch(self, agent):
+        if agent.future is not None and not agent.future.done():
+            return
+        uploader = agent.monitor.uploader
+        if uploader.is_due() or uploader.config_due():
+            agent.future = self.pool.submit(agent.monitor.pump_uploader)
+
+    def run(self, duration):
+        """Roda a frota por ``duration`` segundos, encerra os agents e retorna o resultado"""
+        self.stats = FleetStats(self.clock.monotonic)
+        started_at = self.stats.started_at
+        ends_at = started_at + duration
+        heap = [(started_at + agent.start_at, agent.index) for agent in self.agents]
+        heapq.heapify(heap)
+
+        while heap:
+            deadline, index = heap[0]
+            now = self.clock.monotonic()
+            if now >= ends_at:
+                break
+            if deadline > now:
+                time.sleep(min(deadline, ends_at) - now)
+                continue
+            heapq.heappop(heap)
+            self.lag.append(now - deadline)
+
+            agent = self.agents[index]
+            try:
+                if agent.monitor is None:
+                    agent.monitor = self._create_monitor(agent)
+                delay = agent.monitor.scheduler.run_pending()
+            except Exception as e:
+                logging.error(f"Erro no agent {index}: {str(e)}")
+                delay = 1.0
+            if delay is not None:
+                heapq.heappush(heap, (self.clock.monotonic() + delay, index))
+        load_seconds = self.clock.monotonic() - started_at
+
+        # Encerramento: atividade atual, totais do dia e o que restou na fila
+        drain_started = self.clock.monotonic()
+        running = [agent for agent in self.agents if agent.monitor is not None]
+        wait([agent.future for agent in running if agent.future is not None])
+        wait([self.pool.submit(agent.monitor.finish) for agent in running])
+        drain_seconds = self.clock.monotonic() - drain_started
+        self.pool.shutdown()
+        self.session.close()
+        return self._result(len(running), load_seconds, drain_seconds)
+
+    def _result(self, started, load_seconds, drain_seconds):
+        stats = self.stats
+        # Vazão e linha do tempo só na fase de carga; o encerramento (todos os
+        # agents enviando o que restou ao mesmo tempo) é artefato do gerador
+        load_until = int(load_seconds)
+        load_requests = sum(bucket[0] for second, bucket in stats.per_second.items() if second < load_until)
+        endpoints = {}
+        requests_total = errors_total = 0
+        for endpoint, counters in sorted(stats.endpoints.items()):
+            latencies = sorted(counters['latencies'])
+            requests_total += counters['requests']
+            errors_total += counters['errors']
+            endpoints[endpoint] = {
+                'requests': counters['requests'],
+                'errors': counters['errors'],
+                'error_rate': counters['errors'] / counters['requests'],
+                'statuses': dict(counters['statuses']),
+                'p50_ms': _percentile(latencies, 0.5) * 1000,
+                'p95_ms': _percentile(latencies, 0.95) * 1000,
+                'p99_ms': _percentile(latencies, 0.99) * 1000,
+                'max_ms': latencies[-1] * 1000,
+            }
+
+        monitors = [agent.monitor for agent in self.agents if agent.monitor is not None]
+        transport_totals = defaultdict(int)
+        for monitor in monitors:
+            counters = monitor.transport.counters
+            for key in ('retries', 'circuit_rejections', 'bytes_sent'):
+                transport_totals[key] += counters[key]
+        lag = sorted(self.lag)
+        events_total = sum(stats.events.values())
+        timeline = defaultdict(lambda: [0, 0])
+        for second, (count, errors) in stats.per_second.items():
+            if second >= load_until:
+                continue
+            bucket = timeline[second // TIMELINE_BUCKET * TIMELINE_BUCKET]
+            bucket[0] += count
+            bucket[1] += errors
+
+        result = {
+            'agents': len(self.agents),
+            'started': started,
+            'profile': self.profile,
+            'startup_spread': self.config.STARTUP_SPREAD,
+            'load_seconds': load_seconds,
+            'drain_seconds': drain_seconds,
+            'requests': requests_total,
+            'errors': errors_total,
+            'error_rate': errors_total / requests_total if requests_total else 0.0,
+            'requests_per_second': load_requests / load_until if load_until else 0.0,
+            'peak_rps_1s': stats.peak(1, load_until),
+            'peak_rps_10s': stats.peak(10, load_until),
+            'events': dict(stats.events),
+            'events_per_second': events_total / (load_seconds + drain_seconds),
+            'bytes_sent': transport_totals['bytes_sent'],
+            'retries': transport_totals['retries'],
+            'circuit_rejections': transport_totals['circuit_rejections'],
+            'events_pending': sum(monitor.uploader.pending_count() for monitor in monitors),
+            'endpoints': endpoints,
+            'timeline': {start: tuple(bucket) for start, bucket in sorted(timeline.items())},
+            'generator_lag_p95': _percentile(lag, 0.95) if lag else 0.0,
+            'generator_lag_max': lag[-1] if lag else 0.0,
+        }
+        latencies = sorted(stats.event_latencies)
+        if latencies:
+            result['event_latency'] = {
+                'p50': _percentile(latencies, 0.5),
+                'p95': _percentile(latencies, 0.95),
+                'p99': _percentile(latencies, 0.99),
+                'max': latencies[-1],
+            }
+        return result
+
+
+def print_report(result):
+    print(f"{result['started']}/{result['agents']} agents, perfil {result['profile']}, "
+          f"startup_spread {result['startup_spread']:g}s: {result['load_seconds']:.0f}s de carga "
+          f"+ {result['drain_seconds']:.1f}s de encerramento")
+    print(f"Requisições:  {result['requests']} ({result['requests_per_second']:.1f}/s durante a carga, "
+          f"pico {result['peak_rps_10s']:.1f}/s em 10s e {result['peak_rps_1s']:.0f}/s em 1s)")
+    print(f"Eventos:      {sum(result['events'].values())} confirmados ({result['events_per_second']:.1f}/s), "
+          f"{result['events_pending']} pendentes ao final")
+    print(f"Erros:        {result['errors']} ({result['error_rate'] * 100:.2f}%), "
+          f"{result['retries']} retentativas, {result['circuit_rejections']} recusas do circuit breaker")
+    print(f"{'rota':32}{'req':>8}{'erros':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'máx ms':>9}")
+    for endpoint, counters in result['endpoints'].items():
+        print(f"{endpoint:32}{counters['requests']:>8}{counters['error_rate'] * 100:>7.1f}%"
+              f"{counters['p50_ms']:>9.1f}{counters['p95_ms']:>9.1f}{counters['p99_ms']:>9.1f}"
+              f"{counters['max_ms']:>9.0f}")
+        failures = {status: count for status, count in counters['statuses'].items()
+                    if not isinstance(status, int) or status >= 400}
+        if failures:
+            print(f"{'':4}falhas: {failures}")
+    for event_type, count in sorted(result['events'].items()):
+        print(f"  {event_type}: {count} eventos")
+    if 'event_latency' in result:
+        latency = result['event_latency']
+        print(f"Latência dos eventos (enqueue → confirmação): p50 {latency['p50']:.1f}s, "
+              f"p95 {latency['p95']:.1f}s, p99 {latency['p99']:.1f}s, máx {latency['max']:.1f}s")
+    print(f"Linha do tempo (req/s a cada {TIMELINE_BUCKET}s):")
+    for start, (count, errors) in result['timeline'].items():
+        print(f"  {start:>6}s  {count / TIMELINE_BUCKET:>8.1f}/s  {errors:>6} erros")
+    print(f"Atraso do gerador: p95 {result['generator_lag_p95'] * 1000:.0f} ms, "
+          f"máx {result['generator_lag_max'] * 1000:.0f} ms")
+    if result['generator_lag_p95'] > 1.0:
+        print("  Atenção: o gerador não acompanhou a frota; use menos agents ou mais máquinas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gerador de carga: frota de agents simulados')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='URL da API (PHP, stand-in ou collector já rodando)')
+    target.add_argument('--target', choices=['stand-in', 'collector'],
+                        help='Sobe localmente o stand-in ou o collector (SQLite) em outro processo')
+    parser.add_argument('--agents', type=int, default=100, help='Agents simulados')
+    parser.add_argument('--duration', type=float, default=300.0, help='Segundos de carga')
+    parser.add_argument('--profile', default='burst', help='burst[:S], linear:S ou steps:N:S')
+    parser.add_argument('--workers', type=int, default=32, help='Threads de envio (conexões simultâneas)')
+    parser.add_argument('--startup-spread', type=float, default=None,
+                        help='Espalhamento inicial dos envios de cada agent (padrão: o do config.json, 60s)')
+    parser.add_argument('--wire', choices=['json', 'msgpack'], default='json', help='Formato dos envios')
+    parser.add_argument('--seed', type=int, default=0, help='Seed dos usuários e dos instantes de entrada')
+    parser.add_argument('--json', action='store_true', help='Resultado em JSON')
+    parser.add_argument('--debug', '-d', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.ERROR,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    process = None
+    if args.target:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+        import ingest_bench
+
+        workdir = tempfile.mkdtemp(prefix='pcmon-fleet-')
+        if args.target == 'stand-in':
+            url, process = ingest_bench._spawn('stand_in.py', '--db', os.path.join(workdir, 'stand_in.db'))
+        else:
+            url, process = ingest_bench._spawn('collector.py', '--sqlite', os.path.join(workdir, 'collector.db'))
+    else:
+        url = args.url
+
+    try:
+        fleet = Fleet(url, args.agents, args.profile, args.workers, args.startup_spread, args.seed, args.wire)
+        result = fleet.run(args.duration)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        print(json.dumps(result, indent=2, default=str))
+    else:
+        print_report(result)
+
+
+if __name__ == '__main__':
+    main()
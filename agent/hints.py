@@ -0,0 +1,131 @@
+"""
+Hints - Dicas de taxa enviadas pelo servidor (backpressure da frota)
+
+Quando o servidor está sobrecarregado ele pode pedir aos agents que enviem
+menos, sem precisar redistribuí-los. As dicas chegam no campo
+``agent_config`` das respostas de ``POST /api/batch`` e da consulta
+periódica ``GET /api/agent-config``::
+
+    {
+      "pause_seconds": 120,
+      "interval_multipliers": {"windows_snapshot": 3, "*": 2},
+      "max_batch_size": 100,
+      "config_interval": 900
+    }
+
+- ``pause_seconds``: nenhum envio antes de N segundos (como um Retry-After).
+  Respostas 429/503 com ``Retry-After`` têm o mesmo efeito.
+- ``interval_multipliers``: multiplica o intervalo de cada fluxo de envio
+  (``STREAMS``); ``"*"`` vale para os fluxos não listados.
+- ``max_batch_size``: limite de eventos por lote (nunca acima do do agent).
+- ``config_interval``: intervalo da consulta a ``/api/agent-config``.
+
+A resposta da consulta periódica substitui todas as dicas (``{}`` volta ao
+padrão); as das respostas de lote também. Valores fora dos limites são
+ajustados, para que um servidor mal configurado não pare a frota.
+"""
+import logging
+import random
+import threading
+import time
+
+# Fluxos de envio que aceitam multiplicador de intervalo
+STREAMS = (
+    'windows_snapshot',  # Snapshot de janelas (e keepalive)
+    'mouse_activity',    # Renovação do lease de presença
+    'checkpoint',        # Checkpoint da atividade em andamento
+    'daily_rollup',      # Totais do dia
+    'batch',             # Idade máxima do lote antes do envio
+)
+
+MAX_PAUSE_SECONDS = 3600
+MAX_MULTIPLIER = 10.0
+MAX_BATCH_SIZE = 500
+MIN_CONFIG_INTERVAL = 60
+MAX_CONFIG_INTERVAL = 86400
+# Cada agent estende a pausa em até 25% (e no mínimo alguns segundos), para
+# que a frota não volte toda no mesmo instante
+PAUSE_SPREAD = 0.25
+PAUSE_SPREAD_MIN = 5.0
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class RateHints:
+    """Dicas de taxa em vigor. Atualizadas pela thread de envio e lidas pelo monitor.
+
+    ``version`` muda a cada atualização que altera multiplicadores, para o
+    monitor reaplicar os intervalos só quando necessário.
+    """
+
+    def __init__(self, clock=time.monotonic, rng=None):
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self.multipliers = {}
+        self.max_batch_size = None
+        self.config_interval = None
+        self.pause_until = 0.0
+        self.version = 0
+        self.pauses = 0
+
+    def update(self, config):
+        """Aplica um ``agent_config`` recebido do servidor"""
+        if not isinstance(config, dict):
+            return
+
+        multipliers = {}
+        for stream, value in (config.get('interval_multipliers') or {}).items():
+            if stream != '*' and stream not in STREAMS:
+                continue
+            try:
+                multipliers[stream] = _clamp(float(value), 1.0, MAX_MULTIPLIER)
+            except (TypeError, ValueError):
+                logging.error(f"Multiplicador inválido para {stream}: {value!r}")
+
+        max_batch_size = self._int(config.get('max_batch_size'), 1, MAX_BATCH_SIZE)
+        config_interval = self._int(config.get('config_interval'), MIN_CONFIG_INTERVAL, MAX_CONFIG_INTERVAL)
+
+        with self._lock:
+            if multipliers != self.multipliers:
+                self.multipliers = multipliers
+                self.version += 1
+                logging.info(f"Servidor ajustou os intervalos de envio: {multipliers or 'padrão'}")
+            self.max_batch_size = max_batch_size
+            self.config_interval = config_interval
+
+        pause = self._int(config.get('pause_seconds'), 0, MAX_PAUSE_SECONDS)
+        if pause:
+            self.pause(pause)
+
+    @staticmethod
+    def _int(value, low, high):
+        if value is None:
+            return None
+        try:
+            return int(_clamp(float(value), low, high))
+        except (TypeError, ValueError):
+            return None
+
+    def pause(self, seconds):
+        """Suspende os envios por ``seconds`` (mais uma extensão aleatória)"""
+        seconds = min(float(seconds), MAX_PAUSE_SECONDS)
+        if seconds <= 0:
+            return
+        spread = max(PAUSE_SPREAD_MIN, seconds * PAUSE_SPREAD)
+        until = self.clock() + seconds + self.rng.uniform(0, spread)
+        with self._lock:
+            if until > self.pause_until:
+                self.pause_until = until
+                self.pauses += 1
+                logging.info(f"Servidor pediu pausa nos envios: ~{seconds:.0f}s")
+
+    def pause_remaining(self):
+        """Segundos até o fim da pausa (0 se não há pausa)"""
+        return max(0.0, self.pause_until - self.clock())
+
+    def multiplier(self, stream):
+        multipliers = self.multipliers
+        return multipliers.get(stream, multipliers.get('*', 1.0))
@@ -0,0 +1,200 @@
+"""
+Log queue - Escrita do log em segundo plano, com rotação e supressão de repetidos
+
+O loop do monitor só enfileira o registro (``QueueHandler``); uma thread
+dedicada escreve no arquivo, que é rotacionado por tamanho
+(``monitor.log``, ``monitor.log.1``, ...). Disco lento ou antivírus
+segurando o arquivo não atrasam as amostras.
+
+Erros repetidos (ex.: servidor fora do ar, um erro por envio) passam no
+máximo ``burst`` vezes por ``interval`` segundos com a mesma assinatura (a
+mensagem sem números e endereços). As demais são contadas e viram uma linha
+"N mensagens semelhantes suprimidas" quando a janela termina. Se a fila
+encher, os registros novos são descartados e contados da mesma forma.
+"""
+import logging
+import logging.handlers
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Números, endereços e IDs variam entre repetições do mesmo erro
+_VARIABLE = re.compile(r'0x[0-9a-fA-F]+|[0-9a-f]{12,}|\d+')
+_STOP = object()
+
+
+class DedupFilter(logging.Filter):
+    """Deixa passar ``burst`` mensagens iguais (a partir de ``min_level``) por ``interval`` segundos"""
+
+    def __init__(self, interval=60.0, burst=3, min_level=logging.WARNING, max_keys=256, clock=time.monotonic):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.min_level = min_level
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()  # Registros chegam de todas as threads do agent
+        self._windows = OrderedDict()  # assinatura -> [início, aceitas, suprimidas, origem, mensagem]
+        self._evicted = []  # Resumos de assinaturas removidas por max_keys, escritos na próxima varredura
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno < self.min_level or not self.interval:
+            return True
+        message = record.getMessage()
+        key = (record.levelno, record.name, _VARIABLE.sub('#', message))
+        now = self.clock()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                # Janela nova; as suprimidas da anterior (ainda não resumidas) vão nesta linha
+                pending = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0, (record.name, record.pathname, record.lineno), message]
+                self._windows.move_to_end(key)
+                if len(self._windows) > self.max_keys:
+                    old_key, old_window = self._windows.popitem(last=False)
+                    if old_window[2]:
+                        self._evicted.append(self._summary(old_key, old_window, now))
+                if pending:
+                    record.msg = f"{message} (+{pending} mensagens semelhantes suprimidas antes desta)"
+                    record.args = None
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+    def expired(self, force=False):
+        """Registros de resumo das janelas encerradas com mensagens suprimidas"""
+        now = self.clock()
+        with self._lock:
+            summaries, self._evicted = self._evicted, []
+            for key, window in list(self._windows.items()):
+                if not force and now - window[0] < self.interval:
+                    continue
+                del self._windows[key]
+                if window[2]:
+                    summaries.append(self._summary(key, window, now))
+        return summaries
+
+    def _summary(self, key, window, now):
+        started, _, suppressed, (name, pathname, lineno), message = window
+        return logging.LogRecord(
+            name, key[0], pathname, lineno,
+            f"{suppressed} mensagens semelhantes suprimidas em "
+            f"{min(now - started, self.interval):.0f}s: {message}", None, None
+        )
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler com fila limitada: se a escrita não acompanhar, descarta e conta"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter:
+    """Thread que tira os registros da fila e escreve no handler de destino"""
+
+    def __init__(self, target, maxsize=10000, dedup=None, sweep_interval=5.0):
+        self.target = target
+        self.dedup = dedup
+        self.sweep_interval = sweep_interval
+        self.queue = queue.Queue(maxsize)
+        self.handler = DroppingQueueHandler(self.queue)
+        if dedup is not None:
+            self.handler.addFilter(dedup)
+        self._reported_drops = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while True:
+            try:
+                record = self.queue.get(timeout=self.sweep_interval)
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                break
+            if record is not None:
+                self._write(record)
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                self._write_summaries()
+        # Fim: o que ainda estava na fila e os resumos pendentes
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not _STOP:
+                self._write(record)
+        self._write_summaries(force=True)
+
+    def _write(self, record):
+        try:
+            self.target.handle(record)
+        except Exception:
+            self.target.handleError(record)
+
+    def _write_summaries(self, force=False):
+        if self.dedup is not None:
+            for summary in self.dedup.expired(force):
+                self._write(summary)
+        dropped = self.handler.dropped - self._reported_drops
+        if dropped:
+            self._reported_drops += dropped
+            self._write(logging.LogRecord('root', logging.ERROR, __file__, 0,
+                                          f"{dropped} mensagens de log descartadas (fila de escrita cheia)",
+                                          None, None))
+
+    def stop(self, timeout=5.0):
+        """Escreve o que falta na fila e fecha o arquivo"""
+        logging.getLogger().removeHandler(self.handler)
+        if self._thread is not None:
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+            self._thread = None
+        self.target.close()
+
+
+def configure(log_file=None, level=logging.ERROR, max_bytes=2 * 1024 * 1024, backups=3,
+              dedup_interval=60.0, dedup_burst=3):
+    """Liga o logger raiz à fila; retorna o ``LogWriter`` (chamar ``stop()`` ao sair)"""
+    if log_file:
+        target = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups,
+                                                      encoding='utf-8', delay=True)
+    else:
+        # Fallback: apenas console/stderr
+        target = logging.StreamHandler()
+    target.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+
+    dedup = DedupFilter(interval=dedup_interval, burst=dedup_burst) if dedup_interval else None
+    writer = LogWriter(target, dedup=dedup)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(writer.handler)
+    root.setLevel(level)
+    writer.start()
+    return writer
@@ -2,6 +2,11 @@
 WinSysMonitor - Executável principal
 Roda em segundo plano monitorando atividades
 """
+import time
+
+# Início da linha do tempo da partida (ver metrics.StartupTimeline), antes dos imports
+STARTED_AT = time.perf_counter()
+
 import sys
 import os
 import argparse
@@ -12,61 +17,34 @@ if sys.platform == 'win32':
     import ctypes
     ctypes.windll.user32.ShowWindow(ctypes.windll.kernel32.GetConsoleWindow(), 0)
 
+import log_queue
+from config import Config, get_data_dir
+from metrics import StartupTimeline
 from monitor import ActivityMonitor
 
-def setup_logging(debug_mode=False):
-    """Configura o sistema de logging"""
+def setup_logging(debug_mode=False, config=None):
+    """Configura o sistema de logging (escrita em segundo plano, ver log_queue.py)"""
     # Define nível baseado no modo debug
     level = logging.DEBUG if debug_mode else logging.ERROR
+    config = config or Config()
     
-    # Lista de diretórios para tentar (do mais específico ao mais genérico)
-    possible_log_dirs = [
-        os.path.join(os.environ.get('LOCALAPPDATA', ''), 'svch'),
-        os.path.join(os.environ.get('APPDATA', ''), 'svch'),
-        os.path.join(os.path.expanduser('~'), '.svch'),
-        os.path.join(os.environ.get('TEMP', ''), 'svch'),
-    ]
-    
-    log_file = None
-    
-    # Tenta cada diretório até conseguir criar o arquivo de log
-    for log_dir in possible_log_dirs:
-        if not log_dir or log_dir.startswith(os.sep):  # Skip se vazio ou inválido
-            continue
-            
-        try:
-            os.makedirs(log_dir, exist_ok=True)
-            test_file = os.path.join(log_dir, 'monitor.log')
-            
-            # Testa se consegue escrever no arquivo
-            with open(test_file, 'a') as f:
-                f.write('')
-            
-            log_file = test_file
-            break
-        except (PermissionError, OSError):
-            continue
-    
+    data_dir = get_data_dir()
     # Se nenhum local funcionou, usa apenas console
-    if log_file:
-        logging.basicConfig(
-            filename=log_file,
-            level=level,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-    else:
-        # Fallback: apenas console/stderr
-        logging.basicConfig(
-            level=level,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+    log_file = os.path.join(data_dir, 'monitor.log') if data_dir else None
+    
+    writer = log_queue.configure(
+        log_file,
+        level=level,
+        max_bytes=config.LOG_MAX_BYTES,
+        backups=config.LOG_BACKUPS,
+        dedup_interval=config.LOG_DEDUP_INTERVAL
+    )
     
     if debug_mode:
         logging.info("=" * 50)
         logging.info("WinSysMonitor iniciado em MODO DEBUG")
         logging.info("=" * 50)
+    return writer
 
 def main():
     """Função principal"""
@@ -77,16 +55,23 @@ def main():
     args = parser.parse_args()
     
     # Configura logging
-    setup_logging(args.debug)
+    config = Config()
+    log_writer = setup_logging(args.debug, config)
+    startup = StartupTimeline(origin=STARTED_AT)
+    startup.mark('imports')
     
     try:
         # Inicializar e rodar monitor
-        monitor = ActivityMonitor(debug_mode=args.debug)
+        monitor = ActivityMonitor(debug_mode=args.debug, config=config, startup=startup)
+        startup.mark('monitor_ready')
         monitor.start()
     except KeyboardInterrupt:
         pass
     except Exception as e:
         logging.error(f"Erro fatal: {str(e)}")
+    finally:
+        # Grava o que ainda está na fila do log
+        log_writer.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,221 @@
+"""
+Metrics - Instrumentação do próprio agent
+
+Histogramas de tempo por etapa (enumerar janelas, serializar, enviar), com
+baldes fixos em escala logarítmica: memória constante, qualquer que seja o
+tempo de execução. ``snapshot()`` junta esses tempos com os contadores do
+transporte por rota, a fila de envio, o atraso do loop (scheduler) e o
+RSS/CPU do processo.
+
+O monitor grava o snapshot periodicamente em ``metrics.json`` no diretório de
+dados (``metrics_interval``) e, com menos frequência, envia um resumo
+(``health_summary``) como evento ``agent_health`` junto com os demais do lote
+(``heartbeat_interval``), para o servidor mostrar a saúde de cada agent.
+
+``StartupTimeline`` marca os marcos da partida (imports, monitor pronto,
+primeira amostra, primeiro envio aceito) em ms desde o início do processo;
+a linha do tempo vai no snapshot e no heartbeat.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites superiores dos baldes (milissegundos); o último balde é "acima de 10 s"
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Contagem por balde, soma e máximo de durações (em segundos)"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Limite superior (ms) do balde que contém o percentil (o máximo, no último balde)"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if index == len(BUCKETS_MS):
+                    break
+                return min(BUCKETS_MS[index], self.max * 1000)
+        return self.max * 1000
+
+    def summary(self):
+        return {
+            'n': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5), 2),
+            'p95_ms': round(self.percentile(0.95), 2),
+            'p99_ms': round(self.percentile(0.99), 2),
+            'max_ms': round(self.max * 1000, 2),
+        }
+
+
+class StartupTimeline:
+    """Marcos da partida do agent, em ms desde ``origin`` (o primeiro marco de cada nome vale)"""
+
+    def __init__(self, clock=time.perf_counter, origin=None):
+        self.clock = clock
+        self.origin = clock() if origin is None else origin
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            if name in self.marks:
+                return
+            elapsed = self.marks[name] = round((self.clock() - self.origin) * 1000, 1)
+        logging.info(f"Partida: {name} em {elapsed:.0f} ms")
+        if name == 'first_send':
+            logging.info("Partida: " + ", ".join(f"{key} {value:.0f} ms" for key, value in self.as_dict().items()))
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self.marks)
+
+
+class AgentMetrics:
+    """Histogramas por etapa e coleta dos indicadores do agent"""
+
+    def __init__(self, clock=time.monotonic, startup=None):
+        self.clock = clock
+        self.started_at = clock()
+        self._lock = threading.Lock()  # Etapas de envio são medidas na thread de envio
+        self.stages = {}
+        self.startup = startup or StartupTimeline()
+        # psutil só na primeira coleta: fora do caminho da partida
+        self._process = None
+        self._cpu_mark = None
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def _cpu_seconds(self):
+        times = self._process.cpu_times()
+        return times.user + times.system
+
+    def process_stats(self):
+        """RSS (MB), CPU (% de um núcleo desde a coleta anterior) e threads do processo"""
+        import psutil
+
+        try:
+            if self._process is None:
+                self._process = psutil.Process()
+                # Primeira coleta: CPU desde a criação do processo
+                created = time.time() - self._process.create_time()
+                self._cpu_mark = (time.monotonic() - max(created, 0.0), 0.0)
+            now, cpu = time.monotonic(), self._cpu_seconds()
+            marked_at, marked_cpu = self._cpu_mark
+            self._cpu_mark = (now, cpu)
+            return {
+                'rss_mb': round(self._process.memory_info().rss / 1024 / 1024, 1),
+                'cpu_percent': round((cpu - marked_cpu) / (now - marked_at) * 100, 2) if now > marked_at else 0.0,
+                'cpu_seconds': round(cpu, 2),
+                'threads': self._process.num_threads(),
+            }
+        except psutil.Error as e:
+            logging.error(f"Erro ao ler métricas do processo: {str(e)}")
+            return {}
+
+    def snapshot(self, transport=None, uploader=None, scheduler=None):
+        """Todas as métricas, em um dicionário serializável"""
+        with self._lock:
+            stages = {stage: histogram.summary() for stage, histogram in self.stages.items()}
+        data = {
+            'uptime_seconds': round(self.clock() - self.started_at),
+            'stages': stages,
+            'process': self.process_stats(),
+            'startup': self.startup.as_dict(),
+        }
+        if transport is not None:
+            stats = transport.stats()
+            data['transport'] = {
+                key: stats[key] for key in ('requests', 'failures', 'retries', 'circuit_rejections',
+                                            'bytes_sent', 'bytes_received')
+            }
+            data['transport']['circuit_open'] = stats['circuit_open']
+            data['endpoints'] = stats['endpoints']
+        if uploader is not None:
+            data['queue'] = {
+                'queued': len(uploader.queue),
+                'spooled': len(uploader.spool) if uploader.spool is not None else 0,
+                'oldest_age': round(uploader.queue.oldest_age() or 0.0, 1),
+                'dropped': uploader.queue.dropped,
+            }
+        if scheduler is not None:
+            tasks = scheduler.stats()
+            data['loop'] = {
+                'lag_p95_ms': round(max((task['lateness_p95'] for task in tasks.values()), default=0.0) * 1000, 1),
+                'lag_max_ms': round(max((task['lateness_max'] for task in tasks.values()), default=0.0) * 1000, 1),
+                'skipped': sum(task['skipped'] for task in tasks.values()),
+                'errors': sum(task['errors'] for task in tasks.values()),
+                'run_ms': {name: round(task['run_time_avg'] * 1000, 2) for name, task in tasks.items()},
+            }
+        return data
+
+    @staticmethod
+    def health_summary(snapshot):
+        """Resumo compacto para o heartbeat (evento agent_health)"""
+        stages = snapshot.get('stages', {})
+        transport = snapshot.get('transport', {})
+        queue = snapshot.get('queue', {})
+        return {
+            'uptime_seconds': snapshot.get('uptime_seconds', 0),
+            'rss_mb': snapshot.get('process', {}).get('rss_mb'),
+            'cpu_percent': snapshot.get('process', {}).get('cpu_percent'),
+            'loop_lag_p95_ms': snapshot.get('loop', {}).get('lag_p95_ms'),
+            'loop_lag_max_ms': snapshot.get('loop', {}).get('lag_max_ms'),
+            'enumerate_p95_ms': stages.get('enumerate', {}).get('p95_ms'),
+            'send_p95_ms': stages.get('send', {}).get('p95_ms'),
+            'requests': transport.get('requests', 0),
+            'failures': transport.get('failures', 0),
+            'queue_pending': queue.get('queued', 0) + queue.get('spooled', 0),
+            'metrics': {
+                'stages': stages,
+                'endpoints': snapshot.get('endpoints', {}),
+                'queue': queue,
+                'startup': snapshot.get('startup', {}),
+            },
+        }
+
+
+def write_metrics(path, data):
+    """Grava o JSON de métricas (troca atômica: quem lê nunca vê o arquivo pela metade)"""
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+    except OSError as e:
+        logging.error(f"Erro ao gravar métricas: {str(e)}")
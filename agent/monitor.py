@@ -1,92 +1,229 @@
 """
 Activity Monitor - Monitora atividades do usuário
 """
-import win32gui
-import win32process
-import win32api
-import psutil
-import time
-import requests
-import json
+import os
+import random
 import socket
+import threading
 import getpass
-from datetime import datetime
-from config import Config
+from datetime import timedelta
+from backends import SystemClock, create_backend
+from canonicalize import TitleCanonicalizer
+from config import Config, get_data_dir
+from hints import RateHints
+from metrics import AgentMetrics, write_metrics
+from rollup import DailyRollup
+from scheduler import Scheduler
+from snapshot import SnapshotEncoder
+from spool import Spool
+from transport import Transport
+from uploader import BatchUploader
 import logging
-import ctypes
-
-class LASTINPUTINFO(ctypes.Structure):
-    _fields_ = [
-        ('cbSize', ctypes.c_uint),
-        ('dwTime', ctypes.c_uint),
-    ]
 
 class ActivityMonitor:
-    def __init__(self, debug_mode=False):
+    def __init__(self, debug_mode=False, backend=None, clock=None, config=None,
+                 persist_state=True, background_upload=True, transport=None,
+                 hostname=None, username=None, startup=None):
+        # Plataforma (janelas, input, processos) e relógio: reais no Windows,
+        # simulados para testes e benchmarks (ver backends.py)
+        self.backend = backend or create_backend()
+        self.clock = clock or SystemClock()
+        self.background_upload = background_upload
         self.running = False
         self.current_activity = None
         self.current_activity_id = None  # ID do registro atual no banco
-        self.last_checkpoint_time = None  # Controla quando foi o último checkpoint
-        self.last_windows_snapshot_time = None  # Controla snapshot de janelas
-        self.last_mouse_activity_time = None  # Controla envio de atividade do mouse
+        self.current_activity_ref = None  # event_id local do insert da atividade atual
+        self._activity_lock = threading.Lock()  # Confirmações chegam pela thread de envio
+        self.last_activity = None  # Atividade em andamento (janela ativa)
+        self.last_checkpoint_time = None  # Controla quando foi o último checkpoint (monotônico)
+        self.checkpoint_interval = 60  # Envia dados a cada 60 segundos (1 minuto) para tempo real
+        self.base_checkpoint_interval = 60  # Sem multiplicador do servidor (ver apply_rate_hints)
+        self.scheduler = None
+        self.event_source = None  # Notificações de janela (modo 'events'; ver backends.EventSource)
+        self.foreground_hwnd = None
         self.current_period_type = None  # 'active' ou 'inactive'
         self.current_period_start = None  # Início do período atual
         self.idle_threshold = 60  # Segundos de inatividade para considerar ausente
-        self.config = Config()
-        self.hostname = socket.gethostname()
-        self.username = getpass.getuser()
+        # Intervalos (segundos) das tarefas periódicas, normais e em modo ocioso
+        self.task_periods = {
+            'windows_snapshot': 10,  # Snapshot de todas as janelas abertas
+            'mouse_activity': 60,  # Renovação do lease de presença
+            'activity_period': 10,  # Mudanças de estado ativo/inativo
+            'active_window': 2,  # Janela ativa, com checkpoint a cada checkpoint_interval
+            'daily_rollup': 300,  # Totais do dia por executável
+        }
+        self.idle_task_periods = {
+            'windows_snapshot': 120,  # Só keepalive (online = snapshot nos últimos 5 min)
+            'mouse_activity': 600,  # Sem lease a renovar enquanto inativo
+            'activity_period': 5,  # Detecta o retorno do usuário mais rápido
+            'active_window': 30,
+            'daily_rollup': 900,
+        }
+        # Limite dos intervalos multiplicados pelo servidor: o computador
+        # continua online (snapshot nos últimos 5 min) e o tempo real aceitável
+        self.max_task_periods = {
+            'windows_snapshot': 240,
+            'mouse_activity': 600,
+            'daily_rollup': 3600,
+            'checkpoint': 600,
+        }
+        self._hints_version = 0
+        self.idle_mode = False
+        self._rollup_mark = None  # Instante (monotônico) até onde o rollup já foi somado
+        self.presence_lease = 90  # Segundos de "ativo" garantidos por renovação do lease
+        self.config = config or Config()
+        for name, period in self.config.INTERVALS.items():
+            if name in self.task_periods:
+                self.task_periods[name] = period
+            elif name == 'checkpoint':
+                self.base_checkpoint_interval = self.checkpoint_interval = period
+        # Título canônico na chave da atividade (contadores, timers etc. não criam atividade nova)
+        self.canonicalizer = TitleCanonicalizer(self.config.TITLE_RULES)
+        # Identidade e transporte injetáveis (gerador de carga com vários agents)
+        self.hostname = hostname or socket.gethostname()
+        self.username = username or getpass.getuser()
         self.debug_mode = debug_mode
+        self.snapshot_encoder = SnapshotEncoder(clock=self.clock.monotonic)
+        # Relógio virtual: jitter e deslocamentos reproduzíveis (e distintos por agent)
+        if getattr(self.clock, 'is_virtual', False):
+            self.rng = random.Random(f"{self.hostname}-{self.username}")
+        else:
+            self.rng = random.Random()
+        self.transport = transport or Transport(self.config.API_URL, wire_format=self.config.WIRE_FORMAT)
+        self.uploader = BatchUploader(
+            self.transport,
+            hostname=self.hostname,
+            username=self.username,
+            max_batch_size=self.config.MAX_BATCH_SIZE,
+            spool=self._open_spool() if persist_state else None,
+            clock=self.clock.monotonic,
+            debug_mode=debug_mode,
+            hints=RateHints(self.clock.monotonic, self.rng),
+            startup_delay=self.rng.uniform(0, self.config.STARTUP_SPREAD),
+            config_interval=self.config.CONFIG_INTERVAL
+        )
+        self.rollup = self._open_rollup() if persist_state else DailyRollup()
+        # Instrumentação do próprio agent (ver metrics.py)
+        self.metrics = AgentMetrics(self.clock.monotonic, startup=startup)
+        self.transport.metrics = self.metrics
+        data_dir = get_data_dir() if persist_state else None
+        self.metrics_path = os.path.join(data_dir, 'metrics.json') if data_dir else None
         
         if self.debug_mode:
             logging.info(f"Monitor inicializado para {self.username}@{self.hostname}")
             logging.info(f"URL da API: {self.config.API_URL}")
     
+    def _open_spool(self):
+        """Abre o spool de eventos pendentes no diretório de dados (svch)"""
+        data_dir = get_data_dir()
+        if not data_dir:
+            logging.error("Sem diretório de dados: eventos não enviados não serão persistidos")
+            return None
+        try:
+            spool = Spool(os.path.join(data_dir, 'spool.db'))
+            if len(spool) and self.debug_mode:
+                logging.info(f"Spool com {len(spool)} eventos pendentes de execução anterior")
+            return spool
+        except Exception as e:
+            logging.error(f"Erro ao abrir spool: {str(e)}")
+            return None
+    
+    def _open_rollup(self):
+        """Carrega os totais diários do diretório de dados (continua acumulando após reiniciar)"""
+        data_dir = get_data_dir()
+        if not data_dir:
+            return DailyRollup()
+        return DailyRollup(os.path.join(data_dir, 'rollup.json'))
+    
+    def _account_rollup(self, until=None):
+        """Soma ao rollup o tempo desde a última contabilização (janela ativa e estado atuais)
+        até ``until`` (monotônico; padrão: agora)"""
+        now_mono = self.clock.monotonic()
+        if until is None or until > now_mono:
+            until = now_mono
+        if self._rollup_mark is not None and until < self._rollup_mark:
+            until = self._rollup_mark
+        if self._rollup_mark is not None and self.last_activity:
+            end = self.clock.now()
+            if until < now_mono:
+                end -= timedelta(seconds=now_mono - until)
+            elapsed = until - self._rollup_mark
+            self.rollup.add(
+                self.last_activity['executable'],
+                end - timedelta(seconds=elapsed),
+                end,
+                self.current_period_type or 'active'
+            )
+        self._rollup_mark = until
+    
+    def send_daily_rollup(self):
+        """Envia os totais acumulados dos dias alterados desde o último envio"""
+        try:
+            self._account_rollup()
+            for payload in self.rollup.pending():
+                data = {
+                    'hostname': self.hostname,
+                    'username': self.username,
+                    **payload
+                }
+                self.uploader.enqueue('daily_rollup', data)
+                
+                if self.debug_mode:
+                    logging.info(f"Rollup de {payload['date']} enfileirado: {payload['total_active_seconds']}s ativo, {len(payload['apps'])} apps")
+            self.rollup.prune(self.clock.now())
+            self.rollup.save()
+        except Exception as e:
+            logging.error(f"Erro ao enviar rollup diário: {str(e)}")
+    
     def get_last_input_time(self):
         """Retorna o tempo em segundos desde o último input (mouse/teclado)"""
         try:
-            last_input_info = LASTINPUTINFO()
-            last_input_info.cbSize = ctypes.sizeof(LASTINPUTINFO)
-            ctypes.windll.user32.GetLastInputInfo(ctypes.byref(last_input_info))
-            
-            millis_since_boot = ctypes.windll.kernel32.GetTickCount()
-            millis_since_input = millis_since_boot - last_input_info.dwTime
-            
-            return millis_since_input / 1000.0  # Converte para segundos
+            return self.backend.get_idle_seconds()
         except Exception as e:
             logging.error(f"Erro ao obter last input time: {str(e)}")
             return 0
     
     def send_mouse_activity(self):
-        """Envia timestamp da última atividade do mouse/teclado"""
+        """Renova o lease de presença enquanto o usuário está ativo"""
         try:
             idle_seconds = self.get_last_input_time()
-            # Só envia se houve atividade recente (menos de 5 segundos de idle)
-            if idle_seconds < 5:
-                url = f"{self.config.API_URL}/api/mouse-activity"
-                data = {
-                    'hostname': self.hostname,
-                    'username': self.username,
-                    'last_activity': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                
-                response = requests.post(
-                    url,
-                    json=data,
-                    timeout=10,
-                    headers={'Content-Type': 'application/json'}
-                )
-                
-                if response.status_code in [200, 201]:
-                    if self.debug_mode:
-                        logging.info(f"Mouse activity enviada (idle: {idle_seconds:.1f}s)")
-                else:
-                    logging.error(f"Erro ao enviar mouse activity: Status {response.status_code}")
+            # Inativo: a transição já encerrou o lease (ver check_and_update_activity_period)
+            if idle_seconds < self.idle_threshold:
+                self.send_presence('active', idle_seconds)
                     
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de conexão ao enviar mouse activity: {str(e)}")
         except Exception as e:
             logging.error(f"Erro ao enviar mouse activity: {str(e)}")
     
+    def send_presence(self, state, idle_seconds):
+        """Envia a presença: último input, estado e até quando o usuário conta como ativo.
+        
+        Ativo: lease de presence_lease segundos, renovado a cada
+        presence_renew_interval (se o agent parar, o servidor deixa de mostrar
+        ativo quando o lease expira). Inativo: o lease termina no instante em
+        que o idle atingiu idle_threshold.
+        """
+        now = self.clock.now()
+        last_input = now - timedelta(seconds=idle_seconds)
+        if state == 'active':
+            # O lease cobre o intervalo de renovação, mesmo multiplicado pelo servidor
+            lease = max(self.presence_lease, self._task_period('mouse_activity') * 1.5)
+            active_until = now + timedelta(seconds=lease)
+        else:
+            active_until = min(now, last_input + timedelta(seconds=self.idle_threshold))
+        
+        data = {
+            'hostname': self.hostname,
+            'username': self.username,
+            'last_activity': last_input.strftime('%Y-%m-%d %H:%M:%S'),
+            'state': state,
+            'active_until': active_until.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        self.uploader.enqueue('mouse_activity', data)
+        
+        if self.debug_mode:
+            logging.info(f"Presença enfileirada: {state} até {data['active_until']} (idle: {idle_seconds:.1f}s)")
+    
     def check_and_update_activity_period(self):
         """Verifica mudanças de estado (ativo/inativo) e registra APENAS períodos inativos"""
         try:
@@ -95,33 +232,123 @@ class ActivityMonitor:
             
             # Se mudou de estado ou é a primeira vez
             if self.current_period_type != current_state:
-                now = datetime.now()
+                now = self.clock.now()
+                # Instante exato da mudança, calculado pelo idle (independe da
+                # frequência desta verificação): ao voltar, o último input; ao
+                # sair, o momento em que o idle atingiu idle_threshold
+                if current_state == 'active':
+                    changed_at = now - timedelta(seconds=idle_seconds)
+                else:
+                    changed_at = now - timedelta(seconds=idle_seconds - self.idle_threshold)
+                
+                # Rollup: até agora no estado anterior; desde a mudança, no novo
+                previous_state = self.current_period_type
+                self._account_rollup()
+                if previous_state is not None and self.last_activity:
+                    self.rollup.reclassify(
+                        self.last_activity['executable'],
+                        min(changed_at, now), now, previous_state, current_state
+                    )
+                
+                # Atividade da janela atual: um segmento por estado
+                if previous_state is not None and self.last_activity:
+                    self.split_activity(changed_at, current_state)
                 
                 # Finalizar período anterior SE FOR INATIVO
                 if self.current_period_type == 'inactive' and self.current_period_start is not None:
-                    duration = (now - self.current_period_start).total_seconds()
+                    changed_at = max(changed_at, self.current_period_start)
+                    duration = (changed_at - self.current_period_start).total_seconds()
                     if duration >= 1:  # Só registra se durou pelo menos 1 segundo
                         self.send_activity_period(
                             'inactive',
                             self.current_period_start,
-                            now,
+                            changed_at,
                             int(duration)
                         )
                 
                 # Iniciar novo período
                 self.current_period_type = current_state
-                self.current_period_start = now
+                self.current_period_start = changed_at
                 
                 if self.debug_mode:
                     logging.info(f"Mudança de estado: {current_state} (idle: {idle_seconds:.1f}s)")
+                
+                # Presença só nas transições (e renovação do lease enquanto ativo)
+                self.send_presence(current_state, idle_seconds)
+                self.set_idle_mode(current_state == 'inactive')
                     
         except Exception as e:
             logging.error(f"Erro ao verificar período de atividade: {str(e)}")
     
+    def split_activity(self, changed_at, state):
+        """Fecha o segmento da atividade atual em ``changed_at`` e abre outro com ``state``.
+        
+        Cada registro de atividade fica inteiro em um único estado (ativo ou
+        inativo), então o servidor soma as durações sem cruzar com os
+        períodos de inatividade.
+        """
+        activity = self.last_activity
+        now = self.clock.now()
+        now_mono = self.clock.monotonic()
+        # Limite no relógio monotônico, nunca antes do início do segmento
+        back = max(0.0, (now - changed_at).total_seconds())
+        boundary_mono = max(activity['started_at'], now_mono - back)
+        boundary = now - timedelta(seconds=now_mono - boundary_mono)
+        duration = boundary_mono - activity['started_at']
+        
+        if duration < 1:
+            # Segmento curto demais: só troca o estado (vai no próximo envio)
+            activity['state'] = state
+            return
+        
+        self.send_activity(self._build_activity_data(activity, boundary, duration), is_checkpoint=False)
+        
+        # Novo segmento da mesma janela (novo registro no servidor)
+        with self._activity_lock:
+            self.current_activity_id = None
+            self.current_activity_ref = None
+        self.last_checkpoint_time = now_mono
+        self.last_activity = {
+            **activity,
+            'start_time': boundary,
+            'started_at': boundary_mono,
+            'state': state
+        }
+        
+        if self.debug_mode:
+            logging.debug(f"Atividade dividida em {boundary.strftime('%H:%M:%S')}: {activity['executable']} ({state})")
+    
+    def set_idle_mode(self, idle):
+        """Modo de baixo consumo enquanto o usuário está inativo.
+        
+        Reduz a frequência da janela ativa e do mouse, suspende a enumeração
+        de janelas (só o keepalive do snapshot, para o computador continuar
+        online) e verifica o retorno do usuário com mais frequência. Ao voltar,
+        todas as tarefas rodam na hora e retomam os intervalos normais.
+        """
+        if idle == self.idle_mode:
+            return
+        self.idle_mode = idle
+        if not self.scheduler:
+            return
+        
+        for name in self.task_periods:
+            if name not in self.scheduler.tasks:
+                continue
+            period = self._task_period(name)
+            if name in ('activity_period', 'mouse_activity', 'daily_rollup'):
+                # Verificação em execução, presença recém-enviada pela transição e
+                # totais que não têm pressa: só muda o intervalo
+                self.scheduler.reschedule(name, delay=period, period=period)
+            else:
+                self.scheduler.reschedule(name, delay=period if idle else 0, period=period)
+        
+        if self.debug_mode:
+            logging.info("Modo ocioso ativado" if idle else "Modo ocioso desativado: amostragem normal")
+    
     def send_activity_period(self, period_type, start_time, end_time, duration_seconds):
         """Envia período de INATIVIDADE para o servidor"""
         try:
-            url = f"{self.config.API_URL}/api/activity-periods"
             data = {
                 'hostname': self.hostname,
                 'username': self.username,
@@ -131,49 +358,36 @@ class ActivityMonitor:
                 'duration_seconds': duration_seconds
             }
             
-            response = requests.post(
-                url,
-                json=data,
-                timeout=10,
-                headers={'Content-Type': 'application/json'}
-            )
+            self.uploader.enqueue('activity_period', data)
             
-            if response.status_code in [200, 201]:
-                if self.debug_mode:
-                    logging.info(f"Período {period_type} registrado: {duration_seconds}s")
-            else:
-                logging.error(f"Erro ao enviar período: Status {response.status_code}")
+            if self.debug_mode:
+                logging.info(f"Período {period_type} enfileirado: {duration_seconds}s")
                 
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de conexão ao enviar período: {str(e)}")
         except Exception as e:
             logging.error(f"Erro ao enviar período: {str(e)}")
     
     def get_all_open_windows(self):
         """Obtém todas as janelas abertas no sistema"""
         windows = []
-        active_hwnd = win32gui.GetForegroundWindow()
         
-        def enum_windows_callback(hwnd, windows_list):
-            if win32gui.IsWindowVisible(hwnd):
-                window_title = win32gui.GetWindowText(hwnd)
-                if window_title:  # Só adiciona janelas com título
-                    try:
-                        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                        process = psutil.Process(pid)
-                        executable = process.name()
-                        
-                        windows_list.append({
+        try:
+            with self.metrics.timed('enumerate'):
+                active_hwnd = self.backend.get_foreground_window()
+                for hwnd in self.backend.enum_windows():
+                    window_title = self.backend.get_window_title(hwnd)
+                    if not window_title:  # Só adiciona janelas com título
+                        continue
+                    pid = self.backend.get_window_pid(hwnd)
+                    # Processo que terminou ou sem acesso: ignora a janela
+                    executable = self.backend.get_process_name(pid, hwnd)
+                    if executable:
+                        windows.append({
+                            'window_id': hwnd,
                             'executable': executable,
                             'pid': pid,
                             'window_title': window_title,
                             'is_active': (hwnd == active_hwnd)
                         })
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        pass
-        
-        try:
-            win32gui.EnumWindows(enum_windows_callback, windows)
             return windows
         except Exception as e:
             logging.error(f"Erro ao enumerar janelas: {str(e)}")
@@ -182,65 +396,70 @@ class ActivityMonitor:
     def send_windows_snapshot(self):
         """Envia snapshot de todas as janelas abertas"""
         try:
-            windows = self.get_all_open_windows()
-            if not windows:
+            windows = None
+            # Usuário inativo: sem enumerar janelas, só mantém o computador online
+            snapshot = self.snapshot_encoder.keepalive() if self.idle_mode else None
+            if snapshot is None:
+                windows = self.get_all_open_windows()
+                if not windows:
+                    return
+                
+                # Baseline completa de tempos em tempos, senão apenas o que mudou
+                snapshot = self.snapshot_encoder.encode(windows)
+            if snapshot is None:
                 return
             
-            url = f"{self.config.API_URL}/api/windows-snapshot"
             data = {
                 'hostname': self.hostname,
                 'username': self.username,
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'windows': windows
+                'timestamp': self.clock.now().strftime('%Y-%m-%d %H:%M:%S'),
+                **snapshot
             }
             
-            response = requests.post(
-                url,
-                json=data,
-                timeout=10,
-                headers={'Content-Type': 'application/json'}
-            )
+            self.uploader.enqueue('windows_snapshot', data, on_ack=self._on_snapshot_ack)
             
-            if response.status_code in [200, 201]:
-                if self.debug_mode:
-                    logging.info(f"Snapshot enviado: {len(windows)} janelas abertas")
-            else:
-                logging.error(f"Erro ao enviar snapshot: Status {response.status_code}")
+            if self.debug_mode:
+                if windows is None:
+                    logging.info(f"Snapshot keepalive #{snapshot['seq']} enfileirado (modo ocioso)")
+                else:
+                    logging.info(f"Snapshot {snapshot['mode']} #{snapshot['seq']} enfileirado: {len(windows)} janelas abertas")
                 
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de conexão ao enviar snapshot: {str(e)}")
         except Exception as e:
             logging.error(f"Erro ao enviar snapshot: {str(e)}")
         
-    def get_active_window_info(self):
-        """Obtém informações da janela ativa"""
+    def _on_snapshot_ack(self, event_id, result):
+        """Servidor fora de sequência (snapshot perdido): a próxima vai completa"""
+        if (result.get('data') or {}).get('resync'):
+            self.snapshot_encoder.request_resync()
+            if self.debug_mode:
+                logging.info("Servidor pediu resync do snapshot de janelas")
+    
+    def get_active_window_info(self, hwnd=None):
+        """Obtém informações da janela ativa (ou da janela ``hwnd`` notificada)"""
         try:
-            hwnd = win32gui.GetForegroundWindow()
+            hwnd = hwnd or self.backend.get_foreground_window()
             if not hwnd:
                 return None
                 
             # Obtém o título da janela
-            window_title = win32gui.GetWindowText(hwnd)
+            window_title = self.backend.get_window_title(hwnd)
             if not window_title:
                 return None
             
             # Obtém o PID do processo
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
+            pid = self.backend.get_window_pid(hwnd)
             
-            # Obtém informações do processo
-            try:
-                process = psutil.Process(pid)
-                executable = process.name()
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                executable = "Unknown"
+            # Obtém informações do processo (cache por pid + horário de criação)
+            executable = self.backend.get_process_name(pid, hwnd) or "Unknown"
             
             info = {
+                'hwnd': hwnd,
                 'hostname': self.hostname,
                 'username': self.username,
                 'executable': executable,
                 'pid': pid,
                 'window_title': window_title,
-                'timestamp': datetime.now()
+                'timestamp': self.clock.now()
             }
             
             if self.debug_mode:
@@ -264,180 +483,316 @@ class ActivityMonitor:
                 'window_title': activity_data['window_title'],
                 'start_time': activity_data['start_time'].strftime('%Y-%m-%d %H:%M:%S.%f'),
                 'end_time': activity_data['end_time'].strftime('%Y-%m-%d %H:%M:%S.%f'),
-                'duration_seconds': activity_data['duration_seconds']
+                'duration_seconds': activity_data['duration_seconds'],
+                'state': activity_data['state']
             }
             
-            # Se é checkpoint e já temos um ID, faz UPDATE
-            if is_checkpoint and self.current_activity_id:
-                url = f"{self.config.API_URL}/api/window-activity/{self.current_activity_id}"
-                response = requests.put(
-                    url,
-                    json=data,
-                    timeout=10,
-                    headers={'Content-Type': 'application/json'}
-                )
-                
-                if response.status_code in [200, 201]:
+            with self._activity_lock:
+                # Atividade já inserida (checkpoint anterior): UPDATE, também na
+                # finalização, para não gravar o mesmo intervalo duas vezes
+                if self.current_activity_id or self.current_activity_ref:
+                    # Se o insert ainda não foi confirmado, o servidor resolve pelo ref
+                    data['activity_id'] = self.current_activity_id
+                    data['ref'] = self.current_activity_ref
+                    self.uploader.enqueue('window_activity_update', data)
+                    
                     if self.debug_mode:
-                        logging.info(f"Checkpoint atualizado (ID {self.current_activity_id}): {data['executable']} - {data['window_title'][:30]} ({data['duration_seconds']:.1f}s)")
+                        kind = "Checkpoint" if is_checkpoint else "Finalização"
+                        logging.info(f"{kind} enfileirado (ID {self.current_activity_id or self.current_activity_ref}): {data['executable']} - {data['window_title'][:30]} ({data['duration_seconds']:.1f}s)")
                 else:
-                    logging.error(f"Erro ao atualizar checkpoint: Status {response.status_code}")
-            else:
-                # Nova atividade - faz INSERT
-                url = f"{self.config.API_URL}/api/window-activity"
-                response = requests.post(
-                    url,
-                    json=data,
-                    timeout=10,
-                    headers={'Content-Type': 'application/json'}
-                )
-                
-                if response.status_code in [200, 201]:
-                    # Salva o ID retornado para futuros checkpoints
-                    response_data = response.json()
-                    if response_data.get('success') and 'data' in response_data:
-                        self.current_activity_id = response_data['data'].get('id')
+                    # Nova atividade - faz INSERT (o ID chega na confirmação do lote)
+                    self.current_activity_ref = self.uploader.enqueue(
+                        'window_activity', data, on_ack=self._on_activity_ack
+                    )
+                    self.rollup.record(activity_data['executable'], activity_data['start_time'])
                     
                     if self.debug_mode:
-                        logging.info(f"Nova atividade enviada (ID {self.current_activity_id}): {data['executable']} - {data['window_title'][:30]} ({data['duration_seconds']:.1f}s)")
-                else:
-                    logging.error(f"Erro ao enviar atividade: Status {response.status_code}")
+                        logging.info(f"Nova atividade enfileirada ({self.current_activity_ref}): {data['executable']} - {data['window_title'][:30]} ({data['duration_seconds']:.1f}s)")
                 
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Erro de conexão com API: {str(e)}")
         except Exception as e:
             logging.error(f"Erro ao enviar atividade: {str(e)}")
     
-    def start(self):
-        """Inicia o monitoramento"""
-        self.running = True
-        last_activity = None
-        checkpoint_interval = 60  # Envia dados a cada 60 segundos (1 minuto) para tempo real
-        snapshot_interval = 10  # Envia snapshot de janelas a cada 10 segundos
-        mouse_activity_interval = 5  # Envia atividade do mouse a cada 5 segundos
-        period_check_interval = 10  # Verifica mudanças de estado a cada 10 segundos
-        last_period_check = None
+    def _on_activity_ack(self, event_id, result):
+        """Salva o ID retornado pelo servidor para futuros checkpoints"""
+        with self._activity_lock:
+            if event_id == self.current_activity_ref:
+                self.current_activity_id = result.get('data', {}).get('id')
+    
+    def _build_activity_data(self, activity, end_time, duration):
+        return {
+            'hostname': activity['hostname'],
+            'username': activity['username'],
+            'executable': activity['executable'],
+            'pid': activity['pid'],
+            'window_title': activity['window_title'],
+            'start_time': activity['start_time'],
+            'end_time': end_time,
+            'duration_seconds': duration,
+            'state': activity['state']
+        }
+    
+    def poll_active_window(self):
+        """Detecta troca de janela ativa e envia checkpoints das atividades longas"""
+        self.observe_window()
+    
+    def handle_window_event(self, event):
+        """Notificação da fonte de eventos: troca de janela ou de título em ``event.at``"""
+        if event.kind == 'foreground':
+            self.foreground_hwnd = event.hwnd
+        elif event.hwnd != self.foreground_hwnd:
+            return  # Título de uma janela que já não está em primeiro plano
+        self.observe_window(event.hwnd, event.at)
+    
+    def observe_window(self, hwnd=None, at=None):
+        """Registra a janela ``hwnd`` (padrão: a que está em primeiro plano agora).
         
-        while self.running:
-            try:
-                # Envia snapshot de todas as janelas abertas (a cada 10 segundos)
-                if self.last_windows_snapshot_time is None or \
-                   (datetime.now() - self.last_windows_snapshot_time).total_seconds() >= snapshot_interval:
-                    self.send_windows_snapshot()
-                    self.last_windows_snapshot_time = datetime.now()
-                
-                # Envia atividade do mouse/teclado (a cada 5 segundos)
-                if self.last_mouse_activity_time is None or \
-                   (datetime.now() - self.last_mouse_activity_time).total_seconds() >= mouse_activity_interval:
-                    self.send_mouse_activity()
-                    self.last_mouse_activity_time = datetime.now()
-                
-                # Verifica mudanças de estado ativo/inativo (a cada 10 segundos)
-                if last_period_check is None or \
-                   (datetime.now() - last_period_check).total_seconds() >= period_check_interval:
-                    self.check_and_update_activity_period()
-                    last_period_check = datetime.now()
-                    self.last_mouse_activity_time = datetime.now()
-                
-                # Obtém informações da janela ativa
-                current_info = self.get_active_window_info()
-                
-                if current_info:
-                    # Cria identificador único da atividade
-                    activity_id = f"{current_info['executable']}_{current_info['window_title']}"
-                    
-                    # Se mudou a atividade
-                    if last_activity is None or activity_id != last_activity['id']:
-                        # Finaliza atividade anterior
-                        if last_activity:
-                            end_time = datetime.now()
-                            duration = (end_time - last_activity['start_time']).total_seconds()
-                            
-                            # Só envia se duração >= 1 segundo
-                            if duration >= 1:
-                                activity_data = {
-                                    'hostname': last_activity['hostname'],
-                                    'username': last_activity['username'],
-                                    'executable': last_activity['executable'],
-                                    'pid': last_activity['pid'],
-                                    'window_title': last_activity['window_title'],
-                                    'start_time': last_activity['start_time'],
-                                    'end_time': end_time,
-                                    'duration_seconds': duration
-                                }
-                                # Finaliza atividade anterior (não é checkpoint)
-                                self.send_activity(activity_data, is_checkpoint=False)
-                        
-                        # Inicia nova atividade (reseta o ID)
-                        self.current_activity_id = None
-                        self.last_checkpoint_time = current_info['timestamp']
-                        last_activity = {
-                            'id': activity_id,
-                            'hostname': current_info['hostname'],
-                            'username': current_info['username'],
-                            'executable': current_info['executable'],
-                            'pid': current_info['pid'],
-                            'window_title': current_info['window_title'],
-                            'start_time': current_info['timestamp']
-                        }
-                        
-                        if self.debug_mode:
-                            logging.debug(f"Nova atividade iniciada: {current_info['executable']}")
-                    
-                    # Checkpoint em tempo real: envia dados a cada 1 minuto
-                    elif last_activity:
-                        # Calcula tempo desde o último checkpoint (não desde o início)
-                        time_since_checkpoint = (datetime.now() - self.last_checkpoint_time).total_seconds()
-                        
-                        if time_since_checkpoint >= checkpoint_interval:
-                            end_time = datetime.now()
-                            # Duração total desde o início da atividade
-                            total_duration = (end_time - last_activity['start_time']).total_seconds()
-                            
-                            activity_data = {
-                                'hostname': last_activity['hostname'],
-                                'username': last_activity['username'],
-                                'executable': last_activity['executable'],
-                                'pid': last_activity['pid'],
-                                'window_title': last_activity['window_title'],
-                                'start_time': last_activity['start_time'],
-                                'end_time': end_time,
-                                'duration_seconds': total_duration
-                            }
-                            # Envia como checkpoint (vai fazer UPDATE se tiver ID)
-                            self.send_activity(activity_data, is_checkpoint=True)
-                            
-                            if self.debug_mode:
-                                logging.info(f"Checkpoint enviado: {last_activity['executable']} ({total_duration:.1f}s total)")
-                            
-                            # Atualiza apenas o tempo do último checkpoint
-                            self.last_checkpoint_time = datetime.now()
-                
-                # Aguarda 2 segundos antes da próxima verificação
-                time.sleep(2)
+        ``at`` é o instante (monotônico) da troca informado pela notificação;
+        sem ele (amostragem), a troca conta a partir de agora.
+        """
+        # Durações medidas no relógio monotônico (imunes a ajustes do relógio do sistema)
+        now_mono = self.clock.monotonic()
+        changed_mono = now_mono if at is None else min(at, now_mono)
+        # Tempo até a troca vai para a janela que estava ativa
+        self._account_rollup(changed_mono)
+        current_info = self.get_active_window_info(hwnd)
+        if not current_info:
+            return
+        self.metrics.startup.mark('first_sample')
+        self.foreground_hwnd = current_info['hwnd']
+        
+        last_activity = self.last_activity
+        # Cria identificador único da atividade (título canônico)
+        activity_id = self.canonicalizer.key(current_info['executable'], current_info['window_title'])
+        
+        # Mesma atividade com outro título bruto: o registro guarda o mais recente
+        if last_activity is not None and activity_id == last_activity['id']:
+            last_activity['window_title'] = current_info['window_title']
+        
+        # Se mudou a atividade
+        if last_activity is None or activity_id != last_activity['id']:
+            # Instante da troca (notificação); nunca antes do início da atividade anterior
+            if last_activity is not None:
+                changed_mono = max(changed_mono, last_activity['started_at'])
+            changed_at = current_info['timestamp'] - timedelta(seconds=now_mono - changed_mono)
+            
+            # Finaliza atividade anterior
+            if last_activity:
+                duration = changed_mono - last_activity['started_at']
                 
+                # Só envia se duração >= 1 segundo
+                if duration >= 1:
+                    activity_data = self._build_activity_data(last_activity, changed_at, duration)
+                    # Finaliza atividade anterior (não é checkpoint)
+                    self.send_activity(activity_data, is_checkpoint=False)
+            
+            if last_activity is None or last_activity['executable'] != current_info['executable']:
+                self.rollup.activation(current_info['executable'], changed_at)
+            
+            # Inicia nova atividade (reseta o ID)
+            with self._activity_lock:
+                self.current_activity_id = None
+                self.current_activity_ref = None
+            self.last_checkpoint_time = changed_mono
+            self.last_activity = {
+                'id': activity_id,
+                'hostname': current_info['hostname'],
+                'username': current_info['username'],
+                'executable': current_info['executable'],
+                'pid': current_info['pid'],
+                'window_title': current_info['window_title'],
+                'start_time': changed_at,
+                'started_at': changed_mono,
+                'state': self.current_period_type or 'active'
+            }
+            
+            if self.debug_mode:
+                logging.debug(f"Nova atividade iniciada: {current_info['executable']}")
+        
+        # Checkpoint em tempo real: envia dados a cada 1 minuto
+        elif now_mono - self.last_checkpoint_time >= self.checkpoint_interval:
+            # Duração total desde o início da atividade
+            total_duration = now_mono - last_activity['started_at']
+            activity_data = self._build_activity_data(last_activity, self.clock.now(), total_duration)
+            # Envia como checkpoint (vai fazer UPDATE se tiver ID)
+            self.send_activity(activity_data, is_checkpoint=True)
+            
+            if self.debug_mode:
+                logging.info(f"Checkpoint enviado: {last_activity['executable']} ({total_duration:.1f}s total)")
+            
+            # Atualiza apenas o tempo do último checkpoint
+            self.last_checkpoint_time = now_mono
+    
+    def collect_metrics(self):
+        data = self.metrics.snapshot(self.transport, self.uploader, self.scheduler)
+        data['capture'] = {
+            'mode': 'events' if self.event_source else 'poll',
+            'events': self.event_source.received if self.event_source else 0,
+        }
+        return data
+    
+    def write_metrics(self):
+        """Grava metrics.json no diretório de dados"""
+        if self.metrics_path:
+            write_metrics(self.metrics_path, self.collect_metrics())
+    
+    def send_heartbeat(self):
+        """Resumo das métricas para o servidor, no próximo lote (sem requisição própria)"""
+        try:
+            data = {
+                'hostname': self.hostname,
+                'username': self.username,
+                'timestamp': self.clock.now().strftime('%Y-%m-%d %H:%M:%S'),
+                **self.metrics.health_summary(self.collect_metrics())
+            }
+            self.uploader.enqueue('agent_health', data)
+        except Exception as e:
+            logging.error(f"Erro ao enviar heartbeat: {str(e)}")
+    
+    def pump_uploader(self):
+        """Sem thread de envio (simulação): envia no próprio loop"""
+        self.uploader.fetch_config_if_due()
+        self.uploader.replay()
+        self.uploader.flush_if_due()
+    
+    def _task_period(self, name):
+        """Intervalo atual da tarefa: base (normal ou ocioso) vezes o multiplicador do servidor"""
+        periods = self.idle_task_periods if self.idle_mode else self.task_periods
+        base = periods[name]
+        if name not in self.max_task_periods:
+            return base
+        multiplied = base * self.uploader.hints.multiplier(name)
+        return max(base, min(multiplied, self.max_task_periods[name]))
+    
+    def apply_rate_hints(self):
+        """Reaplica os intervalos quando o servidor muda os multiplicadores.
+        
+        As dicas chegam pela thread de envio; a troca dos intervalos acontece
+        aqui, na thread do scheduler. A próxima execução de cada tarefa cai em
+        um ponto aleatório do novo intervalo, para a frota não se sincronizar
+        ao receber a mesma dica.
+        """
+        hints = self.uploader.hints
+        if hints.version == self._hints_version:
+            return
+        self._hints_version = hints.version
+        
+        multiplied = self.base_checkpoint_interval * hints.multiplier('checkpoint')
+        self.checkpoint_interval = max(self.base_checkpoint_interval,
+                                       min(multiplied, self.max_task_periods['checkpoint']))
+        for name in self.max_task_periods:
+            if name in self.scheduler.tasks:
+                period = self._task_period(name)
+                self.scheduler.reschedule(name, delay=self.rng.uniform(0, period), period=period)
+        
+        if self.debug_mode:
+            logging.info(f"Intervalos com dicas do servidor: checkpoint {self.checkpoint_interval:.0f}s, "
+                         + ", ".join(f"{name} {task.period:.0f}s" for name, task in self.scheduler.tasks.items()))
+    
+    def _open_event_source(self):
+        """Fonte de notificações de janela do backend (None: continua na amostragem)"""
+        source = self.backend.create_event_source(self.clock)
+        if source is None:
+            return None
+        try:
+            source.start()
+        except Exception as e:
+            logging.error(f"Notificações de janela indisponíveis, usando amostragem: {str(e)}")
+            return None
+        # Com as notificações, a amostragem da janela ativa é só a rede de segurança
+        # (notificação perdida) e o relógio dos checkpoints
+        for periods in (self.task_periods, self.idle_task_periods):
+            periods['active_window'] = max(periods['active_window'], self.config.EVENT_POLL_INTERVAL)
+        if self.debug_mode:
+            logging.info(f"Janela ativa por notificações (amostragem de segurança a cada "
+                         f"{self.task_periods['active_window']:.0f}s)")
+        return source
+    
+    def _wait_for_events(self, timeout):
+        """Sleep do scheduler no modo por eventos: até o próximo prazo ou a próxima notificação"""
+        for event in self.event_source.wait(timeout):
+            try:
+                with self.metrics.timed('window_event'):
+                    self.handle_window_event(event)
             except Exception as e:
-                logging.error(f"Erro no loop de monitoramento: {str(e)}")
-                time.sleep(5)
+                logging.error(f"Erro ao tratar notificação de janela: {str(e)}")
+    
+    def _build_scheduler(self):
+        """Registra as tarefas periódicas (período e jitter próprios de cada uma)"""
+        rng = self.rng
+        sleep = self._wait_for_events if self.event_source else self.clock.sleep
+        scheduler = Scheduler(clock=self.clock.monotonic, sleep=sleep, rng=rng)
+        periods = self.task_periods
+        # Fluxos de envio começam em fase aleatória (até startup_spread), para
+        # computadores ligados juntos não enviarem juntos
+        spread = self.config.STARTUP_SPREAD
+        scheduler.add('windows_snapshot', self.send_windows_snapshot, periods['windows_snapshot'], jitter=1.0,
+                      initial_delay=rng.uniform(0, min(spread, periods['windows_snapshot'])))
+        # A primeira presença vai na verificação de estado; aqui só as renovações
+        # (antes do lease de presence_lease segundos expirar)
+        scheduler.add('mouse_activity', self.send_mouse_activity, periods['mouse_activity'], jitter=1.0,
+                      initial_delay=periods['mouse_activity'] - rng.uniform(0, min(spread, periods['mouse_activity']) / 2))
+        scheduler.add('activity_period', self.check_and_update_activity_period, periods['activity_period'])
+        scheduler.add('active_window', self.poll_active_window, periods['active_window'])
+        scheduler.add('daily_rollup', self.send_daily_rollup, periods['daily_rollup'], jitter=10.0,
+                      initial_delay=periods['daily_rollup'] + rng.uniform(0, spread))
+        scheduler.add('rate_hints', self.apply_rate_hints, 5)
+        # Métricas locais e heartbeat (fase aleatória: a frota não reporta junta)
+        if self.metrics_path and self.config.METRICS_INTERVAL:
+            scheduler.add('metrics', self.write_metrics, self.config.METRICS_INTERVAL,
+                          initial_delay=self.config.METRICS_INTERVAL)
+        if self.config.HEARTBEAT_INTERVAL:
+            scheduler.add('heartbeat', self.send_heartbeat, self.config.HEARTBEAT_INTERVAL, jitter=10.0,
+                          initial_delay=rng.uniform(0, self.config.HEARTBEAT_INTERVAL))
+        if not self.background_upload:
+            scheduler.add('upload', self.pump_uploader, 1)
+        return scheduler
+    
+    def start(self):
+        """Inicia o monitoramento"""
+        self.prepare()
         
+        if self.running:
+            self.scheduler.run()
+        
+        self.finish()
+    
+    def prepare(self):
+        """Monta as tarefas sem rodar o loop (um loop externo pode chamar scheduler.run_pending)"""
+        self.running = True
+        if self.background_upload:
+            self.uploader.start()
+        if self.config.CAPTURE_MODE == 'events':
+            self.event_source = self._open_event_source()
+        self.scheduler = self._build_scheduler()
+    
+    def finish(self):
+        """Encerramento: fecha a atividade atual, envia os totais e o que restou na fila"""
+        if self.event_source:
+            self.event_source.stop()
         # Finaliza última atividade ao parar
+        last_activity = self.last_activity
         if last_activity:
-            end_time = datetime.now()
-            duration = (end_time - last_activity['start_time']).total_seconds()
+            duration = self.clock.monotonic() - last_activity['started_at']
             if duration >= 1:
-                activity_data = {
-                    'hostname': last_activity['hostname'],
-                    'username': last_activity['username'],
-                    'executable': last_activity['executable'],
-                    'pid': last_activity['pid'],
-                    'window_title': last_activity['window_title'],
-                    'start_time': last_activity['start_time'],
-                    'end_time': end_time,
-                    'duration_seconds': duration
-                }
+                activity_data = self._build_activity_data(last_activity, self.clock.now(), duration)
                 # Finalização (não é checkpoint)
                 self.send_activity(activity_data, is_checkpoint=False)
+        
+        # Totais do dia até o encerramento
+        self.send_daily_rollup()
+        
+        # Envia o que restou na fila antes de encerrar
+        self.uploader.stop()
+        self.write_metrics()
+        if self.debug_mode:
+            logging.info(f"Estatísticas de envio: {self.transport.stats()}")
+            logging.info(f"Atraso das tarefas: {self.scheduler.stats()}")
+        self.transport.close()
     
     def stop(self):
         """Para o monitoramento"""
         self.running = False
+        if self.scheduler:
+            self.scheduler.stop()
+        if self.event_source:
+            self.event_source.wake()
@@ -0,0 +1,166 @@
+"""
+Process Cache - Metadados de processos reaproveitados entre ciclos de coleta
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import psutil
+
+
+class ProcessInfo:
+    """Metadados de um processo, identificado por (pid, create_time)"""
+
+    __slots__ = ('pid', 'create_time', 'name', 'exe', 'ppid', 'verified_at', 'hwnds')
+
+    def __init__(self, pid, create_time, name, exe, ppid, verified_at):
+        self.pid = pid
+        self.create_time = create_time
+        self.name = name  # None quando o acesso ao processo é negado
+        self.exe = exe
+        self.ppid = ppid
+        self.verified_at = verified_at
+        self.hwnds = set()  # Janelas já vistas com este processo como dono
+
+    @property
+    def key(self):
+        return (self.pid, self.create_time)
+
+
+class ProcessCache:
+    """Cache LRU de metadados de processos.
+
+    As entradas são indexadas por ``(pid, create_time)``. Nome, executável e
+    PID do pai são lidos uma única vez por processo (em ``oneshot``).
+
+    A conferência do horário de criação (uma chamada ao sistema) só é feita
+    quando algo pode ter mudado: PID ainda desconhecido ou janela (``hwnd``)
+    que ainda não tinha sido vista com esse processo. Uma janela pertence ao
+    mesmo processo enquanto existe (ela é destruída quando o processo
+    termina), então um PID reutilizado chega sempre com janelas novas e é
+    conferido. Sem ``hwnd``, toda consulta confere. ``prune`` (a cada
+    enumeração de janelas) remove os PIDs que sumiram da lista do sistema.
+    """
+
+    MAX_HWNDS = 256  # Janelas lembradas por processo
+
+    def __init__(self, max_size=512, clock=time.monotonic):
+        self.max_size = max_size
+        self.clock = clock
+        self._entries = OrderedDict()  # (pid, create_time) -> ProcessInfo
+        self._current = {}  # pid -> ProcessInfo do processo que tinha o PID na última conferência
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.verifications = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, pid, hwnd=None):
+        """Retorna o ProcessInfo do PID (dono da janela ``hwnd``) ou None se o processo não existe mais"""
+        with self._lock:
+            entry = self._current.get(pid)
+            if entry is not None and hwnd is not None and hwnd in entry.hwnds:
+                self._entries.move_to_end(entry.key)
+                self.hits += 1
+                return entry
+
+        now = self.clock()
+        try:
+            process = psutil.Process(pid)
+            create_time = process.create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            self.invalidate(pid)
+            return None
+
+        key = (pid, create_time)
+        with self._lock:
+            self.verifications += 1
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Mesmo processo: só lembra a janela
+                self._remember(entry, hwnd, now)
+                self._current[pid] = entry
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        info = self._load(process, create_time, now)
+        if info is None:
+            self.invalidate(pid)
+            return None
+
+        with self._lock:
+            self.misses += 1
+            # PID reutilizado: a entrada do processo anterior não serve mais
+            previous = self._current.get(pid)
+            if previous is not None and self._entries.pop(previous.key, None) is not None:
+                self.evictions += 1
+            self._remember(info, hwnd, now)
+            self._entries[key] = info
+            self._current[pid] = info
+            while len(self._entries) > self.max_size:
+                (old_pid, _), old = self._entries.popitem(last=False)
+                if self._current.get(old_pid) is old:
+                    del self._current[old_pid]
+                self.evictions += 1
+        return info
+
+    def _remember(self, entry, hwnd, now):
+        entry.verified_at = now
+        if hwnd is not None:
+            if len(entry.hwnds) >= self.MAX_HWNDS:
+                entry.hwnds.clear()
+            entry.hwnds.add(hwnd)
+
+    def name(self, pid, hwnd=None):
+        """Nome do executável (None se o processo não existe ou o acesso é negado)"""
+        info = self.get(pid, hwnd)
+        return info.name if info else None
+
+    def _load(self, process, create_time, now):
+        try:
+            with process.oneshot():
+                try:
+                    name = process.name()
+                except psutil.AccessDenied:
+                    name = None
+                try:
+                    exe = process.exe()
+                except (psutil.AccessDenied, OSError):
+                    exe = None
+                try:
+                    ppid = process.ppid()
+                except psutil.AccessDenied:
+                    ppid = None
+        except psutil.NoSuchProcess:
+            return None
+        return ProcessInfo(process.pid, create_time, name, exe, ppid, now)
+
+    def invalidate(self, pid):
+        with self._lock:
+            entry = self._current.pop(pid, None)
+            if entry is not None and self._entries.pop(entry.key, None) is not None:
+                self.evictions += 1
+
+    def prune(self, live_pids=None):
+        """Remove processos que terminaram (uma única listagem de PIDs)"""
+        if live_pids is None:
+            live_pids = psutil.pids()
+        live = set(live_pids)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] not in live]:
+                del self._entries[key]
+                self._current.pop(key[0], None)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'verifications': self.verifications,
+            'evictions': self.evictions,
+        }
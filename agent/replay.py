@@ -0,0 +1,56 @@
+"""
+Replay - Reproduz um trace gravado no ActivityMonitor contra o stand-in da API
+
+Permite comparar mudanças no loop do monitor (checkpoints, snapshots,
+períodos) com uso real: o mesmo trace gera sempre a mesma sequência de
+entradas. Mostra chamadas e bytes por rota, eventos por tipo, latência dos
+eventos e CPU por hora simulada.
+
+Uso:
+    python replay.py dia.trace.gz --speed 1000
+"""
+import argparse
+import logging
+
+from backends import VirtualClock
+from simulate import print_report, run_monitor
+from tracefile import TraceBackend, read_trace
+
+
+def run_replay(path, speed=None, db_path=':memory:', trace_memory=False, debug_mode=False):
+    """Reproduz o trace (``speed`` vezes o tempo real; None = o mais rápido possível)"""
+    header, samples = read_trace(path)
+    if not samples:
+        raise ValueError(f"Trace vazio: {path}")
+    clock = VirtualClock(start=TraceBackend.start_time(header), speed=speed)
+    backend = TraceBackend(clock, header, samples)
+    # Última amostra + um intervalo para encerrar a atividade em andamento
+    duration = backend.duration + header.get('interval', 2.0)
+    result = run_monitor(backend, clock, duration, db_path, trace_memory, debug_mode)
+    result['samples'] = len(samples)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reproduz um trace no ActivityMonitor')
+    parser.add_argument('trace', help='Arquivo do trace (.trace.gz)')
+    parser.add_argument('--speed', type=float, default=1000.0,
+                        help='Velocidade em relação ao tempo real (0 = sem espera)')
+    parser.add_argument('--db', default=':memory:', help='Banco SQLite do stand-in')
+    parser.add_argument('--tracemalloc', action='store_true', help='Mede o pico de memória Python')
+    parser.add_argument('--debug', '-d', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.ERROR,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    result = run_replay(args.trace, args.speed or None, args.db, args.tracemalloc, args.debug)
+
+    print(f"Replay: {result['samples']} amostras, {result['hours']:.2f}h em {result['wall_seconds']:.1f}s reais")
+    print_report(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Daily Rollup - Agregados diários por executável (segundos ativo/inativo)
+
+O agent soma localmente quanto tempo cada executável ficou em primeiro plano
+com o usuário ativo e inativo, por dia, e envia os totais acumulados. O
+estado é gravado em JSON no diretório de dados para continuar acumulando
+após reiniciar o agent.
+
+Cada dia tem um ``instance_id``, criado junto com os totais do dia. Os
+valores enviados são absolutos (não incrementos) dentro da instância, então
+o servidor mescla com GREATEST por instância (reenvios, lotes repetidos do
+spool e ordem trocada não duplicam tempo) e soma as instâncias do dia. Se o
+rollup.json se perde, o dia recomeça do zero com outra instância, que é
+somada à anterior em vez de ficar abaixo dela.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+APP_FIELDS = 4  # ativo, inativo, ativações, registros
+
+
+class DailyRollup:
+    """Totais por dia e por executável.
+
+    ``days``: ``'AAAA-MM-DD' -> {'instance', 'active', 'inactive', 'first', 'last', 'apps'}``
+    com ``apps``: ``executável -> [segundos ativo, segundos inativo, ativações, registros]``.
+    Ativações contam as trocas para o executável; registros, as atividades
+    gravadas em activity_events (como o ``COUNT(*)`` dos relatórios antigos).
+    """
+
+    def __init__(self, path=None, keep_days=7):
+        self.path = path
+        self.keep_days = keep_days
+        self.days = {}
+        self._dirty = {}  # data -> executáveis alterados desde o último envio
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.days = json.load(f).get('days', {})
+            for day in self.days.values():
+                # Arquivo de versão anterior: instância '' (a mesma dos totais já gravados no servidor)
+                day.setdefault('instance', '')
+                for app in day['apps'].values():
+                    app.extend([0] * (APP_FIELDS - len(app)))  # Arquivo de versão anterior
+        except (OSError, ValueError) as e:
+            logging.error(f"Erro ao carregar rollup ({self.path}): {str(e)}")
+            self.days = {}
+
+    def save(self):
+        """Grava o estado (arquivo temporário + rename, para não corromper)"""
+        if not self.path:
+            return
+        with self._lock:
+            content = json.dumps({'days': self.days}, separators=(',', ':'))
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Erro ao gravar rollup ({self.path}): {str(e)}")
+
+    def _day(self, date):
+        day = self.days.get(date)
+        if day is None:
+            day = self.days[date] = {
+                'instance': uuid.uuid4().hex[:12],
+                'active': 0.0, 'inactive': 0.0, 'first': None, 'last': None, 'apps': {}
+            }
+        return day
+
+    def add(self, executable, start, end, state, sign=1):
+        """Soma (ou, com ``sign=-1``, subtrai) o intervalo ``start``-``end``, dividido na meia-noite"""
+        if not executable or end <= start:
+            return
+        index = 0 if state == 'active' else 1
+        with self._lock:
+            while start < end:
+                midnight = datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+                chunk_end = min(end, midnight)
+                seconds = (chunk_end - start).total_seconds() * sign
+                date = start.strftime('%Y-%m-%d')
+
+                day = self._day(date)
+                app = day['apps'].setdefault(executable, [0.0, 0.0, 0, 0])
+                app[index] = max(0.0, app[index] + seconds)
+                key = 'active' if index == 0 else 'inactive'
+                day[key] = max(0.0, day[key] + seconds)
+                if index == 0 and sign > 0:
+                    first = start.strftime(TIME_FORMAT)
+                    last = chunk_end.strftime(TIME_FORMAT)
+                    if day['first'] is None or first < day['first']:
+                        day['first'] = first
+                    if day['last'] is None or last > day['last']:
+                        day['last'] = last
+                self._dirty.setdefault(date, set()).add(executable)
+                start = chunk_end
+
+    def reclassify(self, executable, start, end, from_state, to_state):
+        """Move o intervalo de um estado para outro (ex.: idle detectado depois do fato)"""
+        if from_state == to_state:
+            return
+        self.add(executable, start, end, from_state, sign=-1)
+        self.add(executable, start, end, to_state)
+
+    def activation(self, executable, at):
+        """Conta uma vez em que o executável passou a ficar em primeiro plano"""
+        if not executable:
+            return
+        date = at.strftime('%Y-%m-%d')
+        with self._lock:
+            app = self._day(date)['apps'].setdefault(executable, [0.0, 0.0, 0, 0])
+            app[2] += 1
+            self._dirty.setdefault(date, set()).add(executable)
+
+    def record(self, executable, at):
+        """Conta uma atividade gravada (insert em activity_events) do executável"""
+        if not executable:
+            return
+        date = at.strftime('%Y-%m-%d')
+        with self._lock:
+            app = self._day(date)['apps'].setdefault(executable, [0.0, 0.0, 0, 0])
+            app[3] += 1
+            self._dirty.setdefault(date, set()).add(executable)
+
+    def pending(self):
+        """Payloads dos dias alterados desde o último envio (valores absolutos, só apps alterados)"""
+        payloads = []
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            for date, executables in sorted(dirty.items()):
+                day = self.days.get(date)
+                if day is None:
+                    continue
+                payloads.append({
+                    'date': date,
+                    'instance_id': day['instance'],
+                    'total_active_seconds': int(round(day['active'])),
+                    'total_inactive_seconds': int(round(day['inactive'])),
+                    'first_activity': day['first'],
+                    'last_activity': day['last'],
+                    'apps': [
+                        {
+                            'executable': executable,
+                            'active_seconds': int(round(day['apps'][executable][0])),
+                            'inactive_seconds': int(round(day['apps'][executable][1])),
+                            'activations': day['apps'][executable][2],
+                            'events': day['apps'][executable][3],
+                        }
+                        for executable in sorted(executables)
+                    ],
+                })
+        return payloads
+
+    def prune(self, today):
+        """Descarta dias com mais de ``keep_days`` (já enviados)"""
+        cutoff = (today - timedelta(days=self.keep_days)).strftime('%Y-%m-%d')
+        with self._lock:
+            for date in [date for date in self.days if date < cutoff and date not in self._dirty]:
+                del self.days[date]
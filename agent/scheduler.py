@@ -0,0 +1,152 @@
+"""
+Scheduler - Agenda as tarefas periódicas do monitor em relógio monotônico
+"""
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+
+
+class ScheduledTask:
+    """Tarefa periódica: ``callback`` a cada ``period`` segundos (± ``jitter``)"""
+
+    def __init__(self, name, callback, period, jitter=0.0):
+        self.name = name
+        self.callback = callback
+        self.period = period
+        self.jitter = jitter
+        self.next_nominal = 0.0  # Grade sem jitter: o atraso não se acumula
+        self.deadline = 0.0
+        self.cancelled = False
+        # Estatísticas
+        self.runs = 0
+        self.skipped = 0  # Execuções perdidas (ex.: computador suspenso)
+        self.errors = 0
+        self.lateness_total = 0.0
+        self.lateness_max = 0.0
+        self.recent_lateness = deque(maxlen=256)
+        self.run_time_total = 0.0
+
+
+class Scheduler:
+    """Fila de prioridade (heapq) de tarefas periódicas em ``time.monotonic``.
+
+    - Cada tarefa tem período e jitter próprios; o próximo prazo é calculado
+      sobre a grade nominal (prazo anterior + período), então atrasos de uma
+      execução não se acumulam nas seguintes.
+    - Se uma tarefa ficou mais de um período atrasada (suspensão, travamento),
+      as execuções perdidas são puladas em vez de rodarem em rajada.
+    - Entre as tarefas o scheduler dorme exatamente até o próximo prazo.
+    - Mudanças no relógio do sistema (horário de verão, NTP) não afetam os
+      intervalos.
+    - ``stats()`` informa, por tarefa, quanto ela rodou atrasada em relação
+      ao prazo.
+    """
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.running = False
+        self.tasks = {}
+        self._heap = []
+        self._seq = itertools.count()  # Desempate: ordem de registro
+
+    def add(self, name, callback, period, jitter=0.0, initial_delay=0.0):
+        """Registra uma tarefa; a primeira execução é em ``initial_delay`` segundos"""
+        if period <= 0:
+            raise ValueError(f"Período inválido para {name}: {period}")
+        task = ScheduledTask(name, callback, period, jitter)
+        task.next_nominal = self.clock() + initial_delay
+        task.deadline = task.next_nominal
+        self.tasks[name] = task
+        self._push(task)
+        return task
+
+    def cancel(self, name):
+        task = self.tasks.pop(name, None)
+        if task:
+            task.cancelled = True
+
+    def reschedule(self, name, delay=0.0, period=None):
+        """Antecipa/adia a próxima execução (e opcionalmente muda o período)"""
+        task = self.tasks[name]
+        if period is not None:
+            task.period = period
+        # A entrada antiga no heap é ignorada ao sair (prazo diferente)
+        task.next_nominal = self.clock() + delay
+        task.deadline = task.next_nominal
+        self._push(task)
+
+    def _push(self, task):
+        heapq.heappush(self._heap, (task.deadline, next(self._seq), task))
+
+    def _advance(self, task, now):
+        task.next_nominal += task.period
+        if task.next_nominal <= now:
+            missed = int((now - task.next_nominal) // task.period) + 1
+            task.skipped += missed
+            task.next_nominal += missed * task.period
+        offset = self.rng.uniform(-task.jitter, task.jitter) if task.jitter else 0.0
+        task.deadline = max(now, task.next_nominal + offset)
+        self._push(task)
+
+    def run_pending(self):
+        """Executa as tarefas vencidas e retorna os segundos até o próximo prazo"""
+        while self._heap:
+            deadline, _, task = self._heap[0]
+            if task.cancelled or deadline != task.deadline:
+                heapq.heappop(self._heap)  # Entrada obsoleta
+                continue
+            now = self.clock()
+            if deadline > now:
+                return deadline - now
+            heapq.heappop(self._heap)
+
+            lateness = now - deadline
+            task.runs += 1
+            task.lateness_total += lateness
+            task.lateness_max = max(task.lateness_max, lateness)
+            task.recent_lateness.append(lateness)
+            try:
+                task.callback()
+            except Exception as e:
+                task.errors += 1
+                logging.error(f"Erro na tarefa {task.name}: {str(e)}")
+            finished = self.clock()
+            task.run_time_total += finished - now
+
+            if not task.cancelled and self.tasks.get(task.name) is task and task.deadline == deadline:
+                self._advance(task, finished)
+        return None
+
+    def run(self):
+        """Executa até ``stop()``"""
+        self.running = True
+        while self.running:
+            delay = self.run_pending()
+            if not self.running or delay is None:
+                break
+            self.sleep(delay)
+
+    def stop(self):
+        self.running = False
+
+    def stats(self):
+        """Por tarefa: execuções, puladas, erros e atraso em relação ao prazo (segundos)"""
+        stats = {}
+        for name, task in self.tasks.items():
+            recent = sorted(task.recent_lateness)
+            stats[name] = {
+                'period': task.period,
+                'runs': task.runs,
+                'skipped': task.skipped,
+                'errors': task.errors,
+                'lateness_avg': task.lateness_total / task.runs if task.runs else 0.0,
+                'lateness_p95': recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0,
+                'lateness_max': task.lateness_max,
+                'run_time_avg': task.run_time_total / task.runs if task.runs else 0.0,
+            }
+        return stats
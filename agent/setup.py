@@ -18,26 +18,28 @@ include_files = [
     ("config.json.template", "config.json")
 ]
 
-# Adicionar DLLs do pywin32 se existirem
+# Adicionar a DLL do pywintypes (o pythoncom não é usado pelo agent)
 if pywin32_dll_path and os.path.exists(pywin32_dll_path):
     for dll in os.listdir(pywin32_dll_path):
-        if dll.endswith('.dll'):
+        if dll.startswith('pywintypes') and dll.endswith('.dll'):
             dll_path = os.path.join(pywin32_dll_path, dll)
             include_files.append((dll_path, dll))
 
 # Configurações do executável
+# Só "includes": o cx_Freeze segue os imports (inclusive os feitos dentro de
+# funções, como o do requests no transporte) e leva apenas os módulos usados,
+# em vez da árvore inteira de cada pacote (testes do psutil, contrib do urllib3...)
 build_exe_options = {
-    "packages": [
+    "includes": [
         "psutil",
         "requests",
         "urllib3",
+        "msgpack",
         "win32gui",
         "win32process",
         "win32api",
         "pywintypes",
-        "win32con"
-    ],
-    "includes": [
+        "win32con",
         "http.client",
         "urllib.parse",
         "urllib.request"
@@ -49,7 +51,19 @@ build_exe_options = {
         "email", 
         "html", 
         "xml",
-        "test"
+        "test",
+        "psutil.tests",
+        "urllib3.contrib",
+        "asyncio",
+        "multiprocessing",
+        "pydoc",
+        "doctest",
+        "pdb",
+        "lib2to3",
+        "distutils",
+        "setuptools",
+        "pip",
+        "numpy"
     ],
     "optimize": 2,
     "include_msvcr": True,
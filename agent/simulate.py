@@ -0,0 +1,275 @@
+"""
+Simulação - Roda o ActivityMonitor em tempo virtual contra o stand-in da API
+
+Usa o SimulatedBackend (usuário aleatório determinístico pela seed) e um
+VirtualClock, então horas de uso passam em segundos e funcionam em qualquer
+sistema. Ao final mostra o custo do agent por hora simulada: CPU, requisições,
+bytes enviados e memória.
+
+``--compare-capture`` roda a mesma seed com a janela ativa por amostragem
+(2 s) e por notificações (com e sem notificações perdidas) e compara
+acordadas, CPU e o erro do tempo por aplicativo contra uma referência
+amostrada a cada 0,1 s.
+
+Uso:
+    python simulate.py --hours 8 --seed 42
+    python simulate.py --hours 4 --compare-capture
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import psutil
+
+from backends import RandomUserModel, SimulatedBackend, VirtualClock
+from config import Config
+from monitor import ActivityMonitor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+import stand_in  # noqa: E402
+
+
+def start_stand_in(db_path=':memory:', agent_config=None):
+    """Sobe o stand-in da API em uma porta livre, em uma thread"""
+    server = stand_in.create_server(port=0, db_path=db_path, agent_config=agent_config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_monitor(backend, clock, duration, db_path=':memory:', trace_memory=False, debug_mode=False,
+                wire_format='json', agent_config=None, capture_mode='events', poll_period=None):
+    """Roda o ActivityMonitor por ``duration`` segundos virtuais contra o stand-in.
+
+    ``agent_config``: dicas de taxa que o stand-in devolve ao agent (ver hints.py).
+    ``capture_mode``: janela ativa por notificações ('events') ou amostragem
+    ('poll', a cada ``poll_period`` segundos se informado).
+    Retorna as métricas da execução: CPU da thread do monitor, requisições e
+    bytes (total e por rota), eventos confirmados por tipo, latência dos
+    eventos (do enqueue à confirmação, em tempo virtual) e memória.
+    """
+    server = start_stand_in(db_path, agent_config)
+    monitor = ActivityMonitor(
+        debug_mode=debug_mode,
+        backend=backend,
+        clock=clock,
+        config=Config(api_url=f"http://127.0.0.1:{server.server_address[1]}", wire_format=wire_format,
+                      capture_mode=capture_mode),
+        persist_state=False,
+        background_upload=False
+    )
+    if poll_period:
+        monitor.task_periods['active_window'] = poll_period
+
+    events = {}
+    latencies = []
+
+    def on_delivered(event, latency):
+        counters = events.setdefault(event['type'], {'count': 0, 'bytes': 0})
+        counters['count'] += 1
+        counters['bytes'] += len(json.dumps(event['data'], separators=(',', ':')))
+        if latency is not None:
+            latencies.append(latency)
+
+    monitor.uploader.on_delivered = on_delivered
+    started_at = clock.monotonic()
+
+    def stop_when_done(virtual_clock):
+        if virtual_clock.monotonic() - started_at >= duration:
+            monitor.stop()
+
+    clock.on_sleep = stop_when_done
+
+    if trace_memory:
+        tracemalloc.start()
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()  # Só a thread do monitor (o stand-in roda em outra)
+
+    try:
+        monitor.start()
+    finally:
+        cpu_seconds = time.thread_time() - cpu_start
+        wall_seconds = time.perf_counter() - wall_start
+        server.shutdown()
+        server.server_close()
+    store = server.RequestHandlerClass.store
+
+    hours = duration / 3600
+    stats = monitor.transport.stats()
+    latencies.sort()
+    result = {
+        'hours': hours,
+        'wall_seconds': wall_seconds,
+        'cpu_seconds': cpu_seconds,
+        'cpu_per_hour': cpu_seconds / hours,
+        'requests': stats['requests'],
+        'requests_per_hour': stats['requests'] / hours,
+        'bytes_sent_per_hour': stats['bytes_sent'] / hours,
+        'bytes_raw_per_hour': stats['bytes_raw'] / hours,
+        'endpoints': stats['endpoints'],
+        'wire_format': 'msgpack' if monitor.transport.wire_enabled else 'json',
+        'encode_seconds': stats['encode_seconds'],
+        'wire_resyncs': stats['wire_resyncs'],
+        'events': events,
+        'backend_calls': backend.calls,
+        'capture': monitor.collect_metrics()['capture'],
+        'app_seconds': {
+            row[0]: row[1] for row in store.conn.execute(
+                "SELECT executable, SUM(duration_seconds) FROM activity_events GROUP BY executable")
+        },
+        'tasks': monitor.scheduler.stats() if monitor.scheduler else {},
+        'rss_mb': process.memory_info().rss / 1024 / 1024,
+        'rss_growth_mb': (process.memory_info().rss - rss_before) / 1024 / 1024,
+        'stored': {
+            table: store.count(table)
+            for table in ('activity_events', 'activity_periods', 'windows_snapshot', 'daily_app_summary', 'agent_health')
+        },
+    }
+    if latencies:
+        result['event_latency'] = {
+            'avg': sum(latencies) / len(latencies),
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+            'max': latencies[-1],
+        }
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['python_peak_mb'] = peak / 1024 / 1024
+    return result
+
+
+def print_report(result):
+    print(f"CPU do agent:   {result['cpu_seconds']:.2f}s ({result['cpu_per_hour'] * 1000:.0f} ms/h)")
+    print(f"Requisições:    {result['requests']} ({result['requests_per_hour']:.0f}/h)")
+    print(f"Bytes enviados: {result['bytes_sent_per_hour'] / 1024:.1f} KB/h "
+          f"({result['bytes_raw_per_hour'] / 1024:.1f} KB/h sem compressão, {result['wire_format']})")
+    print(f"Serialização:   {result['encode_seconds'] * 1000:.0f} ms de CPU "
+          f"({result['encode_seconds'] / result['hours'] * 1000:.1f} ms/h)")
+    for endpoint, counters in sorted(result['endpoints'].items()):
+        print(f"  {endpoint}: {counters['requests']} chamadas, "
+              f"{counters['bytes_sent'] / 1024:.1f} KB enviados, "
+              f"{counters['bytes_received'] / 1024:.1f} KB recebidos")
+    for event_type, counters in sorted(result['events'].items()):
+        print(f"  {event_type}: {counters['count']} eventos, {counters['bytes'] / 1024:.1f} KB (JSON)")
+    if 'event_latency' in result:
+        latency = result['event_latency']
+        print(f"Latência dos eventos: média {latency['avg']:.1f}s, p50 {latency['p50']:.1f}s, "
+              f"p95 {latency['p95']:.1f}s, máx {latency['max']:.1f}s")
+    for name, task in result.get('tasks', {}).items():
+        print(f"  tarefa {name}: {task['runs']} execuções a cada {task['period']:g}s, "
+              f"atraso p95 {task['lateness_p95'] * 1000:.1f} ms, máx {task['lateness_max'] * 1000:.1f} ms")
+    print(f"Memória (RSS):  {result['rss_mb']:.1f} MB (+{result['rss_growth_mb']:.1f} MB)")
+    if 'python_peak_mb' in result:
+        print(f"Pico Python:    {result['python_peak_mb']:.1f} MB")
+    print(f"Registros no stand-in: {result['stored']}")
+
+
+def run_simulation(hours=8.0, seed=0, db_path=':memory:', trace_memory=False, debug_mode=False,
+                   wire_format='json', agent_config=None, capture_mode='events', poll_period=None,
+                   drop_events=0):
+    """Simula ``hours`` horas de um usuário aleatório e retorna as métricas"""
+    clock = VirtualClock()
+    backend = SimulatedBackend(clock, RandomUserModel(seed=seed), drop_events=drop_events)
+    result = run_monitor(backend, clock, hours * 3600, db_path, trace_memory, debug_mode, wire_format,
+                         agent_config, capture_mode, poll_period)
+    result['seed'] = seed
+    return result
+
+
+def compare_wire(hours, seed):
+    """Mesma simulação (mesma seed) em JSON e em MessagePack com dicionário de strings"""
+    results = {fmt: run_simulation(hours, seed, wire_format=fmt) for fmt in ('json', 'msgpack')}
+    if results['msgpack']['wire_format'] != 'msgpack':
+        print("msgpack não está instalado: só JSON disponível")
+        return
+
+    rows = [
+        ('Sem compressão (KB/h)', lambda r: r['bytes_raw_per_hour'] / 1024),
+        ('Enviado, com gzip (KB/h)', lambda r: r['bytes_sent_per_hour'] / 1024),
+        ('CPU serialização (ms/h)', lambda r: r['encode_seconds'] / r['hours'] * 1000),
+        ('CPU total do agent (ms/h)', lambda r: r['cpu_per_hour'] * 1000),
+    ]
+    print(f"Simulação: {hours:g}h (seed {seed})")
+    print(f"{'':28}{'JSON':>10}{'msgpack':>10}{'diferença':>12}")
+    for label, metric in rows:
+        before, after = metric(results['json']), metric(results['msgpack'])
+        change = (after / before - 1) * 100 if before else 0.0
+        print(f"{label:28}{before:>10.1f}{after:>10.1f}{change:>+11.1f}%")
+    print(f"Registros no stand-in: JSON {results['json']['stored']}, msgpack {results['msgpack']['stored']}")
+
+
+def compare_capture(hours, seed):
+    """Mesma seed com amostragem de 2 s, notificações e notificações perdidas (1 em 5)"""
+    reference = run_simulation(hours, seed, capture_mode='poll', poll_period=0.1)['app_seconds']
+    total = sum(reference.values())
+    runs = [
+        ('amostragem 2s', dict(capture_mode='poll')),
+        ('eventos', dict(capture_mode='events')),
+        ('eventos, 20% perdidos', dict(capture_mode='events', drop_events=5)),
+    ]
+    print(f"Simulação: {hours:g}h (seed {seed}); referência: amostragem a cada 0,1 s "
+          f"({total / 3600:.2f}h de atividades)")
+    print(f"{'':24}{'acordadas/h':>12}{'chamadas/h':>12}{'CPU ms/h':>10}{'atividades':>12}{'erro por app':>14}")
+    for label, options in runs:
+        result = run_simulation(hours, seed, **options)
+        # Acordadas do loop para a janela ativa: amostragens + notificações recebidas
+        wakeups = result['tasks']['active_window']['runs'] + result['capture']['events']
+        error = sum(abs(result['app_seconds'].get(app, 0) - seconds) for app, seconds in reference.items())
+        error += sum(seconds for app, seconds in result['app_seconds'].items() if app not in reference)
+        print(f"{label:24}{wakeups / hours:>12.0f}{result['backend_calls'] / hours:>12.0f}"
+              f"{result['cpu_per_hour'] * 1000:>10.0f}{result['stored']['activity_events']:>12}"
+              f"{error / total * 100:>13.2f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simula o agent em tempo virtual')
+    parser.add_argument('--hours', type=float, default=8.0, help='Horas simuladas')
+    parser.add_argument('--seed', type=int, default=0, help='Seed do modelo de usuário')
+    parser.add_argument('--db', default=':memory:', help='Banco SQLite do stand-in')
+    parser.add_argument('--tracemalloc', action='store_true', help='Mede o pico de memória Python')
+    parser.add_argument('--wire', choices=['json', 'msgpack'], default='json', help='Formato dos envios')
+    parser.add_argument('--compare-wire', action='store_true',
+                        help='Roda a mesma simulação em JSON e MessagePack e compara bytes/CPU')
+    parser.add_argument('--agent-config', type=json.loads, default=None,
+                        help='Dicas de taxa devolvidas pelo stand-in, em JSON (ex.: \'{"interval_multipliers": {"*": 3}}\')')
+    parser.add_argument('--capture', choices=['events', 'poll'], default='events',
+                        help='Janela ativa por notificações ou por amostragem de 2 s')
+    parser.add_argument('--drop-events', type=int, default=0,
+                        help='Perde 1 notificação a cada N (exercita a amostragem de segurança)')
+    parser.add_argument('--compare-capture', action='store_true',
+                        help='Compara amostragem e notificações na mesma simulação')
+    parser.add_argument('--debug', '-d', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.ERROR,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    if args.compare_wire:
+        compare_wire(args.hours, args.seed)
+        return
+    if args.compare_capture:
+        compare_capture(args.hours, args.seed)
+        return
+
+    result = run_simulation(args.hours, args.seed, args.db, args.tracemalloc, args.debug, args.wire,
+                            args.agent_config, args.capture, drop_events=args.drop_events)
+
+    print(f"Simulação: {result['hours']:g}h (seed {result['seed']}) em {result['wall_seconds']:.1f}s reais")
+    print_report(result)
+
+
+if __name__ == '__main__':
+    main()
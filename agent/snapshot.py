@@ -0,0 +1,113 @@
+"""
+Snapshot Encoder - Envia snapshots de janelas como deltas sobre uma base completa
+"""
+import threading
+import time
+
+# Campos de cada janela comparados entre snapshots (is_active vai à parte, em 'active')
+WINDOW_FIELDS = ('executable', 'pid', 'window_title')
+
+
+def window_key(window):
+    """Identidade estável da janela: handle (hwnd) ou, na falta dele, pid + executável"""
+    if window.get('window_id') is not None:
+        return str(window['window_id'])
+    return f"{window.get('pid')}:{window.get('executable')}"
+
+
+class SnapshotEncoder:
+    """Converte a lista completa de janelas em payloads ``full`` ou ``delta``.
+
+    - ``full``: lista completa (baseline), enviada na primeira vez, a cada
+      ``full_interval`` segundos e sempre que o servidor pede resync.
+    - ``delta``: apenas janelas adicionadas, removidas e alteradas, mais a
+      janela ativa quando ela muda. ``base_seq`` indica o snapshot sobre o
+      qual o delta se aplica; se o servidor não estiver nesse ``seq`` ele
+      responde pedindo resync.
+    - Sem mudanças, nada é enviado, exceto um delta vazio a cada
+      ``keepalive_interval`` segundos (mantém o computador "online").
+    """
+
+    def __init__(self, full_interval=600, keepalive_interval=60, clock=time.monotonic):
+        self.full_interval = full_interval
+        self.keepalive_interval = keepalive_interval
+        self.clock = clock
+        self.seq = 0
+        self._windows = {}
+        self._active = None
+        self._last_full_at = None
+        self._last_sent_at = None
+        self._resync = threading.Event()
+
+    def request_resync(self):
+        """Força uma baseline completa no próximo encode (chamado pela confirmação do servidor)"""
+        self._resync.set()
+
+    def keepalive(self):
+        """Delta vazio sobre o último snapshot, sem enumerar janelas (None sem baseline)"""
+        if self._last_full_at is None or self._resync.is_set():
+            return None
+        self.seq += 1
+        self._last_sent_at = self.clock()
+        return {
+            'mode': 'delta',
+            'base_seq': self.seq - 1,
+            'added': [],
+            'removed': [],
+            'changed': [],
+            'seq': self.seq,
+        }
+
+    def encode(self, windows):
+        """Retorna o payload do snapshot (sem hostname/timestamp) ou None se não há o que enviar"""
+        now = self.clock()
+        current = {}
+        active = None
+        for window in windows:
+            key = window_key(window)
+            current[key] = {field: window.get(field) for field in WINDOW_FIELDS}
+            current[key]['window_id'] = key
+            if window.get('is_active'):
+                active = key
+
+        needs_full = (
+            self._last_full_at is None
+            or self._resync.is_set()
+            or now - self._last_full_at >= self.full_interval
+        )
+        if needs_full:
+            self._resync.clear()
+            payload = {
+                'mode': 'full',
+                'windows': [dict(info, is_active=(key == active)) for key, info in current.items()]
+            }
+            self._last_full_at = now
+        else:
+            added = [info for key, info in current.items() if key not in self._windows]
+            removed = [key for key in self._windows if key not in current]
+            changed = [
+                info for key, info in current.items()
+                if key in self._windows and info != self._windows[key]
+            ]
+            active_changed = active != self._active
+
+            if not (added or removed or changed or active_changed):
+                if now - self._last_sent_at < self.keepalive_interval:
+                    return None
+
+            payload = {
+                'mode': 'delta',
+                'base_seq': self.seq,
+                'added': added,
+                'removed': removed,
+                'changed': changed,
+            }
+            if active_changed:
+                payload['active'] = active
+
+        self.seq += 1
+        payload['seq'] = self.seq
+        self._windows = current
+        self._active = active
+        self._last_sent_at = now
+        return payload
@@ -0,0 +1,199 @@
+"""
+Spool - Armazena em disco os eventos que não puderam ser enviados
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+# Eventos substituídos pelo próximo do mesmo tipo: na compactação só o último é mantido
+COMPACTABLE_TYPES = ('mouse_activity',)
+# Snapshots: um delta depende dos anteriores desde o último completo, então
+# ficam o snapshot completo mais recente e os deltas depois dele
+SNAPSHOT_TYPE = 'windows_snapshot'
+_FULL_SNAPSHOT = "COALESCE(json_extract(payload, '$.mode'), 'full') = 'full'"
+
+
+class Spool:
+    """Log persistente (SQLite) de eventos pendentes, em ordem de chegada.
+
+    Os eventos são gravados em transação (WAL), então um crash do agent não
+    perde o que já estava no spool. Quando ``max_events`` ou ``max_bytes`` é
+    ultrapassado, a compactação remove primeiro os pings de mouse já
+    substituídos e os snapshots anteriores ao último completo e, se ainda
+    necessário, os eventos mais antigos.
+
+    A tabela ``acked_ids`` guarda o ID no banco dos inserts confirmados
+    enquanto há eventos no spool, para que checkpoints gravados só com o
+    ``ref`` (event_id do insert) sejam resolvidos mesmo depois de reiniciar o
+    agent. Ela é esvaziada junto com o spool.
+    """
+
+    def __init__(self, path, max_events=100000, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " event_id TEXT NOT NULL,"
+            " type TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " timestamp REAL NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS acked_ids ("
+            " event_id TEXT PRIMARY KEY,"
+            " record_id INTEGER NOT NULL)"
+        )
+        self._count, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM spool"
+        ).fetchone()
+        if self._count == 0:
+            self._conn.execute("DELETE FROM acked_ids")
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def append(self, events):
+        """Grava eventos no final do spool (id, type, data, timestamp)"""
+        rows = []
+        for event in events:
+            payload = json.dumps(event['data'], separators=(',', ':'))
+            rows.append((event['id'], event['type'], payload,
+                         event.get('timestamp') or time.time(), len(payload)))
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO spool (event_id, type, payload, timestamp, size) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.execute("COMMIT")
+            self._count += len(rows)
+            self._bytes += sum(row[4] for row in rows)
+
+            if self._count > self.max_events or self._bytes > self.max_bytes:
+                self._compact()
+
+    def peek(self, limit):
+        """Retorna os eventos mais antigos sem removê-los"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event_id, type, payload, timestamp FROM spool ORDER BY seq LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {'seq': seq, 'id': event_id, 'type': event_type,
+             'data': json.loads(payload), 'timestamp': timestamp}
+            for seq, event_id, event_type, payload, timestamp in rows
+        ]
+
+    def remove(self, events):
+        """Remove do spool eventos já entregues (retornados por peek)"""
+        seqs = [(event['seq'],) for event in events]
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM spool WHERE seq = ?", seqs)
+            self._conn.execute("COMMIT")
+            self._refresh_totals()
+            if self._count == 0:
+                # Nenhum evento pendente pode mais referenciar os inserts confirmados
+                self._conn.execute("DELETE FROM acked_ids")
+                self._conn.execute("PRAGMA incremental_vacuum")
+
+    def remember(self, event_id, record_id):
+        """Grava o ID no banco de um insert confirmado (ver ``resolve``)"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO acked_ids (event_id, record_id) VALUES (?, ?)",
+                               (event_id, record_id))
+
+    def resolve(self, event_id):
+        """ID no banco do insert ``event_id`` confirmado enquanto havia eventos no spool (ou None)"""
+        with self._lock:
+            row = self._conn.execute("SELECT record_id FROM acked_ids WHERE event_id = ?",
+                                     (event_id,)).fetchone()
+        return row[0] if row else None
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        before = self._count
+        self._conn.execute("BEGIN")
+        # 1. Mantém apenas o último evento de cada tipo compactável
+        for event_type in COMPACTABLE_TYPES:
+            self._conn.execute(
+                "DELETE FROM spool WHERE type = ? AND seq < "
+                "(SELECT MAX(seq) FROM spool WHERE type = ?)",
+                (event_type, event_type)
+            )
+        # 2. Snapshots (completos e deltas) anteriores ao último completo; sem
+        #    nenhum completo no spool, a cadeia de deltas fica inteira
+        self._conn.execute(
+            "DELETE FROM spool WHERE type = ? AND seq < "
+            f"(SELECT MAX(seq) FROM spool WHERE type = ? AND {_FULL_SNAPSHOT})",
+            (SNAPSHOT_TYPE, SNAPSHOT_TYPE)
+        )
+        self._conn.execute("COMMIT")
+        self._refresh_totals()
+        superseded = before - self._count
+
+        # 3. Ainda acima do limite: descarta os mais antigos. Se algum snapshot
+        #    sair, os deltas seguintes perdem a base: saem também, até o próximo
+        #    completo (o servidor pede resync e o encoder manda um completo)
+        while self._count > self.max_events or self._bytes > self.max_bytes:
+            excess = max(self._count - self.max_events, self._count // 10, 1)
+            self._conn.execute("BEGIN")
+            snapshots = self._conn.execute(
+                "SELECT COUNT(*) FROM (SELECT type FROM spool ORDER BY seq LIMIT ?) WHERE type = ?",
+                (excess, SNAPSHOT_TYPE)
+            ).fetchone()[0]
+            self._conn.execute(
+                "DELETE FROM spool WHERE seq IN (SELECT seq FROM spool ORDER BY seq LIMIT ?)",
+                (excess,)
+            )
+            if snapshots:
+                self._conn.execute(
+                    "DELETE FROM spool WHERE type = ? AND seq < COALESCE("
+                    f"(SELECT MIN(seq) FROM spool WHERE type = ? AND {_FULL_SNAPSHOT}), "
+                    "(SELECT MAX(seq) + 1 FROM spool))",
+                    (SNAPSHOT_TYPE, SNAPSHOT_TYPE)
+                )
+            self._conn.execute("COMMIT")
+            self._refresh_totals()
+
+        self._conn.execute("PRAGMA incremental_vacuum")
+
+        if superseded:
+            logging.info(f"Spool compactado: {superseded} eventos substituídos removidos")
+        lost = before - superseded - self._count
+        if lost:
+            self.dropped += lost
+            logging.error(f"Spool cheio: {lost} eventos mais antigos descartados ({self._count} restantes)")
+
+    def _refresh_totals(self):
+        self._count, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM spool"
+        ).fetchone()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,305 @@
+"""
+Trace File - Grava e reproduz as entradas amostradas pelo agent
+
+Um trace guarda, a cada amostra, a janela em primeiro plano, a lista de
+janelas e os segundos sem input, para reproduzir um dia real de uso no
+``ActivityMonitor`` (ver replay.py).
+
+Formato (JSON por linha, gzip):
+
+- 1ª linha: cabeçalho ``{"format": "pcmon-trace", "version": 1, "start": ..., "interval": ...}``
+- demais: ``[dt, foreground, idle]`` ou ``[dt, foreground, idle, mudanças]``, onde
+  ``dt`` é o intervalo desde a amostra anterior e ``mudanças`` só traz o que
+  mudou na lista de janelas:
+
+  - ``"s"``: novos textos (executáveis e títulos), referenciados pela posição
+  - ``"+"``: janelas novas ou alteradas ``[hwnd, pid, executável, título, visível]``
+  - ``"-"``: handles das janelas fechadas
+
+Uso:
+    python tracefile.py --out dia.trace.gz --hours 9
+    python tracefile.py --out sim.trace.gz --hours 9 --simulate 42   # usuário simulado
+"""
+import argparse
+import gzip
+import json
+import logging
+import zlib
+from datetime import datetime
+
+from backends import PlatformBackend, SystemClock
+
+TRACE_FORMAT = 'pcmon-trace'
+TRACE_VERSION = 1
+
+
+class TraceWriter:
+    """Escreve amostras no formato compacto (somente as diferenças entre amostras)"""
+
+    def __init__(self, path, start, interval):
+        self.path = path
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._strings = {}
+        self._windows = {}
+        self._last_t = 0.0
+        self.samples = 0
+        self._write({
+            'format': TRACE_FORMAT,
+            'version': TRACE_VERSION,
+            'start': start.isoformat(),
+            'interval': interval,
+        })
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(',', ':'), ensure_ascii=False))
+        self._file.write('\n')
+
+    def _intern(self, text, new_strings):
+        if text is None:
+            return -1
+        index = self._strings.get(text)
+        if index is None:
+            index = self._strings[text] = len(self._strings)
+            new_strings.append(text)
+        return index
+
+    def write_sample(self, t, foreground, idle_seconds, windows):
+        """Grava uma amostra.
+
+        ``t`` são os segundos desde o início do trace e ``windows`` um dict
+        ``hwnd -> (pid, executável, título, visível)``.
+        """
+        new_strings = []
+        changed = []
+        for hwnd, (pid, executable, title, visible) in windows.items():
+            entry = [hwnd, pid, self._intern(executable, new_strings),
+                     self._intern(title, new_strings), 1 if visible else 0]
+            if self._windows.get(hwnd) != entry:
+                changed.append(entry)
+                self._windows[hwnd] = entry
+        removed = [hwnd for hwnd in self._windows if hwnd not in windows]
+        for hwnd in removed:
+            del self._windows[hwnd]
+
+        record = [round(t - self._last_t, 2), foreground, round(idle_seconds, 1)]
+        if changed or removed:
+            changes = {}
+            if new_strings:
+                changes['s'] = new_strings
+            if changed:
+                changes['+'] = changed
+            if removed:
+                changes['-'] = removed
+            record.append(changes)
+
+        self._write(record)
+        self._last_t = t
+        self.samples += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_trace(path):
+    """Lê um trace e retorna ``(cabeçalho, amostras)``.
+
+    Cada amostra é ``(t, foreground, idle, mudanças)`` com ``t`` absoluto
+    (segundos desde o início) e os índices de texto já resolvidos. Um trace
+    truncado (gravação interrompida) é lido até a última linha completa.
+    """
+    samples = []
+    strings = []
+    header = None
+    t = 0.0
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Última linha incompleta
+                if header is None:
+                    if not isinstance(record, dict) or record.get('format') != TRACE_FORMAT:
+                        raise ValueError(f"{path} não é um trace do pcmon")
+                    header = record
+                    continue
+
+                dt, foreground, idle = record[:3]
+                t += dt
+                changes = None
+                if len(record) > 3:
+                    raw = record[3]
+                    strings.extend(raw.get('s', []))
+                    changes = {
+                        'upsert': [
+                            (hwnd, pid, strings[exe] if exe >= 0 else None,
+                             strings[title] if title >= 0 else None, bool(visible))
+                            for hwnd, pid, exe, title, visible in raw.get('+', [])
+                        ],
+                        'remove': raw.get('-', []),
+                    }
+                samples.append((t, foreground, idle, changes))
+    except (EOFError, zlib.error) as e:
+        logging.error(f"Trace truncado em {path}: {str(e)}")
+
+    if header is None:
+        raise ValueError(f"{path} não é um trace do pcmon")
+    return header, samples
+
+
+class TraceRecorder:
+    """Amostra um backend real e grava o trace"""
+
+    def __init__(self, backend, path, interval=2.0, clock=None):
+        self.backend = backend
+        self.clock = clock or SystemClock()
+        self.interval = interval
+        self.writer = TraceWriter(path, self.clock.now(), interval)
+        self.running = False
+
+    def sample(self):
+        """Lê o estado atual do backend: (foreground, idle, janelas)"""
+        foreground = self.backend.get_foreground_window()
+        visible = set(self.backend.enum_windows())
+        # A janela em primeiro plano entra no trace mesmo se não estiver visível
+        handles = visible | {foreground} if foreground else visible
+        windows = {}
+        for hwnd in handles:
+            pid = self.backend.get_window_pid(hwnd)
+            windows[hwnd] = (
+                pid,
+                self.backend.get_process_name(pid, hwnd),
+                self.backend.get_window_title(hwnd),
+                hwnd in visible,
+            )
+        return foreground, self.backend.get_idle_seconds(), windows
+
+    def record(self, duration=None):
+        """Grava até ``duration`` segundos (ou até ``stop``)"""
+        self.running = True
+        started = self.clock.monotonic()
+        try:
+            while self.running:
+                t = self.clock.monotonic() - started
+                if duration is not None and t >= duration:
+                    break
+                try:
+                    foreground, idle, windows = self.sample()
+                    self.writer.write_sample(t, foreground, idle, windows)
+                    if self.writer.samples % 30 == 0:
+                        self.writer.flush()
+                except Exception as e:
+                    logging.error(f"Erro ao amostrar: {str(e)}")
+                self.clock.sleep(self.interval)
+        finally:
+            self.writer.close()
+        return self.writer.samples
+
+    def stop(self):
+        self.running = False
+
+
+class TraceBackend(PlatformBackend):
+    """Backend que reproduz um trace conforme o relógio (virtual) avança.
+
+    O relógio começa no início do trace (``clock.monotonic() == 0``). Entre
+    duas amostras o estado é o da anterior e o idle cresce com o tempo.
+    """
+
+    def __init__(self, clock, header, samples):
+        self.clock = clock
+        self.header = header
+        self.samples = samples
+        self.duration = samples[-1][0] if samples else 0.0
+        self.windows = {}  # hwnd -> (pid, executável, título, visível)
+        self.foreground = 0
+        self._idle = 0.0
+        self._sample_t = 0.0
+        self._index = 0
+        self.calls = 0
+
+    @classmethod
+    def load(cls, clock, path):
+        header, samples = read_trace(path)
+        return cls(clock, header, samples)
+
+    @staticmethod
+    def start_time(header):
+        return datetime.fromisoformat(header['start'])
+
+    def _sync(self):
+        self.calls += 1
+        now = self.clock.monotonic()
+        while self._index < len(self.samples) and self.samples[self._index][0] <= now:
+            t, foreground, idle, changes = self.samples[self._index]
+            self._index += 1
+            if changes:
+                for hwnd, pid, executable, title, visible in changes['upsert']:
+                    self.windows[hwnd] = (pid, executable, title, visible)
+                for hwnd in changes['remove']:
+                    self.windows.pop(hwnd, None)
+            self.foreground = foreground
+            self._idle = idle
+            self._sample_t = t
+
+    def get_foreground_window(self):
+        self._sync()
+        return self.foreground
+
+    def get_window_title(self, hwnd):
+        window = self.windows.get(hwnd)
+        return (window[2] or '') if window else ''
+
+    def get_window_pid(self, hwnd):
+        window = self.windows.get(hwnd)
+        return window[0] if window else 0
+
+    def enum_windows(self):
+        self._sync()
+        return [hwnd for hwnd, window in self.windows.items() if window[3]]
+
+    def get_idle_seconds(self):
+        self._sync()
+        return self._idle + max(0.0, self.clock.monotonic() - self._sample_t)
+
+    def get_process_name(self, pid, hwnd=None):
+        for window in self.windows.values():
+            if window[0] == pid:
+                return window[1]
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Grava um trace das entradas do agent')
+    parser.add_argument('--out', required=True, help='Arquivo do trace (.trace.gz)')
+    parser.add_argument('--hours', type=float, default=None, help='Duração (padrão: até Ctrl+C)')
+    parser.add_argument('--interval', type=float, default=2.0, help='Intervalo entre amostras')
+    parser.add_argument('--simulate', type=int, metavar='SEED', default=None,
+                        help='Grava um usuário simulado (tempo virtual) em vez do backend real')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.simulate is not None:
+        from backends import RandomUserModel, SimulatedBackend, VirtualClock
+        if not args.hours:
+            parser.error('--simulate exige --hours')
+        clock = VirtualClock()
+        backend = SimulatedBackend(clock, RandomUserModel(seed=args.simulate))
+        recorder = TraceRecorder(backend, args.out, args.interval, clock)
+    else:
+        from backends import create_backend
+        recorder = TraceRecorder(create_backend(), args.out, args.interval)
+    logging.info(f"Gravando trace em {args.out} (Ctrl+C para parar)")
+    try:
+        samples = recorder.record(args.hours * 3600 if args.hours else None)
+    except KeyboardInterrupt:
+        samples = recorder.writer.samples
+    logging.info(f"Trace gravado: {samples} amostras")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+Transport - Camada HTTP única usada por todos os envios do agent
+"""
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import wire
+
+
+class CircuitOpenError(Exception):
+    """Envio recusado porque o circuito está aberto (servidor considerado fora do ar)"""
+
+    def __init__(self, retry_in):
+        super().__init__(f"Circuito aberto, nova tentativa em {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class Transport:
+    """Sessão HTTP com keep-alive, gzip, backoff com jitter e circuit breaker.
+
+    - As conexões são reaproveitadas pelo pool da ``requests.Session``.
+    - Corpos a partir de ``compress_min_bytes`` vão com ``Content-Encoding: gzip``.
+    - Erros de conexão, 5xx e 429 são repetidos até ``max_retries`` vezes,
+      aguardando ``uniform(0, min(backoff_max, backoff_base * 2^tentativa))``.
+    - Após ``failure_threshold`` falhas seguidas o circuito abre e os envios
+      são recusados (``CircuitOpenError``) por ``reset_timeout`` segundos; depois
+      disso uma única requisição de teste decide se o circuito fecha.
+    - Com ``wire_format='msgpack'``, os corpos passam a ir em MessagePack com
+      dicionário de strings (ver wire.py) assim que o servidor anunciar o
+      formato em ``Accept-Post``; JSON continua sendo o padrão e o fallback.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, api_url, timeout=10, pool_size=2, compress_min_bytes=512,
+                 max_retries=2, backoff_base=0.5, backoff_max=30.0,
+                 failure_threshold=5, reset_timeout=60.0, wire_format='json', session=None):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.compress_min_bytes = compress_min_bytes
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.wire_format = wire_format
+        self._wire = None  # WireEncoder, depois que o servidor aceitar o formato
+        if wire_format == 'msgpack' and not wire.available():
+            logging.error("wire_format 'msgpack' configurado, mas o msgpack não está instalado; usando JSON")
+
+        # Sessão compartilhada (gerador de carga): o pool de conexões é de quem a criou.
+        # A própria só é criada no primeiro envio: importar o requests (urllib3,
+        # ssl, http.client) é a parte mais cara da partida do executável
+        self._owns_session = session is None
+        self._session = session
+        self.pool_size = pool_size
+        if session is not None:
+            session.headers.update({'Content-Type': 'application/json'})
+
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._half_open = False
+        self._latencies = deque(maxlen=512)
+        self.counters = {
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'circuit_rejections': 0,
+            'bytes_raw': 0,
+            'bytes_sent': 0,
+            'bytes_received': 0,
+            'encode_seconds': 0.0,  # CPU gasta serializando e comprimindo
+            'wire_resyncs': 0,
+        }
+        self.endpoints = {}  # "MÉTODO /rota" -> requisições e bytes
+        # Chamado a cada requisição: on_request(endpoint, latência, status ou None se erro de conexão)
+        self.on_request = None
+        self.metrics = None  # AgentMetrics: histogramas das etapas serialize e send
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Content-Type': 'application/json'})
+            self._session = session
+        return self._session
+
+    # ------------------------------------------------------------------
+    # Circuit breaker
+    # ------------------------------------------------------------------
+    @property
+    def circuit_open(self):
+        return time.monotonic() < self._open_until
+
+    def retry_in(self):
+        """Segundos até o circuito aceitar uma nova tentativa (0 se fechado)"""
+        return max(0.0, self._open_until - time.monotonic())
+
+    def _before_request(self):
+        with self._lock:
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                self.counters['circuit_rejections'] += 1
+                raise CircuitOpenError(remaining)
+            if self._open_until:
+                # Período de espera terminou: esta requisição é o teste (half-open)
+                self._half_open = True
+
+    def _record_success(self):
+        with self._lock:
+            if self._half_open or self._open_until:
+                logging.info("Circuito fechado: API respondendo novamente")
+            self._consecutive_failures = 0
+            self._open_until = 0.0
+            self._half_open = False
+
+    def _record_failure(self):
+        with self._lock:
+            self.counters['failures'] += 1
+            self._consecutive_failures += 1
+            if self._half_open or self._consecutive_failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.reset_timeout * random.uniform(0.8, 1.2)
+                self._half_open = False
+                logging.error(
+                    f"Circuito aberto após {self._consecutive_failures} falhas seguidas; "
+                    f"envios suspensos por ~{self.reset_timeout:.0f}s"
+                )
+
+    # ------------------------------------------------------------------
+    # Envio
+    # ------------------------------------------------------------------
+    def encode(self, payload):
+        """Serializa o payload e comprime se valer a pena. Retorna (corpo, headers, tamanho sem gzip)"""
+        started = time.thread_time()
+        headers = {}
+        if self._wire is not None:
+            body = self._wire.encode(payload)
+            headers['Content-Type'] = wire.CONTENT_TYPE
+        else:
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        raw_size = len(body)
+        if raw_size >= self.compress_min_bytes:
+            body = gzip.compress(body, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+        elapsed = time.thread_time() - started
+        with self._lock:
+            self.counters['encode_seconds'] += elapsed
+        if self.metrics:
+            self.metrics.observe('serialize', elapsed)
+        return body, headers, raw_size
+
+    @property
+    def wire_enabled(self):
+        return self._wire is not None
+
+    def _negotiate(self, response):
+        """Passa a usar o formato binário quando o servidor o anuncia"""
+        if self._wire is not None or self.wire_format != 'msgpack' or not wire.available():
+            return
+        if wire.CONTENT_TYPE in (response.headers.get('Accept-Post') or ''):
+            self._wire = wire.WireEncoder()
+            logging.info("Servidor aceita MessagePack: envios passam a usar o formato binário")
+
+    def _check_wire_response(self, response, headers, resynced):
+        """Trata a resposta a um corpo binário. Retorna True se o corpo deve ser refeito e reenviado"""
+        if headers.get('Content-Type') != wire.CONTENT_TYPE or self._wire is None:
+            return False
+        status = response.status_code
+        if status == 415:
+            logging.error("Servidor recusou MessagePack (415): voltando para JSON")
+            self._wire = None
+            return True
+        if status == 409 and not resynced:
+            try:
+                resync = bool(response.json().get('resync_strings'))
+            except ValueError:
+                resync = False
+            if resync:
+                # Servidor sem o dicionário da sessão: recomeça do zero
+                with self._lock:
+                    self.counters['wire_resyncs'] += 1
+                self._wire.reset()
+                return True
+        if 200 <= status < 300:
+            self._wire.commit()
+        else:
+            self._wire.rollback()
+        return False
+
+    def backoff_delay(self, attempt):
+        """Full jitter: uniform(0, min(backoff_max, base * 2^attempt))"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, path, payload):
+        return self.request('POST', path, payload)
+
+    def request(self, method, path, payload=None):
+        """Envia a requisição com retentativas.
+
+        Retorna a última ``Response`` (que pode ter status de erro) ou lança
+        ``CircuitOpenError`` / ``requests.exceptions.RequestException``.
+        """
+        self._before_request()
+
+        body, headers, raw_size = (None, {}, 0) if payload is None else self.encode(payload)
+        url = f"{self.api_url}{path}"
+        session = self.session
+        from requests.exceptions import RequestException
+
+        attempt = 0
+        resynced = False
+        while True:
+            started = time.monotonic()
+            try:
+                response = session.request(method, url, data=body, headers=headers, timeout=self.timeout)
+                error = None
+            except RequestException as e:
+                response, error = None, e
+            self._record_request(f"{method} {path.split('?')[0]}", started, raw_size, len(body or b''), response)
+
+            if response is not None:
+                if payload is not None and self._check_wire_response(response, headers, resynced):
+                    resynced = True
+                    body, headers, raw_size = self.encode(payload)
+                    continue
+                self._negotiate(response)
+            elif self._wire is not None and headers.get('Content-Type') == wire.CONTENT_TYPE:
+                self._wire.rollback()
+
+            retryable = error is not None or response.status_code in self.RETRY_STATUS
+            if not retryable:
+                self._record_success()
+                return response
+
+            if attempt >= self.max_retries:
+                self._record_failure()
+                if error is not None:
+                    raise error
+                return response
+
+            attempt += 1
+            with self._lock:
+                self.counters['retries'] += 1
+            time.sleep(self._retry_delay(attempt - 1, response))
+            if self._wire is not None and payload is not None:
+                # As strings pendentes foram descartadas: refaz o corpo binário
+                body, headers, raw_size = self.encode(payload)
+
+    def _retry_delay(self, attempt, response):
+        # Retry-After do servidor tem prioridade sobre o backoff calculado
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return min(self.backoff_max, float(retry_after))
+                except ValueError:
+                    pass
+        return self.backoff_delay(attempt)
+
+    def _record_request(self, endpoint, started, raw_size, sent_size, response):
+        latency = time.monotonic() - started
+        received = len(response.content or b'') if response is not None else 0
+        error = response is None or response.status_code >= 400
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['bytes_raw'] += raw_size
+            self.counters['bytes_sent'] += sent_size
+            self.counters['bytes_received'] += received
+            self._latencies.append(latency)
+            counters = self.endpoints.setdefault(
+                endpoint, {'requests': 0, 'errors': 0, 'bytes_sent': 0, 'bytes_received': 0}
+            )
+            counters['requests'] += 1
+            counters['errors'] += error
+            counters['bytes_sent'] += sent_size
+            counters['bytes_received'] += received
+        if self.metrics:
+            self.metrics.observe('send', latency)
+            if not error:
+                self.metrics.startup.mark('first_send')
+        if self.on_request:
+            self.on_request(endpoint, latency, response.status_code if response is not None else None)
+
+    def stats(self):
+        """Cópia dos contadores, com latências (segundos) das últimas requisições"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['endpoints'] = {endpoint: dict(counters) for endpoint, counters in self.endpoints.items()}
+            latencies = sorted(self._latencies)
+            stats['circuit_open'] = self.circuit_open
+        if latencies:
+            stats['latency_avg'] = sum(latencies) / len(latencies)
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['latency_max'] = latencies[-1]
+        return stats
+
+    def close(self):
+        if self._owns_session and self._session is not None:
+            self._session.close()
@@ -0,0 +1,516 @@
+"""
+Batch Uploader - Agrupa eventos do agent e envia em lote para a API
+"""
+import itertools
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from urllib.parse import quote
+
+from hints import RateHints
+from transport import CircuitOpenError
+
+# Tipos de evento aceitos pelo endpoint /api/batch (mesmos payloads das rotas individuais)
+EVENT_TYPES = (
+    'window_activity',         # POST /api/window-activity
+    'window_activity_update',  # PUT  /api/window-activity/{id}
+    'mouse_activity',          # POST /api/mouse-activity
+    'windows_snapshot',        # POST /api/windows-snapshot
+    'activity_period',         # POST /api/activity-periods
+    'daily_rollup',            # POST /api/daily-rollup
+    'agent_health',            # POST /api/agent-health
+)
+
+# Eventos que são substituídos pelo próximo do mesmo tipo (podem ser descartados primeiro)
+SUPERSEDED_TYPES = ('mouse_activity', 'agent_health')
+# Snapshots só são substituídos por um completo (os deltas dependem dos anteriores)
+SNAPSHOT_TYPE = 'windows_snapshot'
+
+# Políticas de estouro da fila
+OVERFLOW_POLICIES = (
+    'drop_oldest',      # descarta o evento mais antigo
+    'drop_newest',      # descarta o evento que está chegando
+    'drop_superseded',  # descarta primeiro mouse/snapshot substituídos, depois o mais antigo
+)
+
+
+class EventQueue:
+    """Fila limitada e thread-safe entre a coleta e o envio.
+
+    ``put`` nunca bloqueia: quando a fila está cheia, a política de estouro
+    decide qual evento é descartado. Assim a coleta mantém sua cadência
+    independente da rede.
+    """
+
+    def __init__(self, maxsize=5000, overflow_policy='drop_superseded', clock=time.monotonic):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de estouro desconhecida: {overflow_policy}")
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.clock = clock
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, event):
+        """Adiciona um evento; retorna False se o próprio evento foi descartado"""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                if self.overflow_policy == 'drop_newest':
+                    return False
+                if self.overflow_policy == 'drop_superseded':
+                    self._drop_superseded()
+                else:
+                    self._items.popleft()
+            self._items.append(event)
+            self._cond.notify()
+            return True
+
+    def _drop_superseded(self):
+        last_full = self._last_full_snapshot()
+        for index, queued in enumerate(self._items):
+            if queued['type'] in SUPERSEDED_TYPES or (queued['type'] == SNAPSHOT_TYPE and index < last_full):
+                del self._items[index]
+                return
+        self._items.popleft()
+
+    def _last_full_snapshot(self):
+        """Posição do snapshot completo mais recente na fila (-1 se não há)"""
+        for index, queued in zip(range(len(self._items) - 1, -1, -1), reversed(self._items)):
+            if queued['type'] == SNAPSHOT_TYPE and queued['data'].get('mode', 'full') == 'full':
+                return index
+        return -1
+
+    def oldest_age(self):
+        """Segundos desde que o evento mais antigo entrou na fila (None se vazia)"""
+        with self._cond:
+            if not self._items:
+                return None
+            return self.clock() - self._items[0]['enqueued_at']
+
+    def take(self, max_items):
+        """Remove e retorna até max_items eventos, na ordem de chegada"""
+        with self._cond:
+            count = min(max_items, len(self._items))
+            return [self._items.popleft() for _ in range(count)]
+
+    def wait(self, timeout):
+        """Aguarda até chegar um novo evento (ou timeout)"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait_for(lambda: self._items, timeout)
+            else:
+                self._cond.wait(timeout)
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+
+class BatchUploader:
+    """Fila de saída que envia os eventos em um único POST /api/batch.
+
+    O lote é enviado quando atinge ``max_batch_size`` eventos ou quando o
+    evento mais antigo está na fila há ``max_batch_age`` segundos. Cada evento
+    recebe um ID local (``event_id``) e a resposta do servidor traz um
+    resultado por evento, permitindo associar o ID gerado no banco ao evento
+    que o criou (ex.: ``current_activity_id`` dos checkpoints).
+
+    Com ``start()`` o envio roda em uma thread própria: ``enqueue`` apenas
+    coloca o evento na fila e retorna, e os callbacks ``on_ack`` são chamados
+    na thread de envio.
+
+    Com um ``spool``, lotes que falham por erro de conexão/servidor são
+    gravados em disco e reenviados em ordem quando a API volta. Enquanto o
+    spool não está vazio, os lotes novos também vão para o spool, mantendo a
+    ordem. O reenvio é limitado a ``replay_rate`` eventos/s e as novas
+    tentativas usam intervalo aleatório, para que agents reconectando ao
+    mesmo tempo não sobrecarreguem o servidor.
+
+    O servidor pode reduzir a taxa de envio (``hints``, ver hints.py): pausas
+    (``agent_config`` ou ``Retry-After`` em 429/503), lotes menores e lotes
+    mais espaçados. ``startup_delay`` adia o primeiro envio, e a consulta
+    periódica a ``/api/agent-config`` começa em um instante aleatório, para
+    que computadores ligados juntos não enviem juntos.
+    """
+
+    def __init__(self, transport, hostname=None, username=None, max_batch_size=50,
+                 max_batch_age=5.0, max_queue_size=5000, overflow_policy='drop_superseded',
+                 spool=None, replay_rate=20.0, retry_interval=30.0, clock=time.monotonic,
+                 debug_mode=False, hints=None, startup_delay=0.0, config_interval=900.0):
+        self.transport = transport
+        self.hostname = hostname
+        self.username = username
+        self.max_batch_size = max_batch_size
+        self.max_batch_age = max_batch_age
+        self.debug_mode = debug_mode
+        self.session_id = uuid.uuid4().hex[:8]
+        self.clock = clock
+        self.queue = EventQueue(max_queue_size, overflow_policy, clock)
+        self._seq = itertools.count(1)
+        self._thread = None
+        self._running = False
+        # Mapa event_id -> ID no banco dos inserts já confirmados (limitado)
+        self._acked_ids = OrderedDict()
+        self._max_acked_ids = 1000
+        # Spool em disco e controle do reenvio
+        self.spool = spool
+        self.replay_rate = replay_rate
+        self.retry_interval = retry_interval
+        self._callbacks = OrderedDict()  # on_ack dos eventos que foram para o spool
+        self._next_retry_at = 0.0
+        self._replay_tokens = float(max_batch_size)
+        self._tokens_updated_at = clock()
+        # Chamado a cada evento confirmado: on_delivered(evento, segundos desde o enqueue)
+        self.on_delivered = None
+        # Dicas de taxa do servidor e deslocamento aleatório dos envios
+        self.hints = hints or RateHints(clock)
+        self._send_after = clock() + startup_delay
+        self.config_interval = config_interval  # 0 desativa a consulta periódica
+        self._next_config_at = clock() + random.uniform(0, config_interval)
+
+    def enqueue(self, event_type, data, on_ack=None):
+        """Adiciona um evento à fila e retorna o event_id local"""
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Tipo de evento desconhecido: {event_type}")
+
+        event_id = f"{self.session_id}-{next(self._seq)}"
+        accepted = self.queue.put({
+            'id': event_id,
+            'type': event_type,
+            'data': data,
+            'on_ack': on_ack,
+            'timestamp': time.time(),
+            'enqueued_at': self.clock(),
+        })
+        if not accepted:
+            logging.error(f"Fila de envio cheia: evento {event_type} descartado")
+        return event_id
+
+    def resolve(self, event_id):
+        """Retorna o ID no banco de um insert já confirmado (ou None).
+
+        Procura nos confirmados recentes e, com spool, nos gravados em disco
+        (checkpoints do spool cujo insert foi confirmado antes de um reinício).
+        """
+        if event_id is None:
+            return None
+        record_id = self._acked_ids.get(event_id)
+        if record_id is None and self.spool is not None:
+            try:
+                record_id = self.spool.resolve(event_id)
+            except Exception as e:
+                logging.error(f"Erro ao consultar IDs confirmados no spool: {str(e)}")
+        return record_id
+
+    def pending_count(self):
+        return len(self.queue) + (len(self.spool) if self.spool else 0)
+
+    def batch_size(self):
+        """Eventos por lote: o do agent, ou o limite do servidor se for menor"""
+        limit = self.hints.max_batch_size
+        return min(self.max_batch_size, limit) if limit else self.max_batch_size
+
+    def batch_age(self):
+        return self.max_batch_age * self.hints.multiplier('batch')
+
+    def pause_remaining(self):
+        """Segundos até poder enviar (atraso inicial ou pausa pedida pelo servidor)"""
+        return max(self._send_after - self.clock(), self.hints.pause_remaining(), 0.0)
+
+    def is_due(self):
+        """Indica se o lote atual deve ser enviado (tamanho ou idade)"""
+        age = self.queue.oldest_age()
+        if age is None or self.pause_remaining() > 0:
+            return False
+        return len(self.queue) >= self.batch_size() or age >= self.batch_age()
+
+    def flush_if_due(self):
+        if self.is_due():
+            self.flush()
+
+    def flush(self):
+        """Envia todos os eventos pendentes, em lotes de até batch_size()"""
+        while True:
+            batch = self.queue.take(self.batch_size())
+            if not batch:
+                break
+            self._deliver(batch)
+
+    def _deliver(self, batch):
+        # Em pausa (só acontece no flush do encerramento): guarda para depois
+        if self.spool is not None and self.pause_remaining() > 0:
+            self._spool_batch(batch)
+            return
+        # Spool com eventos pendentes: entra na fila do disco para manter a ordem
+        if self.spool is not None and len(self.spool) > 0:
+            self._spool_batch(batch)
+            return
+        if not self._send_batch(batch) and self.spool is not None:
+            self._spool_batch(batch)
+            self._schedule_retry()
+
+    def _spool_batch(self, batch):
+        # Checkpoints cujo insert já foi confirmado vão para o disco com o ID resolvido
+        batch = [self._with_activity_id(event) for event in batch]
+        try:
+            self.spool.append(batch)
+        except Exception as e:
+            logging.error(f"Erro ao gravar lote no spool ({len(batch)} eventos): {str(e)}")
+            return
+        for event in batch:
+            if event.get('on_ack'):
+                self._callbacks[event['id']] = event['on_ack']
+        while len(self._callbacks) > self._max_acked_ids:
+            self._callbacks.popitem(last=False)
+
+    def _schedule_retry(self):
+        delay = self.retry_interval * random.uniform(0.5, 1.5)
+        # Circuito aberto: não adianta tentar antes de ele liberar o teste
+        delay = max(delay, self.transport.retry_in() + random.uniform(0, 5))
+        self._next_retry_at = self.clock() + delay
+
+    def replay(self):
+        """Reenvia eventos do spool respeitando o limite de taxa.
+
+        Retorna None se o spool ficou vazio ou, caso contrário, quantos
+        segundos aguardar até a próxima tentativa.
+        """
+        while self.spool is not None and len(self.spool) > 0:
+            now = self.clock()
+            wait = max(self._next_retry_at - now, self.pause_remaining())
+            if wait > 0:
+                return wait
+
+            batch_size = self.batch_size()
+            self._replay_tokens = min(
+                float(batch_size),
+                self._replay_tokens + (now - self._tokens_updated_at) * self.replay_rate
+            )
+            self._tokens_updated_at = now
+            wanted = min(batch_size, len(self.spool))
+            if self._replay_tokens < wanted:
+                return (wanted - self._replay_tokens) / self.replay_rate
+
+            batch = self.spool.peek(wanted)
+            if not batch:
+                break
+            if not self._send_batch(batch):
+                self._schedule_retry()
+                return self._next_retry_at - self.clock()
+
+            self.spool.remove(batch)
+            self._replay_tokens -= len(batch)
+            if self.debug_mode:
+                logging.info(f"Spool: {len(batch)} eventos reenviados ({len(self.spool)} restantes)")
+        return None
+
+    def start(self):
+        """Inicia a thread de envio"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='uploader', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=15):
+        """Para a thread de envio e tenta enviar o que restou na fila"""
+        if self._thread is None:
+            self.flush()
+            return
+        self._running = False
+        self.queue.wake()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while self._running:
+            try:
+                config_delay = self.fetch_config_if_due()
+                replay_delay = self.replay()
+                age = self.queue.oldest_age()
+                if age is not None and self.is_due():
+                    self.flush()
+                    continue
+                batch_age = self.batch_age()
+                timeout = batch_age if age is None else max(batch_age - age, self.pause_remaining())
+                if replay_delay is not None:
+                    timeout = min(timeout, replay_delay)
+                if config_delay is not None:
+                    timeout = min(timeout, config_delay)
+                self.queue.wait(timeout)
+            except Exception as e:
+                logging.error(f"Erro na thread de envio: {str(e)}")
+                time.sleep(1)
+        self.flush()
+
+    def config_due(self):
+        """Indica se a consulta a /api/agent-config já deve ser feita"""
+        return bool(self.config_interval) and self.clock() >= self._next_config_at
+
+    def fetch_config_if_due(self):
+        """Consulta /api/agent-config quando chega a hora.
+
+        Retorna os segundos até a próxima consulta (None se desativada).
+        """
+        if not self.config_interval:
+            return None
+        now = self.clock()
+        if now < self._next_config_at:
+            return self._next_config_at - now
+        interval = self.hints.config_interval or self.config_interval
+        self._next_config_at = now + interval * random.uniform(0.9, 1.1)
+        self.fetch_config()
+        return self._next_config_at - now
+
+    def fetch_config(self):
+        """Busca as dicas de taxa do servidor; retorna True se a resposta foi aplicada"""
+        from requests.exceptions import RequestException  # Só carrega no primeiro envio (ver Transport.session)
+
+        path = f"/api/agent-config?hostname={quote(self.hostname or '')}&username={quote(self.username or '')}"
+        try:
+            response = self.transport.request('GET', path)
+        except CircuitOpenError:
+            return False
+        except RequestException as e:
+            logging.error(f"Erro de conexão ao buscar configuração do agent: {str(e)}")
+            return False
+
+        self._check_retry_after(response)
+        if response.status_code != 200:
+            if self.debug_mode:
+                logging.info(f"Configuração do agent indisponível: Status {response.status_code}")
+            return False
+        try:
+            config = response.json().get('agent_config')
+        except (ValueError, AttributeError):
+            logging.error("Resposta inválida do endpoint de configuração do agent")
+            return False
+        self.hints.update(config or {})
+        return True
+
+    def _check_retry_after(self, response):
+        """429/503 com Retry-After: pausa os envios pelo tempo pedido"""
+        if response.status_code not in (429, 503):
+            return
+        try:
+            retry_after = float(response.headers.get('Retry-After') or 0)
+        except ValueError:
+            return
+        self.hints.pause(retry_after)
+
+    def _with_activity_id(self, event):
+        """Atualização de checkpoint cujo insert já foi confirmado: resolve o ID pelo ref"""
+        data = event['data']
+        if event['type'] != 'window_activity_update' or data.get('activity_id'):
+            return event
+        resolved = self.resolve(data.get('ref'))
+        if not resolved:
+            return event
+        return dict(event, data=dict(data, activity_id=resolved))
+
+    def _serialize_event(self, event):
+        data = dict(self._with_activity_id(event)['data'])
+        # hostname/username vão uma vez só no envelope do lote
+        if data.get('hostname') == self.hostname:
+            data.pop('hostname')
+        if data.get('username') == self.username:
+            data.pop('username')
+        return {'id': event['id'], 'type': event['type'], 'data': data}
+
+    def _send_batch(self, batch):
+        """Envia um lote. Retorna False apenas em falhas que valem nova tentativa."""
+        payload = {
+            'session_id': self.session_id,
+            'hostname': self.hostname,
+            'username': self.username,
+            'events': [self._serialize_event(event) for event in batch]
+        }
+
+        from requests.exceptions import RequestException  # Só carrega no primeiro envio (ver Transport.session)
+
+        try:
+            response = self.transport.post('/api/batch', payload)
+        except CircuitOpenError as e:
+            if self.debug_mode:
+                logging.info(f"Lote adiado ({len(batch)} eventos): {str(e)}")
+            return False
+        except RequestException as e:
+            logging.error(f"Erro de conexão ao enviar lote ({len(batch)} eventos): {str(e)}")
+            return False
+
+        if response.status_code not in [200, 201]:
+            logging.error(f"Erro ao enviar lote: Status {response.status_code}")
+            self._check_retry_after(response)
+            # 4xx (exceto timeout/limite de taxa) não se resolve com nova tentativa
+            return 400 <= response.status_code < 500 and response.status_code not in [408, 429]
+
+        try:
+            body = response.json()
+            results = body.get('results', [])
+        except ValueError:
+            logging.error("Resposta inválida do endpoint de lote")
+            return False
+
+        if 'agent_config' in body:
+            self.hints.update(body['agent_config'])
+
+        self._handle_results(batch, results)
+
+        if self.debug_mode:
+            logging.info(f"Lote enviado: {len(batch)} eventos")
+        return True
+
+    def _handle_results(self, batch, results):
+        by_id = {result.get('id'): result for result in results}
+        for event in batch:
+            result = by_id.get(event['id'])
+            if result is None:
+                logging.error(f"Evento {event['id']} ({event['type']}) sem confirmação no lote")
+                continue
+
+            if not result.get('success'):
+                logging.error(
+                    f"Erro ao gravar evento {event['type']}: "
+                    f"Status {result.get('status')} - {result.get('message', '')}"
+                )
+                continue
+
+            if self.on_delivered:
+                enqueued_at = event.get('enqueued_at')
+                self.on_delivered(event, None if enqueued_at is None else self.clock() - enqueued_at)
+
+            record_id = (result.get('data') or {}).get('id')
+            if record_id is not None:
+                if event['type'] == 'window_activity_update' and event['data'].get('ref'):
+                    # O servidor resolveu (ou recriou) o registro do insert original
+                    self._remember(event['data']['ref'], record_id)
+                else:
+                    self._remember(event['id'], record_id)
+
+            on_ack = event.get('on_ack') or self._callbacks.pop(event['id'], None)
+            if on_ack:
+                try:
+                    on_ack(event['id'], result)
+                except Exception as e:
+                    logging.error(f"Erro no callback do evento {event['id']}: {str(e)}")
+
+    def _remember(self, event_id, record_id):
+        self._acked_ids[event_id] = record_id
+        while len(self._acked_ids) > self._max_acked_ids:
+            self._acked_ids.popitem(last=False)
+        # Com eventos no spool, algum checkpoint gravado só com o ref pode
+        # depender deste ID depois de um reinício (ou de sair do mapa acima)
+        if self.spool is not None and len(self.spool) > 0:
+            try:
+                self.spool.remember(event_id, record_id)
+            except Exception as e:
+                logging.error(f"Erro ao gravar ID confirmado no spool: {str(e)}")
@@ -0,0 +1,170 @@
+"""
+Win32 Backend - Acesso às APIs do Windows (janelas, input e processos)
+"""
+import ctypes
+import logging
+import threading
+from ctypes import wintypes
+
+import win32gui
+import win32process
+
+from backends import EventSource, PlatformBackend
+from process_cache import ProcessCache
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_NAMECHANGE = 0x800C
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+WM_QUIT = 0x0012
+
+WINEVENTPROC = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                  wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+# Instâncias próprias: os argtypes abaixo não afetam o ctypes.windll usado no resto do agent
+_user32 = ctypes.WinDLL('user32', use_last_error=True)
+_user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WINEVENTPROC,
+                                    wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+_user32.SetWinEventHook.restype = wintypes.HANDLE
+_user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+_user32.GetMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT]
+_user32.GetMessageW.restype = wintypes.BOOL
+_user32.TranslateMessage.argtypes = [ctypes.POINTER(wintypes.MSG)]
+_user32.DispatchMessageW.argtypes = [ctypes.POINTER(wintypes.MSG)]
+_user32.PostThreadMessageW.argtypes = [wintypes.DWORD, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+_user32.GetForegroundWindow.restype = wintypes.HWND
+_kernel32 = ctypes.WinDLL('kernel32')
+_kernel32.GetTickCount.restype = wintypes.DWORD
+
+
+class LASTINPUTINFO(ctypes.Structure):
+    _fields_ = [
+        ('cbSize', ctypes.c_uint),
+        ('dwTime', ctypes.c_uint),
+    ]
+
+
+class Win32Backend(PlatformBackend):
+    """Backend real do Windows (pywin32 + GetLastInputInfo + psutil)"""
+
+    def __init__(self, process_cache=None):
+        self.process_cache = process_cache or ProcessCache()
+
+    def get_foreground_window(self):
+        return win32gui.GetForegroundWindow()
+
+    def get_window_title(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
+
+    def get_window_pid(self, hwnd):
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+        return pid
+
+    def enum_windows(self):
+        # Remove do cache os processos que terminaram desde a última enumeração
+        self.process_cache.prune()
+
+        def enum_windows_callback(hwnd, handles):
+            if win32gui.IsWindowVisible(hwnd):
+                handles.append(hwnd)
+
+        handles = []
+        win32gui.EnumWindows(enum_windows_callback, handles)
+        return handles
+
+    def get_idle_seconds(self):
+        last_input_info = LASTINPUTINFO()
+        last_input_info.cbSize = ctypes.sizeof(LASTINPUTINFO)
+        ctypes.windll.user32.GetLastInputInfo(ctypes.byref(last_input_info))
+
+        millis_since_boot = ctypes.windll.kernel32.GetTickCount()
+        millis_since_input = millis_since_boot - last_input_info.dwTime
+
+        return millis_since_input / 1000.0  # Converte para segundos
+
+    def get_process_name(self, pid, hwnd=None):
+        return self.process_cache.name(pid, hwnd)
+
+    def create_event_source(self, clock):
+        return Win32EventSource(clock)
+
+
+class Win32EventSource(EventSource):
+    """Notificações do Windows via ``SetWinEventHook`` (fora do processo, sem DLL injetada).
+
+    Uma thread própria registra os hooks de ``EVENT_SYSTEM_FOREGROUND`` e
+    ``EVENT_OBJECT_NAMECHANGE`` e roda o loop de mensagens por onde o Windows
+    entrega as notificações. O callback só filtra e enfileira: mudanças de
+    nome de controles e de janelas em segundo plano são descartadas ali.
+    O instante vem do ``dwmsEventTime`` da notificação (ms do GetTickCount).
+    """
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self._foreground = 0
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+        self._error = None
+        # Referência mantida: o Windows chama o callback até o unhook
+        self._callback = WINEVENTPROC(self._on_event)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='win-events', daemon=True)
+        self._thread.start()
+        if not self._ready.wait(5):
+            raise RuntimeError("Thread de notificações do Windows não iniciou")
+        if self._error:
+            raise RuntimeError(self._error)
+
+    def _run(self):
+        self._thread_id = _kernel32.GetCurrentThreadId()
+        hooks = []
+        for event in (EVENT_SYSTEM_FOREGROUND, EVENT_OBJECT_NAMECHANGE):
+            hook = _user32.SetWinEventHook(event, event, None, self._callback, 0, 0,
+                                           WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+            if not hook:
+                self._error = f"SetWinEventHook falhou (evento 0x{event:04X}, erro {ctypes.get_last_error()})"
+                break
+            hooks.append(hook)
+        if self._error is None:
+            self._foreground = _user32.GetForegroundWindow() or 0
+        self._ready.set()
+
+        try:
+            if self._error is None:
+                msg = wintypes.MSG()
+                while _user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+                    _user32.TranslateMessage(ctypes.byref(msg))
+                    _user32.DispatchMessageW(ctypes.byref(msg))
+        except Exception as e:
+            logging.error(f"Erro no loop de notificações do Windows: {str(e)}")
+        finally:
+            for hook in hooks:
+                _user32.UnhookWinEvent(hook)
+
+    def _on_event(self, hook, event, hwnd, id_object, id_child, thread, event_time):
+        # Só a própria janela (não os controles dentro dela)
+        if id_object != OBJID_WINDOW or id_child != CHILDID_SELF or not hwnd:
+            return
+        if event == EVENT_SYSTEM_FOREGROUND:
+            self._foreground = hwnd
+            kind = 'foreground'
+        elif hwnd == self._foreground:
+            kind = 'title'
+        else:
+            return
+        # Idade da notificação (o contador de 32 bits dá a volta a cada ~49 dias)
+        age = ((_kernel32.GetTickCount() - event_time) & 0xFFFFFFFF) / 1000.0
+        self.post(kind, hwnd, self.clock.monotonic() - min(age, 60.0))
+
+    def stop(self):
+        if self._thread is not None:
+            if self._thread_id:
+                _user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+            self._thread.join(2)
+            self._thread = None
+        super().stop()
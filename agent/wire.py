@@ -0,0 +1,111 @@
+"""
+Wire - Formato binário compacto (MessagePack) com dicionário de strings por sessão
+
+Os lotes em JSON repetem hostname, username, executáveis e títulos de
+janela em todo envio (e os snapshots repetem o mesmo executável dezenas de
+vezes). No formato ``application/x-pcmon-msgpack`` cada uma dessas strings
+vai uma única vez por sessão; depois disso é referenciada por um índice.
+
+Corpo da requisição: dois objetos MessagePack seguidos.
+
+1. Cabeçalho ``{"s": sessão, "b": base, "d": [strings novas]}``: as strings
+   novas recebem os índices ``base``, ``base + 1``, ...
+2. O payload, igual ao JSON, mas com as strings dos campos de
+   ``INTERNED_KEYS`` trocadas por ``ExtType(1, índice big-endian)``.
+
+Negociação: o servidor que entende o formato anuncia o tipo no header
+``Accept-Post`` das respostas; só então o agent passa a usá-lo. Respostas:
+
+- ``409`` com ``resync_strings``: o servidor não tem o dicionário da sessão
+  (reiniciou ou perdeu um envio). O agent começa uma sessão nova e reenvia.
+- ``415``: o servidor deixou de aceitar o formato. O agent volta ao JSON.
+
+As strings novas só passam a valer como conhecidas pelo servidor depois de
+uma resposta 2xx; se o envio falhar, elas vão de novo no próximo.
+O decoder de referência (usado pelo stand-in) está em server/wire_decoder.py.
+"""
+import uuid
+
+try:
+    import msgpack
+except ImportError:  # Dependência opcional: sem ela o agent usa só JSON
+    msgpack = None
+
+CONTENT_TYPE = 'application/x-pcmon-msgpack'
+STRING_REF = 1  # Código do ExtType de referência ao dicionário
+
+# Campos cujos valores se repetem entre eventos (os demais vão literais)
+INTERNED_KEYS = frozenset([
+    'hostname', 'username', 'executable', 'window_title', 'type',
+    'mode', 'state', 'period_type',
+])
+MIN_INTERNED_LENGTH = 3  # Strings curtas custam menos que a referência
+MAX_STRINGS = 20000  # Limite do dicionário por sessão (depois disso, novas strings vão literais)
+
+
+def available():
+    return msgpack is not None
+
+
+def _ref(index):
+    length = 1 if index < 0x100 else 2 if index < 0x10000 else 4
+    return msgpack.ExtType(STRING_REF, index.to_bytes(length, 'big'))
+
+
+class WireEncoder:
+    """Codifica payloads com dicionário de strings de uma sessão"""
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("msgpack não está instalado")
+        self.reset()
+
+    def reset(self):
+        """Nova sessão: o servidor recebe o dicionário do zero"""
+        self.session = uuid.uuid4().hex[:12]
+        self.strings = {}  # Confirmadas pelo servidor
+        self._pending = {}  # Enviadas na requisição em andamento
+        self._pending_list = []
+
+    def _intern(self, text):
+        index = self.strings.get(text)
+        if index is None:
+            index = self._pending.get(text)
+        if index is None:
+            if len(self.strings) + len(self._pending) >= MAX_STRINGS:
+                return text
+            index = len(self.strings) + len(self._pending)
+            self._pending[text] = index
+            self._pending_list.append(text)
+        return _ref(index)
+
+    def _convert(self, value, key=None):
+        if isinstance(value, dict):
+            return {k: self._convert(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._convert(item, key) for item in value]
+        if key in INTERNED_KEYS and isinstance(value, str) and len(value) >= MIN_INTERNED_LENGTH:
+            return self._intern(value)
+        return value
+
+    def encode(self, payload):
+        """Serializa ``payload``; as strings novas ficam pendentes até ``commit()``"""
+        self._pending = {}
+        self._pending_list = []
+        body = msgpack.packb(self._convert(payload), use_bin_type=True)
+        header = msgpack.packb({
+            's': self.session,
+            'b': len(self.strings),
+            'd': self._pending_list,
+        }, use_bin_type=True)
+        return header + body
+
+    def commit(self):
+        """O servidor aceitou a requisição: as strings pendentes passam a ser conhecidas"""
+        self.strings.update(self._pending)
+        self._pending = {}
+        self._pending_list = []
+
+    def rollback(self):
+        self._pending = {}
+        self._pending_list = []
@@ -97,3 +97,20 @@ function validateRequired($data, $requiredFields) {
     }
     return $missing;
 }
+
+// Reserva $count IDs de $table em id_ranges (compartilhada com o collector);
+// retorna o primeiro, ou null sem a tabela/linha (usa o AUTO_INCREMENT)
+function reserveIds($db, $table, $count = 1) {
+    try {
+        $stmt = $db->prepare("UPDATE id_ranges 
+                              SET next_id = LAST_INSERT_ID(next_id + :count) 
+                              WHERE table_name = :table_name");
+        $stmt->execute([':count' => $count, ':table_name' => $table]);
+    } catch (PDOException $e) {
+        return null;
+    }
+    if ($stmt->rowCount() === 0) {
+        return null;
+    }
+    return (int)$db->lastInsertId() - $count;
+}
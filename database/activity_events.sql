@@ -0,0 +1,5 @@
+-- Migração de activity_events: segmentos de atividade com estado do usuário
+-- O agent divide cada atividade de janela nas transições ativo/inativo e envia
+-- o estado de cada segmento; NULL = registro de agent antigo (estado desconhecido)
+ALTER TABLE activity_events ADD COLUMN IF NOT EXISTS state ENUM('active', 'inactive') NULL AFTER duration_seconds;
+ALTER TABLE activity_events ADD INDEX IF NOT EXISTS idx_username_state_start (username, state, start_time);
@@ -32,3 +32,96 @@ CREATE TABLE IF NOT EXISTS daily_activity_summary (
     INDEX idx_date (date),
     INDEX idx_hostname_username (hostname, username)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tabela para sumário diário por aplicativo (rollups enviados pelo agent)
+CREATE TABLE IF NOT EXISTS daily_app_summary (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    hostname VARCHAR(255) NOT NULL,
+    username VARCHAR(255) NOT NULL,
+    date DATE NOT NULL,
+    executable VARCHAR(255) NOT NULL,
+    active_seconds INT DEFAULT 0,
+    inactive_seconds INT DEFAULT 0,
+    activations INT DEFAULT 0,
+    events INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_daily_app (hostname, username, date, executable),
+    INDEX idx_date_executable (date, executable)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Migração: registros por aplicativo/dia (activity_events), o COUNT(*) dos relatórios
+ALTER TABLE daily_app_summary ADD COLUMN IF NOT EXISTS events INT DEFAULT 0 AFTER activations;
+
+-- Migração: preencher daily_app_summary com o histórico de activity_events
+-- (tudo como tempo ativo; os agents atualizados passam a separar ativo/inativo)
+INSERT INTO daily_app_summary (hostname, username, date, executable, active_seconds, activations, events)
+SELECT hostname, username, DATE(start_time), executable,
+       CAST(SUM(duration_seconds) AS UNSIGNED), COUNT(*), COUNT(*)
+FROM activity_events
+WHERE duration_seconds IS NOT NULL
+GROUP BY hostname, username, DATE(start_time), executable
+ON DUPLICATE KEY UPDATE
+    active_seconds = GREATEST(active_seconds, VALUES(active_seconds)),
+    activations = GREATEST(activations, VALUES(activations)),
+    events = GREATEST(events, VALUES(events));
+
+-- Migração: preencher daily_activity_summary com o histórico (antes só o
+-- tempo inativo era gravado, somado a cada checkpoint). Tempo ativo e
+-- primeira/última atividade vêm de activity_events (tudo como ativo, como
+-- em daily_app_summary).
+INSERT INTO daily_activity_summary (hostname, username, date, total_active_seconds, first_activity, last_activity)
+SELECT hostname, username, DATE(start_time),
+       CAST(SUM(duration_seconds) AS UNSIGNED),
+       MIN(start_time), MAX(COALESCE(end_time, start_time))
+FROM activity_events
+WHERE duration_seconds IS NOT NULL
+GROUP BY hostname, username, DATE(start_time)
+ON DUPLICATE KEY UPDATE
+    total_active_seconds = GREATEST(total_active_seconds, VALUES(total_active_seconds)),
+    first_activity = LEAST(COALESCE(first_activity, VALUES(first_activity)), VALUES(first_activity)),
+    last_activity = GREATEST(COALESCE(last_activity, VALUES(last_activity)), VALUES(last_activity));
+
+-- Tempo inativo recalculado a partir dos períodos (o valor antigo estava inflado)
+INSERT INTO daily_activity_summary (hostname, username, date, total_inactive_seconds, first_activity, last_activity)
+SELECT hostname, username, DATE(start_time), CAST(SUM(duration_seconds) AS UNSIGNED),
+       MIN(start_time), MAX(COALESCE(end_time, start_time))
+FROM activity_periods
+WHERE period_type = 'inactive' AND duration_seconds IS NOT NULL
+GROUP BY hostname, username, DATE(start_time)
+ON DUPLICATE KEY UPDATE
+    total_inactive_seconds = VALUES(total_inactive_seconds),
+    first_activity = LEAST(COALESCE(first_activity, VALUES(first_activity)), VALUES(first_activity)),
+    last_activity = GREATEST(COALESCE(last_activity, VALUES(last_activity)), VALUES(last_activity));
+
+-- Rollups por instância do agent (instance_id criado junto com os totais do
+-- dia no agent; executable '' = totais do dia). Dentro da instância os
+-- valores são absolutos e mesclados com GREATEST; daily_activity_summary e
+-- daily_app_summary guardam a soma das instâncias do dia. Assim um agent que
+-- perdeu o rollup.json recomeça com outra instância, somada à anterior.
+CREATE TABLE IF NOT EXISTS daily_rollup_instances (
+    hostname VARCHAR(255) NOT NULL,
+    username VARCHAR(255) NOT NULL,
+    date DATE NOT NULL,
+    instance_id VARCHAR(64) NOT NULL DEFAULT '',
+    executable VARCHAR(255) NOT NULL DEFAULT '',
+    active_seconds INT DEFAULT 0,
+    inactive_seconds INT DEFAULT 0,
+    activations INT DEFAULT 0,
+    events INT DEFAULT 0,
+    first_activity TIMESTAMP NULL,
+    last_activity TIMESTAMP NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (hostname, username, date, instance_id, executable)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Migração: os totais já gravados (histórico e rollups sem instance_id) viram a instância ''
+INSERT IGNORE INTO daily_rollup_instances
+    (hostname, username, date, instance_id, executable, active_seconds, inactive_seconds, first_activity, last_activity)
+SELECT hostname, username, date, '', '', total_active_seconds, total_inactive_seconds, first_activity, last_activity
+FROM daily_activity_summary;
+
+INSERT IGNORE INTO daily_rollup_instances
+    (hostname, username, date, instance_id, executable, active_seconds, inactive_seconds, activations, events)
+SELECT hostname, username, date, '', executable, active_seconds, inactive_seconds, activations, events
+FROM daily_app_summary;
@@ -0,0 +1,24 @@
+-- Saúde de cada agent (heartbeat): última amostra das métricas do próprio agent
+CREATE TABLE IF NOT EXISTS `agent_health` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `hostname` VARCHAR(255) NOT NULL,
+  `username` VARCHAR(255) NOT NULL,
+  `reported_at` DATETIME NOT NULL,
+  `uptime_seconds` INT NULL,
+  `rss_mb` DECIMAL(8,1) NULL,
+  `cpu_percent` DECIMAL(6,2) NULL,
+  `loop_lag_p95_ms` DECIMAL(10,1) NULL,
+  `loop_lag_max_ms` DECIMAL(10,1) NULL,
+  `enumerate_p95_ms` DECIMAL(10,1) NULL,
+  `send_p95_ms` DECIMAL(10,1) NULL,
+  `requests` INT NULL,
+  `failures` INT NULL,
+  `queue_pending` INT NULL,
+  -- Histogramas por etapa, contadores por rota e fila (detalhe do heartbeat)
+  `metrics_json` JSON NULL,
+  `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `unique_computer` (`hostname`, `username`),
+  INDEX `idx_reported_at` (`reported_at`),
+  INDEX `idx_loop_lag` (`loop_lag_p95_ms`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
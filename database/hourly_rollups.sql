@@ -0,0 +1,43 @@
+-- Rollups por hora dos dados brutos antigos (server/retention.py)
+-- activity_events e activity_periods com mais de N dias são somados aqui e
+-- apagados em lotes pequenos; relatórios de longo prazo leem estas tabelas.
+
+-- Tempo por computador/usuário/aplicativo em cada hora
+CREATE TABLE IF NOT EXISTS hourly_app_summary (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    hostname VARCHAR(255) NOT NULL,
+    username VARCHAR(255) NOT NULL,
+    hour DATETIME NOT NULL,
+    executable VARCHAR(255) NOT NULL,
+    active_seconds INT DEFAULT 0,
+    inactive_seconds INT DEFAULT 0,
+    activations INT DEFAULT 0,
+    UNIQUE KEY unique_hourly_app (hostname, username, hour, executable),
+    INDEX idx_hour_executable (hour, executable),
+    INDEX idx_username_hour (username, hour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Tempo ativo/inativo (activity_periods) por computador/usuário em cada hora
+CREATE TABLE IF NOT EXISTS hourly_activity_summary (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    hostname VARCHAR(255) NOT NULL,
+    username VARCHAR(255) NOT NULL,
+    hour DATETIME NOT NULL,
+    active_seconds INT DEFAULT 0,
+    inactive_seconds INT DEFAULT 0,
+    UNIQUE KEY unique_hourly_activity (hostname, username, hour),
+    INDEX idx_hour (hour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Progresso do job de retenção (retomado de onde parou se for interrompido)
+CREATE TABLE IF NOT EXISTS retention_progress (
+    task VARCHAR(64) PRIMARY KEY,
+    status ENUM('running', 'done') NOT NULL,
+    cutoff DATETIME NOT NULL,
+    max_id BIGINT NULL,
+    last_id BIGINT DEFAULT 0,
+    rows_compacted BIGINT DEFAULT 0,
+    rows_deleted BIGINT DEFAULT 0,
+    started_at DATETIME NULL,
+    updated_at DATETIME NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
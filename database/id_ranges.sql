@@ -0,0 +1,14 @@
+-- Próximo ID livre de activity_events e activity_periods (server/collector.py)
+-- Cada instância do collector reserva blocos de IDs aqui (UPDATE atômico) e
+-- os endpoints PHP tiram seus IDs da mesma linha (reserveIds()), então vários
+-- collectors e o PHP podem gravar nas mesmas tabelas sem colisão.
+CREATE TABLE IF NOT EXISTS id_ranges (
+    table_name VARCHAR(64) PRIMARY KEY,
+    next_id BIGINT NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO id_ranges (table_name, next_id)
+SELECT 'activity_events', COALESCE(MAX(id), 0) + 1 FROM activity_events;
+
+INSERT IGNORE INTO id_ranges (table_name, next_id)
+SELECT 'activity_periods', COALESCE(MAX(id), 0) + 1 FROM activity_periods;
@@ -4,9 +4,19 @@ CREATE TABLE IF NOT EXISTS last_mouse_activity (
     hostname VARCHAR(255) NOT NULL,
     username VARCHAR(255) NOT NULL,
     last_activity TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- Presença por lease: ativo enquanto active_until > NOW() (renovado pelo agent)
+    presence_state ENUM('active', 'inactive') NULL,
+    active_until DATETIME NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     UNIQUE KEY unique_computer (hostname, username),
     INDEX idx_last_activity (last_activity),
-    INDEX idx_hostname_username (hostname, username)
+    INDEX idx_hostname_username (hostname, username),
+    INDEX idx_active_until (active_until)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Migração de instalações existentes: presença por transições + lease
+ALTER TABLE last_mouse_activity ADD COLUMN IF NOT EXISTS presence_state ENUM('active', 'inactive') NULL AFTER last_activity;
+ALTER TABLE last_mouse_activity ADD COLUMN IF NOT EXISTS active_until DATETIME NULL AFTER presence_state;
+ALTER TABLE last_mouse_activity ADD INDEX IF NOT EXISTS idx_active_until (active_until);
+UPDATE last_mouse_activity SET active_until = DATE_ADD(last_activity, INTERVAL 60 SECOND) WHERE active_until IS NULL;
@@ -5,6 +5,7 @@ CREATE TABLE IF NOT EXISTS `windows_snapshot` (
   `username` VARCHAR(255) NOT NULL,
   `timestamp` DATETIME NOT NULL,
   `windows_json` JSON NOT NULL,
+  `seq` INT NULL,
   `created_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   UNIQUE KEY `unique_computer` (`hostname`, `username`),
@@ -12,6 +13,9 @@ CREATE TABLE IF NOT EXISTS `windows_snapshot` (
   INDEX `idx_hostname_username` (`hostname`, `username`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Migração de instalações existentes: sequência do protocolo de snapshots delta
+ALTER TABLE `windows_snapshot` ADD COLUMN IF NOT EXISTS `seq` INT NULL AFTER `windows_json`;
+
 -- Limpar snapshots antigos (mais de 5 minutos) automaticamente
 -- Você pode rodar este comando periodicamente ou criar um evento
 -- DELETE FROM windows_snapshot WHERE timestamp < DATE_SUB(NOW(), INTERVAL 5 MINUTE);
@@ -0,0 +1,591 @@
+"""
+Analytics - Motor vetorizado de intervalos para os relatórios por usuário
+
+Faz o cálculo de ``src/endpoints/user-analytics.php`` (tempo válido de cada
+atividade dentro do horário filtrado, descontando o horário ignorado) sobre
+colunas NumPy, em uma passada para todos os usuários:
+
+- as atividades (``activity_events`` ativas ou sem estado) são cortadas nas
+  viradas de hora, para o mapa de calor dia da semana x hora ser exato;
+- o horário ignorado (ex.: almoço) e, com ``subtract_idle``, os períodos
+  ``inactive`` de ``activity_periods`` viram um único conjunto de intervalos
+  disjuntos por usuário;
+- a sobreposição de cada pedaço com esse conjunto sai de uma soma acumulada
+  + ``searchsorted`` (O(n log m)), sem comparar cada atividade com cada
+  intervalo;
+- totais por aplicativo, dia, dia da semana e hora saem de ``bincount``.
+
+O PHP é a referência: por padrão os resultados são os de
+``getUserStats()``/``getUserApplications()`` (conferido em
+``tests/test_analytics.py``), com os mesmos filtros aplicados ao dia em que a
+atividade começou. Os períodos de inatividade só são descontados com
+``subtract_idle`` (``--subtract-idle``), que o PHP não faz. Isso só muda o
+resultado nos registros antigos sem ``state``: as atividades atuais já vêm
+divididas pelo agent nas transições ativo/inativo, e as inativas ficam fora.
+O ``heatmap`` (tempo por hora em que aconteceu) não existe no PHP.
+
+Depois da retenção (``retention.py``), as atividades antigas só existem em
+``hourly_app_summary``. Cada linha dela entra como um intervalo
+``[hora, hora + active_seconds)`` que vale ``activations`` atividades (como no
+PHP), somado às linhas brutas. A união não filtra pelo corte de
+``retention_progress``: cada lote da retenção soma no rollup e apaga as linhas
+na mesma transação, então uma atividade está em só um dos dois lados, mesmo
+no meio de uma execução interrompida. A duração máxima (e mínima) por sessão
+vem só das linhas brutas.
+
+Os horários são os do banco (hora local, sem fuso), em segundos. Os dados vêm
+do SQLite (stand-in ou export do MySQL) ou de CSV com as colunas das tabelas.
+
+Uso:
+    python analytics.py --db stand_in.db                           # totais por usuário
+    python analytics.py --db stand_in.db --user joao.silva --business-hours
+    python analytics.py --events events.csv --periods periods.csv --user joao.silva --ignore 12:00-13:00 --json
+"""
+import argparse
+import csv
+import json
+import sqlite3
+
+import numpy as np
+
+HOUR = 3600
+DAY = 86400
+# Chave (usuário, instante) em um único int64: instantes ficam abaixo de 2^34 s (ano 2514)
+USER_SHIFT = 1 << 34
+USER_DAYS = USER_SHIFT // DAY  # Mesmo para chaves (usuário, dia)
+# Mesmos rótulos do PHP (DAYOFWEEK do MySQL: 1 = domingo)
+WEEKDAYS = ['Domingo', 'Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
+
+
+def parse_times(values):
+    """Textos 'AAAA-MM-DD HH:MM:SS' -> segundos (int64); vazios viram -1"""
+    times = np.array([value if value and value != 'NULL' else 'NaT' for value in values], dtype='datetime64[s]')
+    seconds = times.astype(np.int64)
+    seconds[np.isnat(times)] = -1
+    return seconds
+
+
+def format_time(seconds):
+    return str(np.datetime64(int(seconds), 's')).replace('T', ' ')
+
+
+def format_dates(days):
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype(str)
+
+
+def _seconds_of_day(text):
+    parts = [int(part) for part in text.split(':')]
+    hours, minutes, seconds = (parts + [0, 0])[:3]
+    return hours * HOUR + minutes * 60 + seconds
+
+
+def _encode(values, index):
+    """Textos -> códigos inteiros (índice compartilhado entre tabelas)"""
+    return np.fromiter((index.setdefault(value, len(index)) for value in values),
+                       dtype=np.int64, count=len(values))
+
+
+class Dataset:
+    """Atividades e períodos de inatividade em colunas NumPy.
+
+    Usuários e executáveis são códigos inteiros (``users[code]`` é o nome);
+    início e fim em segundos desde 1970, no horário local do banco.
+    ``event_count`` é quantas atividades cada linha vale (1 nas brutas,
+    ``activations`` nas de ``hourly_app_summary``, marcadas em ``event_hourly``).
+    """
+
+    def __init__(self, users, apps, event_user, event_app, event_start, event_end,
+                 idle_user=None, idle_start=None, idle_end=None, event_count=None, event_hourly=None):
+        self.users = list(users)
+        self.apps = list(apps)
+        self.event_user = np.asarray(event_user, dtype=np.int64)
+        self.event_app = np.asarray(event_app, dtype=np.int64)
+        self.event_start = np.asarray(event_start, dtype=np.int64)
+        # Fim antes do início (relógio ajustado no meio da atividade) conta como zero
+        self.event_end = np.maximum(np.asarray(event_end, dtype=np.int64), self.event_start)
+        self.event_count = (np.ones(len(self.event_start), dtype=np.int64) if event_count is None
+                            else np.asarray(event_count, dtype=np.int64))
+        self.event_hourly = (np.zeros(len(self.event_start), dtype=bool) if event_hourly is None
+                             else np.asarray(event_hourly, dtype=bool))
+        empty = np.empty(0, dtype=np.int64)
+        self.idle_user = empty if idle_user is None else np.asarray(idle_user, dtype=np.int64)
+        self.idle_start = empty if idle_start is None else np.asarray(idle_start, dtype=np.int64)
+        self.idle_end = empty if idle_end is None else np.asarray(idle_end, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.event_start)
+
+    @classmethod
+    def from_rows(cls, events, idle_periods=(), hourly=()):
+        """Monta a partir de linhas já filtradas.
+
+        ``events``: (username, executable, start_time, end_time, duration_seconds);
+        ``idle_periods``: (username, start_time, end_time, duration_seconds);
+        ``hourly``: (username, executable, hour, None, active_seconds, activations).
+        Horários em texto; sem end_time, o fim é início + duração (sem os dois,
+        a linha é ignorada).
+        """
+        users, apps = {}, {}
+        hourly = list(hourly)
+        events = [tuple(row[:5]) + (1,) for row in events] + [tuple(row) for row in hourly]
+        idle_periods = list(idle_periods)
+
+        def columns(rows, offset):
+            start = parse_times([row[offset] for row in rows])
+            end = parse_times([row[offset + 1] for row in rows])
+            duration = np.array([float(row[offset + 2]) if row[offset + 2] not in (None, '', 'NULL') else -1.0
+                                 for row in rows], dtype=np.float64).astype(np.int64)
+            open_ended = (end < 0) & (duration >= 0)
+            end[open_ended] = start[open_ended] + duration[open_ended]
+            keep = (start >= 0) & (end >= 0)
+            return start, end, keep
+
+        event_start, event_end, keep = columns(events, 2)
+        event_user = _encode([row[0] for row in events], users)
+        event_app = _encode([row[1] for row in events], apps)
+        event_count = np.array([int(row[5] or 0) for row in events], dtype=np.int64)
+        event_hourly = np.arange(len(events)) >= len(events) - len(hourly)
+        idle_start, idle_end, idle_keep = columns(idle_periods, 1)
+        idle_user = _encode([row[0] for row in idle_periods], users)
+
+        return cls(
+            sorted(users, key=users.get), sorted(apps, key=apps.get),
+            event_user[keep], event_app[keep], event_start[keep], event_end[keep],
+            idle_user[idle_keep], idle_start[idle_keep], idle_end[idle_keep],
+            event_count[keep], event_hourly[keep]
+        )
+
+
+def _date_filter(column, since=None, until=None, username=None):
+    filters, params = [], []
+    if since:
+        filters.append(f"{column} >= ?")
+        params.append(since)
+    if until:
+        filters.append(f"{column} < date(?, '+1 day')")
+        params.append(until)
+    if username:
+        filters.append("username = ?")
+        params.append(username)
+    return ''.join(f" AND {condition}" for condition in filters), params
+
+
+def load_sqlite(path, since=None, until=None, username=None):
+    """Lê activity_events / activity_periods (e hourly_app_summary) de um banco SQLite (stand-in ou export).
+
+    A conversão dos horários para segundos é feita pelo próprio SQLite.
+    ``since``/``until`` são datas (AAAA-MM-DD, inclusivas).
+    """
+    extra, params = _date_filter('start_time', since, until, username)
+    hourly_extra, hourly_params = _date_filter('hour', since, until, username)
+
+    seconds = "CAST(strftime('%s', {column}) AS INTEGER)"
+    end = (f"COALESCE({seconds.format(column='end_time')}, "
+           f"{seconds.format(column='start_time')} + CAST(duration_seconds AS INTEGER))")
+
+    conn = sqlite3.connect(path)
+    try:
+        events = conn.execute(
+            f"""SELECT username, executable, {seconds.format(column='start_time')}, {end}
+                FROM activity_events
+                WHERE (state IS NULL OR state = 'active') {extra}""",
+            params
+        ).fetchall()
+        periods = conn.execute(
+            f"""SELECT username, {seconds.format(column='start_time')}, {end}
+                FROM activity_periods
+                WHERE period_type = 'inactive' {extra}""",
+            params
+        ).fetchall()
+        hourly = []
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'hourly_app_summary'").fetchone():
+            hourly = conn.execute(
+                f"""SELECT username, executable, {seconds.format(column='hour')},
+                           {seconds.format(column='hour')} + active_seconds, activations
+                    FROM hourly_app_summary
+                    WHERE active_seconds > 0 {hourly_extra}""",
+                hourly_params
+            ).fetchall()
+    finally:
+        conn.close()
+
+    events = [row + (1,) for row in events if row[2] is not None and row[3] is not None]
+    raw_count = len(events)
+    events += [row for row in hourly if row[2] is not None]
+    periods = [row for row in periods if row[1] is not None and row[2] is not None]
+    users, apps = {}, {}
+    event_user = _encode([row[0] for row in events], users)
+    event_app = _encode([row[1] for row in events], apps)
+    idle_user = _encode([row[0] for row in periods], users)
+    return Dataset(
+        sorted(users, key=users.get), sorted(apps, key=apps.get),
+        event_user, event_app,
+        np.fromiter((row[2] for row in events), dtype=np.int64, count=len(events)),
+        np.fromiter((row[3] for row in events), dtype=np.int64, count=len(events)),
+        idle_user,
+        np.fromiter((row[1] for row in periods), dtype=np.int64, count=len(periods)),
+        np.fromiter((row[2] for row in periods), dtype=np.int64, count=len(periods)),
+        np.fromiter((row[4] for row in events), dtype=np.int64, count=len(events)),
+        np.arange(len(events)) >= raw_count
+    )
+
+
+def load_csv(events_path, periods_path=None, since=None, until=None, username=None, hourly_path=None):
+    """Lê exports CSV (com cabeçalho) de activity_events, activity_periods e hourly_app_summary"""
+    def rows(path, wanted, column='start_time'):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                if username and row['username'] != username:
+                    continue
+                start = row[column]
+                if (since and start < since) or (until and start[:10] > until):
+                    continue
+                if wanted(row):
+                    yield row
+
+    events = [
+        (row['username'], row['executable'], row['start_time'], row.get('end_time'), row.get('duration_seconds'))
+        for row in rows(events_path, lambda row: row.get('state') in (None, '', 'NULL', 'active'))
+    ]
+    periods = []
+    if periods_path:
+        periods = [
+            (row['username'], row['start_time'], row.get('end_time'), row.get('duration_seconds'))
+            for row in rows(periods_path, lambda row: row['period_type'] == 'inactive')
+        ]
+    hourly = []
+    if hourly_path:
+        hourly = [
+            (row['username'], row['executable'], row['hour'], None, row['active_seconds'], row['activations'])
+            for row in rows(hourly_path, lambda row: int(row['active_seconds'] or 0) > 0, 'hour')
+        ]
+    return Dataset.from_rows(events, periods, hourly)
+
+
+class Filters:
+    """Filtros de horário do relatório (mesmos parâmetros e regras do PHP)"""
+
+    def __init__(self, start_time=None, end_time=None, ignore_from=None, ignore_to=None, subtract_idle=False):
+        self.has_window = bool(start_time or end_time)
+        self.day_start = _seconds_of_day(start_time or '00:00:00')
+        self.day_end = _seconds_of_day(end_time or '23:59:59')
+        self.ignore = None
+        if ignore_from and ignore_to and _seconds_of_day(ignore_to) > _seconds_of_day(ignore_from):
+            self.ignore = (_seconds_of_day(ignore_from), _seconds_of_day(ignore_to))
+        self.subtract_idle = subtract_idle
+
+    @classmethod
+    def from_params(cls, params):
+        """Query string do PHP: businessHours, startTime, endTime, ignoreTimeFrom, ignoreTimeTo"""
+        business = params.get('businessHours') == 'true'
+        return cls(
+            start_time='08:00:00' if business else params.get('startTime'),
+            end_time='18:00:00' if business else params.get('endTime'),
+            ignore_from=params.get('ignoreTimeFrom'),
+            ignore_to=params.get('ignoreTimeTo')
+        )
+
+
+def split_by_hour(start, end):
+    """Corta cada [start, end) nas viradas de hora; retorna (inícios, fins, índice da atividade)"""
+    first = start // HOUR
+    pieces = np.maximum((end - 1) // HOUR - first + 1, 1)
+    parent = np.repeat(np.arange(len(start)), pieces)
+    offset = np.arange(len(parent)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    hour = first[parent] + offset
+    return np.maximum(start[parent], hour * HOUR), np.minimum(end[parent], (hour + 1) * HOUR), parent
+
+
+def merge_intervals(start, end):
+    """União de intervalos -> intervalos disjuntos, ordenados pelo início"""
+    if not len(start):
+        return start, end
+    order = np.argsort(start, kind='stable')
+    start, end = start[order], end[order]
+    reach = np.maximum.accumulate(end)
+    opens = np.empty(len(start), dtype=bool)
+    opens[0] = True
+    opens[1:] = start[1:] > reach[:-1]
+    firsts = np.flatnonzero(opens)
+    lasts = np.append(firsts[1:] - 1, len(start) - 1)
+    return start[firsts], reach[lasts]
+
+
+def overlap_seconds(start, end, merged_start, merged_end):
+    """Quanto de cada [start, end) cai dentro de um conjunto de intervalos disjuntos ordenados"""
+    if not len(merged_start):
+        return np.zeros(len(start), dtype=np.int64)
+    lengths = merged_end - merged_start
+    before = np.concatenate(([0], np.cumsum(lengths)[:-1]))  # Coberto antes do intervalo i
+
+    def covered(t):
+        # Medida do conjunto em (-inf, t]: intervalos anteriores + parte do atual
+        index = np.searchsorted(merged_start, t, side='right') - 1
+        safe = np.maximum(index, 0)
+        inside = np.clip(t - merged_start[safe], 0, lengths[safe])
+        return np.where(index >= 0, before[safe] + inside, 0)
+
+    return covered(end) - covered(start)
+
+
+class Analysis:
+    """Tempo válido de cada atividade e os agregados dos relatórios.
+
+    ``seconds[i]`` é o tempo válido da atividade ``i`` do dataset; os pedaços
+    por hora (``piece_*``) alimentam o mapa de calor e o total por hora.
+    """
+
+    def __init__(self, dataset, filters=None):
+        self.dataset = dataset
+        self.filters = filters = filters or Filters()
+        start, end = dataset.event_start, dataset.event_end
+
+        piece_start, piece_end, parent = split_by_hour(start, end)
+        user = dataset.event_user[parent]
+
+        # Horário do relatório: janela do dia em que a atividade começou (como no PHP)
+        if filters.has_window:
+            day = start[parent] // DAY * DAY
+            piece_start = np.maximum(piece_start, day + filters.day_start)
+            piece_end = np.maximum(np.minimum(piece_end, day + filters.day_end), piece_start)
+
+        # Horário ignorado do dia em que a atividade começou (como no PHP) + inatividade do usuário,
+        # sem duplicar sobreposições
+        excluded_start, excluded_end = [], []
+        if filters.ignore:
+            user_days = np.unique(user * USER_DAYS + start[parent] // DAY)
+            base = user_days // USER_DAYS * USER_SHIFT + user_days % USER_DAYS * DAY
+            excluded_start.append(base + filters.ignore[0])
+            excluded_end.append(base + filters.ignore[1])
+        if filters.subtract_idle and len(dataset.idle_start):
+            base = dataset.idle_user * USER_SHIFT
+            excluded_start.append(base + dataset.idle_start)
+            excluded_end.append(base + np.maximum(dataset.idle_end, dataset.idle_start))
+
+        valid = piece_end - piece_start
+        if excluded_start:
+            merged_start, merged_end = merge_intervals(np.concatenate(excluded_start), np.concatenate(excluded_end))
+            base = user * USER_SHIFT
+            valid = valid - overlap_seconds(base + piece_start, base + piece_end, merged_start, merged_end)
+
+        self.piece_start = piece_start
+        self.piece_seconds = valid
+        self.piece_user = user
+        self.seconds = np.bincount(parent, weights=valid, minlength=len(dataset)).astype(np.int64)
+
+    def _select(self, username=None):
+        """Índices das atividades com tempo válido (de um usuário ou de todos)"""
+        mask = self.seconds > 0
+        if username is not None:
+            if username not in self.dataset.users:
+                return np.empty(0, dtype=np.int64)
+            mask &= self.dataset.event_user == self.dataset.users.index(username)
+        return np.flatnonzero(mask)
+
+    def user_totals(self):
+        """Tempo válido e atividades de todos os usuários (maior tempo primeiro)"""
+        selected = self._select()
+        users = self.dataset.event_user[selected]
+        count = len(self.dataset.users)
+        seconds = np.bincount(users, weights=self.seconds[selected], minlength=count)
+        activities = np.bincount(users, weights=self.dataset.event_count[selected], minlength=count).astype(np.int64)
+        present = np.bincount(users, minlength=count)
+        apps = np.bincount(np.unique(users * len(self.dataset.apps) + self.dataset.event_app[selected])
+                           // max(len(self.dataset.apps), 1), minlength=count)
+        days = np.unique(users * USER_DAYS + self.dataset.event_start[selected] // DAY)
+        active_days = np.bincount(days // USER_DAYS, minlength=count)
+        totals = [{
+            'username': self.dataset.users[code],
+            'total_activities': int(activities[code]),
+            'total_time_seconds': int(seconds[code]),
+            'total_hours': round(seconds[code] / 3600, 2),
+            'unique_apps': int(apps[code]),
+            'active_days': int(active_days[code]),
+        } for code in np.flatnonzero(present)]
+        totals.sort(key=lambda row: row['total_time_seconds'], reverse=True)
+        return totals
+
+    def heatmap(self, username=None):
+        """Segundos válidos por dia da semana (linha 0 = domingo) x hora do dia"""
+        mask = self.piece_seconds > 0
+        if username is not None:
+            code = self.dataset.users.index(username) if username in self.dataset.users else -1
+            mask &= self.piece_user == code
+        hours = self.piece_start[mask] // HOUR
+        cells = ((hours // 24 + 4) % 7) * 24 + hours % 24  # 01/01/1970 foi quinta-feira
+        return np.bincount(cells, weights=self.piece_seconds[mask], minlength=7 * 24).reshape(7, 24).astype(np.int64)
+
+    def user_applications(self, username):
+        """Aplicativos do usuário, no formato de GET /api/user-analytics/{user}/applications"""
+        selected = self._select(username)
+        apps = self.dataset.event_app[selected]
+        seconds = self.seconds[selected]
+        start = self.dataset.event_start[selected]
+        end = self.dataset.event_end[selected]
+        raw = ~self.dataset.event_hourly[selected]
+        count = len(self.dataset.apps)
+
+        total = np.bincount(apps, weights=seconds, minlength=count)
+        accesses = np.bincount(apps, weights=self.dataset.event_count[selected], minlength=count).astype(np.int64)
+        present = np.bincount(apps, minlength=count)
+        # Mínimo e máximo por sessão: só as linhas brutas (o rollup por hora não guarda as sessões)
+        minimum = np.full(count, np.iinfo(np.int64).max)
+        maximum = np.zeros(count, dtype=np.int64)
+        np.minimum.at(minimum, apps[raw], seconds[raw])
+        np.maximum.at(maximum, apps[raw], seconds[raw])
+        minimum[minimum == np.iinfo(np.int64).max] = 0
+        first_use = np.full(count, np.iinfo(np.int64).max)
+        np.minimum.at(first_use, apps, start)
+        # Último uso: fim da atividade que começou por último (como no PHP)
+        order = np.lexsort((start, apps))
+        last_index = order[np.append(np.flatnonzero(np.diff(apps[order])), len(order) - 1)] if len(order) else order
+        last_use = np.zeros(count, dtype=np.int64)
+        last_use[apps[last_index]] = end[last_index]
+        days = np.unique(apps * USER_DAYS + start // DAY)
+        active_days = np.bincount(days // USER_DAYS, minlength=count)
+
+        applications = [{
+            'executable': self.dataset.apps[app],
+            'access_count': int(accesses[app]),
+            'total_seconds': int(total[app]),
+            'avg_seconds': total[app] / accesses[app] if accesses[app] else 0,
+            'min_seconds': int(minimum[app]),
+            'max_seconds': int(maximum[app]),
+            'total_hours': round(total[app] / 3600, 2),
+            'first_use': format_time(first_use[app]),
+            'last_use': format_time(last_use[app]),
+            'active_days': int(active_days[app]),
+        } for app in np.flatnonzero(present)]
+        applications.sort(key=lambda row: row['total_seconds'], reverse=True)
+        return applications
+
+    def user_stats(self, username):
+        """Estatísticas do usuário, no formato de GET /api/user-analytics/{user}/stats (mais o heatmap)"""
+        selected = self._select(username)
+        seconds = self.seconds[selected]
+        start = self.dataset.event_start[selected]
+        weights = self.dataset.event_count[selected]
+        raw_seconds = seconds[~self.dataset.event_hourly[selected]]
+        days = start // DAY
+        total = int(seconds.sum())
+        activities = int(weights.sum())
+
+        weekday = (days + 4) % 7
+        weekday_seconds = np.bincount(weekday, weights=seconds, minlength=7)
+        weekday_count = np.bincount(weekday, weights=weights, minlength=7).astype(np.int64)
+        weekday_present = np.bincount(weekday, minlength=7)
+
+        hour = start // HOUR % 24
+        hour_seconds = np.bincount(hour, weights=seconds, minlength=24)
+        hour_count = np.bincount(hour, weights=weights, minlength=24).astype(np.int64)
+        hour_present = np.bincount(hour, minlength=24)
+
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        date_seconds = np.bincount(day_index, weights=seconds, minlength=len(unique_days))
+        date_count = np.bincount(day_index, weights=weights, minlength=len(unique_days)).astype(np.int64)
+        date_apps = np.bincount(np.unique(day_index * max(len(self.dataset.apps), 1) + self.dataset.event_app[selected])
+                                // max(len(self.dataset.apps), 1), minlength=len(unique_days))
+        dates = format_dates(unique_days)
+
+        applications = self.user_applications(username)
+        return {
+            'general': {
+                'total_activities': activities,
+                'unique_apps': len(applications),
+                'active_days': len(unique_days),
+                'total_time_seconds': total,
+                'avg_session_seconds': total / activities if activities else 0,
+                'max_session_seconds': int(raw_seconds.max()) if len(raw_seconds) else 0,
+            },
+            'top_apps': [{
+                'executable': app['executable'],
+                'total_seconds': app['total_seconds'],
+                'access_count': app['access_count'],
+                'max_seconds': app['max_seconds'],
+                'total_hours': app['total_hours'],
+                'avg_seconds': app['avg_seconds'],
+            } for app in applications[:10]],
+            'by_weekday': [{
+                'day_number': int(day) + 1,
+                'weekday': WEEKDAYS[day],
+                'total_seconds': int(weekday_seconds[day]),
+                'activities': int(weekday_count[day]),
+                'total_hours': round(weekday_seconds[day] / 3600, 2),
+            } for day in np.flatnonzero(weekday_present)],
+            # Por hora em que a atividade começou (como no PHP); o heatmap divide pelas horas
+            'by_hour': [{
+                'hour': int(hour),
+                'total_seconds': int(hour_seconds[hour]),
+                'activities': int(hour_count[hour]),
+                'total_hours': round(hour_seconds[hour] / 3600, 2),
+            } for hour in np.flatnonzero(hour_present)],
+            'timeline': [{
+                'date': dates[index],
+                'activities': int(date_count[index]),
+                'total_seconds': int(date_seconds[index]),
+                'total_hours': round(date_seconds[index] / 3600, 2),
+                'unique_apps': int(date_apps[index]),
+            } for index in range(len(unique_days) - 1, -1, -1)],
+            'heatmap': self.heatmap(username).tolist(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relatórios de uso por usuário (motor vetorizado)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--db', help='Banco SQLite (stand-in ou export)')
+    source.add_argument('--events', help='CSV de activity_events')
+    parser.add_argument('--periods', help='CSV de activity_periods (com --events)')
+    parser.add_argument('--hourly', help='CSV de hourly_app_summary (com --events)')
+    parser.add_argument('--user', help='Usuário (sem ele: totais de todos os usuários)')
+    parser.add_argument('--since', help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('--until', help='Data final (AAAA-MM-DD)')
+    parser.add_argument('--business-hours', action='store_true', help='Só das 08:00 às 18:00')
+    parser.add_argument('--start-time', help='Início do horário (HH:MM)')
+    parser.add_argument('--end-time', help='Fim do horário (HH:MM)')
+    parser.add_argument('--ignore', help='Horário ignorado, ex.: 12:00-13:00')
+    parser.add_argument('--subtract-idle', action='store_true',
+                        help='Descontar também os períodos de inatividade (o PHP não desconta)')
+    parser.add_argument('--json', action='store_true', help='Resultado em JSON')
+    args = parser.parse_args()
+
+    if args.db:
+        dataset = load_sqlite(args.db, args.since, args.until, args.user)
+    else:
+        dataset = load_csv(args.events, args.periods, args.since, args.until, args.user, args.hourly)
+
+    ignore_from, ignore_to = args.ignore.split('-') if args.ignore else (None, None)
+    filters = Filters(
+        start_time='08:00:00' if args.business_hours else args.start_time,
+        end_time='18:00:00' if args.business_hours else args.end_time,
+        ignore_from=ignore_from,
+        ignore_to=ignore_to,
+        subtract_idle=args.subtract_idle
+    )
+    analysis = Analysis(dataset, filters)
+    result = analysis.user_stats(args.user) if args.user else analysis.user_totals()
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+
+    if not args.user:
+        print(f"{'usuário':30}{'horas':>10}{'atividades':>12}{'apps':>6}{'dias':>6}")
+        for row in result:
+            print(f"{row['username'][:29]:30}{row['total_hours']:>10.2f}{row['total_activities']:>12}"
+                  f"{row['unique_apps']:>6}{row['active_days']:>6}")
+        return
+
+    general = result['general']
+    print(f"{args.user}: {general['total_time_seconds'] / 3600:.2f} h em {general['total_activities']} atividades, "
+          f"{general['unique_apps']} aplicativos, {general['active_days']} dias")
+    for app in result['top_apps']:
+        print(f"  {app['executable'][:40]:40}{app['total_hours']:>8.2f} h{app['access_count']:>8}x")
+    print("Mapa de calor (horas por dia da semana x hora do dia):")
+    print('     ' + ''.join(f"{hour:>5}" for hour in range(24)))
+    for day, row in enumerate(result['heatmap']):
+        print(f"{WEEKDAYS[day][:3]:5}" + ''.join(f"{seconds / 3600:>5.1f}" if seconds else '    .' for seconds in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Analytics bench - Escala do motor vetorizado (analytics.py) x laço por atividade
+
+Gera uma equipe sintética (usuários x dias úteis, atividades encadeadas das
+8h às 18h, almoço e pausas como períodos de inatividade) e mede, para cada
+tamanho, o tempo do ``Analysis`` (corte por hora, sobreposições e agregados)
+e o pico de memória. Até ``--reference-limit`` atividades, compara com o
+laço do PHP (``calculateValidDuration`` + cada período de inatividade
+descontado um a um) e confere se os totais batem.
+
+``--loaders`` mede também a leitura do SQLite e do CSV (export gerado em um
+diretório temporário).
+
+Uso:
+    python analytics_bench.py                                  # 10 mil a 3 milhões de atividades
+    python analytics_bench.py --events 100000,1000000 --loaders
+    python analytics_bench.py --events 20000 --reference-limit 20000
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import analytics
+from analytics import DAY, Analysis, Dataset, Filters
+from schema import SCHEMA
+
+APPS = ['chrome.exe', 'outlook.exe', 'teams.exe', 'excel.exe', 'code.exe', 'winword.exe',
+        'explorer.exe', 'slack.exe', 'acrord32.exe', 'powerpnt.exe', 'notepad.exe', 'mstsc.exe']
+# Filtros do relatório mais comum (horário comercial sem o almoço), descontando também a inatividade
+BENCH_FILTERS = dict(start_time='08:00:00', end_time='18:00:00', ignore_from='12:00:00', ignore_to='13:00:00',
+                     subtract_idle=True)
+
+
+def generate(events, users=50, per_day=200, idle_per_day=6, seed=1):
+    """Equipe sintética com ~``events`` atividades (``per_day`` por usuário e dia útil)"""
+    rng = np.random.default_rng(seed)
+    days = max(1, -(-events // (users * per_day)))
+    first_day = np.datetime64('2026-01-05', 'D').astype(np.int64)
+    # Só dias úteis (segunda a sexta)
+    calendar = np.arange(first_day, first_day + days * 7 // 5 + 7)
+    calendar = calendar[(calendar + 3) % 7 < 5][:days]
+
+    user_days = users * days
+    user = np.repeat(np.arange(users), days)
+    day = np.tile(calendar, users)
+
+    # Atividades encadeadas a partir das 8h (algumas passam das 18h e da meia-noite)
+    length = rng.exponential(10 * 3600 / per_day, size=(user_days, per_day)).astype(np.int64) + 1
+    gap = rng.integers(0, 30, size=(user_days, per_day))
+    start = np.cumsum(length + gap, axis=1) - length
+    start += (day * DAY + 8 * 3600 - rng.integers(0, 1800, size=user_days))[:, None]
+    app = rng.zipf(1.6, size=(user_days, per_day)) % len(APPS)
+
+    # Inatividade: o almoço (às vezes) e pausas curtas espalhadas pelo dia
+    idle_start = (day * DAY)[:, None] + rng.integers(9 * 3600, 18 * 3600, size=(user_days, idle_per_day))
+    idle_start[:, 0] = day * DAY + 12 * 3600 + rng.integers(-900, 900, size=user_days)
+    idle_length = rng.integers(120, 1800, size=(user_days, idle_per_day))
+    idle_length[:, 0] = rng.integers(1800, 4500, size=user_days)
+
+    keep = slice(0, events)
+    return Dataset(
+        [f"usuario{index:04d}" for index in range(users)], APPS,
+        np.repeat(user, per_day)[keep], app.ravel()[keep],
+        start.ravel()[keep], (start + length).ravel()[keep],
+        np.repeat(user, idle_per_day), idle_start.ravel(), (idle_start + idle_length).ravel()
+    )
+
+
+def loop_valid_seconds(dataset, filters):
+    """Referência: o laço do PHP, atividade por atividade, intervalo por intervalo"""
+    idle = {}
+    for user, start, end in zip(dataset.idle_user.tolist(), dataset.idle_start.tolist(), dataset.idle_end.tolist()):
+        idle.setdefault(user, []).append((start, end))
+
+    seconds = []
+    for user, start, end in zip(dataset.event_user.tolist(), dataset.event_start.tolist(),
+                                dataset.event_end.tolist()):
+        day = start // DAY * DAY
+        if filters.has_window:
+            start = max(start, day + filters.day_start)
+            end = min(end, day + filters.day_end)
+            if end <= start:
+                seconds.append(0)
+                continue
+        excluded = list(idle.get(user, [])) if filters.subtract_idle else []
+        if filters.ignore:
+            excluded.append((day + filters.ignore[0], day + filters.ignore[1]))
+        excluded.sort()
+
+        valid = end - start
+        covered_until = start  # Não desconta duas vezes o que o almoço e uma pausa cobrem juntos
+        for excluded_start, excluded_end in excluded:
+            overlap_start = max(excluded_start, covered_until)
+            overlap_end = min(excluded_end, end)
+            if overlap_start < overlap_end:
+                valid -= overlap_end - overlap_start
+                covered_until = overlap_end
+        seconds.append(max(0, valid))
+    return np.array(seconds, dtype=np.int64)
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def measure(dataset, filters, reference=False):
+    """Tempo e pico de memória do Analysis (e da referência, se pedido)"""
+    tracemalloc.start()
+    try:
+        analysis, elapsed = _timed(Analysis, dataset, filters)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Sem o tracemalloc (ele pesa nas alocações): melhor de três
+    elapsed = min([elapsed] + [_timed(Analysis, dataset, filters)[1] for _ in range(2)])
+    _, report_time = _timed(lambda: [analysis.user_stats(user) for user in dataset.users[:10]])
+
+    result = {
+        'events': len(dataset),
+        'pieces': len(analysis.piece_seconds),
+        'idle_periods': len(dataset.idle_start),
+        'analysis_s': elapsed,
+        'ns_per_event': elapsed / max(len(dataset), 1) * 1e9,
+        'peak_mb': peak / 1024 / 1024,
+        'reports_s': report_time / min(10, len(dataset.users)),
+        'total_hours': analysis.seconds.sum() / 3600,
+    }
+    if reference:
+        expected, result['reference_s'] = _timed(loop_valid_seconds, dataset, filters)
+        mismatches = int(np.count_nonzero(expected != analysis.seconds))
+        result['mismatches'] = mismatches
+    return result
+
+
+def _export(dataset, directory):
+    """Grava o dataset como SQLite (esquema do stand-in) e CSV"""
+    def rows():
+        text = lambda seconds: seconds.astype('datetime64[s]').astype(str)
+        for user, app, start, end in zip(dataset.event_user.tolist(), dataset.event_app.tolist(),
+                                         text(dataset.event_start), text(dataset.event_end)):
+            yield (dataset.users[user], dataset.apps[app], start.replace('T', ' '), end.replace('T', ' '))
+
+    def idle_rows():
+        text = lambda seconds: seconds.astype('datetime64[s]').astype(str)
+        for user, start, end in zip(dataset.idle_user.tolist(), text(dataset.idle_start), text(dataset.idle_end)):
+            yield (dataset.users[user], start.replace('T', ' '), end.replace('T', ' '))
+
+    db_path = os.path.join(directory, 'analytics.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO activity_events (hostname, username, executable, start_time, end_time, state) "
+        "VALUES ('PC', ?, ?, ?, ?, 'active')", rows())
+    conn.executemany(
+        "INSERT INTO activity_periods (hostname, username, period_type, start_time, end_time) "
+        "VALUES ('PC', ?, 'inactive', ?, ?)", idle_rows())
+    conn.commit()
+    conn.close()
+
+    events_path = os.path.join(directory, 'activity_events.csv')
+    with open(events_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['username', 'executable', 'start_time', 'end_time', 'duration_seconds', 'state'])
+        writer.writerows(row + ('', 'active') for row in rows())
+    periods_path = os.path.join(directory, 'activity_periods.csv')
+    with open(periods_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['username', 'period_type', 'start_time', 'end_time', 'duration_seconds'])
+        writer.writerows((user, 'inactive', start, end, '') for user, start, end in idle_rows())
+    return db_path, events_path, periods_path
+
+
+def measure_loaders(dataset, filters):
+    """Leitura do SQLite e do CSV, conferindo que o resultado é o mesmo do dataset original"""
+    expected = Analysis(dataset, filters).seconds.sum()
+    with tempfile.TemporaryDirectory() as directory:
+        db_path, events_path, periods_path = _export(dataset, directory)
+        loaded_sqlite, sqlite_time = _timed(analytics.load_sqlite, db_path)
+        loaded_csv, csv_time = _timed(analytics.load_csv, events_path, periods_path)
+    return {
+        'sqlite_s': sqlite_time,
+        'csv_s': csv_time,
+        'sqlite_ok': Analysis(loaded_sqlite, filters).seconds.sum() == expected,
+        'csv_ok': Analysis(loaded_csv, filters).seconds.sum() == expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Escala do motor de analytics')
+    parser.add_argument('--events', default='10000,100000,1000000,3000000',
+                        help='Números de atividades (separados por vírgula)')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--per-day', type=int, default=200, help='Atividades por usuário e dia')
+    parser.add_argument('--reference-limit', type=int, default=100000,
+                        help='Até quantas atividades rodar o laço de referência')
+    parser.add_argument('--loaders', action='store_true', help='Mede também a leitura de SQLite e CSV')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    filters = Filters(**BENCH_FILTERS)
+    print(f"Filtros: {BENCH_FILTERS['start_time']}-{BENCH_FILTERS['end_time']}, ignorando "
+          f"{BENCH_FILTERS['ignore_from']}-{BENCH_FILTERS['ignore_to']}, descontando inatividade\n")
+    print(f"{'atividades':>11}{'pedaços':>11}{'inativ.':>9}{'motor s':>9}{'ns/ativ.':>10}{'pico MB':>9}"
+          f"{'relat. ms':>10}{'laço s':>9}{'ganho':>8}  confere")
+
+    for events in (int(value) for value in args.events.split(',') if value):
+        dataset = generate(events, args.users, args.per_day, seed=args.seed)
+        result = measure(dataset, filters, reference=events <= args.reference_limit)
+        reference = ''
+        if 'reference_s' in result:
+            check = 'ok' if not result['mismatches'] else f"{result['mismatches']} diferentes"
+            reference = (f"{result['reference_s']:>9.2f}{result['reference_s'] / result['analysis_s']:>7.0f}x"
+                         f"  {check}")
+        print(f"{result['events']:>11}{result['pieces']:>11}{result['idle_periods']:>9}"
+              f"{result['analysis_s']:>9.3f}{result['ns_per_event']:>10.0f}{result['peak_mb']:>9.1f}"
+              f"{result['reports_s'] * 1000:>10.1f}{reference}")
+        if args.loaders:
+            loaders = measure_loaders(dataset, filters)
+            print(f"{'':11}leitura: SQLite {loaders['sqlite_s']:.2f} s "
+                  f"({'ok' if loaders['sqlite_ok'] else 'DIFERENTE'}), "
+                  f"CSV {loaders['csv_s']:.2f} s ({'ok' if loaders['csv_ok'] else 'DIFERENTE'})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1003 @@
+"""
+Collector - Serviço de ingestão em lote para os eventos do agent
+
+Alternativa ao caminho PHP para as rotas de ingestão. No PHP, cada
+requisição abre uma conexão PDO e cada evento vira um INSERT/UPDATE próprio
+(com um commit por requisição). O collector aceita os mesmos payloads nas
+mesmas rotas (``/api/batch``, ``/api/window-activity``, ``/api/mouse-activity``,
+``/api/windows-snapshot``, ``/api/activity-periods``, ``/api/daily-rollup``,
+``/api/agent-health``),
+mas só valida e acumula em memória, por tabela. Uma thread grava o acumulado
+com INSERT multi-linha ``... ON DUPLICATE KEY UPDATE`` (``ON CONFLICT`` no
+SQLite), em uma única transação e em uma conexão do pool. A gravação começa
+assim que há linhas no buffer (após ``linger`` segundos, se configurado); o
+que chega enquanto ela roda vai para a próxima, então o tamanho dos lotes
+cresce sozinho com a carga (group commit).
+
+- Linhas com a mesma chave se mesclam no buffer. Por exemplo, o insert de
+  uma atividade e os checkpoints seguintes viram uma linha, e só o último
+  ping de mouse de cada computador é gravado.
+- A resposta só sai depois que o flush com os eventos da requisição foi
+  gravado (``ack='flushed'``, padrão). Se o flush falhar, a resposta é 503
+  com ``Retry-After`` e o agent reenvia (spool). Com ``ack='buffered'`` a
+  resposta sai na hora (menor latência; um crash perde até um intervalo).
+- IDs de ``activity_events`` e ``activity_periods`` são pré-alocados, para
+  devolver o ID ao agent antes do INSERT: cada instância reserva blocos de
+  ``ID_BLOCK`` IDs na tabela ``id_ranges`` (UPDATE atômico do próximo ID).
+  Várias instâncias do collector podem gravar no mesmo banco, e os endpoints
+  PHP tiram seus IDs da mesma tabela (``reserveIds()``), então não há colisão
+  com o AUTO_INCREMENT. IDs de um bloco não usado até o fim da instância
+  ficam como lacunas.
+- Os corpos podem vir em JSON ou no formato binário de ``agent/wire.py``
+  (anunciado em ``Accept-Post``; dicionário de strings por sessão do agent,
+  em memória, com 409 ``resync_strings`` quando a sessão não é conhecida).
+- O estado necessário para responder (último período por computador, seq e
+  janelas do snapshot) fica em cache e é lido do banco só na primeira vez.
+
+Ganho medido (ver ``ingest_bench.py``): só na gravação (28-34x mais
+eventos/s que um commit por evento). Pelo HTTP em Python, com cliente e
+servidor na mesma máquina, não há diferença consistente em relação ao
+stand-in (de 15% a mais até metade dos eventos/s, conforme a máquina e a
+duração): o custo por requisição domina.
+
+Backends: SQLite (testes e desenvolvimento, mesmo schema do stand-in) e
+MariaDB/MySQL (produção; requer ``pymysql`` e usa as variáveis DB_* do .env).
+
+Uso:
+    python collector.py --port 8090 --sqlite collector.db
+    python collector.py --port 8090 --mysql
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+from urllib.parse import urlparse
+
+try:
+    import pymysql
+except ImportError:  # Dependência opcional: só para o backend MariaDB/MySQL
+    pymysql = None
+
+import wire_decoder
+from schema import (HEALTH_FIELDS, PRESENCE_DEFAULT_LEASE_SECONDS, SCHEMA, BadRequest, UnsupportedMediaType,
+                    rollup_instance, validate_required)
+
+
+class TableSpec:
+    """Tabela gravada pelo collector: colunas, chave do upsert e regra de cada coluna atualizada.
+
+    Regras: ``set`` (valor novo), ``coalesce`` (novo, se não nulo), ``max``
+    e ``min`` (ignorando nulos) e ``add`` (soma, para rollups). As mesmas
+    regras valem para mesclar linhas no buffer e para o ``UPDATE`` do upsert
+    no banco.
+    """
+
+    def __init__(self, name, columns, keys, updates):
+        self.name = name
+        self.columns = columns
+        self.keys = keys
+        self.updates = updates
+
+    def key(self, row):
+        return tuple(row[column] for column in self.keys)
+
+    def merge(self, old, new):
+        """Combina duas linhas com a mesma chave (``new`` é a mais recente)"""
+        merged = dict(old)
+        for column, rule in self.updates.items():
+            before, after = old.get(column), new.get(column)
+            if rule == 'set':
+                merged[column] = after
+            elif after is None:
+                merged[column] = before
+            elif rule == 'coalesce' or before is None:
+                merged[column] = after
+            elif rule == 'max':
+                merged[column] = max(before, after)
+            elif rule == 'min':
+                merged[column] = min(before, after)
+            elif rule == 'add':
+                merged[column] = before + after
+        return merged
+
+
+TABLES = OrderedDict((spec.name, spec) for spec in [
+    TableSpec('activity_events',
+              ('id', 'hostname', 'username', 'executable', 'pid', 'window_title',
+               'start_time', 'end_time', 'duration_seconds', 'state'),
+              ('id',),
+              {'start_time': 'coalesce', 'end_time': 'coalesce', 'duration_seconds': 'coalesce',
+               'state': 'coalesce', 'window_title': 'coalesce'}),
+    TableSpec('activity_periods',
+              ('id', 'hostname', 'username', 'period_type', 'start_time', 'end_time', 'duration_seconds'),
+              ('id',),
+              {'end_time': 'set', 'duration_seconds': 'set'}),
+    TableSpec('last_mouse_activity',
+              ('hostname', 'username', 'last_activity', 'presence_state', 'active_until'),
+              ('hostname', 'username'),
+              {'last_activity': 'set', 'presence_state': 'set', 'active_until': 'set'}),
+    TableSpec('windows_snapshot',
+              ('hostname', 'username', 'timestamp', 'windows_json', 'seq'),
+              ('hostname', 'username'),
+              {'timestamp': 'set', 'windows_json': 'set', 'seq': 'set'}),
+    TableSpec('daily_rollup_instances',
+              ('hostname', 'username', 'date', 'instance_id', 'executable', 'active_seconds',
+               'inactive_seconds', 'activations', 'events', 'first_activity', 'last_activity'),
+              ('hostname', 'username', 'date', 'instance_id', 'executable'),
+              {'active_seconds': 'max', 'inactive_seconds': 'max', 'activations': 'max', 'events': 'max',
+               'first_activity': 'min', 'last_activity': 'max'}),
+    TableSpec('agent_health',
+              ('hostname', 'username', 'reported_at') + HEALTH_FIELDS + ('metrics_json',),
+              ('hostname', 'username'),
+              {column: 'set' for column in ('reported_at',) + HEALTH_FIELDS + ('metrics_json',)}),
+])
+
+# Checkpoints sem os dados da atividade (PUT antigo): só UPDATE, sem recriar o registro
+ACTIVITY_UPDATE = TableSpec('activity_events', ('id', 'start_time', 'end_time', 'duration_seconds',
+                                                'state', 'window_title'), ('id',),
+                            {'start_time': 'coalesce', 'end_time': 'coalesce', 'duration_seconds': 'coalesce',
+                             'state': 'coalesce', 'window_title': 'coalesce'})
+
+# Sumários diários: soma das instâncias de daily_rollup_instances (executable '' = totais do dia)
+ROLLUP_SUMMARIES = (
+    (TableSpec('daily_activity_summary',
+               ('hostname', 'username', 'date', 'total_active_seconds', 'total_inactive_seconds',
+                'first_activity', 'last_activity'),
+               ('hostname', 'username', 'date'),
+               {'total_active_seconds': 'set', 'total_inactive_seconds': 'set',
+                'first_activity': 'set', 'last_activity': 'set'}),
+     "SUM(active_seconds), SUM(inactive_seconds), MIN(first_activity), MAX(last_activity)"),
+    (TableSpec('daily_app_summary',
+               ('hostname', 'username', 'date', 'executable', 'active_seconds', 'inactive_seconds',
+                'activations', 'events'),
+               ('hostname', 'username', 'date', 'executable'),
+               {'active_seconds': 'set', 'inactive_seconds': 'set', 'activations': 'set', 'events': 'set'}),
+     "SUM(active_seconds), SUM(inactive_seconds), SUM(activations), SUM(events)"),
+)
+
+ACTIVITY_REQUIRED = ['hostname', 'username', 'executable', 'pid', 'start_time']
+
+
+class FlushError(Exception):
+    """O flush com os eventos da requisição falhou (o agent deve reenviar)"""
+
+
+# ----------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------
+class ConnectionPool:
+    """Pool simples de conexões; conexões com erro são descartadas"""
+
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = size
+        self._idle = Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                self._discard(conn)
+                raise
+            self._idle.put(conn)
+            raise
+        else:
+            self._idle.put(conn)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self.factory()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class SQLiteBackend:
+    """SQLite (testes): mesmo schema do stand-in, uma conexão para escrita"""
+
+    placeholder = '?'
+    greatest, least = 'MAX', 'MIN'
+    insert_ignore = 'INSERT OR IGNORE'
+    # Limite de parâmetros por comando (SQLITE_MAX_VARIABLE_NUMBER)
+    max_params = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+    max_rows = 1000
+
+    def __init__(self, path=':memory:'):
+        self.path = path
+        self.pool = ConnectionPool(self._connect, size=1)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def query_one(self, sql, params=()):
+        """Lê uma linha (consultas escritas com '?'); retorna tupla ou None"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql.replace('?', self.placeholder), params)
+            row = cursor.fetchone()
+            conn.commit()  # Encerra a transação de leitura
+            return row
+
+    def reserve_ids(self, table, count):
+        """Reserva ``count`` IDs de ``table`` em ``id_ranges``; retorna o primeiro.
+
+        O UPDATE trava a linha da tabela até o commit, então duas instâncias
+        nunca recebem o mesmo bloco. Sem linha ainda (banco sem
+        database/id_ranges.sql), ela começa em ``MAX(id) + 1``.
+        """
+        placeholder = self.placeholder
+        update = f"UPDATE id_ranges SET next_id = next_id + {placeholder} WHERE table_name = {placeholder}"
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(update, (count, table))
+            if cursor.rowcount == 0:
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+                cursor.execute(f"{self.insert_ignore} INTO id_ranges (table_name, next_id) "
+                               f"VALUES ({placeholder}, {placeholder})", (table, cursor.fetchone()[0]))
+                cursor.execute(update, (count, table))
+            cursor.execute(f"SELECT next_id FROM id_ranges WHERE table_name = {placeholder}", (table,))
+            next_id = cursor.fetchone()[0]
+            conn.commit()
+            return next_id - count
+
+    def new_value(self, column):
+        return f"excluded.{column}"
+
+    def upsert_clause(self, spec, assignments):
+        return f"ON CONFLICT ({', '.join(spec.keys)}) DO UPDATE SET {assignments}"
+
+
+class MySQLBackend(SQLiteBackend):
+    """MariaDB/MySQL (produção), com as credenciais DB_* do .env"""
+
+    placeholder = '%s'
+    greatest, least = 'GREATEST', 'LEAST'
+    insert_ignore = 'INSERT IGNORE'
+    max_params = 65535
+    max_rows = 1000
+
+    def __init__(self, host=None, port=None, database=None, user=None, password=None, pool_size=4):
+        if pymysql is None:
+            raise RuntimeError("Backend MySQL requer o pacote pymysql (pip install pymysql)")
+        self.params = {
+            'host': host or os.environ.get('DB_HOST', 'localhost'),
+            'port': int(port or os.environ.get('DB_PORT', 3306)),
+            'database': database or os.environ.get('DB_NAME', 'unimonitor'),
+            'user': user or os.environ.get('DB_USER', 'root'),
+            'password': password if password is not None else os.environ.get('DB_PASSWORD', ''),
+            'charset': 'utf8mb4',
+            'autocommit': False,
+        }
+        self.pool = ConnectionPool(self._connect, size=pool_size)
+
+    def _connect(self):
+        return pymysql.connect(**self.params)
+
+    def new_value(self, column):
+        return f"VALUES({column})"
+
+    def upsert_clause(self, spec, assignments):
+        return f"ON DUPLICATE KEY UPDATE {assignments}"
+
+
+def _assignment(backend, column, rule):
+    new = backend.new_value(column)
+    if rule == 'set':
+        return f"{column} = {new}"
+    if rule == 'coalesce':
+        return f"{column} = COALESCE({new}, {column})"
+    if rule == 'add':
+        return f"{column} = COALESCE({column}, 0) + COALESCE({new}, 0)"
+    function = backend.greatest if rule == 'max' else backend.least
+    return f"{column} = {function}(COALESCE({column}, {new}), COALESCE({new}, {column}))"
+
+
+def upsert_sql(backend, spec, row_count):
+    """INSERT multi-linha com atualização das colunas conforme as regras da tabela"""
+    row = '(' + ', '.join([backend.placeholder] * len(spec.columns)) + ')'
+    assignments = ', '.join(_assignment(backend, column, rule) for column, rule in spec.updates.items())
+    return (
+        f"INSERT INTO {spec.name} ({', '.join(spec.columns)}) VALUES {', '.join([row] * row_count)} "
+        + backend.upsert_clause(spec, assignments)
+    )
+
+
+def rollup_sum_sql(backend, spec, sums):
+    """Recalcula um sumário diário como a soma das instâncias, para uma chave"""
+    keys = ', '.join(spec.keys)
+    where = ' AND '.join(f"{column} = {backend.placeholder}" for column in spec.keys)
+    if 'executable' not in spec.keys:
+        where += " AND executable = ''"
+    assignments = ', '.join(_assignment(backend, column, rule) for column, rule in spec.updates.items())
+    # O WHERE antes do ON CONFLICT evita a ambiguidade do parser do SQLite em INSERT ... SELECT
+    return (
+        f"INSERT INTO {spec.name} ({', '.join(spec.columns)}) "
+        f"SELECT {keys}, {sums} FROM daily_rollup_instances WHERE {where} GROUP BY {keys} "
+        + backend.upsert_clause(spec, assignments)
+    )
+
+
+def update_sql(backend, spec):
+    assignments = ', '.join(
+        f"{column} = COALESCE({backend.placeholder}, {column})" for column in spec.columns if column != 'id'
+    )
+    return f"UPDATE {spec.name} SET {assignments} WHERE id = {backend.placeholder}"
+
+
+# ----------------------------------------------------------------------
+# Buffer e gravação
+# ----------------------------------------------------------------------
+class Collector:
+    """Valida os eventos, acumula por tabela e grava em lote"""
+
+    ID_BLOCK = 1000  # IDs reservados por vez em id_ranges
+
+    def __init__(self, backend, linger=0.0, max_rows=5000, ack='flushed'):
+        if ack not in ('flushed', 'buffered'):
+            raise ValueError(f"Modo de confirmação desconhecido: {ack}")
+        self.backend = backend
+        self.linger = linger  # Espera extra para juntar mais linhas por gravação
+        self.max_rows = max_rows
+        self.ack = ack
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._buffers = {name: OrderedDict() for name in TABLES}
+        self._updates = OrderedDict()
+        self._rows = 0
+        # Geração do buffer: a requisição espera o flush da geração em que entrou
+        self._generation = 1
+        self._done_generation = 0
+        self._failed = OrderedDict()  # geração -> erro (últimas falhas)
+        self._id_blocks = {}  # tabela -> [próximo ID, fim do bloco reservado (exclusivo)]
+        self._periods = {}  # (hostname, username) -> (id, period_type)
+        self._snapshots = {}  # (hostname, username) -> {'seq': ..., 'windows': {...}}
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.counters = {
+            'events': 0,
+            'rows_buffered': 0,
+            'rows_merged': 0,  # Linhas absorvidas por outra de mesma chave no buffer
+            'rows_written': 0,
+            'statements': 0,
+            'flushes': 0,
+            'flush_failures': 0,
+            'flush_seconds': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='collector-flush', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para a thread e grava o que restou no buffer"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: not self._running or self._rows or self._updates)
+                if not self._running:
+                    return
+            if self.linger:
+                with self._cond:
+                    self._cond.wait_for(lambda: not self._running or self._rows >= self.max_rows,
+                                        timeout=self.linger)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Erro no flush do collector: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # Buffer
+    # ------------------------------------------------------------------
+    def _add(self, spec, row, buffer=None):
+        buffer = self._buffers[spec.name] if buffer is None else buffer
+        key = spec.key(row)
+        if key in buffer:
+            buffer[key] = spec.merge(buffer[key], row)
+            self.counters['rows_merged'] += 1
+        else:
+            buffer[key] = row
+            self._rows += 1
+        self.counters['rows_buffered'] += 1
+
+    def _next_id(self, table):
+        """ID pré-alocado: o próximo do bloco reservado, reservando outro quando acaba"""
+        block = self._id_blocks.get(table)
+        if block is None or block[0] >= block[1]:
+            first = self.backend.reserve_ids(table, self.ID_BLOCK)
+            block = self._id_blocks[table] = [first, first + self.ID_BLOCK]
+        block[0] += 1
+        return block[0] - 1
+
+    def submit(self, events):
+        """Processa ``[(tipo, dados)]`` de uma requisição.
+
+        Retorna (resultados, geração); cada resultado é ``(sucesso, status,
+        mensagem, dados)``, no formato de ``_handle_event`` do stand-in.
+        """
+        results = []
+        inserted_ids = {}
+        with self._lock:
+            for event_id, event_type, data in events:
+                self.counters['events'] += 1
+                try:
+                    result = self._handle(event_type, data, inserted_ids)
+                except BadRequest as e:
+                    result = (False, 400, f"{e}: {', '.join(e.missing_fields)}", None)
+                except (KeyError, TypeError, ValueError) as e:
+                    result = (False, 400, f"Evento inválido: {str(e)}", None)
+                if result[0] and result[3] and 'id' in result[3] and event_id is not None:
+                    if event_type == 'window_activity':
+                        inserted_ids[event_id] = result[3]['id']
+                    elif event_type == 'window_activity_update' and data.get('ref'):
+                        inserted_ids[data['ref']] = result[3]['id']
+                results.append(result)
+            generation = self._generation
+            self._cond.notify_all()
+        return results, generation
+
+    def _handle(self, event_type, data, inserted_ids):
+        if not isinstance(data, dict):
+            return False, 400, 'Tipo de evento desconhecido', None
+
+        if event_type == 'window_activity':
+            return True, 201, 'Atividade registrada com sucesso', {'id': self._add_activity(None, data)}
+
+        if event_type == 'window_activity_update':
+            activity_id = data.get('activity_id') or inserted_ids.get(data.get('ref'))
+            missing = [field for field in ACTIVITY_REQUIRED if data.get(field) in (None, '')]
+            if activity_id and missing:
+                # Checkpoint só com os tempos: atualiza sem recriar
+                self._update_activity(int(activity_id), data)
+                return True, 200, 'Atividade atualizada com sucesso', {'id': int(activity_id)}
+            if activity_id:
+                self._add_activity(int(activity_id), data)
+                return True, 200, 'Atividade atualizada com sucesso', {'id': int(activity_id)}
+            return True, 201, 'Atividade registrada com sucesso', {'id': self._add_activity(None, data)}
+
+        if event_type == 'mouse_activity':
+            validate_required(data, ['hostname', 'username', 'last_activity'])
+            active_until = data.get('active_until')
+            if active_until is None:
+                active_until = (
+                    datetime.strptime(data['last_activity'], '%Y-%m-%d %H:%M:%S')
+                    + timedelta(seconds=PRESENCE_DEFAULT_LEASE_SECONDS)
+                ).strftime('%Y-%m-%d %H:%M:%S')
+            self._add(TABLES['last_mouse_activity'], {
+                'hostname': data['hostname'], 'username': data['username'],
+                'last_activity': data['last_activity'], 'presence_state': data.get('state', 'active'),
+                'active_until': active_until,
+            })
+            return True, 200, 'Mouse activity atualizada', None
+
+        if event_type == 'windows_snapshot':
+            return True, 201, 'Snapshot salvo com sucesso', self._add_snapshot(data)
+
+        if event_type == 'activity_period':
+            period_id, updated = self._add_period(data)
+            return (True, 200 if updated else 201, 'Período registrado com sucesso',
+                    {'id': period_id, 'updated': updated})
+
+        if event_type == 'daily_rollup':
+            return True, 200, 'Rollup diário atualizado', {'apps': self._add_rollup(data)}
+
+        if event_type == 'agent_health':
+            validate_required(data, ['hostname', 'username', 'timestamp'])
+            metrics = data.get('metrics')
+            self._add(TABLES['agent_health'], dict(
+                {field: data.get(field) for field in HEALTH_FIELDS},
+                hostname=data['hostname'], username=data['username'], reported_at=data['timestamp'],
+                metrics_json=json.dumps(metrics) if metrics is not None else None,
+            ))
+            return True, 200, 'Saúde do agent atualizada', None
+
+        return False, 400, 'Tipo de evento desconhecido', None
+
+    def _add_activity(self, activity_id, data):
+        validate_required(data, ACTIVITY_REQUIRED)
+        if activity_id is None:
+            activity_id = self._next_id('activity_events')
+        state = data.get('state')
+        self._add(TABLES['activity_events'], {
+            'id': activity_id, 'hostname': data['hostname'], 'username': data['username'],
+            'executable': data['executable'], 'pid': data['pid'], 'window_title': data.get('window_title'),
+            'start_time': data['start_time'], 'end_time': data.get('end_time'),
+            'duration_seconds': data.get('duration_seconds'),
+            'state': state if state in ('active', 'inactive') else None,
+        })
+        return activity_id
+
+    def _update_activity(self, activity_id, data):
+        state = data.get('state')
+        row = {'id': activity_id, 'start_time': data.get('start_time'), 'end_time': data.get('end_time'),
+               'duration_seconds': data.get('duration_seconds'),
+               'state': state if state in ('active', 'inactive') else None,
+               'window_title': data.get('window_title')}
+        buffered = self._buffers['activity_events'].get((activity_id,))
+        if buffered is not None:
+            # Insert ainda no buffer: mescla nele
+            self._add(TABLES['activity_events'], dict(buffered, **{k: v for k, v in row.items() if v is not None}))
+        else:
+            self._add(ACTIVITY_UPDATE, row, self._updates)
+
+    def update(self, activity_id, data):
+        """Checkpoint parcial (PUT /api/window-activity/{id}).
+
+        Retorna a geração a aguardar, ou None se a atividade não existe.
+        """
+        with self._lock:
+            buffered = (activity_id,) in self._buffers['activity_events']
+        if not buffered and self.backend.query_one(
+                "SELECT 1 FROM activity_events WHERE id = ?", (activity_id,)) is None:
+            return None
+        with self._lock:
+            self._update_activity(activity_id, data)
+            self._cond.notify_all()
+            return self._generation
+
+    def _add_period(self, data):
+        """Mesma regra de saveActivityPeriod(): mesmo tipo do último período = atualização"""
+        validate_required(data, ['hostname', 'username', 'period_type', 'start_time',
+                                 'end_time', 'duration_seconds'])
+        owner = (data['hostname'], data['username'])
+        if owner not in self._periods:
+            self._periods[owner] = self.backend.query_one(
+                "SELECT id, period_type FROM activity_periods WHERE hostname = ? AND username = ? "
+                "ORDER BY start_time DESC LIMIT 1", owner
+            )
+        last = self._periods[owner]
+        updated = bool(last) and last[1] == data['period_type']
+        period_id = last[0] if updated else self._next_id('activity_periods')
+        # Período existente: o upsert só altera fim e duração
+        self._add(TABLES['activity_periods'], {
+            'id': period_id, 'hostname': owner[0], 'username': owner[1],
+            'period_type': data['period_type'], 'start_time': data['start_time'],
+            'end_time': data['end_time'], 'duration_seconds': data['duration_seconds'],
+        })
+        self._periods[owner] = (period_id, data['period_type'])
+        return period_id, updated
+
+    def _add_snapshot(self, data):
+        """Mesma regra de applyWindowsSnapshot(): delta fora de sequência devolve ``resync``"""
+        owner = (data.get('hostname'), data.get('username'))
+        if data.get('mode', 'full') == 'full':
+            validate_required(data, ['hostname', 'username', 'timestamp', 'windows'])
+            windows = OrderedDict((str(w.get('window_id')), w) for w in data['windows'])
+            self._snapshots[owner] = {'seq': data.get('seq'), 'windows': windows}
+            self._add(TABLES['windows_snapshot'], {
+                'hostname': owner[0], 'username': owner[1], 'timestamp': data['timestamp'],
+                'windows_json': json.dumps(data['windows']), 'seq': data.get('seq'),
+            })
+            return {'seq': data.get('seq'), 'windows_count': len(data['windows'])}
+
+        validate_required(data, ['hostname', 'username', 'timestamp', 'seq', 'base_seq'])
+        current = self._snapshots.get(owner)
+        if current is None:
+            row = self.backend.query_one(
+                "SELECT seq, windows_json FROM windows_snapshot WHERE hostname = ? AND username = ?", owner
+            )
+            if row is not None:
+                current = {'seq': row[0], 'windows': OrderedDict(
+                    (str(w.get('window_id')), w) for w in json.loads(row[1]))}
+                self._snapshots[owner] = current
+        if current is None or current['seq'] is None or current['seq'] != data['base_seq']:
+            return {'resync': True, 'seq': current['seq'] if current else None}
+
+        windows = current['windows']
+        for key in data.get('removed') or []:
+            windows.pop(str(key), None)
+        for window in (data.get('added') or []) + (data.get('changed') or []):
+            key = str(window['window_id'])
+            windows[key] = dict(window, is_active=windows.get(key, {}).get('is_active', False))
+        if 'active' in data:
+            for key, window in windows.items():
+                window['is_active'] = data['active'] is not None and key == str(data['active'])
+        current['seq'] = data['seq']
+
+        self._add(TABLES['windows_snapshot'], {
+            'hostname': owner[0], 'username': owner[1], 'timestamp': data['timestamp'],
+            'windows_json': json.dumps(list(windows.values())), 'seq': data['seq'],
+        })
+        return {'seq': data['seq'], 'windows_count': len(windows)}
+
+    def _add_rollup(self, data):
+        validate_required(data, ['hostname', 'username', 'date'])
+        key = {'hostname': data['hostname'], 'username': data['username'], 'date': data['date'],
+               'instance_id': rollup_instance(data)}
+        self._add(TABLES['daily_rollup_instances'], dict(
+            key,
+            executable='',
+            active_seconds=int(data.get('total_active_seconds') or 0),
+            inactive_seconds=int(data.get('total_inactive_seconds') or 0),
+            activations=0,
+            events=0,
+            first_activity=data.get('first_activity'),
+            last_activity=data.get('last_activity'),
+        ))
+        apps = [app for app in data.get('apps') or [] if isinstance(app, dict) and app.get('executable')]
+        for app in apps:
+            self._add(TABLES['daily_rollup_instances'], dict(
+                key,
+                executable=app['executable'],
+                active_seconds=int(app.get('active_seconds') or 0),
+                inactive_seconds=int(app.get('inactive_seconds') or 0),
+                activations=int(app.get('activations') or 0),
+                events=int(app.get('events') or 0),
+                first_activity=None,
+                last_activity=None,
+            ))
+        return len(apps)
+
+    # ------------------------------------------------------------------
+    # Flush
+    # ------------------------------------------------------------------
+    def flush(self):
+        """Grava o buffer atual em uma transação; retorna o número de linhas"""
+        with self._flush_lock:
+            with self._lock:
+                buffers, updates = self._buffers, self._updates
+                generation = self._generation
+                self._buffers = {name: OrderedDict() for name in TABLES}
+                self._updates = OrderedDict()
+                self._rows = 0
+                self._generation += 1
+
+            started = time.perf_counter()
+            error = None
+            rows = statements = 0
+            try:
+                if any(buffers.values()) or updates:
+                    rows, statements = self._write(buffers, updates)
+            except Exception as e:
+                error = e
+                logging.error(f"Erro ao gravar lote do collector ({sum(map(len, buffers.values()))} linhas): {str(e)}")
+
+            with self._cond:
+                self.counters['flush_seconds'] += time.perf_counter() - started
+                if error is None:
+                    self.counters['flushes'] += 1 if rows else 0
+                    self.counters['rows_written'] += rows
+                    self.counters['statements'] += statements
+                else:
+                    self.counters['flush_failures'] += 1
+                    self._failed[generation] = str(error)
+                    while len(self._failed) > 1000:
+                        self._failed.popitem(last=False)
+                    # O cache pode apontar para linhas que não foram gravadas
+                    self._periods.clear()
+                    self._snapshots.clear()
+                    if self.ack == 'buffered':
+                        self._restore(buffers, updates)
+                self._done_generation = generation
+                self._cond.notify_all()
+            return rows
+
+    def _restore(self, buffers, updates):
+        """Devolve ao buffer as linhas de um flush que falhou (as mais novas prevalecem)"""
+        for name, rows in buffers.items():
+            spec = TABLES[name]
+            current = self._buffers[name]
+            for key, row in rows.items():
+                current[key] = spec.merge(row, current[key]) if key in current else row
+            self._rows += len(rows)
+        for key, row in updates.items():
+            self._updates[key] = ACTIVITY_UPDATE.merge(row, self._updates[key]) if key in self._updates else row
+
+    def _write(self, buffers, updates):
+        backend = self.backend
+        rows = statements = 0
+        with backend.pool.connection() as conn:
+            cursor = conn.cursor()
+            for name, buffered in buffers.items():
+                if not buffered:
+                    continue
+                spec = TABLES[name]
+                chunk = max(1, min(backend.max_rows, backend.max_params // len(spec.columns)))
+                values = [tuple(row.get(column) for column in spec.columns) for row in buffered.values()]
+                for start in range(0, len(values), chunk):
+                    part = values[start:start + chunk]
+                    cursor.execute(upsert_sql(backend, spec, len(part)),
+                                   [value for row in part for value in row])
+                    statements += 1
+                rows += len(values)
+            rollups = buffers.get('daily_rollup_instances')
+            if rollups:
+                # Depois das instâncias, na mesma transação: os sumários são a soma delas
+                # Chaves do buffer: (hostname, username, date, instance_id, executable)
+                days = list(OrderedDict.fromkeys(key[:3] for key in rollups))
+                apps = list(OrderedDict.fromkeys(key[:3] + key[4:] for key in rollups if key[4]))
+                for (spec, sums), keys in zip(ROLLUP_SUMMARIES, (days, apps)):
+                    if keys:
+                        cursor.executemany(rollup_sum_sql(backend, spec, sums), keys)
+                        statements += 1
+            if updates:
+                columns = [column for column in ACTIVITY_UPDATE.columns if column != 'id']
+                cursor.executemany(update_sql(backend, ACTIVITY_UPDATE),
+                                   [tuple(row.get(column) for column in columns) + (row['id'],)
+                                    for row in updates.values()])
+                statements += 1
+                rows += len(updates)
+            conn.commit()
+        return rows, statements
+
+    def wait_flushed(self, generation, timeout=30.0):
+        """Aguarda o flush da geração; lança ``FlushError`` se ele falhou"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._done_generation >= generation, timeout):
+                raise FlushError("Tempo esgotado aguardando a gravação")
+            error = self._failed.get(generation)
+        if error is not None:
+            raise FlushError(error)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['rows_pending'] = self._rows + len(self._updates)
+        if stats['statements']:
+            stats['rows_per_statement'] = stats['rows_written'] / stats['statements']
+        return stats
+
+
+# ----------------------------------------------------------------------
+# HTTP
+# ----------------------------------------------------------------------
+def _result(event_id, result):
+    success, status, message, data = result
+    body = {'id': event_id, 'success': success, 'status': status, 'message': message}
+    if data is not None:
+        body['data'] = data
+    return body
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """Rotas de ingestão do src/index.php sobre o Collector"""
+
+    collector = None
+    wire = None  # WireDecoder (corpos em MessagePack), se o msgpack estiver instalado
+    agent_config = {}  # Dicas de taxa para os agents (ver agent/hints.py)
+    protocol_version = 'HTTP/1.1'  # Keep-alive: o agent reaproveita a conexão
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    def _read_json(self):
+        """Corpo em JSON ou MessagePack (Content-Type), com ou sem gzip"""
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if 'gzip' in (self.headers.get('Content-Encoding') or ''):
+            body = gzip.decompress(body)
+        if not body:
+            return {}
+        if wire_decoder.CONTENT_TYPE in (self.headers.get('Content-Type') or ''):
+            if self.wire is None:
+                raise UnsupportedMediaType()
+            return self.wire.decode(body)
+        return json.loads(body)
+
+    def _read_payload(self):
+        """Lê o corpo ou responde o erro (400/409/415); retorna None se já respondeu"""
+        try:
+            return self._read_json()
+        except UnsupportedMediaType:
+            self._send_json(415, {'success': False, 'message': 'Formato não suportado'})
+        except wire_decoder.WireResync as e:
+            self._send_json(409, {'success': False, 'message': str(e), 'resync_strings': True})
+        except ValueError:
+            self._send_json(400, {'success': False, 'message': 'JSON inválido'})
+        return None
+
+    def _send_json(self, status, body, headers=None):
+        raw = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        # Formatos aceitos no corpo (negociação do formato binário)
+        if self.wire is not None:
+            self.send_header('Accept-Post', f"{wire_decoder.CONTENT_TYPE}, application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _submit(self, events):
+        """Envia ao collector e aguarda a gravação (ack 'flushed'); None se já respondeu 503"""
+        results, generation = self.collector.submit(events)
+        if self.collector.ack == 'flushed' and any(result[0] for result in results):
+            try:
+                self.collector.wait_flushed(generation)
+            except FlushError as e:
+                self._send_json(503, {'success': False, 'message': f"Erro ao gravar eventos: {e}"},
+                                {'Retry-After': '10'})
+                return None
+        return results
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip('/')
+        if path == '/api/health':
+            self._send_json(200, {'success': True, 'status': 'healthy'})
+        elif path == '/api/agent-config':
+            self._send_json(200, {'success': True, 'agent_config': self.agent_config})
+        elif path == '/api/collector/stats':
+            self._send_json(200, {'success': True, 'stats': self.collector.stats()})
+        else:
+            self._send_json(404, {'success': False, 'message': 'Endpoint não encontrado'})
+
+    def do_POST(self):
+        payload = self._read_payload()
+        if payload is None:
+            return
+
+        path = self.path.rstrip('/')
+        if path == '/api/batch':
+            self._post_batch(payload)
+            return
+
+        single_routes = {
+            '/api/window-activity': 'window_activity',
+            '/api/mouse-activity': 'mouse_activity',
+            '/api/windows-snapshot': 'windows_snapshot',
+            '/api/activity-periods': 'activity_period',
+            '/api/daily-rollup': 'daily_rollup',
+            '/api/agent-health': 'agent_health',
+        }
+        if path not in single_routes:
+            self._send_json(404, {'success': False, 'message': 'Endpoint não encontrado'})
+            return
+
+        results = self._submit([(None, single_routes[path], payload)])
+        if results is None:
+            return
+        success, status, message, data = results[0]
+        body = {'success': success, 'message': message}
+        if data is not None:
+            body['data'] = data
+        self._send_json(status, body)
+
+    def _post_batch(self, payload):
+        events = payload.get('events') if isinstance(payload, dict) else None
+        if not isinstance(events, list):
+            self._send_json(400, {'success': False, 'message': 'Campos obrigatórios ausentes',
+                                  'missing_fields': ['events']})
+            return
+
+        # hostname/username do envelope valem para todos os eventos
+        defaults = {key: payload[key] for key in ('hostname', 'username') if payload.get(key)}
+        submitted = []
+        for event in events:
+            data = event.get('data') if isinstance(event, dict) else None
+            if isinstance(data, dict):
+                data = {**defaults, **data}
+            submitted.append((event.get('id') if isinstance(event, dict) else None,
+                              event.get('type') if isinstance(event, dict) else None, data))
+
+        results = self._submit(submitted)
+        if results is None:
+            return
+        body = {'success': True,
+                'results': [_result(event_id, result) for (event_id, _, _), result in zip(submitted, results)]}
+        if self.agent_config:
+            body['agent_config'] = self.agent_config
+        self._send_json(200, body)
+
+    def do_PUT(self):
+        # O corpo é lido antes de rotear, para a conexão keep-alive continuar válida
+        payload = self._read_payload()
+        if payload is None:
+            return
+        match = re.match(r'^/api/window-activity/(\d+)$', self.path.rstrip('/'))
+        if not match or not isinstance(payload, dict):
+            self._send_json(404, {'success': False, 'message': 'Endpoint não encontrado'})
+            return
+
+        generation = self.collector.update(int(match.group(1)), payload)
+        if generation is None:
+            self._send_json(404, {'success': False, 'message': 'Atividade não encontrada'})
+            return
+        if self.collector.ack == 'flushed':
+            try:
+                self.collector.wait_flushed(generation)
+            except FlushError as e:
+                self._send_json(503, {'success': False, 'message': f"Erro ao gravar eventos: {e}"},
+                                {'Retry-After': '10'})
+                return
+        self._send_json(200, {'success': True, 'message': 'Atividade atualizada com sucesso'})
+
+
+def create_server(collector, host='127.0.0.1', port=8090, agent_config=None):
+    """Cria o servidor HTTP do collector (porta 0 escolhe uma porta livre).
+
+    Os dicionários de strings do formato binário ficam por sessão do agent,
+    em memória desta instância: com várias instâncias atrás de um balanceador,
+    uma requisição que cai em outra instância recebe 409 e o agent recomeça o
+    dicionário (use afinidade por agent para evitar isso).
+    """
+    handler = type('BoundCollectorHandler', (CollectorHandler,), {
+        'collector': collector,
+        'wire': wire_decoder.WireDecoder() if wire_decoder.available() else None,
+        'agent_config': dict(agent_config or {}),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Collector de ingestão em lote do pcmon')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument('--sqlite', default=':memory:', help='Arquivo SQLite (padrão: memória)')
+    backend.add_argument('--mysql', action='store_true', help='MariaDB/MySQL com as variáveis DB_* do ambiente')
+    parser.add_argument('--pool-size', type=int, default=4, help='Conexões no pool (MySQL)')
+    parser.add_argument('--linger', type=float, default=0.0,
+                        help='Segundos de espera para juntar mais linhas por gravação')
+    parser.add_argument('--max-rows', type=int, default=5000, help='Linhas no buffer que antecipam a gravação')
+    parser.add_argument('--ack', choices=['flushed', 'buffered'], default='flushed',
+                        help='Responder após gravar (padrão) ou ao acumular')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    backend = MySQLBackend(pool_size=args.pool_size) if args.mysql else SQLiteBackend(args.sqlite)
+    collector = Collector(backend, args.linger, args.max_rows, args.ack)
+    collector.start()
+    server = create_server(collector, args.host, args.port)
+    logging.info(f"Collector escutando em http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        collector.stop()
+        logging.info(f"Collector encerrado: {collector.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""
+Ingest bench - Carga de ingestão: collector em lote x caminho por evento
+
+Sobe localmente, em processos separados, o stand-in (um comando e um commit
+por evento, como os endpoints PHP) e o collector (buffer por tabela e INSERT
+multi-linha), ambos em arquivos SQLite, e dispara eventos no formato do agent a partir de N
+agents sintéticos em paralelo. Mede eventos/s sustentados, latência das
+requisições e erros, nos dois modos de envio do agent:
+
+- ``single``: uma requisição por evento (rotas individuais, agent antigo);
+- ``batch``: ``POST /api/batch`` com ``--batch-size`` eventos.
+
+``--url`` acrescenta um servidor já rodando (ex.: a API PHP) à comparação.
+
+Como cliente e servidores dividem a mesma máquina, o HTTP em Python pesa nos
+dois lados; o cenário ``storage`` mede só a gravação, no mesmo processo: um
+commit por evento (como as rotas PHP) x buffer do collector com um flush a
+cada rodada de requisições simultâneas.
+
+Resultados medidos (SQLite, cliente e servidores na mesma máquina):
+
+- ``storage``: o collector grava 28-34x mais eventos/s que um commit por
+  evento. É aqui que está o ganho do collector.
+- HTTP (``single`` e ``batch``): sem diferença consistente. Em uma máquina
+  com 1 CPU, três rodadas de 10 s deram o collector 10-15% à frente (single
+  368-431 x 333-377 ev/s; batch 4613-5553 x 4090-4976 ev/s); em outra,
+  15 s deram empate (single 309 x 305; batch 4828 x 4761) e 5 s deram o
+  collector atrás (single 170 x 349; batch 2956 x 4762). O gargalo é o
+  servidor HTTP em Python (parse e JSON por requisição, sob o GIL) e os
+  lotes saem pequenos (1,5-3 linhas por comando), então a gravação mais
+  barata quase não aparece. O p99 do collector em ``batch`` é maior, porque
+  a resposta espera o flush. Para medir o ganho de ponta a ponta, compare
+  com ``--url`` contra a API PHP real, que paga um commit por evento no
+  MariaDB.
+
+Uso:
+    python ingest_bench.py --agents 50 --duration 10
+    python ingest_bench.py --url http://localhost:8090 --mode batch
+    python ingest_bench.py --mode storage --events 50000
+"""
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import requests
+
+import collector
+import stand_in
+
+# Ciclo de eventos de cada agent (proporção aproximada do agent real:
+# checkpoints e snapshots mais frequentes que novas atividades)
+EVENT_CYCLE = (
+    'window_activity', 'window_activity_update', 'windows_snapshot', 'window_activity_update',
+    'mouse_activity', 'windows_snapshot', 'window_activity_update', 'activity_period',
+)
+
+SINGLE_ROUTES = {
+    'window_activity': '/api/window-activity',
+    'mouse_activity': '/api/mouse-activity',
+    'windows_snapshot': '/api/windows-snapshot',
+    'activity_period': '/api/activity-periods',
+}
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class SyntheticAgent:
+    """Gera os payloads de um agent (hostname próprio) em sequência"""
+
+    def __init__(self, index):
+        self.hostname = f"BENCH-{index:05d}"
+        self.username = f"user{index:05d}"
+        self.clock = datetime(2026, 1, 5, 8, 0, 0) + timedelta(seconds=index)
+        self.activity = None  # {'id' ou 'ref', 'start'}
+        self.seq = 0
+        self.period_start = self.clock
+        self.cycle = 0
+
+    def next_event(self, event_id):
+        """Próximo evento (tipo, dados) do ciclo"""
+        event_type = EVENT_CYCLE[self.cycle % len(EVENT_CYCLE)]
+        self.cycle += 1
+        self.clock += timedelta(seconds=2)
+        now = self.clock.strftime('%Y-%m-%d %H:%M:%S')
+        base = {'hostname': self.hostname, 'username': self.username}
+
+        if event_type == 'window_activity' or self.activity is None and event_type == 'window_activity_update':
+            self.activity = {'ref': event_id, 'id': None, 'start': now}
+            return 'window_activity', dict(base, executable='chrome.exe', pid=4321,
+                                           window_title=f"Documento {self.cycle} - Google Chrome",
+                                           start_time=now, state='active')
+        if event_type == 'window_activity_update':
+            start = datetime.strptime(self.activity['start'], '%Y-%m-%d %H:%M:%S')
+            data = dict(base, executable='chrome.exe', pid=4321, start_time=self.activity['start'],
+                        end_time=now, duration_seconds=(self.clock - start).total_seconds(), state='active')
+            if self.activity['id']:
+                data['activity_id'] = self.activity['id']
+            else:
+                data['ref'] = self.activity['ref']
+            return event_type, data
+        if event_type == 'windows_snapshot':
+            self.seq += 1
+            windows = [{'window_id': 1000 + n, 'executable': 'chrome.exe', 'window_title': f"Aba {n}",
+                        'is_active': n == self.seq % 8} for n in range(8)]
+            return event_type, dict(base, timestamp=now, windows=windows, seq=self.seq, mode='full')
+        if event_type == 'mouse_activity':
+            until = (self.clock + timedelta(seconds=90)).strftime('%Y-%m-%d %H:%M:%S')
+            return event_type, dict(base, last_activity=now, state='active', active_until=until)
+        duration = int((self.clock - self.period_start).total_seconds())
+        return 'activity_period', dict(base, period_type='active',
+                                       start_time=self.period_start.strftime('%Y-%m-%d %H:%M:%S'),
+                                       end_time=now, duration_seconds=duration)
+
+    def acked(self, event_type, event_id, record_id):
+        if record_id and self.activity and event_type in ('window_activity', 'window_activity_update') \
+                and self.activity['ref'] == event_id:
+            self.activity['id'] = record_id
+
+
+def _run_client(url, mode, batch_size, agent, deadline, stats, lock):
+    session = requests.Session()
+    latencies, events, errors, requests_count = [], 0, 0, 0
+    seq = 0
+    while time.perf_counter() < deadline:
+        batch = []
+        for _ in range(batch_size if mode == 'batch' else 1):
+            seq += 1
+            event_id = f"{agent.hostname}-{seq}"
+            event_type, data = agent.next_event(event_id)
+            batch.append((event_id, event_type, data))
+
+        started = time.perf_counter()
+        try:
+            if mode == 'batch':
+                response = session.post(f"{url}/api/batch", timeout=30, json={
+                    'session_id': agent.hostname, 'hostname': agent.hostname, 'username': agent.username,
+                    'events': [{'id': event_id, 'type': event_type, 'data': data}
+                               for event_id, event_type, data in batch],
+                })
+                ok = response.status_code == 200
+                if ok:
+                    for result, (event_id, event_type, _) in zip(response.json().get('results', []), batch):
+                        if result.get('success'):
+                            events += 1
+                            agent.acked(event_type, event_id, (result.get('data') or {}).get('id'))
+                        else:
+                            errors += 1
+            else:
+                event_id, event_type, data = batch[0]
+                if event_type == 'window_activity_update' and data.get('activity_id'):
+                    response = session.put(f"{url}/api/window-activity/{data['activity_id']}", json=data, timeout=30)
+                else:
+                    if event_type == 'window_activity_update':
+                        event_type = 'window_activity'
+                    response = session.post(f"{url}{SINGLE_ROUTES[event_type]}", json=data, timeout=30)
+                ok = response.status_code in (200, 201)
+                if ok:
+                    events += 1
+                    agent.acked(event_type, event_id, (response.json().get('data') or {}).get('id'))
+        except requests.exceptions.RequestException:
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        requests_count += 1
+        if not ok:
+            errors += len(batch)
+
+    with lock:
+        stats['latencies'].extend(latencies)
+        stats['events'] += events
+        stats['errors'] += errors
+        stats['requests'] += requests_count
+
+
+def run_load(url, mode, agents, duration, batch_size):
+    """Dispara a carga contra ``url`` e retorna as métricas"""
+    stats = {'latencies': [], 'events': 0, 'errors': 0, 'requests': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=_run_client, args=(url, mode, batch_size, SyntheticAgent(index),
+                                                   deadline, stats, lock), daemon=True)
+        for index in range(agents)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats['latencies'])
+    result = {
+        'events_per_second': stats['events'] / elapsed,
+        'requests_per_second': stats['requests'] / elapsed,
+        'events': stats['events'],
+        'errors': stats['errors'],
+    }
+    if latencies:
+        result.update({
+            'p50_ms': _percentile(latencies, 0.5) * 1000,
+            'p95_ms': _percentile(latencies, 0.95) * 1000,
+            'p99_ms': _percentile(latencies, 0.99) * 1000,
+        })
+    return result
+
+
+def run_storage(workdir, agents, events_total, batch_size):
+    """Só a gravação: eventos/s com um commit por evento x collector em lote"""
+    synthetic = [SyntheticAgent(index) for index in range(agents)]
+    requests_batches = []
+    seq = 0
+    while seq < events_total:
+        agent = synthetic[len(requests_batches) % agents]
+        batch = []
+        for _ in range(batch_size):
+            seq += 1
+            event_id = f"{agent.hostname}-{seq}"
+            # Sem respostas (acked) aqui: os checkpoints resolvem o ID pelo ref
+            event_type, data = agent.next_event(event_id)
+            batch.append((event_id, event_type, data))
+        requests_batches.append(batch)
+
+    store = stand_in.StandInStore(os.path.join(workdir, 'storage_per_event.db'))
+    started = time.perf_counter()
+    for batch in requests_batches:
+        for event_id, event_type, data in batch:
+            # Uma requisição (e um commit) por evento, como as rotas PHP
+            stand_in.handle_batch(store, {'events': [{'id': event_id, 'type': event_type, 'data': data}]})
+    per_event = seq / (time.perf_counter() - started)
+
+    ingest = collector.Collector(collector.SQLiteBackend(os.path.join(workdir, 'storage_collector.db')))
+    started = time.perf_counter()
+    for index, batch in enumerate(requests_batches, 1):
+        ingest.submit(batch)
+        if index % agents == 0:
+            ingest.flush()  # Uma gravação por rodada de requisições simultâneas
+    ingest.flush()
+    buffered = seq / (time.perf_counter() - started)
+    return per_event, buffered, ingest.stats()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _spawn(script, *args):
+    """Sobe um servidor em outro processo (sem disputar o GIL com os clientes)"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), script),
+         '--port', str(port), *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{url}/api/health", timeout=1)
+            return url, process
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{script} não respondeu em {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga de ingestão: collector x caminho por evento')
+    parser.add_argument('--agents', type=int, default=50, help='Agents sintéticos em paralelo')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos de carga por cenário')
+    parser.add_argument('--mode', choices=['single', 'batch', 'both', 'storage'], default='both')
+    parser.add_argument('--events', type=int, default=20000, help='Eventos do cenário storage')
+    parser.add_argument('--batch-size', type=int, default=20, help='Eventos por POST /api/batch')
+    parser.add_argument('--linger', type=float, default=0.0, help='Espera do collector para juntar linhas')
+    parser.add_argument('--url', help='Servidor adicional (ex.: API PHP) para comparar')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+    workdir = tempfile.mkdtemp(prefix='pcmon-bench-')
+
+    if args.mode == 'storage':
+        per_event, buffered, stats = run_storage(workdir, args.agents, args.events, args.batch_size)
+        print(f"Só gravação, {args.events} eventos de {args.agents} agents (SQLite em {workdir})")
+        print(f"  um commit por evento: {per_event:>9.0f} eventos/s")
+        print(f"  collector em lote:    {buffered:>9.0f} eventos/s ({buffered / per_event:.1f}x), "
+              f"{stats['rows_written']} linhas em {stats['statements']} comandos, "
+              f"{stats['rows_merged']} mescladas no buffer")
+        return
+
+    modes = ['single', 'batch'] if args.mode == 'both' else [args.mode]
+    print(f"{args.agents} agents, {args.duration:g}s por cenário, lotes de {args.batch_size} (SQLite em {workdir})")
+    print(f"{'alvo':12}{'modo':8}{'eventos/s':>11}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erros':>8}")
+    for mode in modes:
+        targets = [
+            ('stand-in', 'stand_in.py', ['--db', os.path.join(workdir, f'stand_in_{mode}.db')]),
+            ('collector', 'collector.py', ['--sqlite', os.path.join(workdir, f'collector_{mode}.db'),
+                                           '--linger', str(args.linger)]),
+        ]
+        if args.url:
+            targets.append(('url', None, []))
+
+        for name, script, script_args in targets:
+            process = None
+            if script:
+                url, process = _spawn(script, *script_args)
+            else:
+                url = args.url.rstrip('/')
+            try:
+                result = run_load(url, mode, args.agents, args.duration, args.batch_size)
+                print(f"{name:12}{mode:8}{result['events_per_second']:>11.0f}{result['requests_per_second']:>9.0f}"
+                      f"{result.get('p50_ms', 0):>9.1f}{result.get('p95_ms', 0):>9.1f}"
+                      f"{result.get('p99_ms', 0):>9.1f}{result['errors']:>8}")
+                if name == 'collector':
+                    stats = requests.get(f"{url}/api/collector/stats", timeout=5).json()['stats']
+                    print(f"{'':20}collector: {stats['rows_written']} linhas em {stats['statements']} comandos "
+                          f"({stats.get('rows_per_statement', 0):.1f} por comando), "
+                          f"{stats['rows_merged']} mescladas no buffer")
+            finally:
+                if process is not None:
+                    process.terminate()
+                    process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""
+Retention - Retenção em camadas: dados brutos antigos viram rollups por hora
+
+Substitui o ``DELETE ... WHERE start_time < NOW() - 30 DAY`` do
+``cleanup.php`` (um único comando que trava faixas grandes do InnoDB e apaga o
+histórico de vez) por um job de manutenção:
+
+- ``activity_events`` com mais de ``--days`` dias são somados em
+  ``hourly_app_summary`` (computador, usuário, hora, aplicativo) e
+  ``activity_periods`` em ``hourly_activity_summary`` (computador, usuário,
+  hora); atividades que cruzam a virada de hora são divididas entre as horas;
+- as linhas compactadas são apagadas em lotes pequenos, paginados pela chave
+  (``id > último AND id <= máximo ORDER BY id LIMIT n``), cada lote em uma
+  transação curta: soma no rollup, apaga exatamente os IDs lidos e grava o
+  progresso. Entre os lotes o job pausa (``--pause`` e ``--duty``), para
+  não disputar o banco com a ingestão;
+- o progresso fica em ``retention_progress``: se o job for interrompido
+  (ou atingir ``--max-seconds``), a próxima execução continua do último lote,
+  com o mesmo corte, sem somar nada duas vezes;
+- ``windows_snapshot`` e ``last_mouse_activity`` de computadores sem sinal há
+  mais de ``--days`` dias são apagados em lotes (sem rollup, como no PHP).
+
+As tabelas brutas ficam só com os dias recentes. Os relatórios por usuário
+(``getUserStats`` e ``compareUsers`` em ``user-analytics.php`` e
+``analytics.py``) somam ``hourly_app_summary`` com as linhas brutas que
+restam: como cada lote soma e apaga na mesma transação, uma atividade está em
+só um dos lados e a união não depende do corte (nem de a execução ter
+terminado). Os sumários diários (estatísticas, top aplicativos, lista de
+usuários) não são afetados. O rollup das horas logo após o corte pode incluir
+o final de atividades que começaram antes dele.
+
+Uso:
+    python retention.py --sqlite stand_in.db --days 30
+    python retention.py --mysql --days 30 --batch-size 500 --pause 0.1 --max-seconds 900
+    python retention.py --mysql --status
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+
+from collector import MySQLBackend, SQLiteBackend, TableSpec, upsert_sql
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Proteção contra relógio errado: uma atividade conta no máximo 7 dias
+MAX_SPAN = timedelta(days=7)
+
+HOURLY_APP = TableSpec('hourly_app_summary',
+                       ('hostname', 'username', 'hour', 'executable', 'active_seconds', 'inactive_seconds',
+                        'activations'),
+                       ('hostname', 'username', 'hour', 'executable'),
+                       {'active_seconds': 'add', 'inactive_seconds': 'add', 'activations': 'add'})
+HOURLY_ACTIVITY = TableSpec('hourly_activity_summary',
+                            ('hostname', 'username', 'hour', 'active_seconds', 'inactive_seconds'),
+                            ('hostname', 'username', 'hour'),
+                            {'active_seconds': 'add', 'inactive_seconds': 'add'})
+PROGRESS_COLUMNS = ('status', 'cutoff', 'max_id', 'last_id', 'rows_compacted', 'rows_deleted',
+                    'started_at', 'updated_at')
+PROGRESS = TableSpec('retention_progress', ('task',) + PROGRESS_COLUMNS, ('task',),
+                     {column: 'set' for column in PROGRESS_COLUMNS})
+
+
+def _as_datetime(value):
+    """Horário lido do banco (texto no SQLite, datetime no pymysql)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.strptime(str(value)[:19], TIME_FORMAT)
+
+
+def split_hours(start, end):
+    """Divide [start, end) nas horas cheias; retorna [(início da hora, segundos)]"""
+    end = min(end, start + MAX_SPAN)
+    pieces = []
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    while hour < end:
+        next_hour = hour + timedelta(hours=1)
+        seconds = int((min(end, next_hour) - max(start, hour)).total_seconds())
+        if seconds > 0:
+            pieces.append((hour, seconds))
+        hour = next_hour
+    return pieces
+
+
+def _interval(row):
+    """Início e fim de uma linha bruta (sem end_time: início + duração)"""
+    start = _as_datetime(row['start_time'])
+    end = _as_datetime(row['end_time'])
+    if end is None:
+        end = start + timedelta(seconds=float(row['duration_seconds'] or 0))
+    return start, max(start, end)
+
+
+def _add(rollup, spec, key, values):
+    row = rollup.get(key)
+    if row is None:
+        row = rollup[key] = dict(zip(spec.keys, key), **{column: 0 for column in spec.updates})
+    for column, value in values.items():
+        row[column] += value
+
+
+def rollup_events(rows):
+    """activity_events -> linhas de hourly_app_summary"""
+    rollup = {}
+    for row in rows:
+        start, end = _interval(row)
+        column = 'inactive_seconds' if row['state'] == 'inactive' else 'active_seconds'
+        first_hour = start.replace(minute=0, second=0, microsecond=0)
+        # Ativações: segmentos ativos (ou de agents antigos, sem estado), na hora em que começaram
+        activation = 0 if row['state'] == 'inactive' else 1
+        _add(rollup, HOURLY_APP, (row['hostname'], row['username'], first_hour.strftime(TIME_FORMAT),
+                                  row['executable']), {'activations': activation})
+        for hour, seconds in split_hours(start, end):
+            _add(rollup, HOURLY_APP, (row['hostname'], row['username'], hour.strftime(TIME_FORMAT),
+                                      row['executable']), {column: seconds})
+    return rollup
+
+
+def rollup_periods(rows):
+    """activity_periods -> linhas de hourly_activity_summary"""
+    rollup = {}
+    for row in rows:
+        start, end = _interval(row)
+        column = 'inactive_seconds' if row['period_type'] == 'inactive' else 'active_seconds'
+        for hour, seconds in split_hours(start, end):
+            _add(rollup, HOURLY_ACTIVITY, (row['hostname'], row['username'], hour.strftime(TIME_FORMAT)),
+                 {column: seconds})
+    return rollup
+
+
+class CompactTask:
+    """Tabela bruta com ``id`` crescente, compactada em um rollup por hora"""
+
+    def __init__(self, table, columns, spec, rollup):
+        self.table = table
+        self.columns = columns
+        self.spec = spec
+        self.rollup = rollup
+
+
+class PurgeTask:
+    """Tabela de estado atual (uma linha por computador): só apaga o que está parado"""
+
+    def __init__(self, table, time_column, keys):
+        self.table = table
+        self.time_column = time_column
+        self.keys = keys
+
+
+COMPACT_TASKS = [
+    CompactTask('activity_events',
+                ('id', 'hostname', 'username', 'executable', 'start_time', 'end_time', 'duration_seconds', 'state'),
+                HOURLY_APP, rollup_events),
+    CompactTask('activity_periods',
+                ('id', 'hostname', 'username', 'period_type', 'start_time', 'end_time', 'duration_seconds'),
+                HOURLY_ACTIVITY, rollup_periods),
+]
+PURGE_TASKS = [
+    PurgeTask('windows_snapshot', 'timestamp', ('hostname', 'username')),
+    PurgeTask('last_mouse_activity', 'last_activity', ('hostname', 'username')),
+]
+
+
+class RetentionJob:
+    """Compacta e apaga os dados brutos antigos em lotes, com progresso persistente"""
+
+    def __init__(self, backend, days=30, batch_size=500, pause=0.05, duty=0.5, max_seconds=None,
+                 clock=time.monotonic, sleep=time.sleep, now=datetime.now):
+        if days < 1:
+            raise ValueError("A retenção precisa manter pelo menos 1 dia de dados brutos")
+        self.backend = backend
+        self.days = days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.duty = duty
+        self.max_seconds = max_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.now = now
+        self._deadline = None
+
+    def cutoff(self):
+        """Meia-noite de ``days`` dias atrás: o corte cai sempre em uma hora cheia"""
+        today = self.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return (today - timedelta(days=self.days)).strftime(TIME_FORMAT)
+
+    def _sql(self, sql):
+        return sql.replace('?', self.backend.placeholder)
+
+    def _expired(self):
+        return self._deadline is not None and self.clock() >= self._deadline
+
+    def _throttle(self, elapsed):
+        """Pausa entre lotes: no mínimo ``pause``; com ``duty`` < 1, proporcional ao tempo do lote"""
+        delay = self.pause
+        if 0 < self.duty < 1:
+            delay = max(delay, elapsed * (1 - self.duty) / self.duty)
+        if delay > 0:
+            self.sleep(delay)
+
+    # ------------------------------------------------------------------
+    # Progresso
+    # ------------------------------------------------------------------
+    def progress(self, task):
+        row = self.backend.query_one(
+            f"SELECT {', '.join(PROGRESS_COLUMNS)} FROM retention_progress WHERE task = ?", (task,))
+        if row is None:
+            return None
+        progress = dict(zip(PROGRESS_COLUMNS, row))
+        for key in ('cutoff', 'started_at', 'updated_at'):
+            if isinstance(progress[key], datetime):
+                progress[key] = progress[key].strftime(TIME_FORMAT)
+        return progress
+
+    def _save_progress(self, cursor, task, progress):
+        progress['updated_at'] = self.now().strftime(TIME_FORMAT)
+        cursor.execute(upsert_sql(self.backend, PROGRESS, 1), [task] + [progress.get(column) for column in PROGRESS_COLUMNS])
+
+    def status(self):
+        tasks = [task.table for task in COMPACT_TASKS] + [task.table for task in PURGE_TASKS]
+        return {task: self.progress(task) for task in tasks}
+
+    # ------------------------------------------------------------------
+    # Execução
+    # ------------------------------------------------------------------
+    def run(self):
+        """Roda todas as tarefas; retorna o resumo por tabela"""
+        self._deadline = self.clock() + self.max_seconds if self.max_seconds else None
+        summary = {}
+        for task in COMPACT_TASKS:
+            summary[task.table] = self.compact(task)
+        for task in PURGE_TASKS:
+            summary[task.table] = self.purge(task)
+        return summary
+
+    def _begin(self, task):
+        """Progresso da execução: retoma a interrompida ou começa uma nova, com corte fixo"""
+        progress = self.progress(task.table)
+        if progress and progress['status'] == 'running':
+            logging.info(f"Retenção de {task.table}: retomando do id {progress['last_id']} "
+                         f"(corte {progress['cutoff']})")
+            return progress
+
+        cutoff = self.cutoff()
+        row = self.backend.query_one(f"SELECT MAX(id) FROM {task.table} WHERE start_time < ?", (cutoff,))
+        progress = {
+            'status': 'running', 'cutoff': cutoff, 'max_id': row[0] if row else None, 'last_id': 0,
+            'rows_compacted': 0, 'rows_deleted': 0, 'started_at': self.now().strftime(TIME_FORMAT),
+        }
+        with self.backend.pool.connection() as conn:
+            self._save_progress(conn.cursor(), task.table, progress)
+            conn.commit()
+        return progress
+
+    def compact(self, task):
+        progress = self._begin(task)
+        deleted_before = progress['rows_deleted']  # Execuções anteriores (retomada)
+        batches = 0
+        finished = progress['max_id'] is None
+        while not finished and not self._expired():
+            started = self.clock()
+            if not self._compact_batch(task, progress):
+                finished = True
+                break
+            batches += 1
+            self._throttle(self.clock() - started)
+
+        if finished:
+            progress['status'] = 'done'
+            with self.backend.pool.connection() as conn:
+                self._save_progress(conn.cursor(), task.table, progress)
+                conn.commit()
+        deleted = progress['rows_deleted'] - deleted_before
+        logging.info(f"Retenção de {task.table}: {deleted} linhas compactadas e apagadas "
+                     f"em {batches} lotes{'' if finished else ' (interrompido, continua na próxima execução)'}")
+        return {'batches': batches, 'rows': deleted, 'finished': finished,
+                'cutoff': progress['cutoff']}
+
+    def _compact_batch(self, task, progress):
+        """Um lote em uma transação: soma no rollup, apaga os IDs lidos e avança o progresso"""
+        backend = self.backend
+        with backend.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql(
+                f"SELECT {', '.join(task.columns)} FROM {task.table} "
+                f"WHERE id > ? AND id <= ? AND start_time < ? ORDER BY id LIMIT {int(self.batch_size)}"),
+                (progress['last_id'], progress['max_id'], progress['cutoff']))
+            rows = [dict(zip(task.columns, row)) for row in cursor.fetchall()]
+            if not rows:
+                conn.commit()
+                return 0
+
+            rollup = task.rollup(rows)
+            spec = task.spec
+            chunk = max(1, min(backend.max_rows, backend.max_params // len(spec.columns)))
+            values = [tuple(row[column] for column in spec.columns) for row in rollup.values()]
+            for start in range(0, len(values), chunk):
+                part = values[start:start + chunk]
+                cursor.execute(upsert_sql(backend, spec, len(part)), [value for row in part for value in row])
+
+            ids = [row['id'] for row in rows]
+            cursor.execute(self._sql(f"DELETE FROM {task.table} WHERE id IN ({', '.join('?' * len(ids))})"), ids)
+
+            progress['last_id'] = ids[-1]
+            progress['rows_compacted'] += len(rows)
+            progress['rows_deleted'] += len(ids)
+            self._save_progress(cursor, task.table, progress)
+            conn.commit()
+        return len(rows)
+
+    def purge(self, task):
+        """Apaga em lotes as linhas paradas há mais de ``days`` dias"""
+        cutoff = self.cutoff()
+        deleted = batches = 0
+        finished = False
+        where = ' AND '.join(f"{key} = ?" for key in task.keys)
+        while not self._expired():
+            started = self.clock()
+            with self.backend.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(self._sql(
+                    f"SELECT {', '.join(task.keys)} FROM {task.table} WHERE {task.time_column} < ? "
+                    f"ORDER BY {', '.join(task.keys)} LIMIT {int(self.batch_size)}"), (cutoff,))
+                keys = cursor.fetchall()
+                if keys:
+                    # O corte de novo no DELETE: um computador que voltou no meio do lote fica
+                    cursor.executemany(
+                        self._sql(f"DELETE FROM {task.table} WHERE {where} AND {task.time_column} < ?"),
+                        [tuple(key) + (cutoff,) for key in keys])
+                progress = {'status': 'done', 'cutoff': cutoff, 'max_id': None, 'last_id': 0,
+                            'rows_compacted': 0, 'rows_deleted': deleted + len(keys),
+                            'started_at': self.now().strftime(TIME_FORMAT)}
+                self._save_progress(cursor, task.table, progress)
+                conn.commit()
+            if not keys:
+                finished = True
+                break
+            deleted += len(keys)
+            batches += 1
+            self._throttle(self.clock() - started)
+        if deleted:
+            logging.info(f"Retenção de {task.table}: {deleted} computadores parados removidos")
+        return {'batches': batches, 'rows': deleted, 'finished': finished, 'cutoff': cutoff}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Retenção em camadas: compacta e apaga os dados brutos antigos')
+    backend = parser.add_mutually_exclusive_group(required=True)
+    backend.add_argument('--sqlite', help='Arquivo SQLite (stand-in/collector)')
+    backend.add_argument('--mysql', action='store_true', help='MariaDB/MySQL com as variáveis DB_* do ambiente')
+    parser.add_argument('--days', type=int, default=30, help='Dias de dados brutos mantidos')
+    parser.add_argument('--batch-size', type=int, default=500, help='Linhas por lote (por transação)')
+    parser.add_argument('--pause', type=float, default=0.05, help='Pausa mínima entre lotes (segundos)')
+    parser.add_argument('--duty', type=float, default=0.5,
+                        help='Fração do tempo em que o job pode ocupar o banco (1 = sem pausa proporcional)')
+    parser.add_argument('--max-seconds', type=float, help='Tempo máximo desta execução (o resto fica para a próxima)')
+    parser.add_argument('--status', action='store_true', help='Só mostra o progresso gravado')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    backend = MySQLBackend(pool_size=1) if args.mysql else SQLiteBackend(args.sqlite)
+    job = RetentionJob(backend, args.days, args.batch_size, args.pause, args.duty, args.max_seconds)
+
+    if args.status:
+        for task, progress in job.status().items():
+            if progress is None:
+                print(f"{task:24} nunca executado")
+            else:
+                position = f"id {progress['last_id']} de {progress['max_id']}, " if progress['max_id'] else ''
+                print(f"{task:24} {progress['status']:8} corte {progress['cutoff']}  "
+                      f"{progress['rows_deleted']} linhas  ({position}atualizado em {progress['updated_at']})")
+        return
+
+    started = time.monotonic()
+    summary = job.run()
+    pending = [table for table, result in summary.items() if not result['finished']]
+    logging.info(f"Retenção concluída em {time.monotonic() - started:.1f} s"
+                 + (f"; pendente: {', '.join(pending)}" if pending else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Schema - Tabelas e validação compartilhadas pelo collector e pelo stand-in
+
+Mesmo schema (em SQLite) e mesmas regras de validação dos endpoints PHP.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    executable TEXT NOT NULL,
+    pid INTEGER,
+    window_title TEXT,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    duration_seconds REAL,
+    state TEXT
+);
+CREATE TABLE IF NOT EXISTS activity_periods (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    period_type TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time TEXT,
+    duration_seconds INTEGER
+);
+CREATE TABLE IF NOT EXISTS last_mouse_activity (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    last_activity TEXT NOT NULL,
+    presence_state TEXT,
+    active_until TEXT,
+    PRIMARY KEY (hostname, username)
+);
+CREATE TABLE IF NOT EXISTS windows_snapshot (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    windows_json TEXT NOT NULL,
+    seq INTEGER,
+    PRIMARY KEY (hostname, username)
+);
+CREATE TABLE IF NOT EXISTS daily_activity_summary (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    total_active_seconds INTEGER DEFAULT 0,
+    total_inactive_seconds INTEGER DEFAULT 0,
+    first_activity TEXT,
+    last_activity TEXT,
+    PRIMARY KEY (hostname, username, date)
+);
+CREATE TABLE IF NOT EXISTS daily_app_summary (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    executable TEXT NOT NULL,
+    active_seconds INTEGER DEFAULT 0,
+    inactive_seconds INTEGER DEFAULT 0,
+    activations INTEGER DEFAULT 0,
+    events INTEGER DEFAULT 0,
+    PRIMARY KEY (hostname, username, date, executable)
+);
+CREATE TABLE IF NOT EXISTS daily_rollup_instances (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    instance_id TEXT NOT NULL DEFAULT '',
+    executable TEXT NOT NULL DEFAULT '',
+    active_seconds INTEGER DEFAULT 0,
+    inactive_seconds INTEGER DEFAULT 0,
+    activations INTEGER DEFAULT 0,
+    events INTEGER DEFAULT 0,
+    first_activity TEXT,
+    last_activity TEXT,
+    PRIMARY KEY (hostname, username, date, instance_id, executable)
+);
+CREATE TABLE IF NOT EXISTS agent_health (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    reported_at TEXT NOT NULL,
+    uptime_seconds INTEGER,
+    rss_mb REAL,
+    cpu_percent REAL,
+    loop_lag_p95_ms REAL,
+    loop_lag_max_ms REAL,
+    enumerate_p95_ms REAL,
+    send_p95_ms REAL,
+    requests INTEGER,
+    failures INTEGER,
+    queue_pending INTEGER,
+    metrics_json TEXT,
+    PRIMARY KEY (hostname, username)
+);
+CREATE TABLE IF NOT EXISTS hourly_app_summary (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    executable TEXT NOT NULL,
+    active_seconds INTEGER DEFAULT 0,
+    inactive_seconds INTEGER DEFAULT 0,
+    activations INTEGER DEFAULT 0,
+    PRIMARY KEY (hostname, username, hour, executable)
+);
+CREATE TABLE IF NOT EXISTS hourly_activity_summary (
+    hostname TEXT NOT NULL,
+    username TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    active_seconds INTEGER DEFAULT 0,
+    inactive_seconds INTEGER DEFAULT 0,
+    PRIMARY KEY (hostname, username, hour)
+);
+CREATE TABLE IF NOT EXISTS retention_progress (
+    task TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    cutoff TEXT NOT NULL,
+    max_id INTEGER,
+    last_id INTEGER DEFAULT 0,
+    rows_compacted INTEGER DEFAULT 0,
+    rows_deleted INTEGER DEFAULT 0,
+    started_at TEXT,
+    updated_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS id_ranges (
+    table_name TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+"""
+
+# Colunas de agent_health que vêm direto do heartbeat (ver agent/metrics.py)
+HEALTH_FIELDS = ('uptime_seconds', 'rss_mb', 'cpu_percent', 'loop_lag_p95_ms', 'loop_lag_max_ms',
+                 'enumerate_p95_ms', 'send_p95_ms', 'requests', 'failures', 'queue_pending')
+# Ordenações aceitas em GET /api/agent-health (mesmas do PHP)
+HEALTH_SORT_COLUMNS = {
+    'loop_lag': 'loop_lag_p95_ms',
+    'enumerate': 'enumerate_p95_ms',
+    'send': 'send_p95_ms',
+    'rss': 'rss_mb',
+    'cpu': 'cpu_percent',
+    'failures': 'failures',
+    'queue': 'queue_pending',
+    'reported_at': 'reported_at',
+}
+
+# Lease de presença de agents sem active_until (mesmo limite de 60 s do status)
+PRESENCE_DEFAULT_LEASE_SECONDS = 60
+
+
+class UnsupportedMediaType(Exception):
+    """Corpo em formato que este servidor não aceita (HTTP 415)"""
+
+
+class BadRequest(Exception):
+    """Payload inválido (equivale ao HTTP 400 do PHP)"""
+
+    def __init__(self, message, missing_fields=None):
+        super().__init__(message)
+        self.missing_fields = missing_fields or []
+
+
+def activity_state(data):
+    """Estado do segmento ('active'/'inactive'); None para agents antigos"""
+    state = data.get('state')
+    return state if state in ('active', 'inactive') else None
+
+
+def rollup_instance(data):
+    """Instância do rollup diário; '' para agents sem instance_id (mesma linha dos totais antigos)"""
+    instance = data.get('instance_id')
+    return str(instance)[:64] if instance else ''
+
+
+def validate_required(data, required):
+    """Mesma regra de validateRequired() em config/database.php"""
+    missing = []
+    for field in required:
+        value = data.get(field)
+        if value is None:
+            missing.append(field)
+        elif isinstance(value, str) and value.strip() == '':
+            missing.append(field)
+        elif isinstance(value, (list, dict)) and not value:
+            missing.append(field)
+    if missing:
+        raise BadRequest('Campos obrigatórios ausentes', missing)
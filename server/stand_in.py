@@ -0,0 +1,504 @@
+"""
+Stand-in da API - Implementação de referência em Python para testes locais
+
+Reproduz as rotas de ingestão usadas pelo agent (incluindo POST /api/batch)
+sobre um banco SQLite, sem precisar de Apache/PHP/MariaDB.
+
+Uso:
+    python stand_in.py --port 8090 --db stand_in.db
+"""
+import argparse
+import gzip
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import wire_decoder
+from schema import (HEALTH_FIELDS, HEALTH_SORT_COLUMNS, PRESENCE_DEFAULT_LEASE_SECONDS, SCHEMA, BadRequest,
+                    UnsupportedMediaType, activity_state, rollup_instance, validate_required)
+
+
+class StandInStore:
+    """Gravação dos eventos do agent em SQLite (mesma semântica dos endpoints PHP)"""
+
+    def __init__(self, db_path=':memory:'):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def create_window_activity(self, data):
+        validate_required(data, ['hostname', 'username', 'executable', 'pid', 'start_time'])
+        cursor = self.conn.execute(
+            "INSERT INTO activity_events "
+            "(hostname, username, executable, pid, window_title, start_time, end_time, duration_seconds, state) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (data['hostname'], data['username'], data['executable'], data['pid'],
+             data.get('window_title'), data['start_time'], data.get('end_time'),
+             data.get('duration_seconds'), activity_state(data))
+        )
+        return cursor.lastrowid
+
+    def update_window_activity(self, activity_id, data):
+        """Retorna False se a atividade não existe"""
+        cursor = self.conn.execute(
+            "UPDATE activity_events SET start_time = COALESCE(?, start_time), "
+            "end_time = COALESCE(?, end_time), duration_seconds = COALESCE(?, duration_seconds), "
+            "state = COALESCE(?, state), window_title = COALESCE(?, window_title) WHERE id = ?",
+            (data.get('start_time'), data.get('end_time'), data.get('duration_seconds'),
+             activity_state(data), data.get('window_title'), activity_id)
+        )
+        return cursor.rowcount > 0
+
+    def save_mouse_activity(self, data):
+        """Mesma regra de savePresence() do PHP (lease padrão de 60 s para agents antigos)"""
+        validate_required(data, ['hostname', 'username', 'last_activity'])
+        active_until = data.get('active_until')
+        if active_until is None:
+            active_until = (
+                datetime.strptime(data['last_activity'], '%Y-%m-%d %H:%M:%S')
+                + timedelta(seconds=PRESENCE_DEFAULT_LEASE_SECONDS)
+            ).strftime('%Y-%m-%d %H:%M:%S')
+        self.conn.execute(
+            "INSERT INTO last_mouse_activity (hostname, username, last_activity, presence_state, active_until) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (hostname, username) DO UPDATE SET last_activity = excluded.last_activity, "
+            "presence_state = excluded.presence_state, active_until = excluded.active_until",
+            (data['hostname'], data['username'], data['last_activity'],
+             data.get('state', 'active'), active_until)
+        )
+
+    def get_presence(self, hostname, username, now):
+        """Status derivado do lease: 'active' enquanto active_until > now"""
+        row = self.conn.execute(
+            "SELECT last_activity, presence_state, active_until FROM last_mouse_activity "
+            "WHERE hostname = ? AND username = ?",
+            (hostname, username)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'last_activity': row['last_activity'],
+            'active_until': row['active_until'],
+            'status': 'active' if row['active_until'] > now.strftime('%Y-%m-%d %H:%M:%S') else 'inactive',
+        }
+
+    def save_windows_snapshot(self, data):
+        """Aplica snapshot completo ou delta; retorna os dados do resultado do evento
+
+        Mesma regra de applyWindowsSnapshot() em windows-snapshot.php: um delta
+        cujo ``base_seq`` não bate com o ``seq`` gravado devolve ``resync``.
+        """
+        if data.get('mode', 'full') == 'full':
+            validate_required(data, ['hostname', 'username', 'timestamp', 'windows'])
+            self.conn.execute(
+                "INSERT INTO windows_snapshot (hostname, username, timestamp, windows_json, seq) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (hostname, username) DO UPDATE SET "
+                "timestamp = excluded.timestamp, windows_json = excluded.windows_json, seq = excluded.seq",
+                (data['hostname'], data['username'], data['timestamp'],
+                 json.dumps(data['windows']), data.get('seq'))
+            )
+            return {'seq': data.get('seq'), 'windows_count': len(data['windows'])}
+
+        validate_required(data, ['hostname', 'username', 'timestamp', 'seq', 'base_seq'])
+        current = self.conn.execute(
+            "SELECT seq, windows_json FROM windows_snapshot WHERE hostname = ? AND username = ?",
+            (data['hostname'], data['username'])
+        ).fetchone()
+        if current is None or current['seq'] is None or current['seq'] != data['base_seq']:
+            return {'resync': True, 'seq': current['seq'] if current else None}
+
+        added = data.get('added') or []
+        removed = data.get('removed') or []
+        changed = data.get('changed') or []
+        if not (added or removed or changed or 'active' in data):
+            self.conn.execute(
+                "UPDATE windows_snapshot SET timestamp = ?, seq = ? WHERE hostname = ? AND username = ?",
+                (data['timestamp'], data['seq'], data['hostname'], data['username'])
+            )
+            return {'seq': data['seq']}
+
+        windows = {str(w.get('window_id')): w for w in json.loads(current['windows_json'])}
+        for key in removed:
+            windows.pop(str(key), None)
+        for window in added + changed:
+            key = str(window['window_id'])
+            windows[key] = dict(window, is_active=windows.get(key, {}).get('is_active', False))
+        if 'active' in data:
+            for key, window in windows.items():
+                window['is_active'] = data['active'] is not None and key == str(data['active'])
+
+        self.conn.execute(
+            "UPDATE windows_snapshot SET timestamp = ?, windows_json = ?, seq = ? "
+            "WHERE hostname = ? AND username = ?",
+            (data['timestamp'], json.dumps(list(windows.values())), data['seq'],
+             data['hostname'], data['username'])
+        )
+        return {'seq': data['seq'], 'windows_count': len(windows)}
+
+    def get_windows(self, hostname, username):
+        row = self.conn.execute(
+            "SELECT windows_json FROM windows_snapshot WHERE hostname = ? AND username = ?",
+            (hostname, username)
+        ).fetchone()
+        return json.loads(row['windows_json']) if row else None
+
+    def save_activity_period(self, data):
+        """Retorna (id, updated) como saveActivityPeriod() do PHP
+
+        Não mexe em daily_activity_summary: os totais diários vêm só do rollup.
+        """
+        validate_required(data, ['hostname', 'username', 'period_type', 'start_time',
+                                 'end_time', 'duration_seconds'])
+        last = self.conn.execute(
+            "SELECT id, period_type FROM activity_periods WHERE hostname = ? AND username = ? "
+            "ORDER BY start_time DESC LIMIT 1",
+            (data['hostname'], data['username'])
+        ).fetchone()
+
+        if last and last['period_type'] == data['period_type']:
+            self.conn.execute(
+                "UPDATE activity_periods SET end_time = ?, duration_seconds = ? WHERE id = ?",
+                (data['end_time'], data['duration_seconds'], last['id'])
+            )
+            return last['id'], True
+
+        cursor = self.conn.execute(
+            "INSERT INTO activity_periods "
+            "(hostname, username, period_type, start_time, end_time, duration_seconds) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (data['hostname'], data['username'], data['period_type'], data['start_time'],
+             data['end_time'], data['duration_seconds'])
+        )
+        return cursor.lastrowid, False
+
+    def save_daily_rollup(self, data):
+        """Mescla com MAX por instância e soma as instâncias, como applyDailyRollup() do PHP.
+
+        Retorna o número de apps.
+        """
+        validate_required(data, ['hostname', 'username', 'date'])
+        key = (data['hostname'], data['username'], data['date'])
+        instance = rollup_instance(data)
+        apps = [app for app in data.get('apps') or [] if isinstance(app, dict) and app.get('executable')]
+        rows = [key + (instance, '', int(data.get('total_active_seconds') or 0),
+                       int(data.get('total_inactive_seconds') or 0), 0, 0,
+                       data.get('first_activity'), data.get('last_activity'))]
+        rows += [key + (instance, app['executable'], int(app.get('active_seconds') or 0),
+                        int(app.get('inactive_seconds') or 0), int(app.get('activations') or 0),
+                        int(app.get('events') or 0), None, None)
+                 for app in apps]
+        self.conn.executemany(
+            "INSERT INTO daily_rollup_instances "
+            "(hostname, username, date, instance_id, executable, active_seconds, inactive_seconds, "
+            "activations, events, first_activity, last_activity) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (hostname, username, date, instance_id, executable) DO UPDATE SET "
+            "active_seconds = MAX(active_seconds, excluded.active_seconds), "
+            "inactive_seconds = MAX(inactive_seconds, excluded.inactive_seconds), "
+            "activations = MAX(activations, excluded.activations), "
+            "events = MAX(events, excluded.events), "
+            "first_activity = MIN(COALESCE(first_activity, excluded.first_activity), "
+            "COALESCE(excluded.first_activity, first_activity)), "
+            "last_activity = MAX(COALESCE(last_activity, excluded.last_activity), "
+            "COALESCE(excluded.last_activity, last_activity))",
+            rows
+        )
+
+        # Sumários = soma das instâncias do dia
+        self.conn.execute(
+            "INSERT INTO daily_activity_summary "
+            "(hostname, username, date, total_active_seconds, total_inactive_seconds, first_activity, last_activity) "
+            "SELECT hostname, username, date, SUM(active_seconds), SUM(inactive_seconds), "
+            "MIN(first_activity), MAX(last_activity) FROM daily_rollup_instances "
+            "WHERE hostname = ? AND username = ? AND date = ? AND executable = '' "
+            "GROUP BY hostname, username, date "
+            "ON CONFLICT (hostname, username, date) DO UPDATE SET "
+            "total_active_seconds = excluded.total_active_seconds, "
+            "total_inactive_seconds = excluded.total_inactive_seconds, "
+            "first_activity = excluded.first_activity, last_activity = excluded.last_activity",
+            key
+        )
+        self.conn.executemany(
+            "INSERT INTO daily_app_summary "
+            "(hostname, username, date, executable, active_seconds, inactive_seconds, activations, events) "
+            "SELECT hostname, username, date, executable, SUM(active_seconds), SUM(inactive_seconds), "
+            "SUM(activations), SUM(events) FROM daily_rollup_instances "
+            "WHERE hostname = ? AND username = ? AND date = ? AND executable = ? "
+            "GROUP BY hostname, username, date, executable "
+            "ON CONFLICT (hostname, username, date, executable) DO UPDATE SET "
+            "active_seconds = excluded.active_seconds, inactive_seconds = excluded.inactive_seconds, "
+            "activations = excluded.activations, events = excluded.events",
+            [key + (app['executable'],) for app in apps]
+        )
+        return len(apps)
+
+    def save_agent_health(self, data):
+        """Última amostra de saúde do agent, como applyAgentHealth() do PHP"""
+        validate_required(data, ['hostname', 'username', 'timestamp'])
+        columns = ('hostname', 'username', 'reported_at') + HEALTH_FIELDS + ('metrics_json',)
+        metrics = data.get('metrics')
+        self.conn.execute(
+            f"INSERT INTO agent_health ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            "ON CONFLICT (hostname, username) DO UPDATE SET "
+            + ', '.join(f"{column} = excluded.{column}" for column in columns[2:]),
+            (data['hostname'], data['username'], data['timestamp'])
+            + tuple(data.get(field) for field in HEALTH_FIELDS)
+            + (json.dumps(metrics) if metrics is not None else None,)
+        )
+
+    def list_agent_health(self, sort='loop_lag', limit=100):
+        """Frota ordenada pelo indicador (piores primeiro)"""
+        column = HEALTH_SORT_COLUMNS.get(sort, 'loop_lag_p95_ms')
+        rows = self.conn.execute(
+            f"SELECT hostname, username, reported_at, {', '.join(HEALTH_FIELDS)} FROM agent_health "
+            f"ORDER BY {column} DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, table):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def handle_batch(store, payload):
+    """Processa POST /api/batch e devolve (status, corpo)
+
+    Cada evento recebe um resultado próprio; a falha de um evento não
+    impede a gravação dos demais. Checkpoints (window_activity_update)
+    resolvem o ID pelo ``ref`` quando o insert está no mesmo lote e viram
+    insert quando o registro original não existe.
+    """
+    events = payload.get('events') if isinstance(payload, dict) else None
+    if not isinstance(events, list):
+        return 400, {'success': False, 'message': 'Campos obrigatórios ausentes',
+                     'missing_fields': ['events']}
+
+    # hostname/username do envelope valem para todos os eventos
+    defaults = {key: payload[key] for key in ('hostname', 'username') if payload.get(key)}
+
+    inserted_ids = {}
+    results = []
+    with store.lock, store.conn:
+        for event in events:
+            event_id = event.get('id')
+            data = event.get('data')
+            if isinstance(data, dict):
+                data = {**defaults, **data}
+            result = _handle_event(store, event.get('type'), data, inserted_ids)
+            result['id'] = event_id
+
+            record_id = (result.get('data') or {}).get('id')
+            if result['success'] and record_id is not None:
+                if event.get('type') == 'window_activity' and event_id is not None:
+                    inserted_ids[event_id] = record_id
+                elif event.get('type') == 'window_activity_update' and data.get('ref'):
+                    inserted_ids[data['ref']] = record_id
+            results.append(result)
+
+    return 200, {'success': True, 'results': results}
+
+
+def _result(success, status, message, data=None):
+    result = {'success': success, 'status': status, 'message': message}
+    if data is not None:
+        result['data'] = data
+    return result
+
+
+def _handle_event(store, event_type, data, inserted_ids):
+    if not isinstance(data, dict):
+        return _result(False, 400, 'Tipo de evento desconhecido')
+
+    try:
+        if event_type == 'window_activity':
+            return _result(True, 201, 'Atividade registrada com sucesso',
+                           {'id': store.create_window_activity(data)})
+
+        if event_type == 'window_activity_update':
+            activity_id = data.get('activity_id') or inserted_ids.get(data.get('ref'))
+            if activity_id and store.update_window_activity(activity_id, data):
+                return _result(True, 200, 'Atividade atualizada com sucesso', {'id': activity_id})
+            return _result(True, 201, 'Atividade registrada com sucesso',
+                           {'id': store.create_window_activity(data)})
+
+        if event_type == 'mouse_activity':
+            store.save_mouse_activity(data)
+            return _result(True, 200, 'Mouse activity atualizada')
+
+        if event_type == 'windows_snapshot':
+            return _result(True, 201, 'Snapshot salvo com sucesso', store.save_windows_snapshot(data))
+
+        if event_type == 'activity_period':
+            period_id, updated = store.save_activity_period(data)
+            return _result(True, 200 if updated else 201, 'Período registrado com sucesso',
+                           {'id': period_id, 'updated': updated})
+
+        if event_type == 'daily_rollup':
+            return _result(True, 200, 'Rollup diário atualizado', {'apps': store.save_daily_rollup(data)})
+
+        if event_type == 'agent_health':
+            store.save_agent_health(data)
+            return _result(True, 200, 'Saúde do agent atualizada')
+
+    except BadRequest as e:
+        return _result(False, 400, f"{e}: {', '.join(e.missing_fields)}")
+    except sqlite3.Error as e:
+        return _result(False, 500, f"Erro ao gravar evento: {e}")
+
+    return _result(False, 400, 'Tipo de evento desconhecido')
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Roteador HTTP equivalente ao src/index.php (apenas rotas de ingestão)"""
+
+    store = None
+    wire = None  # WireDecoder (corpos em MessagePack), se o msgpack estiver instalado
+    agent_config = {}  # Dicas de taxa para os agents (ver agent/hints.py)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    def _read_json(self):
+        """Corpo em JSON ou MessagePack (Content-Type), com ou sem gzip"""
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if 'gzip' in (self.headers.get('Content-Encoding') or ''):
+            body = gzip.decompress(body)
+        if not body:
+            return {}
+        if wire_decoder.CONTENT_TYPE in (self.headers.get('Content-Type') or ''):
+            if self.wire is None:
+                raise UnsupportedMediaType()
+            return self.wire.decode(body)
+        return json.loads(body)
+
+    def _read_payload(self):
+        """Lê o corpo ou responde o erro (400/409/415); retorna None se já respondeu"""
+        try:
+            return self._read_json()
+        except UnsupportedMediaType:
+            self._send_json(415, {'success': False, 'message': 'Formato não suportado'})
+        except wire_decoder.WireResync as e:
+            self._send_json(409, {'success': False, 'message': str(e), 'resync_strings': True})
+        except ValueError:
+            self._send_json(400, {'success': False, 'message': 'JSON inválido'})
+        return None
+
+    def _send_json(self, status, body):
+        raw = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        # Formatos aceitos no corpo (negociação do formato binário)
+        if self.wire is not None:
+            self.send_header('Accept-Post', f"{wire_decoder.CONTENT_TYPE}, application/json")
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip('/')
+        if path == '/api/health':
+            self._send_json(200, {'success': True, 'status': 'healthy'})
+        elif path == '/api/agent-config':
+            self._send_json(200, {'success': True, 'agent_config': self.agent_config})
+        elif path == '/api/agent-health':
+            params = parse_qs(urlparse(self.path).query)
+            sort = params.get('sort', ['loop_lag'])[0]
+            limit = max(1, min(1000, int(params.get('limit', ['100'])[0] or 100)))
+            with self.store.lock:
+                agents = self.store.list_agent_health(sort, limit)
+            self._send_json(200, {'success': True, 'data': agents,
+                                  'sort': HEALTH_SORT_COLUMNS.get(sort, 'loop_lag_p95_ms')})
+        else:
+            self._send_json(404, {'success': False, 'message': 'Endpoint não encontrado'})
+
+    def do_POST(self):
+        payload = self._read_payload()
+        if payload is None:
+            return
+
+        path = self.path.rstrip('/')
+        if path == '/api/batch':
+            status, body = handle_batch(self.store, payload)
+            if self.agent_config:
+                body['agent_config'] = self.agent_config
+            self._send_json(status, body)
+            return
+
+        single_routes = {
+            '/api/window-activity': 'window_activity',
+            '/api/mouse-activity': 'mouse_activity',
+            '/api/windows-snapshot': 'windows_snapshot',
+            '/api/activity-periods': 'activity_period',
+            '/api/daily-rollup': 'daily_rollup',
+            '/api/agent-health': 'agent_health',
+        }
+        if path in single_routes:
+            self._send_single(single_routes[path], payload)
+        else:
+            self._send_json(404, {'success': False, 'message': 'Endpoint não encontrado'})
+
+    def do_PUT(self):
+        match = re.match(r'^/api/window-activity/(\d+)$', self.path.rstrip('/'))
+        if not match:
+            self._send_json(404, {'success': False, 'message': 'Endpoint não encontrado'})
+            return
+        payload = self._read_payload()
+        if payload is None:
+            return
+
+        with self.store.lock, self.store.conn:
+            found = self.store.update_window_activity(int(match.group(1)), payload)
+        if found:
+            self._send_json(200, {'success': True, 'message': 'Atividade atualizada com sucesso'})
+        else:
+            self._send_json(404, {'success': False, 'message': 'Atividade não encontrada'})
+
+    def _send_single(self, event_type, payload):
+        with self.store.lock, self.store.conn:
+            result = _handle_event(self.store, event_type, payload, {})
+        body = {'success': result['success'], 'message': result['message']}
+        if 'data' in result:
+            body['data'] = result['data']
+        self._send_json(result['status'], body)
+
+
+def create_server(host='127.0.0.1', port=8090, db_path=':memory:', agent_config=None):
+    """Cria o servidor HTTP (porta 0 escolhe uma porta livre).
+
+    ``agent_config``: dicas de taxa devolvidas aos agents; pode ser trocado
+    com o servidor rodando em ``server.RequestHandlerClass.agent_config``.
+    """
+    handler = type('BoundStandInHandler', (StandInHandler,), {
+        'store': StandInStore(db_path),
+        'wire': wire_decoder.WireDecoder() if wire_decoder.available() else None,
+        'agent_config': dict(agent_config or {}),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in local da API do pcmon')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--db', default=':memory:', help='Arquivo SQLite (padrão: memória)')
+    parser.add_argument('--agent-config', type=json.loads, default=None,
+                        help='Dicas de taxa para os agents, em JSON (ex.: \'{"pause_seconds": 60}\')')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = create_server(args.host, args.port, args.db, args.agent_config)
+    logging.info(f"Stand-in escutando em http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
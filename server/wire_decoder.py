@@ -0,0 +1,81 @@
+"""
+Wire Decoder - Decoder do formato application/x-pcmon-msgpack (ver agent/wire.py)
+
+Mantém o dicionário de strings de cada sessão do agent em memória. Se a
+sessão não é conhecida ou a base não confere (servidor reiniciado, envio
+perdido), ``decode`` lança ``WireResync`` e o servidor responde 409 para o
+agent recomeçar o dicionário.
+"""
+import threading
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:  # Sem msgpack o stand-in aceita só JSON (e não anuncia o formato)
+    msgpack = None
+
+CONTENT_TYPE = 'application/x-pcmon-msgpack'
+STRING_REF = 1
+
+
+class WireResync(Exception):
+    """Dicionário da sessão ausente ou fora de sequência"""
+
+
+def available():
+    return msgpack is not None
+
+
+class WireDecoder:
+    """Dicionários por sessão (os ``max_sessions`` mais recentes)"""
+
+    def __init__(self, max_sessions=1000):
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, body):
+        table = []
+
+        def ext_hook(code, data):
+            if code != STRING_REF:
+                return msgpack.ExtType(code, data)
+            index = int.from_bytes(data, 'big')
+            if index >= len(table):
+                raise ValueError(f"Referência inválida: {index}")
+            return table[index]
+
+        unpacker = msgpack.Unpacker(raw=False, ext_hook=ext_hook)
+        unpacker.feed(body)
+        try:
+            header = unpacker.unpack()
+            session, base, new_strings = header['s'], header['b'], header.get('d') or []
+        except (msgpack.OutOfData, KeyError, TypeError) as e:
+            raise ValueError(f"Cabeçalho inválido: {e}")
+
+        with self._lock:
+            strings = self.sessions.get(session)
+        if strings is None:
+            if base != 0:
+                raise WireResync(f"Sessão desconhecida: {session}")
+            strings = []
+        elif len(strings) != base:
+            # Reenvio de uma requisição já aplicada (resposta perdida): mesmas strings
+            if strings[base:] != list(new_strings):
+                raise WireResync(f"Sessão {session} com {len(strings)} strings, base {base}")
+            strings = strings[:base]
+
+        # O dicionário da sessão só é atualizado se o payload for válido
+        table.extend(strings)
+        table.extend(new_strings)
+        try:
+            payload = unpacker.unpack()
+        except msgpack.OutOfData:
+            raise ValueError("Payload ausente")
+
+        with self._lock:
+            self.sessions[session] = table
+            self.sessions.move_to_end(session)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return payload
@@ -1,5 +1,60 @@
 <?php
 
+// Gravar período: checkpoint (UPDATE) se o último período do usuário é do
+// mesmo tipo, senão um período novo. Retorna ['id' => ..., 'updated' => bool]
+function applyActivityPeriod($db, $data) {
+    $sql = "SELECT id, period_type 
+            FROM activity_periods 
+            WHERE hostname = :hostname 
+            AND username = :username 
+            ORDER BY start_time DESC 
+            LIMIT 1";
+    
+    $stmt = $db->prepare($sql);
+    $stmt->execute([
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username']
+    ]);
+    
+    $lastPeriod = $stmt->fetch(PDO::FETCH_ASSOC);
+    
+    if ($lastPeriod && $lastPeriod['period_type'] === $data['period_type']) {
+        $sql = "UPDATE activity_periods 
+                SET end_time = :end_time,
+                    duration_seconds = :duration_seconds,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = :id";
+        
+        $stmt = $db->prepare($sql);
+        $stmt->execute([
+            ':id' => $lastPeriod['id'],
+            ':end_time' => $data['end_time'],
+            ':duration_seconds' => $data['duration_seconds']
+        ]);
+        
+        return ['id' => (int)$lastPeriod['id'], 'updated' => true];
+    }
+    
+    // Período novo ou mudança de tipo
+    $id = reserveIds($db, 'activity_periods');
+    $sql = "INSERT INTO activity_periods 
+            (id, hostname, username, period_type, start_time, end_time, duration_seconds) 
+            VALUES (:id, :hostname, :username, :period_type, :start_time, :end_time, :duration_seconds)";
+    
+    $stmt = $db->prepare($sql);
+    $stmt->execute([
+        ':id' => $id,
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username'],
+        ':period_type' => $data['period_type'],
+        ':start_time' => $data['start_time'],
+        ':end_time' => $data['end_time'],
+        ':duration_seconds' => $data['duration_seconds']
+    ]);
+    
+    return ['id' => $id ?? (int)$db->lastInsertId(), 'updated' => false];
+}
+
 // Registrar período de atividade/inatividade
 function saveActivityPeriod($db, $data) {
     $required = ['hostname', 'username', 'period_type', 'start_time', 'end_time', 'duration_seconds'];
@@ -15,74 +70,24 @@ function saveActivityPeriod($db, $data) {
     }
     
     try {
-        // Verifica se existe período aberto do mesmo tipo para este usuário
-        $sql = "SELECT id, start_time, period_type 
-                FROM activity_periods 
-                WHERE hostname = :hostname 
-                AND username = :username 
-                ORDER BY start_time DESC 
-                LIMIT 1";
-        
-        $stmt = $db->prepare($sql);
-        $stmt->execute([
-            ':hostname' => $data['hostname'],
-            ':username' => $data['username']
-        ]);
+        $result = applyActivityPeriod($db, $data);
         
-        $lastPeriod = $stmt->fetch(PDO::FETCH_ASSOC);
-        
-        // Se existe período anterior do MESMO tipo, faz UPDATE (checkpoint)
-        if ($lastPeriod && $lastPeriod['period_type'] === $data['period_type']) {
-            $sql = "UPDATE activity_periods 
-                    SET end_time = :end_time,
-                        duration_seconds = :duration_seconds,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = :id";
-            
-            $stmt = $db->prepare($sql);
-            $stmt->execute([
-                ':id' => $lastPeriod['id'],
-                ':end_time' => $data['end_time'],
-                ':duration_seconds' => $data['duration_seconds']
-            ]);
-            
-            // Atualizar sumário diário (incremental)
-            updateDailySummary($db, $data, $lastPeriod['start_time']);
-            
+        if ($result['updated']) {
             jsonResponse([
                 'success' => true,
                 'message' => 'Período atualizado (checkpoint)',
-                'id' => $lastPeriod['id'],
+                'id' => $result['id'],
                 'updated' => true
             ], 200);
-            
-        } else {
-            // Período novo ou mudança de tipo - faz INSERT
-            $sql = "INSERT INTO activity_periods 
-                    (hostname, username, period_type, start_time, end_time, duration_seconds) 
-                    VALUES (:hostname, :username, :period_type, :start_time, :end_time, :duration_seconds)";
-            
-            $stmt = $db->prepare($sql);
-            $stmt->execute([
-                ':hostname' => $data['hostname'],
-                ':username' => $data['username'],
-                ':period_type' => $data['period_type'],
-                ':start_time' => $data['start_time'],
-                ':end_time' => $data['end_time'],
-                ':duration_seconds' => $data['duration_seconds']
-            ]);
-            
-            // Atualizar sumário diário
-            updateDailySummary($db, $data, $data['start_time']);
-            
-            jsonResponse([
-                'success' => true,
-                'message' => 'Período registrado com sucesso',
-                'id' => $db->lastInsertId(),
-                'updated' => false
-            ], 201);
         }
         
+        jsonResponse([
+            'success' => true,
+            'message' => 'Período registrado com sucesso',
+            'id' => $result['id'],
+            'updated' => false
+        ], 201);
+        
     } catch (PDOException $e) {
         error_log("Erro ao salvar período: " . $e->getMessage());
         jsonResponse([
@@ -93,39 +98,6 @@ function saveActivityPeriod($db, $data) {
     }
 }
 
-// Atualizar sumário diário
-function updateDailySummary($db, $data, $startTime) {
-    try {
-        $date = date('Y-m-d', strtotime($startTime));
-        
-        // Apenas registra tempo inativo, não mais tempo ativo
-        $sql = "INSERT INTO daily_activity_summary 
-                (hostname, username, date, total_active_seconds, total_inactive_seconds, first_activity, last_activity) 
-                VALUES (:hostname, :username, :date, 0, :duration, :start_time, :end_time)
-                ON DUPLICATE KEY UPDATE 
-                    total_inactive_seconds = total_inactive_seconds + :duration2,
-                    first_activity = LEAST(COALESCE(first_activity, :start_time2), :start_time2),
-                    last_activity = GREATEST(COALESCE(last_activity, :end_time2), :end_time2),
-                    updated_at = CURRENT_TIMESTAMP";
-        
-        $stmt = $db->prepare($sql);
-        $stmt->execute([
-            ':hostname' => $data['hostname'],
-            ':username' => $data['username'],
-            ':date' => $date,
-            ':duration' => $data['duration_seconds'],
-            ':duration2' => $data['duration_seconds'],
-            ':start_time' => $startTime,
-            ':start_time2' => $startTime,
-            ':end_time' => $data['end_time'],
-            ':end_time2' => $data['end_time']
-        ]);
-        
-    } catch (PDOException $e) {
-        error_log("Erro ao atualizar sumário diário: " . $e->getMessage());
-    }
-}
-
 // Obter estatísticas de atividade/inatividade
 function getActivityStatistics($db, $params) {
     try {
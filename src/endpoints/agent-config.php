@@ -0,0 +1,54 @@
+<?php
+
+/**
+ * Configuração remota dos agents (dicas de taxa)
+ *
+ * Com o servidor sobrecarregado, o operador reduz a carga da frota pelo
+ * .env, sem redistribuir os agents. As dicas são devolvidas em
+ * GET /api/agent-config (consultado periodicamente pelos agents) e no campo
+ * "agent_config" das respostas de POST /api/batch:
+ *
+ *   AGENT_PAUSE_SECONDS=120                   nenhum envio antes de N segundos
+ *   AGENT_INTERVAL_MULTIPLIERS={"windows_snapshot": 3, "*": 2}
+ *   AGENT_MAX_BATCH_SIZE=100                  eventos por lote
+ *   AGENT_CONFIG_INTERVAL=900                 intervalo da consulta (segundos)
+ *
+ * Fluxos aceitos nos multiplicadores: windows_snapshot, mouse_activity,
+ * checkpoint, daily_rollup e batch ("*" vale para os não listados). Os
+ * agents limitam os valores (ver agent/hints.py).
+ */
+
+// Montar as dicas configuradas (array vazio = agents no padrão)
+function getAgentHints() {
+    $hints = [];
+
+    $pause = (int)(getenv('AGENT_PAUSE_SECONDS') ?: 0);
+    if ($pause > 0) {
+        $hints['pause_seconds'] = $pause;
+    }
+
+    $multipliers = json_decode(getenv('AGENT_INTERVAL_MULTIPLIERS') ?: '', true);
+    if (is_array($multipliers) && !empty($multipliers)) {
+        $hints['interval_multipliers'] = $multipliers;
+    }
+
+    $maxBatchSize = (int)(getenv('AGENT_MAX_BATCH_SIZE') ?: 0);
+    if ($maxBatchSize > 0) {
+        $hints['max_batch_size'] = $maxBatchSize;
+    }
+
+    $configInterval = (int)(getenv('AGENT_CONFIG_INTERVAL') ?: 0);
+    if ($configInterval > 0) {
+        $hints['config_interval'] = $configInterval;
+    }
+
+    return $hints;
+}
+
+// Retornar as dicas para o agent
+function getAgentConfig() {
+    jsonResponse([
+        'success' => true,
+        'agent_config' => (object)getAgentHints()
+    ]);
+}
@@ -0,0 +1,172 @@
+<?php
+
+/**
+ * Saúde dos agents (heartbeat)
+ *
+ * Com menos frequência que os demais eventos (heartbeat_interval, 15 min por
+ * padrão), o agent envia um resumo das próprias métricas junto com o lote:
+ *
+ *   { "hostname": "...", "username": "...", "timestamp": "2026-01-28 10:00:00",
+ *     "uptime_seconds": 3600, "rss_mb": 38.2, "cpu_percent": 0.4,
+ *     "loop_lag_p95_ms": 2.5, "loop_lag_max_ms": 40.1,
+ *     "enumerate_p95_ms": 5, "send_p95_ms": 50,
+ *     "requests": 120, "failures": 0, "queue_pending": 3,
+ *     "metrics": { "stages": {...}, "endpoints": {...}, "queue": {...} } }
+ *
+ * Fica só a última amostra de cada computador/usuário. GET /api/agent-health
+ * lista a frota ordenada pelo indicador escolhido, para achar as máquinas lentas.
+ */
+
+// Gravar a última amostra de saúde do agent
+function applyAgentHealth($db, $data) {
+    $sql = "INSERT INTO agent_health
+            (hostname, username, reported_at, uptime_seconds, rss_mb, cpu_percent,
+             loop_lag_p95_ms, loop_lag_max_ms, enumerate_p95_ms, send_p95_ms,
+             requests, failures, queue_pending, metrics_json)
+            VALUES (:hostname, :username, :reported_at, :uptime, :rss_mb, :cpu_percent,
+                    :lag_p95, :lag_max, :enumerate_p95, :send_p95,
+                    :requests, :failures, :queue_pending, :metrics_json)
+            ON DUPLICATE KEY UPDATE
+                reported_at = VALUES(reported_at),
+                uptime_seconds = VALUES(uptime_seconds),
+                rss_mb = VALUES(rss_mb),
+                cpu_percent = VALUES(cpu_percent),
+                loop_lag_p95_ms = VALUES(loop_lag_p95_ms),
+                loop_lag_max_ms = VALUES(loop_lag_max_ms),
+                enumerate_p95_ms = VALUES(enumerate_p95_ms),
+                send_p95_ms = VALUES(send_p95_ms),
+                requests = VALUES(requests),
+                failures = VALUES(failures),
+                queue_pending = VALUES(queue_pending),
+                metrics_json = VALUES(metrics_json)";
+
+    $stmt = $db->prepare($sql);
+    $stmt->execute([
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username'],
+        ':reported_at' => $data['timestamp'],
+        ':uptime' => isset($data['uptime_seconds']) ? (int)$data['uptime_seconds'] : null,
+        ':rss_mb' => $data['rss_mb'] ?? null,
+        ':cpu_percent' => $data['cpu_percent'] ?? null,
+        ':lag_p95' => $data['loop_lag_p95_ms'] ?? null,
+        ':lag_max' => $data['loop_lag_max_ms'] ?? null,
+        ':enumerate_p95' => $data['enumerate_p95_ms'] ?? null,
+        ':send_p95' => $data['send_p95_ms'] ?? null,
+        ':requests' => isset($data['requests']) ? (int)$data['requests'] : null,
+        ':failures' => isset($data['failures']) ? (int)$data['failures'] : null,
+        ':queue_pending' => isset($data['queue_pending']) ? (int)$data['queue_pending'] : null,
+        ':metrics_json' => isset($data['metrics']) ? json_encode($data['metrics']) : null
+    ]);
+}
+
+// Salvar heartbeat (POST /api/agent-health)
+function saveAgentHealth($db, $data) {
+    $required = ['hostname', 'username', 'timestamp'];
+    $missing = validateRequired($data, $required);
+
+    if (!empty($missing)) {
+        jsonResponse([
+            'success' => false,
+            'message' => 'Campos obrigatórios ausentes',
+            'missing_fields' => $missing
+        ], 400);
+    }
+
+    try {
+        applyAgentHealth($db, $data);
+
+        jsonResponse([
+            'success' => true,
+            'message' => 'Saúde do agent atualizada'
+        ], 200);
+
+    } catch (PDOException $e) {
+        error_log("Erro ao salvar saúde do agent: " . $e->getMessage());
+        jsonResponse([
+            'success' => false,
+            'message' => 'Erro ao salvar saúde do agent',
+            'error' => $e->getMessage()
+        ], 500);
+    }
+}
+
+// Listar a saúde da frota (GET /api/agent-health)
+function getAgentHealth($db, $params) {
+    // Ordenação: os piores primeiro no indicador escolhido
+    $sortColumns = [
+        'loop_lag' => 'loop_lag_p95_ms',
+        'enumerate' => 'enumerate_p95_ms',
+        'send' => 'send_p95_ms',
+        'rss' => 'rss_mb',
+        'cpu' => 'cpu_percent',
+        'failures' => 'failures',
+        'queue' => 'queue_pending',
+        'reported_at' => 'reported_at'
+    ];
+
+    try {
+        $bindings = [];
+        $where = [];
+
+        if (!empty($params['hostname'])) {
+            $where[] = "hostname = :hostname";
+            $bindings[':hostname'] = $params['hostname'];
+        }
+
+        if (!empty($params['username'])) {
+            $where[] = "username = :username";
+            $bindings[':username'] = $params['username'];
+        }
+
+        // Só agents que reportaram nos últimos N minutos
+        if (!empty($params['minutes'])) {
+            $where[] = "reported_at >= DATE_SUB(NOW(), INTERVAL :minutes MINUTE)";
+            $bindings[':minutes'] = (int)$params['minutes'];
+        }
+
+        $whereClause = !empty($where) ? 'WHERE ' . implode(' AND ', $where) : '';
+        $sort = $sortColumns[$params['sort'] ?? 'loop_lag'] ?? 'loop_lag_p95_ms';
+        $limit = isset($params['limit']) ? max(1, min(1000, (int)$params['limit'])) : 100;
+        $withDetails = isset($params['details']) && $params['details'] === 'true';
+
+        $columns = "hostname, username, reported_at, uptime_seconds, rss_mb, cpu_percent,
+                    loop_lag_p95_ms, loop_lag_max_ms, enumerate_p95_ms, send_p95_ms,
+                    requests, failures, queue_pending" . ($withDetails ? ", metrics_json" : "");
+
+        $sql = "SELECT $columns
+                FROM agent_health
+                $whereClause
+                ORDER BY $sort DESC
+                LIMIT :limit";
+
+        $stmt = $db->prepare($sql);
+        foreach ($bindings as $key => $value) {
+            $stmt->bindValue($key, $value);
+        }
+        $stmt->bindValue(':limit', $limit, PDO::PARAM_INT);
+        $stmt->execute();
+        $agents = $stmt->fetchAll();
+
+        if ($withDetails) {
+            foreach ($agents as &$agent) {
+                $agent['metrics'] = json_decode($agent['metrics_json'] ?? 'null', true);
+                unset($agent['metrics_json']);
+            }
+            unset($agent);
+        }
+
+        jsonResponse([
+            'success' => true,
+            'data' => $agents,
+            'sort' => $sort
+        ]);
+
+    } catch (PDOException $e) {
+        error_log("Erro ao listar saúde dos agents: " . $e->getMessage());
+        jsonResponse([
+            'success' => false,
+            'message' => 'Erro ao listar saúde dos agents',
+            'error' => $e->getMessage()
+        ], 500);
+    }
+}
@@ -0,0 +1,229 @@
+<?php
+
+/**
+ * Endpoint de ingestão em lote do agent
+ *
+ * Recebe vários eventos em uma única requisição e devolve um resultado por evento:
+ *
+ *   { "session_id": "...", "hostname": "...", "username": "...",
+ *     "events": [ { "id": "...", "type": "...", "data": { ... } } ] }
+ *
+ * Os payloads de "data" são os mesmos das rotas individuais; hostname e
+ * username podem vir apenas no envelope do lote.
+ */
+
+require_once __DIR__ . '/activity-periods.php';
+require_once __DIR__ . '/agent-config.php';
+require_once __DIR__ . '/agent-health.php';
+require_once __DIR__ . '/daily-rollup.php';
+require_once __DIR__ . '/mouse-activity.php';
+require_once __DIR__ . '/window-activity.php';
+require_once __DIR__ . '/windows-snapshot.php';
+
+// Processar lote de eventos
+function saveBatch($db, $input) {
+    if (!isset($input['events']) || !is_array($input['events'])) {
+        jsonResponse([
+            'success' => false,
+            'message' => 'Campos obrigatórios ausentes',
+            'missing_fields' => ['events']
+        ], 400);
+    }
+
+    $handlers = [
+        'window_activity' => 'batchCreateWindowActivity',
+        'window_activity_update' => 'batchUpdateWindowActivity',
+        'mouse_activity' => 'batchSaveMouseActivity',
+        'windows_snapshot' => 'batchSaveWindowsSnapshot',
+        'activity_period' => 'batchSaveActivityPeriod',
+        'daily_rollup' => 'batchSaveDailyRollup',
+        'agent_health' => 'batchSaveAgentHealth'
+    ];
+
+    // IDs gerados neste lote (event_id do agent => id no banco)
+    $insertedIds = [];
+    $results = [];
+
+    foreach ($input['events'] as $event) {
+        $eventId = $event['id'] ?? null;
+        $type = $event['type'] ?? null;
+        $data = $event['data'] ?? [];
+
+        if (!isset($handlers[$type]) || !is_array($data)) {
+            $results[] = batchResult($eventId, false, 400, 'Tipo de evento desconhecido');
+            continue;
+        }
+
+        // hostname/username do envelope valem para todos os eventos
+        $data += array_filter([
+            'hostname' => $input['hostname'] ?? null,
+            'username' => $input['username'] ?? null
+        ]);
+
+        try {
+            $result = $handlers[$type]($db, $data, $insertedIds);
+        } catch (PDOException $e) {
+            error_log("Erro ao processar evento $type do lote: " . $e->getMessage());
+            $result = batchResult(null, false, 500, 'Erro ao gravar evento: ' . $e->getMessage());
+        }
+
+        $result['id'] = $eventId;
+        if ($result['success'] && isset($result['data']['id'])) {
+            if ($type === 'window_activity' && $eventId !== null) {
+                $insertedIds[$eventId] = $result['data']['id'];
+            } elseif ($type === 'window_activity_update' && isset($data['ref'])) {
+                $insertedIds[$data['ref']] = $result['data']['id'];
+            }
+        }
+        $results[] = $result;
+    }
+
+    $response = [
+        'success' => true,
+        'results' => $results
+    ];
+
+    // Dicas de taxa para o agent (backpressure), se configuradas
+    $hints = getAgentHints();
+    if (!empty($hints)) {
+        $response['agent_config'] = $hints;
+    }
+
+    jsonResponse($response, 200);
+}
+
+// Monta o resultado de um evento
+function batchResult($eventId, $success, $status, $message, $data = null) {
+    $result = [
+        'id' => $eventId,
+        'success' => $success,
+        'status' => $status,
+        'message' => $message
+    ];
+    if ($data !== null) {
+        $result['data'] = $data;
+    }
+    return $result;
+}
+
+// Campos obrigatórios ausentes em um evento
+function batchMissing($data, $required) {
+    $missing = validateRequired($data, $required);
+    if (empty($missing)) {
+        return null;
+    }
+    return batchResult(null, false, 400, 'Campos obrigatórios ausentes: ' . implode(', ', $missing));
+}
+
+// Nova atividade de janela (equivale a POST /api/window-activity)
+function batchCreateWindowActivity($db, $data, $insertedIds) {
+    $error = batchMissing($data, ['hostname', 'username', 'executable', 'pid', 'start_time']);
+    if ($error) {
+        return $error;
+    }
+
+    $activityId = insertWindowActivity($db, $data);
+
+    return batchResult(null, true, 201, 'Atividade registrada com sucesso', [
+        'id' => $activityId
+    ]);
+}
+
+// Checkpoint de atividade (equivale a PUT /api/window-activity/{id})
+// O ID vem em activity_id ou é resolvido pelo ref (event_id do insert no mesmo lote;
+// inserts de lotes anteriores o agent já resolve, inclusive depois de reiniciar, pelo spool).
+// Se não for possível resolver, a atividade é registrada como nova para não perder dados.
+function batchUpdateWindowActivity($db, $data, $insertedIds) {
+    $activityId = $data['activity_id'] ?? null;
+    if (!$activityId && isset($data['ref']) && isset($insertedIds[$data['ref']])) {
+        $activityId = $insertedIds[$data['ref']];
+    }
+
+    if ($activityId) {
+        $sql = "UPDATE activity_events
+                SET start_time = :start_time, end_time = :end_time, duration_seconds = :duration_seconds,
+                    state = COALESCE(:state, state), window_title = COALESCE(:window_title, window_title)
+                WHERE id = :id";
+        $stmt = $db->prepare($sql);
+        $stmt->execute([
+            ':id' => $activityId,
+            ':start_time' => $data['start_time'],
+            ':end_time' => $data['end_time'] ?? null,
+            ':duration_seconds' => $data['duration_seconds'] ?? null,
+            ':state' => activityState($data),
+            ':window_title' => $data['window_title'] ?? null
+        ]);
+
+        if ($stmt->rowCount() > 0 || batchActivityExists($db, $activityId)) {
+            return batchResult(null, true, 200, 'Atividade atualizada com sucesso', [
+                'id' => (int)$activityId
+            ]);
+        }
+    }
+
+    return batchCreateWindowActivity($db, $data, $insertedIds);
+}
+
+function batchActivityExists($db, $id) {
+    $stmt = $db->prepare("SELECT 1 FROM activity_events WHERE id = :id");
+    $stmt->execute([':id' => $id]);
+    return (bool)$stmt->fetchColumn();
+}
+
+// Atividade do mouse/teclado (equivale a POST /api/mouse-activity)
+function batchSaveMouseActivity($db, $data, $insertedIds) {
+    $error = batchMissing($data, ['hostname', 'username', 'last_activity']);
+    if ($error) {
+        return $error;
+    }
+
+    savePresence($db, $data);
+
+    return batchResult(null, true, 200, 'Mouse activity atualizada');
+}
+
+// Snapshot de janelas abertas, completo ou delta (ver applyWindowsSnapshot)
+function batchSaveWindowsSnapshot($db, $data, $insertedIds) {
+    return applyWindowsSnapshot($db, $data);
+}
+
+// Período de inatividade (equivale a POST /api/activity-periods)
+function batchSaveActivityPeriod($db, $data, $insertedIds) {
+    $error = batchMissing($data, ['hostname', 'username', 'period_type', 'start_time', 'end_time', 'duration_seconds']);
+    if ($error) {
+        return $error;
+    }
+
+    $result = applyActivityPeriod($db, $data);
+
+    if ($result['updated']) {
+        return batchResult(null, true, 200, 'Período atualizado (checkpoint)', $result);
+    }
+    return batchResult(null, true, 201, 'Período registrado com sucesso', $result);
+}
+
+// Totais diários do agent (equivale a POST /api/daily-rollup)
+function batchSaveDailyRollup($db, $data, $insertedIds) {
+    $error = batchMissing($data, ['hostname', 'username', 'date']);
+    if ($error) {
+        return $error;
+    }
+
+    $apps = applyDailyRollup($db, $data);
+
+    return batchResult(null, true, 200, 'Rollup diário atualizado', [
+        'apps' => $apps
+    ]);
+}
+
+// Heartbeat com as métricas do agent (equivale a POST /api/agent-health)
+function batchSaveAgentHealth($db, $data, $insertedIds) {
+    $error = batchMissing($data, ['hostname', 'username', 'timestamp']);
+    if ($error) {
+        return $error;
+    }
+
+    applyAgentHealth($db, $data);
+
+    return batchResult(null, true, 200, 'Saúde do agent atualizada');
+}
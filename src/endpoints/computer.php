@@ -45,9 +45,9 @@ function getComputers($db, $params) {
                     CASE 
                         -- Offline: sem snapshot de telas nos últimos 5 minutos
                         WHEN ws.timestamp IS NULL THEN 'offline'
-                        -- Ativo: input (mouse/teclado) < 60 segundos
-                        WHEN ma.last_activity IS NOT NULL AND TIMESTAMPDIFF(SECOND, ma.last_activity, NOW()) < 60 THEN 'active'
-                        -- Inativo: input > 60 segundos mas tem snapshot de telas
+                        -- Ativo: lease de presença ainda válido (renovado pelo agent)
+                        WHEN ma.active_until IS NOT NULL AND ma.active_until > NOW() THEN 'active'
+                        -- Inativo: lease expirado ou encerrado, mas tem snapshot de telas
                         ELSE 'inactive'
                     END as status,
                     COUNT(*) as total_activities
@@ -56,7 +56,7 @@ function getComputers($db, $params) {
                 LEFT JOIN windows_snapshot ws ON ae.hostname = ws.hostname AND ae.username = ws.username 
                     AND ws.timestamp > DATE_SUB(NOW(), INTERVAL 5 MINUTE)
                 $whereClause
-                GROUP BY ae.hostname, ae.username, ma.last_activity, ws.timestamp
+                GROUP BY ae.hostname, ae.username, ma.last_activity, ma.active_until, ws.timestamp
                 ORDER BY last_activity DESC";
         
         $stmt = $db->prepare($sql);
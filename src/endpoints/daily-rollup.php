@@ -0,0 +1,161 @@
+<?php
+
+/**
+ * Totais diários enviados pelo agent (rollups)
+ *
+ * O agent envia, por dia, os segundos acumulados com o usuário ativo e
+ * inativo, no total e por executável:
+ *
+ *   { "hostname": "...", "username": "...", "date": "2026-01-28",
+ *     "instance_id": "3f9c0a1b2d4e",
+ *     "total_active_seconds": 21000, "total_inactive_seconds": 3600,
+ *     "first_activity": "...", "last_activity": "...",
+ *     "apps": [ { "executable": "chrome.exe", "active_seconds": 9000,
+ *                 "inactive_seconds": 600, "activations": 42, "events": 57 } ] }
+ *
+ * activations conta as trocas para o executável; events, as atividades que
+ * o agent gravou em activity_events (o COUNT(*) usado nos relatórios).
+ *
+ * Os valores são absolutos (acumulados no dia) por instância do agent:
+ * instance_id muda quando o agent começa o dia sem o rollup.json (arquivo
+ * perdido, reinstalação). Dentro de uma instância a mesclagem usa GREATEST
+ * (reenvios e lotes repetidos do spool não duplicam tempo) em
+ * daily_rollup_instances; daily_activity_summary e daily_app_summary são a
+ * soma das instâncias do dia. Assim um total local menor (contagem que
+ * recomeçou) soma ao que já havia, em vez de ficar preso no maior valor.
+ * Agents sem instance_id e os totais antigos usam a instância ''.
+ * Este é o único ponto que grava os totais diários; os períodos de
+ * atividade (activity_periods) não mexem em daily_activity_summary.
+ */
+
+// Mesclar rollup em daily_rollup_instances e recalcular os sumários do dia
+function applyDailyRollup($db, $data) {
+    $apps = array_values(array_filter($data['apps'] ?? [], function ($app) {
+        return is_array($app) && !empty($app['executable']);
+    }));
+
+    // Um único INSERT com os totais do dia (executable '') e todos os aplicativos
+    $rows = ["(:hostname, :username, :date, :instance_id, '', :active, :inactive, 0, 0, :first_activity, :last_activity)"];
+    $bindings = [
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username'],
+        ':date' => $data['date'],
+        ':instance_id' => substr((string)($data['instance_id'] ?? ''), 0, 64),
+        ':active' => (int)($data['total_active_seconds'] ?? 0),
+        ':inactive' => (int)($data['total_inactive_seconds'] ?? 0),
+        ':first_activity' => $data['first_activity'] ?? null,
+        ':last_activity' => $data['last_activity'] ?? null
+    ];
+    foreach ($apps as $i => $app) {
+        $rows[] = "(:hostname, :username, :date, :instance_id, :exe$i, :active$i, :inactive$i, :activations$i, :events$i, NULL, NULL)";
+        $bindings[":exe$i"] = $app['executable'];
+        $bindings[":active$i"] = (int)($app['active_seconds'] ?? 0);
+        $bindings[":inactive$i"] = (int)($app['inactive_seconds'] ?? 0);
+        $bindings[":activations$i"] = (int)($app['activations'] ?? 0);
+        $bindings[":events$i"] = (int)($app['events'] ?? 0);
+    }
+
+    $sql = "INSERT INTO daily_rollup_instances
+            (hostname, username, date, instance_id, executable, active_seconds, inactive_seconds,
+             activations, events, first_activity, last_activity)
+            VALUES " . implode(', ', $rows) . "
+            ON DUPLICATE KEY UPDATE
+                active_seconds = GREATEST(active_seconds, VALUES(active_seconds)),
+                inactive_seconds = GREATEST(inactive_seconds, VALUES(inactive_seconds)),
+                activations = GREATEST(activations, VALUES(activations)),
+                events = GREATEST(events, VALUES(events)),
+                first_activity = LEAST(COALESCE(first_activity, VALUES(first_activity)), COALESCE(VALUES(first_activity), first_activity)),
+                last_activity = GREATEST(COALESCE(last_activity, VALUES(last_activity)), COALESCE(VALUES(last_activity), last_activity)),
+                updated_at = CURRENT_TIMESTAMP";
+
+    $stmt = $db->prepare($sql);
+    $stmt->execute($bindings);
+
+    $key = [
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username'],
+        ':date' => $data['date']
+    ];
+
+    // Totais do dia = soma das instâncias
+    $sql = "INSERT INTO daily_activity_summary
+            (hostname, username, date, total_active_seconds, total_inactive_seconds, first_activity, last_activity)
+            SELECT hostname, username, date, SUM(active_seconds), SUM(inactive_seconds),
+                   MIN(first_activity), MAX(last_activity)
+            FROM daily_rollup_instances
+            WHERE hostname = :hostname AND username = :username AND date = :date AND executable = ''
+            GROUP BY hostname, username, date
+            ON DUPLICATE KEY UPDATE
+                total_active_seconds = VALUES(total_active_seconds),
+                total_inactive_seconds = VALUES(total_inactive_seconds),
+                first_activity = VALUES(first_activity),
+                last_activity = VALUES(last_activity),
+                updated_at = CURRENT_TIMESTAMP";
+
+    $stmt = $db->prepare($sql);
+    $stmt->execute($key);
+
+    if (empty($apps)) {
+        return 0;
+    }
+
+    // Aplicativos enviados = soma das instâncias, em um único comando
+    $names = [];
+    $appBindings = $key;
+    foreach ($apps as $i => $app) {
+        $names[] = ":exe$i";
+        $appBindings[":exe$i"] = $app['executable'];
+    }
+
+    $sql = "INSERT INTO daily_app_summary
+            (hostname, username, date, executable, active_seconds, inactive_seconds, activations, events)
+            SELECT hostname, username, date, executable, SUM(active_seconds), SUM(inactive_seconds),
+                   SUM(activations), SUM(events)
+            FROM daily_rollup_instances
+            WHERE hostname = :hostname AND username = :username AND date = :date
+              AND executable IN (" . implode(', ', $names) . ")
+            GROUP BY hostname, username, date, executable
+            ON DUPLICATE KEY UPDATE
+                active_seconds = VALUES(active_seconds),
+                inactive_seconds = VALUES(inactive_seconds),
+                activations = VALUES(activations),
+                events = VALUES(events),
+                updated_at = CURRENT_TIMESTAMP";
+
+    $stmt = $db->prepare($sql);
+    $stmt->execute($appBindings);
+
+    return count($apps);
+}
+
+// Salvar rollup diário (POST /api/daily-rollup)
+function saveDailyRollup($db, $data) {
+    $required = ['hostname', 'username', 'date'];
+    $missing = validateRequired($data, $required);
+
+    if (!empty($missing)) {
+        jsonResponse([
+            'success' => false,
+            'message' => 'Campos obrigatórios ausentes',
+            'missing_fields' => $missing
+        ], 400);
+    }
+
+    try {
+        $apps = applyDailyRollup($db, $data);
+
+        jsonResponse([
+            'success' => true,
+            'message' => 'Rollup diário atualizado',
+            'apps' => $apps
+        ], 200);
+
+    } catch (PDOException $e) {
+        error_log("Erro ao salvar rollup diário: " . $e->getMessage());
+        jsonResponse([
+            'success' => false,
+            'message' => 'Erro ao salvar rollup diário',
+            'error' => $e->getMessage()
+        ], 500);
+    }
+}
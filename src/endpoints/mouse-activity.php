@@ -1,5 +1,33 @@
 <?php
 
+// Duração padrão do lease de agents antigos (sem active_until): mesmo limite de 60 s do status
+define('PRESENCE_DEFAULT_LEASE_SECONDS', 60);
+
+// Grava a presença: último input, estado e lease (ativo até active_until, salvo renovação)
+function savePresence($db, $data) {
+    $activeUntil = $data['active_until'] ?? date(
+        'Y-m-d H:i:s',
+        strtotime($data['last_activity']) + PRESENCE_DEFAULT_LEASE_SECONDS
+    );
+    
+    $sql = "INSERT INTO last_mouse_activity (hostname, username, last_activity, presence_state, active_until) 
+            VALUES (:hostname, :username, :last_activity, :presence_state, :active_until)
+            ON DUPLICATE KEY UPDATE 
+                last_activity = VALUES(last_activity),
+                presence_state = VALUES(presence_state),
+                active_until = VALUES(active_until),
+                updated_at = CURRENT_TIMESTAMP";
+    
+    $stmt = $db->prepare($sql);
+    $stmt->execute([
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username'],
+        ':last_activity' => $data['last_activity'],
+        ':presence_state' => $data['state'] ?? 'active',
+        ':active_until' => $activeUntil
+    ]);
+}
+
 // Salvar última atividade do mouse/teclado
 function saveMouseActivity($db, $data) {
     $required = ['hostname', 'username', 'last_activity'];
@@ -15,18 +43,7 @@ function saveMouseActivity($db, $data) {
     }
     
     try {
-        $sql = "INSERT INTO last_mouse_activity (hostname, username, last_activity) 
-                VALUES (:hostname, :username, :last_activity)
-                ON DUPLICATE KEY UPDATE 
-                    last_activity = VALUES(last_activity),
-                    updated_at = CURRENT_TIMESTAMP";
-        
-        $stmt = $db->prepare($sql);
-        $result = $stmt->execute([
-            ':hostname' => $data['hostname'],
-            ':username' => $data['username'],
-            ':last_activity' => $data['last_activity']
-        ]);
+        savePresence($db, $data);
         
         jsonResponse([
             'success' => true,
@@ -51,13 +68,14 @@ function getComputersActivityStatus($db) {
                     ma.hostname,
                     ma.username,
                     ma.last_activity,
+                    ma.active_until,
                     TIMESTAMPDIFF(SECOND, ma.last_activity, NOW()) as seconds_since_activity,
                     CASE 
                         -- Offline: sem snapshot de telas nos últimos 5 minutos
                         WHEN ws.timestamp IS NULL THEN 'offline'
-                        -- Ativo: input (mouse/teclado) < 60 segundos
-                        WHEN TIMESTAMPDIFF(SECOND, ma.last_activity, NOW()) < 60 THEN 'active'
-                        -- Inativo: input > 60 segundos mas tem snapshot de telas
+                        -- Ativo: lease de presença ainda válido (renovado pelo agent)
+                        WHEN ma.active_until > NOW() THEN 'active'
+                        -- Inativo: lease expirado ou encerrado, mas tem snapshot de telas
                         ELSE 'inactive'
                     END as status
                 FROM last_mouse_activity ma
@@ -90,13 +108,14 @@ function getComputerActivityStatus($db, $hostname, $username) {
                     ma.hostname,
                     ma.username,
                     ma.last_activity,
+                    ma.active_until,
                     TIMESTAMPDIFF(SECOND, ma.last_activity, NOW()) as seconds_since_activity,
                     CASE 
                         -- Offline: sem snapshot de telas nos últimos 5 minutos
                         WHEN ws.timestamp IS NULL THEN 'offline'
-                        -- Ativo: input (mouse/teclado) < 60 segundos
-                        WHEN TIMESTAMPDIFF(SECOND, ma.last_activity, NOW()) < 60 THEN 'active'
-                        -- Inativo: input > 60 segundos mas tem snapshot de telas
+                        -- Ativo: lease de presença ainda válido (renovado pelo agent)
+                        WHEN ma.active_until > NOW() THEN 'active'
+                        -- Inativo: lease expirado ou encerrado, mas tem snapshot de telas
                         ELSE 'inactive'
                     END as status
                 FROM last_mouse_activity ma
@@ -1,48 +1,106 @@
 <?php
 
-// Obter estatísticas diárias calculadas em tempo real
+// Obter estatísticas diárias (sumários pré-calculados pelos rollups do agent)
+// Dias sem rollup (agents antigos, histórico) são agregados de activity_events.
+// most_used_app e total_activities contam registros, como antes dos rollups;
+// most_used_app_by_time ordena pelo tempo em primeiro plano.
 function getDailyStats($db, $params) {
     try {
         $where = ['1=1'];
+        $eventWhere = ['1=1'];
         $bindings = [];
         
         if (isset($params['hostname'])) {
-            $where[] = "hostname = :hostname";
+            $where[] = "ds.hostname = :hostname";
+            $eventWhere[] = "ae.hostname = :ae_hostname";
             $bindings[':hostname'] = $params['hostname'];
+            $bindings[':ae_hostname'] = $params['hostname'];
         }
         
         if (isset($params['username'])) {
-            $where[] = "username = :username";
+            $where[] = "ds.username = :username";
+            $eventWhere[] = "ae.username = :ae_username";
             $bindings[':username'] = $params['username'];
+            $bindings[':ae_username'] = $params['username'];
         }
         
         if (isset($params['date'])) {
-            $where[] = "DATE(start_time) = :date";
+            $where[] = "ds.date = :date";
+            $eventWhere[] = "ae.start_time >= :ae_date AND ae.start_time < DATE_ADD(:ae_date_end, INTERVAL 1 DAY)";
             $bindings[':date'] = $params['date'];
+            $bindings[':ae_date'] = $params['date'];
+            $bindings[':ae_date_end'] = $params['date'];
         } else {
             // Por padrão, últimos 7 dias
-            $where[] = "start_time >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)";
+            $where[] = "ds.date >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)";
+            $eventWhere[] = "ae.start_time >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)";
         }
         
         $whereClause = 'WHERE ' . implode(' AND ', $where);
+        $eventWhereClause = 'WHERE ' . implode(' AND ', $eventWhere);
         
-        // Calcular estatísticas diretamente da tabela de atividades
+        // Uma linha por dia/usuário em daily_activity_summary; aplicativos em daily_app_summary
         $sql = "SELECT 
-                    DATE(start_time) as date,
-                    hostname,
-                    username,
-                    SUM(duration_seconds) as total_active_time_seconds,
-                    COUNT(DISTINCT executable) as total_applications,
-                    (SELECT executable FROM activity_events ae2 
-                     WHERE ae2.hostname = ae.hostname 
-                     AND ae2.username = ae.username 
+                    ds.date,
+                    ds.hostname,
+                    ds.username,
+                    ds.total_active_seconds as total_active_time_seconds,
+                    ds.total_inactive_seconds as total_inactive_time_seconds,
+                    ds.first_activity,
+                    ds.last_activity,
+                    (SELECT COUNT(*) FROM daily_app_summary das
+                     WHERE das.hostname = ds.hostname
+                     AND das.username = ds.username
+                     AND das.date = ds.date) as total_applications,
+                    (SELECT executable FROM daily_app_summary das
+                     WHERE das.hostname = ds.hostname
+                     AND das.username = ds.username
+                     AND das.date = ds.date
+                     ORDER BY das.events DESC
+                     LIMIT 1) as most_used_app,
+                    (SELECT executable FROM daily_app_summary das
+                     WHERE das.hostname = ds.hostname
+                     AND das.username = ds.username
+                     AND das.date = ds.date
+                     ORDER BY das.active_seconds + das.inactive_seconds DESC
+                     LIMIT 1) as most_used_app_by_time
+                FROM daily_activity_summary ds
+                $whereClause
+                
+                UNION ALL
+                
+                SELECT 
+                    DATE(ae.start_time) as date,
+                    ae.hostname,
+                    ae.username,
+                    SUM(CASE WHEN ae.state = 'inactive' THEN 0 ELSE ae.duration_seconds END) as total_active_time_seconds,
+                    SUM(CASE WHEN ae.state = 'inactive' THEN ae.duration_seconds ELSE 0 END) as total_inactive_time_seconds,
+                    MIN(ae.start_time) as first_activity,
+                    MAX(COALESCE(ae.end_time, ae.start_time)) as last_activity,
+                    COUNT(DISTINCT ae.executable) as total_applications,
+                    (SELECT executable FROM activity_events ae2
+                     WHERE ae2.hostname = ae.hostname
+                     AND ae2.username = ae.username
+                     AND DATE(ae2.start_time) = DATE(ae.start_time)
+                     GROUP BY executable
+                     ORDER BY COUNT(*) DESC
+                     LIMIT 1) as most_used_app,
+                    (SELECT executable FROM activity_events ae2
+                     WHERE ae2.hostname = ae.hostname
+                     AND ae2.username = ae.username
                      AND DATE(ae2.start_time) = DATE(ae.start_time)
-                     GROUP BY executable 
-                     ORDER BY COUNT(*) DESC 
-                     LIMIT 1) as most_used_app
+                     GROUP BY executable
+                     ORDER BY SUM(duration_seconds) DESC
+                     LIMIT 1) as most_used_app_by_time
                 FROM activity_events ae
-                $whereClause
-                GROUP BY DATE(start_time), hostname, username
+                $eventWhereClause
+                AND NOT EXISTS (
+                    SELECT 1 FROM daily_activity_summary ds
+                    WHERE ds.hostname = ae.hostname
+                    AND ds.username = ae.username
+                    AND ds.date = DATE(ae.start_time)
+                )
+                GROUP BY DATE(ae.start_time), ae.hostname, ae.username
                 ORDER BY date DESC";
         
         $stmt = $db->prepare($sql);
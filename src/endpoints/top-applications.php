@@ -1,6 +1,129 @@
 <?php
 
 function getTopApplications($db, $params) {
+    // Filtros por hora do dia só podem ser atendidos pelos eventos brutos;
+    // nos demais casos os totais vêm de daily_app_summary (uma linha por dia/app)
+    $timeFilters = ['startTime', 'endTime', 'ignoreTimeFrom', 'ignoreTimeTo'];
+    foreach ($timeFilters as $filter) {
+        if (!empty($params[$filter])) {
+            return getTopApplicationsFromEvents($db, $params);
+        }
+    }
+
+    try {
+        $bindings = [];
+        $where = [];
+        $eventWhere = [];
+        
+        // Filtros de data
+        if (isset($params['startDate']) && !empty($params['startDate'])) {
+            $where[] = "date >= :start_date";
+            $eventWhere[] = "ae.start_time >= :ae_start_date";
+            $bindings[':start_date'] = $params['startDate'];
+            $bindings[':ae_start_date'] = $params['startDate'];
+        }
+        
+        if (isset($params['endDate']) && !empty($params['endDate'])) {
+            $where[] = "date <= :end_date";
+            $eventWhere[] = "ae.start_time < DATE_ADD(:ae_end_date, INTERVAL 1 DAY)";
+            $bindings[':end_date'] = $params['endDate'];
+            $bindings[':ae_end_date'] = $params['endDate'];
+        }
+        
+        // Filtro de usuário
+        if (isset($params['username']) && !empty($params['username'])) {
+            $where[] = "username = :username";
+            $eventWhere[] = "ae.username = :ae_username";
+            $bindings[':username'] = $params['username'];
+            $bindings[':ae_username'] = $params['username'];
+        }
+        
+        // Filtro de hostname
+        if (isset($params['hostname']) && !empty($params['hostname'])) {
+            $where[] = "hostname = :hostname";
+            $eventWhere[] = "ae.hostname = :ae_hostname";
+            $bindings[':hostname'] = $params['hostname'];
+            $bindings[':ae_hostname'] = $params['hostname'];
+        }
+        
+        // Filtro de dias úteis (Segunda a Sexta)
+        if (isset($params['businessHours']) && $params['businessHours'] === 'true') {
+            $where[] = "WEEKDAY(date) < 5";
+            $eventWhere[] = "WEEKDAY(ae.start_time) < 5";
+        }
+        
+        $whereClause = !empty($where) ? 'WHERE ' . implode(' AND ', $where) : '';
+        // Dias sem rollup (agents antigos, histórico) vêm dos eventos brutos
+        $eventWhere[] = "NOT EXISTS (
+                    SELECT 1 FROM daily_app_summary das
+                    WHERE das.hostname = ae.hostname
+                    AND das.username = ae.username
+                    AND das.date = DATE(ae.start_time))";
+        $eventWhereClause = 'WHERE ' . implode(' AND ', $eventWhere);
+        
+        // Limite de resultados (padrão Top 5)
+        $limit = isset($params['limit']) ? (int)$params['limit'] : 5;
+        
+        // Tempo em primeiro plano (ativo + inativo), como na soma dos eventos;
+        // activity_count conta registros (COUNT(*) de activity_events), activations as trocas de app
+        $sql = "SELECT 
+                    executable,
+                    SUM(total_seconds) as total_seconds,
+                    SUM(active_seconds) as active_seconds,
+                    SUM(activity_count) as activity_count,
+                    SUM(activations) as activations
+                FROM (
+                    SELECT 
+                        executable,
+                        SUM(active_seconds + inactive_seconds) as total_seconds,
+                        SUM(active_seconds) as active_seconds,
+                        SUM(events) as activity_count,
+                        SUM(activations) as activations
+                    FROM daily_app_summary 
+                    $whereClause 
+                    GROUP BY executable
+                    
+                    UNION ALL
+                    
+                    SELECT 
+                        ae.executable,
+                        SUM(ae.duration_seconds) as total_seconds,
+                        SUM(CASE WHEN ae.state = 'inactive' THEN 0 ELSE ae.duration_seconds END) as active_seconds,
+                        COUNT(*) as activity_count,
+                        COUNT(*) as activations
+                    FROM activity_events ae
+                    $eventWhereClause
+                    GROUP BY ae.executable
+                ) apps
+                GROUP BY executable 
+                ORDER BY total_seconds DESC 
+                LIMIT :limit";
+        
+        $stmt = $db->prepare($sql);
+        foreach ($bindings as $key => $value) {
+            $stmt->bindValue($key, $value);
+        }
+        $stmt->bindValue(':limit', $limit, PDO::PARAM_INT);
+        $stmt->execute();
+        
+        $applications = $stmt->fetchAll();
+        
+        jsonResponse([
+            'success' => true,
+            'data' => $applications
+        ]);
+        
+    } catch (PDOException $e) {
+        jsonResponse([
+            'success' => false,
+            'message' => 'Erro ao buscar aplicativos',
+            'error' => $e->getMessage()
+        ], 500);
+    }
+}
+
+// Top aplicativos a partir de activity_events (filtros por hora do dia)
+function getTopApplicationsFromEvents($db, $params) {
     try {
         $bindings = [];
         $where = [];
@@ -61,7 +184,8 @@ function getTopApplications($db, $params) {
         $sql = "SELECT 
                     executable,
                     SUM(duration_seconds) as total_seconds,
-                    COUNT(*) as activity_count
+                    COUNT(*) as activity_count,
+                    COUNT(*) as activations
                 FROM activity_events 
                 $whereClause 
                 GROUP BY executable 
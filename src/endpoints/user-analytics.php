@@ -3,15 +3,68 @@
 // Listar todos os usuários únicos
 function getUsers($db, $params) {
     try {
+        // Totais a partir dos rollups diários (daily_app_summary / daily_activity_summary);
+        // dias sem rollup (agents antigos, histórico) vêm de activity_events.
+        // total_activities conta registros, como antes; total_activations, as trocas de app
         $sql = "SELECT 
-                    username,
-                    hostname,
-                    COUNT(*) as total_activities,
-                    SUM(duration_seconds) as total_time_seconds,
-                    MAX(start_time) as last_activity,
-                    MIN(start_time) as first_activity
-                FROM activity_events
-                GROUP BY username, hostname
+                    totals.username,
+                    totals.hostname,
+                    SUM(totals.total_activities) as total_activities,
+                    SUM(totals.total_activations) as total_activations,
+                    SUM(totals.total_time_seconds) as total_time_seconds,
+                    SUM(totals.inactive_time_seconds) as inactive_time_seconds,
+                    MAX(totals.last_activity) as last_activity,
+                    MIN(totals.first_activity) as first_activity
+                FROM (
+                    SELECT 
+                        apps.username,
+                        apps.hostname,
+                        apps.total_activities,
+                        apps.total_activations,
+                        apps.total_time_seconds,
+                        apps.inactive_time_seconds,
+                        COALESCE(days.last_activity, apps.last_date) as last_activity,
+                        COALESCE(days.first_activity, apps.first_date) as first_activity
+                    FROM (
+                        SELECT username, hostname,
+                               SUM(events) as total_activities,
+                               SUM(activations) as total_activations,
+                               SUM(active_seconds) as total_time_seconds,
+                               SUM(inactive_seconds) as inactive_time_seconds,
+                               MAX(date) as last_date,
+                               MIN(date) as first_date
+                        FROM daily_app_summary
+                        GROUP BY username, hostname
+                    ) apps
+                    LEFT JOIN (
+                        SELECT username, hostname,
+                               MAX(last_activity) as last_activity,
+                               MIN(first_activity) as first_activity
+                        FROM daily_activity_summary
+                        GROUP BY username, hostname
+                    ) days ON days.username = apps.username AND days.hostname = apps.hostname
+                    
+                    UNION ALL
+                    
+                    SELECT 
+                        ae.username,
+                        ae.hostname,
+                        COUNT(*) as total_activities,
+                        COUNT(*) as total_activations,
+                        SUM(CASE WHEN ae.state = 'inactive' THEN 0 ELSE ae.duration_seconds END) as total_time_seconds,
+                        SUM(CASE WHEN ae.state = 'inactive' THEN ae.duration_seconds ELSE 0 END) as inactive_time_seconds,
+                        MAX(ae.start_time) as last_activity,
+                        MIN(ae.start_time) as first_activity
+                    FROM activity_events ae
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM daily_app_summary das
+                        WHERE das.hostname = ae.hostname
+                        AND das.username = ae.username
+                        AND das.date = DATE(ae.start_time)
+                    )
+                    GROUP BY ae.username, ae.hostname
+                ) totals
+                GROUP BY totals.username, totals.hostname
                 ORDER BY total_time_seconds DESC";
         
         $stmt = $db->query($sql);
@@ -90,6 +143,7 @@ function getUserStats($db, $username) {
             // Últimos 30 dias por padrão
             $dateFilter = " AND start_time >= DATE_SUB(NOW(), INTERVAL 30 DAY)";
         }
+        $hourFilter = str_replace('start_time', 'hour', $dateFilter);
         
         // Preparar filtros de horário
         $useBusinessHours = isset($_GET['businessHours']) && $_GET['businessHours'] === 'true';
@@ -100,7 +154,8 @@ function getUserStats($db, $username) {
             'ignoreTo' => $_GET['ignoreTimeTo'] ?? null
         ];
         
-        // Buscar todas as atividades
+        // Segmentos com o usuário ativo (o agent já divide as atividades nas
+        // transições ativo/inativo; registros antigos sem estado entram inteiros)
         $sql = "SELECT 
                     id, executable, start_time, end_time, duration_seconds,
                     DATE(start_time) as activity_date,
@@ -108,14 +163,41 @@ function getUserStats($db, $username) {
                     DAYOFWEEK(start_time) as day_number
                 FROM activity_events
                 WHERE username = :username $dateFilter
+                AND (state IS NULL OR state = 'active')
                 ORDER BY start_time";
         
         $stmt = $db->prepare($sql);
         $stmt->execute($bindings);
         $activities = $stmt->fetchAll(PDO::FETCH_ASSOC);
+        foreach ($activities as &$activity) {
+            $activity['count'] = 1;
+        }
+        unset($activity);
+        
+        // Dados anteriores à retenção (server/retention.py): cada hora de
+        // hourly_app_summary entra como o intervalo [hora, hora + active_seconds)
+        // e vale activations atividades. Cada lote da retenção soma no rollup e
+        // apaga as linhas brutas na mesma transação, então a união não conta
+        // nada duas vezes e não precisa filtrar pelo corte de retention_progress.
+        $hourlySql = "SELECT 
+                    NULL as id, executable, hour as start_time,
+                    DATE_ADD(hour, INTERVAL active_seconds SECOND) as end_time,
+                    active_seconds as duration_seconds,
+                    DATE(hour) as activity_date,
+                    HOUR(hour) as activity_hour,
+                    DAYOFWEEK(hour) as day_number,
+                    activations as count
+                FROM hourly_app_summary
+                WHERE username = :username $hourFilter
+                AND active_seconds > 0
+                ORDER BY hour";
+        $stmt = $db->prepare($hourlySql);
+        $stmt->execute($bindings);
+        $hourly = $stmt->fetchAll(PDO::FETCH_ASSOC);
         
         // Calcular estatísticas com durações ajustadas
         $totalSeconds = 0;
+        $totalActivities = 0;
         $maxSeconds = 0;
         $uniqueApps = [];
         $uniqueDays = [];
@@ -125,7 +207,7 @@ function getUserStats($db, $username) {
         $dateStats = [];
         $validActivities = [];
         
-        foreach ($activities as $activity) {
+        foreach (array_merge($hourly, $activities) as $activity) {
             $validDuration = calculateValidDuration(
                 $activity['start_time'],
                 $activity['end_time'],
@@ -135,9 +217,16 @@ function getUserStats($db, $username) {
             
             if ($validDuration <= 0) continue;
             
-            $validActivities[] = $activity;
+            $count = (int)$activity['count'];
+            $isRaw = $activity['id'] !== null;
+            if ($isRaw) {
+                // Sessões (máximo, recentes) só das linhas brutas
+                unset($activity['count']);
+                $validActivities[] = $activity;
+                $maxSeconds = max($maxSeconds, $validDuration);
+            }
+            $totalActivities += $count;
             $totalSeconds += $validDuration;
-            $maxSeconds = max($maxSeconds, $validDuration);
             $uniqueApps[$activity['executable']] = true;
             $uniqueDays[$activity['activity_date']] = true;
             
@@ -151,11 +240,13 @@ function getUserStats($db, $username) {
                 ];
             }
             $appStats[$activity['executable']]['total_seconds'] += $validDuration;
-            $appStats[$activity['executable']]['access_count']++;
-            $appStats[$activity['executable']]['max_seconds'] = max(
-                $appStats[$activity['executable']]['max_seconds'],
-                $validDuration
-            );
+            $appStats[$activity['executable']]['access_count'] += $count;
+            if ($isRaw) {
+                $appStats[$activity['executable']]['max_seconds'] = max(
+                    $appStats[$activity['executable']]['max_seconds'],
+                    $validDuration
+                );
+            }
             
             // Por dia da semana
             $dayNum = $activity['day_number'];
@@ -169,7 +260,7 @@ function getUserStats($db, $username) {
                 ];
             }
             $weekdayStats[$dayNum]['total_seconds'] += $validDuration;
-            $weekdayStats[$dayNum]['activities']++;
+            $weekdayStats[$dayNum]['activities'] += $count;
             
             // Por hora
             $hour = $activity['activity_hour'];
@@ -181,7 +272,7 @@ function getUserStats($db, $username) {
                 ];
             }
             $hourStats[$hour]['total_seconds'] += $validDuration;
-            $hourStats[$hour]['activities']++;
+            $hourStats[$hour]['activities'] += $count;
             
             // Por data
             $date = $activity['activity_date'];
@@ -194,17 +285,17 @@ function getUserStats($db, $username) {
                 ];
             }
             $dateStats[$date]['total_seconds'] += $validDuration;
-            $dateStats[$date]['activities']++;
+            $dateStats[$date]['activities'] += $count;
             $dateStats[$date]['unique_apps'][$activity['executable']] = true;
         }
         
         // Formatar resultados
         $general = [
-            'total_activities' => count($validActivities),
+            'total_activities' => $totalActivities,
             'unique_apps' => count($uniqueApps),
             'active_days' => count($uniqueDays),
             'total_time_seconds' => $totalSeconds,
-            'avg_session_seconds' => count($validActivities) > 0 ? $totalSeconds / count($validActivities) : 0,
+            'avg_session_seconds' => $totalActivities > 0 ? $totalSeconds / $totalActivities : 0,
             'max_session_seconds' => $maxSeconds
         ];
         
@@ -305,7 +396,7 @@ function getUserApplications($db, $username) {
             $bindings[':app'] = '%' . $_GET['app'] . '%';
         }
         
-        // Buscar todas as atividades
+        // Segmentos com o usuário ativo (ver getUserStats)
         $sql = "SELECT 
                     executable,
                     start_time,
@@ -314,6 +405,7 @@ function getUserApplications($db, $username) {
                     DATE(start_time) as activity_date
                 FROM activity_events
                 WHERE username = :username $dateFilter $appFilter
+                AND (state IS NULL OR state = 'active')
                 ORDER BY start_time";
         
         $stmt = $db->prepare($sql);
@@ -456,7 +548,7 @@ function getUserApplicationActivities($db, $username, $executable) {
         // Buscar atividades
         $sql = "SELECT 
                     id, hostname, executable, window_title, pid,
-                    start_time, end_time, duration_seconds as duration_second
+                    start_time, end_time, duration_seconds as duration_second, state
                 FROM activity_events 
                 WHERE username = :username 
                 AND executable = :executable $dateFilter $timeFilters
@@ -496,29 +588,85 @@ function getUserApplicationActivities($db, $username, $executable) {
 }
 
 // Comparar produtividade entre usuarios
+// Rollups diários; dias sem rollup (agents antigos, histórico) vêm de activity_events
 function compareUsers($db, $params) {
     try {
         $dateFilter = '';
+        $eventFilter = '';
         $bindings = [];
         
         if (isset($params['date'])) {
-            $dateFilter = " WHERE DATE(start_time) = :date";
+            $dateFilter = " WHERE date = :date";
+            $eventFilter = " WHERE ae.start_time >= :ae_date AND ae.start_time < DATE_ADD(:ae_date_end, INTERVAL 1 DAY)";
+            $hourlyFilter = " WHERE hs.hour >= :hs_date AND hs.hour < DATE_ADD(:hs_date_end, INTERVAL 1 DAY)";
             $bindings[':date'] = $params['date'];
+            $bindings[':ae_date'] = $params['date'];
+            $bindings[':ae_date_end'] = $params['date'];
+            $bindings[':hs_date'] = $params['date'];
+            $bindings[':hs_date_end'] = $params['date'];
         } else {
-            $dateFilter = " WHERE start_time >= DATE_SUB(NOW(), INTERVAL 7 DAY)";
+            $dateFilter = " WHERE date >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)";
+            $eventFilter = " WHERE ae.start_time >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)";
+            $hourlyFilter = " WHERE hs.hour >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)";
         }
         
+        // Uma linha por usuário/dia/aplicativo; total_activities conta registros,
+        // como antes dos rollups, e total_activations as trocas de aplicativo.
+        // Dias sem rollup diário vêm das linhas brutas e, antes da retenção
+        // (server/retention.py), de hourly_app_summary: cada atividade está em
+        // só um dos dois (o lote da retenção soma e apaga na mesma transação).
+        // No rollup por hora, events e activations são as ativações.
         $sql = "SELECT 
                     username,
                     hostname,
-                    COUNT(*) as total_activities,
-                    SUM(duration_seconds) as total_seconds,
-                    ROUND(SUM(duration_seconds) / 3600, 2) as total_hours,
+                    SUM(events) as total_activities,
+                    SUM(activations) as total_activations,
+                    SUM(active_seconds) as total_seconds,
+                    ROUND(SUM(active_seconds) / 3600, 2) as total_hours,
+                    SUM(inactive_seconds) as inactive_seconds,
                     COUNT(DISTINCT executable) as unique_apps,
-                    COUNT(DISTINCT DATE(start_time)) as active_days,
-                    AVG(duration_seconds) as avg_session_seconds
-                FROM activity_events
-                $dateFilter
+                    COUNT(DISTINCT date) as active_days,
+                    SUM(active_seconds) / NULLIF(SUM(events), 0) as avg_session_seconds
+                FROM (
+                    SELECT username, hostname, date, executable,
+                           events, activations, active_seconds, inactive_seconds
+                    FROM daily_app_summary
+                    $dateFilter
+                    
+                    UNION ALL
+                    
+                    SELECT ae.username, ae.hostname, DATE(ae.start_time) as date, ae.executable,
+                           COUNT(*) as events,
+                           COUNT(*) as activations,
+                           SUM(CASE WHEN ae.state = 'inactive' THEN 0 ELSE ae.duration_seconds END) as active_seconds,
+                           SUM(CASE WHEN ae.state = 'inactive' THEN ae.duration_seconds ELSE 0 END) as inactive_seconds
+                    FROM activity_events ae
+                    $eventFilter
+                    AND NOT EXISTS (
+                        SELECT 1 FROM daily_app_summary das
+                        WHERE das.hostname = ae.hostname
+                        AND das.username = ae.username
+                        AND das.date = DATE(ae.start_time)
+                    )
+                    GROUP BY ae.username, ae.hostname, DATE(ae.start_time), ae.executable
+                    
+                    UNION ALL
+                    
+                    SELECT hs.username, hs.hostname, DATE(hs.hour) as date, hs.executable,
+                           SUM(hs.activations) as events,
+                           SUM(hs.activations) as activations,
+                           SUM(hs.active_seconds) as active_seconds,
+                           SUM(hs.inactive_seconds) as inactive_seconds
+                    FROM hourly_app_summary hs
+                    $hourlyFilter
+                    AND NOT EXISTS (
+                        SELECT 1 FROM daily_app_summary das
+                        WHERE das.hostname = hs.hostname
+                        AND das.username = hs.username
+                        AND das.date = DATE(hs.hour)
+                    )
+                    GROUP BY hs.username, hs.hostname, DATE(hs.hour), hs.executable
+                ) apps
                 GROUP BY username, hostname
                 ORDER BY total_seconds DESC
                 LIMIT 20";
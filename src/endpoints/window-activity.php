@@ -1,5 +1,35 @@
 <?php
 
+// Estado do usuário no segmento ('active'/'inactive'); null para agents antigos
+function activityState($data) {
+    $state = $data['state'] ?? null;
+    return in_array($state, ['active', 'inactive'], true) ? $state : null;
+}
+
+// Gravar nova atividade de janela; retorna o ID
+function insertWindowActivity($db, $data) {
+    $id = reserveIds($db, 'activity_events');
+    $sql = "INSERT INTO activity_events 
+            (id, hostname, username, executable, pid, window_title, start_time, end_time, duration_seconds, state) 
+            VALUES (:id, :hostname, :username, :executable, :pid, :window_title, :start_time, :end_time, :duration_seconds, :state)";
+    
+    $stmt = $db->prepare($sql);
+    $stmt->execute([
+        ':id' => $id,
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username'],
+        ':executable' => $data['executable'],
+        ':pid' => $data['pid'],
+        ':window_title' => $data['window_title'] ?? null,
+        ':start_time' => $data['start_time'],
+        ':end_time' => $data['end_time'] ?? null,
+        ':duration_seconds' => $data['duration_seconds'] ?? $data['duration_second'] ?? null,
+        ':state' => activityState($data)
+    ]);
+    
+    return $id ?? (int)$db->lastInsertId();
+}
+
 // Criar nova atividade de janela
 function createWindowActivity($db, $data) {
     $required = ['hostname', 'username', 'executable', 'pid', 'start_time'];
@@ -14,23 +44,7 @@ function createWindowActivity($db, $data) {
     }
     
     try {
-        $sql = "INSERT INTO activity_events 
-                (hostname, username, executable, pid, window_title, start_time, end_time, duration_seconds) 
-                VALUES (:hostname, :username, :executable, :pid, :window_title, :start_time, :end_time, :duration_seconds)";
-        
-        $stmt = $db->prepare($sql);
-        $stmt->execute([
-            ':hostname' => $data['hostname'],
-            ':username' => $data['username'],
-            ':executable' => $data['executable'],
-            ':pid' => $data['pid'],
-            ':window_title' => $data['window_title'] ?? null,
-            ':start_time' => $data['start_time'],
-            ':end_time' => $data['end_time'] ?? null,
-            ':duration_seconds' => $data['duration_seconds'] ?? $data['duration_second'] ?? null
-        ]);
-        
-        $activityId = $db->lastInsertId();
+        $activityId = insertWindowActivity($db, $data);
         
         // Atualizar última atividade do computador
         updateComputerActivity($db, $data['hostname'], $data['username']);
@@ -242,6 +256,17 @@ function updateWindowActivity($db, $id, $data) {
             $bindings[':duration_seconds'] = $data['duration_seconds'] ?? $data['duration_second'];
         }
         
+        // Último título bruto (o agent agrupa títulos pelo título canônico)
+        if (isset($data['window_title'])) {
+            $updates[] = "window_title = :window_title";
+            $bindings[':window_title'] = $data['window_title'];
+        }
+        
+        if (activityState($data) !== null) {
+            $updates[] = "state = :state";
+            $bindings[':state'] = activityState($data);
+        }
+        
         if (empty($updates)) {
             jsonResponse([
                 'success' => false,
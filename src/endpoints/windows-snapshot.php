@@ -75,6 +75,117 @@ function saveWindowsSnapshot($db, $data) {
     }
 }
 
+// Aplicar snapshot do protocolo com sequência (lista completa ou delta)
+// Retorna o resultado do evento no formato do endpoint de lote
+function applyWindowsSnapshot($db, $data) {
+    $mode = $data['mode'] ?? 'full';
+    
+    if ($mode === 'full') {
+        $missing = validateRequired($data, ['hostname', 'username', 'timestamp', 'windows']);
+        if (!empty($missing)) {
+            return ['success' => false, 'status' => 400, 'message' => 'Campos obrigatórios ausentes: ' . implode(', ', $missing)];
+        }
+        
+        $sql = "INSERT INTO windows_snapshot (hostname, username, timestamp, windows_json, seq) 
+                VALUES (:hostname, :username, :timestamp, :windows_json, :seq)
+                ON DUPLICATE KEY UPDATE 
+                    timestamp = VALUES(timestamp),
+                    windows_json = VALUES(windows_json),
+                    seq = VALUES(seq)";
+        $stmt = $db->prepare($sql);
+        $stmt->execute([
+            ':hostname' => $data['hostname'],
+            ':username' => $data['username'],
+            ':timestamp' => $data['timestamp'],
+            ':windows_json' => json_encode($data['windows']),
+            ':seq' => $data['seq'] ?? null
+        ]);
+        
+        return [
+            'success' => true,
+            'status' => 201,
+            'message' => 'Snapshot salvo com sucesso',
+            'data' => ['seq' => $data['seq'] ?? null, 'windows_count' => count($data['windows'])]
+        ];
+    }
+    
+    $missing = validateRequired($data, ['hostname', 'username', 'timestamp', 'seq', 'base_seq']);
+    if (!empty($missing)) {
+        return ['success' => false, 'status' => 400, 'message' => 'Campos obrigatórios ausentes: ' . implode(', ', $missing)];
+    }
+    
+    $stmt = $db->prepare("SELECT seq, windows_json FROM windows_snapshot 
+                          WHERE hostname = :hostname AND username = :username");
+    $stmt->execute([':hostname' => $data['hostname'], ':username' => $data['username']]);
+    $current = $stmt->fetch(PDO::FETCH_ASSOC);
+    
+    // Delta sobre um snapshot que não temos (perdido ou agent reiniciado): pede lista completa
+    if (!$current || $current['seq'] === null || (int)$current['seq'] !== (int)$data['base_seq']) {
+        return [
+            'success' => true,
+            'status' => 200,
+            'message' => 'Snapshot fora de sequência, envie a lista completa',
+            'data' => ['resync' => true, 'seq' => $current['seq'] ?? null]
+        ];
+    }
+    
+    $added = $data['added'] ?? [];
+    $removed = $data['removed'] ?? [];
+    $changed = $data['changed'] ?? [];
+    $hasActive = array_key_exists('active', $data);
+    
+    // Delta vazio (keepalive): só atualiza timestamp e seq, sem reescrever o JSON
+    if (empty($added) && empty($removed) && empty($changed) && !$hasActive) {
+        $stmt = $db->prepare("UPDATE windows_snapshot SET timestamp = :timestamp, seq = :seq 
+                              WHERE hostname = :hostname AND username = :username");
+        $stmt->execute([
+            ':timestamp' => $data['timestamp'],
+            ':seq' => $data['seq'],
+            ':hostname' => $data['hostname'],
+            ':username' => $data['username']
+        ]);
+        return ['success' => true, 'status' => 200, 'message' => 'Snapshot sem alterações', 'data' => ['seq' => $data['seq']]];
+    }
+    
+    // Indexar janelas atuais pela identidade estável
+    $windows = [];
+    foreach (json_decode($current['windows_json'], true) ?: [] as $window) {
+        $windows[(string)($window['window_id'] ?? '')] = $window;
+    }
+    
+    foreach ($removed as $key) {
+        unset($windows[(string)$key]);
+    }
+    foreach (array_merge($added, $changed) as $window) {
+        $key = (string)$window['window_id'];
+        $window['is_active'] = $windows[$key]['is_active'] ?? false;
+        $windows[$key] = $window;
+    }
+    if ($hasActive) {
+        foreach ($windows as $key => $window) {
+            $windows[$key]['is_active'] = ($data['active'] !== null && (string)$key === (string)$data['active']);
+        }
+    }
+    
+    $stmt = $db->prepare("UPDATE windows_snapshot 
+                          SET timestamp = :timestamp, windows_json = :windows_json, seq = :seq 
+                          WHERE hostname = :hostname AND username = :username");
+    $stmt->execute([
+        ':timestamp' => $data['timestamp'],
+        ':windows_json' => json_encode(array_values($windows)),
+        ':seq' => $data['seq'],
+        ':hostname' => $data['hostname'],
+        ':username' => $data['username']
+    ]);
+    
+    return [
+        'success' => true,
+        'status' => 200,
+        'message' => 'Snapshot atualizado',
+        'data' => ['seq' => $data['seq'], 'windows_count' => count($windows)]
+    ];
+}
+
 // Obter snapshot mais recente de janelas abertas
 function getWindowsSnapshot($db, $hostname, $username) {
     try {
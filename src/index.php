@@ -19,8 +19,12 @@ $method = $_SERVER['REQUEST_METHOD'];
 $path = parse_url($_SERVER['REQUEST_URI'], PHP_URL_PATH);
 $path = trim($path, '/');
 
-// Pegar corpo da requisição
-$input = json_decode(file_get_contents('php://input'), true);
+// Pegar corpo da requisição (o agent envia corpos maiores com gzip)
+$rawInput = file_get_contents('php://input');
+if (stripos($_SERVER['HTTP_CONTENT_ENCODING'] ?? '', 'gzip') !== false) {
+    $rawInput = gzdecode($rawInput);
+}
+$input = json_decode($rawInput, true);
 
 // Router básico
 try {
@@ -37,6 +41,11 @@ try {
                 'GET /api/window-activities' => 'Listar atividades',
                 'GET /api/window-activities/{id}' => 'Obter atividade específica',
                 'PUT /api/window-activity/{id}' => 'Atualizar atividade',
+                'POST /api/batch' => 'Registrar lote de eventos do agent',
+                'POST /api/daily-rollup' => 'Registrar totais diários do agent',
+                'GET /api/agent-config' => 'Dicas de taxa para os agents',
+                'POST /api/agent-health' => 'Registrar métricas do agent (heartbeat)',
+                'GET /api/agent-health' => 'Saúde dos agents (máquinas lentas primeiro)',
                 'POST /api/computer/register' => 'Registrar computador',
                 'GET /api/computers' => 'Listar computadores',
                 'GET /api/stats/daily' => 'Estatísticas diárias',
@@ -60,6 +69,35 @@ try {
         createWindowActivity($db, $input);
     }
     
+    // Registrar lote de eventos do agent
+    elseif ($path === 'api/batch' && $method === 'POST') {
+        require_once __DIR__ . '/endpoints/batch.php';
+        saveBatch($db, $input);
+    }
+    
+    // Dicas de taxa para os agents (pausa, multiplicadores, tamanho de lote)
+    elseif ($path === 'api/agent-config' && $method === 'GET') {
+        require_once __DIR__ . '/endpoints/agent-config.php';
+        getAgentConfig();
+    }
+    
+    // Métricas do próprio agent (heartbeat) e visão da frota
+    elseif ($path === 'api/agent-health' && $method === 'POST') {
+        require_once __DIR__ . '/endpoints/agent-health.php';
+        saveAgentHealth($db, $input);
+    }
+    
+    elseif ($path === 'api/agent-health' && $method === 'GET') {
+        require_once __DIR__ . '/endpoints/agent-health.php';
+        getAgentHealth($db, $_GET);
+    }
+    
+    // Salvar totais diários por aplicativo (rollup do agent)
+    elseif ($path === 'api/daily-rollup' && $method === 'POST') {
+        require_once __DIR__ . '/endpoints/daily-rollup.php';
+        saveDailyRollup($db, $input);
+    }
+    
     // Salvar snapshot de janelas abertas
     elseif ($path === 'api/windows-snapshot' && $method === 'POST') {
         require_once __DIR__ . '/endpoints/windows-snapshot.php';
@@ -0,0 +1,17 @@
+"""
+Testes do agent (``agent/``) e do servidor Python (``server/``)
+
+Os módulos dos dois diretórios se importam pelo nome (``from spool import
+Spool``), como quando rodam como script; aqui os dois entram no path.
+
+Uso:
+    python -m pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('agent', 'server'):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,147 @@
+"""analytics.py x getUserStats() do PHP (referência) no mesmo banco de teste"""
+import sqlite3
+from datetime import datetime, timedelta
+
+from analytics import Analysis, Filters, load_sqlite
+from schema import SCHEMA
+
+EVENTS = [
+    # executável, início, fim, estado
+    ('chrome.exe', '2026-01-26 08:30:00', '2026-01-26 09:45:00', 'active'),
+    ('chrome.exe', '2026-01-26 09:45:00', '2026-01-26 10:00:00', 'inactive'),
+    ('excel.exe', '2026-01-26 11:40:00', '2026-01-26 12:30:00', 'active'),  # Atravessa o almoço
+    ('outlook.exe', '2026-01-26 17:30:00', '2026-01-26 18:40:00', None),  # Antigo, sem estado
+    ('excel.exe', '2026-01-27 07:00:00', '2026-01-27 08:10:00', 'active'),  # Começa antes do horário
+    ('outlook.exe', '2026-01-27 14:00:00', '2026-01-27 16:00:00', None),  # Antigo, com pausa no meio
+    ('chrome.exe', '2026-01-28 19:00:00', '2026-01-28 19:30:00', 'active'),  # Fora do horário
+]
+IDLE = [('2026-01-27 14:30:00', '2026-01-27 15:00:00')]
+HOURLY = [
+    # Antes da retenção: executável, hora, segundos ativos, ativações
+    ('chrome.exe', '2026-01-20 09:00:00', 2400, 3),
+    ('excel.exe', '2026-01-20 12:00:00', 3000, 1),  # Vira [12:00, 12:50): o almoço desconta tudo
+    ('excel.exe', '2026-01-20 13:00:00', 600, 0),  # Final de uma atividade da hora anterior
+]
+WEEKDAYS = ['', 'Domingo', 'Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
+
+
+def _fixture(tmp_path):
+    path = str(tmp_path / 'analytics.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        "INSERT INTO activity_events (hostname, username, executable, pid, start_time, end_time, "
+        "duration_seconds, state) VALUES ('PC', 'ana', ?, 1, ?, ?, "
+        "CAST(strftime('%s', ?) - strftime('%s', ?) AS INTEGER), ?)",
+        [(exe, start, end, end, start, state) for exe, start, end, state in EVENTS])
+    conn.executemany(
+        "INSERT INTO activity_periods (hostname, username, period_type, start_time, end_time) "
+        "VALUES ('PC', 'ana', 'inactive', ?, ?)", IDLE)
+    conn.executemany(
+        "INSERT INTO hourly_app_summary (hostname, username, hour, executable, active_seconds, activations) "
+        "VALUES ('PC', 'ana', ?, ?, ?, ?)", [(hour, exe, seconds, count) for exe, hour, seconds, count in HOURLY])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _php_valid_duration(start, end, filters):
+    """calculateValidDuration() do PHP, linha a linha"""
+    start, end = (datetime.strptime(value, '%Y-%m-%d %H:%M:%S') for value in (start, end))
+    date = start.strftime('%Y-%m-%d')
+    at = lambda time: datetime.strptime(f"{date} {time}", '%Y-%m-%d %H:%M:%S')
+    if filters['startTime'] or filters['endTime']:
+        day_start, day_end = at(filters['startTime'] or '00:00:00'), at(filters['endTime'] or '23:59:59')
+        if end <= day_start or start >= day_end:
+            return 0
+        start, end = max(start, day_start), min(end, day_end)
+    valid = (end - start).total_seconds()
+    if filters['ignoreFrom'] and filters['ignoreTo'] and valid > 0:
+        overlap_start, overlap_end = max(start, at(filters['ignoreFrom'])), min(end, at(filters['ignoreTo']))
+        if overlap_start < overlap_end:
+            valid -= (overlap_end - overlap_start).total_seconds()
+    return max(0, int(valid))
+
+
+def _php_user_stats(filters):
+    """getUserStats() do PHP: hourly_app_summary + atividades ativas ou sem estado, sem descontar activity_periods"""
+    apps, weekdays, hours, dates = {}, {}, {}, {}
+    total = maximum = count = 0
+    hourly = [(exe, hour, (datetime.strptime(hour, '%Y-%m-%d %H:%M:%S') + timedelta(seconds=seconds))
+               .strftime('%Y-%m-%d %H:%M:%S'), 'active', activations, False)
+              for exe, hour, seconds, activations in HOURLY]
+    raw = [event + (1, True) for event in sorted(EVENTS, key=lambda event: event[1])]
+    for exe, start, end, state, weight, is_raw in hourly + raw:
+        if state not in (None, 'active'):
+            continue
+        valid = _php_valid_duration(start, end, filters)
+        if valid <= 0:
+            continue
+        count += weight
+        total += valid
+        started = datetime.strptime(start, '%Y-%m-%d %H:%M:%S')
+        app = apps.setdefault(exe, {'executable': exe, 'total_seconds': 0, 'access_count': 0, 'max_seconds': 0})
+        app['total_seconds'] += valid
+        app['access_count'] += weight
+        if is_raw:
+            maximum = max(maximum, valid)
+            app['max_seconds'] = max(app['max_seconds'], valid)
+        day_number = started.isoweekday() % 7 + 1  # DAYOFWEEK: 1 = domingo
+        day = weekdays.setdefault(day_number, {'day_number': day_number, 'weekday': WEEKDAYS[day_number],
+                                               'total_seconds': 0, 'activities': 0})
+        hour = hours.setdefault(started.hour, {'hour': started.hour, 'total_seconds': 0, 'activities': 0})
+        date = dates.setdefault(start[:10], {'date': start[:10], 'activities': 0, 'total_seconds': 0, 'apps': set()})
+        for row in (day, hour, date):
+            row['total_seconds'] += valid
+            row['activities'] += weight
+        date['apps'].add(exe)
+
+    top_apps = sorted(apps.values(), key=lambda row: row['total_seconds'], reverse=True)[:10]
+    for app in top_apps:
+        app['total_hours'] = round(app['total_seconds'] / 3600, 2)
+        app['avg_seconds'] = app['total_seconds'] / app['access_count'] if app['access_count'] else 0
+    by_weekday = [dict(weekdays[key], total_hours=round(weekdays[key]['total_seconds'] / 3600, 2))
+                  for key in sorted(weekdays)]
+    by_hour = [dict(hours[key], total_hours=round(hours[key]['total_seconds'] / 3600, 2)) for key in sorted(hours)]
+    timeline = [{'date': date['date'], 'activities': date['activities'], 'total_seconds': date['total_seconds'],
+                 'total_hours': round(date['total_seconds'] / 3600, 2), 'unique_apps': len(date['apps'])}
+                for _, date in sorted(dates.items(), reverse=True)]
+    return {
+        'general': {'total_activities': count, 'unique_apps': len(apps), 'active_days': len(dates),
+                    'total_time_seconds': total, 'avg_session_seconds': total / count if count else 0,
+                    'max_session_seconds': maximum},
+        'top_apps': top_apps,
+        'by_weekday': by_weekday,
+        'by_hour': by_hour,
+        'timeline': timeline,
+    }
+
+
+def _analytics_user_stats(path, filters, subtract_idle=False):
+    analysis = Analysis(load_sqlite(path), Filters(
+        start_time=filters['startTime'], end_time=filters['endTime'],
+        ignore_from=filters['ignoreFrom'], ignore_to=filters['ignoreTo'], subtract_idle=subtract_idle))
+    stats = analysis.user_stats('ana')
+    del stats['heatmap']
+    return stats
+
+
+def test_matches_php_user_stats_with_and_without_filters(tmp_path):
+    path = _fixture(tmp_path)
+    for filters in [
+        {'startTime': None, 'endTime': None, 'ignoreFrom': None, 'ignoreTo': None},
+        {'startTime': '08:00:00', 'endTime': '18:00:00', 'ignoreFrom': '12:00:00', 'ignoreTo': '13:00:00'},
+    ]:
+        assert _analytics_user_stats(path, filters) == _php_user_stats(filters)
+
+
+def test_subtract_idle_only_changes_rows_without_state(tmp_path):
+    path = _fixture(tmp_path)
+    filters = {'startTime': None, 'endTime': None, 'ignoreFrom': None, 'ignoreTo': None}
+    php = _php_user_stats(filters)
+    idle = _analytics_user_stats(path, filters, subtract_idle=True)
+
+    assert idle['general']['total_time_seconds'] == php['general']['total_time_seconds'] - 1800
+    changed = {row['date'] for row in php['timeline']} - {
+        row['date'] for row in php['timeline'] if row in idle['timeline']}
+    assert changed == {'2026-01-27'}  # Só o dia do registro antigo que cruza a pausa
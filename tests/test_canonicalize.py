@@ -0,0 +1,59 @@
+import pytest
+
+import canonicalize
+from canonicalize import TitleCanonicalizer
+
+
+@pytest.mark.parametrize('title, expected', [
+    ("(3) Inbox - Gmail", "Inbox - Gmail"),
+    ("(99+) WhatsApp", "WhatsApp"),
+    ("Caixa de Entrada (12)", "Caixa de Entrada"),
+    ("Inbox (12) - Gmail", "Inbox - Gmail"),
+    ("● main.py - Visual Studio Code", "main.py - Visual Studio Code"),
+    ("notas.txt* - Bloco de notas", "notas.txt - Bloco de notas"),
+    ("47% – Downloading relatorio.pdf", "Downloading relatorio.pdf"),
+    ("Downloading relatorio.pdf - 47%", "Downloading relatorio.pdf"),
+    ("(80%) Build", "Build"),
+    ("Copiando 12,5 % concluído", "Copiando concluído"),
+    ("Reunião diária 01:23", "Reunião diária #:#"),
+    ("Planilha 2024", "Planilha 2024"),
+])
+def test_default_rules(title, expected):
+    assert TitleCanonicalizer().canonicalize('app.exe', title) == expected
+
+
+def test_progress_keeps_downloads_apart():
+    canonicalizer = TitleCanonicalizer()
+    first = canonicalizer.key('chrome.exe', "47% – Downloading a.zip")
+    second = canonicalizer.key('chrome.exe', "12% – Downloading b.zip")
+    assert first != second
+    assert first == canonicalizer.key('chrome.exe', "90% – Downloading a.zip")
+
+
+def test_title_that_is_only_noise_stays_raw():
+    assert TitleCanonicalizer().canonicalize('app.exe', "100%") == "100%"
+
+
+def test_executable_rules_apply_before_defaults():
+    canonicalizer = TitleCanonicalizer({'Chrome.exe': [[r' - Google Chrome$', '']], '*': [[r'\s+- Rascunho$', '']]})
+    assert canonicalizer.canonicalize('chrome.exe', "Docs - Rascunho - Google Chrome") == "Docs"
+    assert canonicalizer.canonicalize('word.exe', "Docs - Rascunho - Google Chrome") == "Docs - Rascunho - Google Chrome"
+
+
+def test_invalid_rule_is_ignored():
+    canonicalizer = TitleCanonicalizer({'*': [['(', ''], ['só um']]})
+    assert canonicalizer.canonicalize('app.exe', "(2) Chat") == "Chat"
+
+
+def test_cache_is_lru(monkeypatch):
+    monkeypatch.setattr(canonicalize, 'CACHE_SIZE', 2)
+    canonicalizer = TitleCanonicalizer()
+    canonicalizer.canonicalize('a.exe', "um")
+    canonicalizer.canonicalize('a.exe', "dois")
+    canonicalizer.canonicalize('a.exe', "um")  # "um" passa a ser o mais recente
+    canonicalizer.canonicalize('a.exe', "três")  # Sai "dois", não o cache inteiro
+    misses = canonicalizer.misses
+    canonicalizer.canonicalize('a.exe', "um")
+    assert canonicalizer.misses == misses
+    canonicalizer.canonicalize('a.exe', "dois")
+    assert canonicalizer.misses == misses + 1
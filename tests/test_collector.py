@@ -0,0 +1,35 @@
+"""Collector: IDs reservados em id_ranges"""
+from collector import Collector, SQLiteBackend
+
+
+def _activity(start):
+    return {'hostname': 'pc', 'username': 'ana', 'executable': 'app.exe', 'pid': 1, 'start_time': start}
+
+
+def _insert(collector, count):
+    results, _ = collector.submit([(None, 'window_activity', _activity(f'2026-01-28 10:00:{i:02d}'))
+                                   for i in range(count)])
+    collector.flush()
+    return [data['id'] for _, _, _, data in results]
+
+
+def test_instances_sharing_a_database_get_disjoint_blocks(tmp_path):
+    path = str(tmp_path / 'collector.db')
+    first, second = Collector(SQLiteBackend(path)), Collector(SQLiteBackend(path))
+    first.ID_BLOCK = second.ID_BLOCK = 3
+
+    ids = _insert(first, 2) + _insert(second, 2) + _insert(first, 2)
+    assert len(set(ids)) == 6
+    assert ids[:2] == [1, 2] and ids[2:4] == [4, 5] and ids[4:] == [3, 7]
+    assert first.backend.query_one("SELECT COUNT(*) FROM activity_events")[0] == 6
+
+
+def test_first_block_starts_after_existing_rows(tmp_path):
+    path = str(tmp_path / 'collector.db')
+    backend = SQLiteBackend(path)
+    with backend.pool.connection() as conn:
+        conn.execute("INSERT INTO activity_events (id, hostname, username, executable, pid, start_time) "
+                     "VALUES (41, 'pc', 'ana', 'app.exe', 1, '2026-01-28 09:00:00')")
+        conn.commit()
+    assert _insert(Collector(backend), 1) == [42]
+    assert backend.query_one("SELECT next_id FROM id_ranges WHERE table_name = 'activity_events'")[0] == 42 + 1000
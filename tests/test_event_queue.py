@@ -0,0 +1,67 @@
+"""EventQueue: políticas de estouro da fila de envio"""
+import pytest
+
+from uploader import EventQueue
+
+
+def _event(number, event_type='window_activity', **data):
+    return {'id': number, 'type': event_type, 'data': data, 'enqueued_at': float(number)}
+
+
+def _ids(queue):
+    return [event['id'] for event in queue.take(len(queue))]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        EventQueue(overflow_policy='block')
+
+
+def test_drop_oldest_keeps_the_newest_events():
+    queue = EventQueue(maxsize=3, overflow_policy='drop_oldest')
+    results = [queue.put(_event(number)) for number in range(1, 6)]
+
+    assert results == [True] * 5
+    assert (queue.dropped, _ids(queue)) == (2, [3, 4, 5])
+
+
+def test_drop_newest_rejects_the_incoming_event():
+    queue = EventQueue(maxsize=3, overflow_policy='drop_newest')
+    results = [queue.put(_event(number)) for number in range(1, 6)]
+
+    assert results == [True, True, True, False, False]
+    assert (queue.dropped, _ids(queue)) == (2, [1, 2, 3])
+
+
+def test_drop_superseded_prefers_mouse_and_health_samples():
+    queue = EventQueue(maxsize=4)
+    queue.put(_event(1))
+    queue.put(_event(2, 'mouse_activity'))
+    queue.put(_event(3))
+    queue.put(_event(4, 'agent_health'))
+    queue.put(_event(5))
+    queue.put(_event(6))
+
+    assert (queue.dropped, _ids(queue)) == (2, [1, 3, 5, 6])
+
+
+def test_drop_superseded_keeps_deltas_after_the_last_full_snapshot():
+    queue = EventQueue(maxsize=4)
+    queue.put(_event(1, 'windows_snapshot', mode='full'))
+    queue.put(_event(2, 'windows_snapshot', mode='delta'))
+    queue.put(_event(3, 'windows_snapshot', mode='full'))
+    queue.put(_event(4, 'windows_snapshot', mode='delta'))
+    queue.put(_event(5))  # Cheia: sai o snapshot mais antigo, substituído pelo completo 3
+    queue.put(_event(6))  # Sai o delta 2, também anterior ao completo
+    queue.put(_event(7))  # Sem nada substituído: sai o mais antigo (o completo 3)
+
+    assert (queue.dropped, _ids(queue)) == (3, [4, 5, 6, 7])
+
+
+def test_oldest_age_uses_the_injected_clock():
+    now = [100.0]
+    queue = EventQueue(clock=lambda: now[0])
+    assert queue.oldest_age() is None
+    queue.put(dict(_event(1), enqueued_at=90.0))
+    queue.put(dict(_event(2), enqueued_at=95.0))
+    assert queue.oldest_age() == 10.0
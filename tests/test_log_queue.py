@@ -0,0 +1,50 @@
+import logging
+
+from log_queue import DedupFilter
+
+
+def _record(message, level=logging.ERROR):
+    return logging.LogRecord('root', level, __file__, 1, message, None, None)
+
+
+def _filter(**kwargs):
+    now = [0.0]
+    dedup = DedupFilter(clock=lambda: now[0], **kwargs)
+    return dedup, now
+
+
+def test_repeated_messages_pass_burst_then_summarized():
+    dedup, now = _filter(interval=60, burst=3)
+    passed = [dedup.filter(_record(f"Erro ao enviar lote {i}")) for i in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+    assert dedup.expired() == []
+
+    now[0] = 61
+    [summary] = dedup.expired()
+    assert summary.getMessage().startswith("7 mensagens semelhantes suprimidas em 60s")
+
+
+def test_new_window_reports_pending_suppressed():
+    dedup, now = _filter(interval=60, burst=1)
+    for _ in range(3):
+        dedup.filter(_record("falhou"))
+    now[0] = 61
+    record = _record("falhou")
+    assert dedup.filter(record)
+    assert "+2 mensagens semelhantes suprimidas" in record.getMessage()
+
+
+def test_info_is_never_suppressed():
+    dedup, _ = _filter(burst=1)
+    assert all(dedup.filter(_record("ok", logging.INFO)) for _ in range(5))
+
+
+def test_evicted_key_still_emits_summary():
+    dedup, _ = _filter(burst=1, max_keys=2)
+    for _ in range(4):
+        dedup.filter(_record("repetida"))
+    dedup.filter(_record("outra b"))
+    dedup.filter(_record("outra c"))  # Estoura max_keys: 'repetida' sai da tabela
+
+    messages = [record.getMessage() for record in dedup.expired()]
+    assert messages == ["3 mensagens semelhantes suprimidas em 0s: repetida"]
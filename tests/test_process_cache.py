@@ -0,0 +1,102 @@
+import contextlib
+
+import psutil
+import pytest
+
+import process_cache
+from process_cache import ProcessCache
+
+
+class FakeProcesses:
+    """Tabela de processos no lugar do psutil: pid -> (create_time, nome)"""
+
+    def __init__(self):
+        self.table = {}
+        self.lookups = 0
+        outer = self
+
+        class Process:
+            def __init__(self, pid):
+                outer.lookups += 1
+                if pid not in outer.table:
+                    raise psutil.NoSuchProcess(pid)
+                self.pid = pid
+
+            def create_time(self):
+                return outer.table[self.pid][0]
+
+            def oneshot(self):
+                return contextlib.nullcontext()
+
+            def name(self):
+                return outer.table[self.pid][1]
+
+            def exe(self):
+                return f"C:\\{self.name()}"
+
+            def ppid(self):
+                return 4
+
+        self.Process = Process
+
+
+@pytest.fixture
+def processes(monkeypatch):
+    fake = FakeProcesses()
+    monkeypatch.setattr(process_cache.psutil, 'Process', fake.Process)
+    return fake
+
+
+def test_known_window_skips_the_system_call(processes):
+    processes.table[10] = (1.0, 'word.exe')
+    cache = ProcessCache()
+    assert cache.name(10, hwnd=0x100) == 'word.exe'
+    for _ in range(5):
+        assert cache.name(10, hwnd=0x100) == 'word.exe'
+    assert processes.lookups == 1
+
+
+def test_reused_pid_with_new_window_returns_new_name(processes):
+    processes.table[10] = (1.0, 'word.exe')
+    cache = ProcessCache()
+    cache.name(10, hwnd=0x100)
+    processes.table[10] = (2.0, 'excel.exe')  # word.exe terminou e o PID foi reutilizado
+    assert cache.name(10, hwnd=0x200) == 'excel.exe'
+    assert len(cache) == 1
+
+
+def test_new_window_of_same_process_is_verified_without_reload(processes):
+    processes.table[10] = (1.0, 'word.exe')
+    cache = ProcessCache()
+    cache.name(10, hwnd=0x100)
+    assert cache.name(10, hwnd=0x200) == 'word.exe'
+    assert cache.stats()['misses'] == 1 and cache.stats()['verifications'] == 2
+
+
+def test_without_hwnd_every_lookup_verifies(processes):
+    processes.table[10] = (1.0, 'word.exe')
+    cache = ProcessCache()
+    cache.name(10)
+    processes.table[10] = (2.0, 'excel.exe')
+    assert cache.name(10) == 'excel.exe'
+
+
+def test_prune_drops_dead_pids_and_missing_process_returns_none(processes):
+    processes.table.update({10: (1.0, 'a.exe'), 11: (1.0, 'b.exe')})
+    cache = ProcessCache()
+    cache.name(10, 1)
+    cache.name(11, 2)
+    cache.prune(live_pids=[11])
+    assert len(cache) == 1
+    del processes.table[11]
+    assert cache.name(11, 3) is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction(processes):
+    processes.table.update({pid: (1.0, f"{pid}.exe") for pid in range(5)})
+    cache = ProcessCache(max_size=3)
+    for pid in range(5):
+        cache.name(pid, pid)
+    assert len(cache) == 3
+    assert cache.stats()['evictions'] == 2
@@ -0,0 +1,83 @@
+"""RetentionJob: retomada pelo retention_progress e relatórios somando rollup + linhas brutas"""
+from datetime import datetime
+
+from analytics import Analysis, load_sqlite
+from collector import SQLiteBackend
+from retention import RetentionJob
+
+NOW = datetime(2026, 3, 1, 10, 0, 0)  # Corte com days=30: 2026-01-30 00:00:00
+EVENTS = [
+    ('chrome.exe', '2026-01-26 08:30:00', '2026-01-26 09:45:00', 'active'),
+    ('chrome.exe', '2026-01-26 09:45:00', '2026-01-26 10:00:00', 'inactive'),
+    ('excel.exe', '2026-01-27 11:40:00', '2026-01-27 12:30:00', 'active'),
+    ('outlook.exe', '2026-01-28 17:30:00', '2026-01-28 18:40:00', None),
+    ('excel.exe', '2026-01-29 23:50:00', '2026-01-30 00:20:00', 'active'),  # Cruza o corte
+    ('chrome.exe', '2026-02-27 09:00:00', '2026-02-27 10:00:00', 'active'),  # Recente
+]
+
+
+def _backend(tmp_path, events=EVENTS):
+    backend = SQLiteBackend(str(tmp_path / 'retention.db'))
+    _insert(backend, events)
+    return backend
+
+
+def _insert(backend, events):
+    with backend.pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO activity_events (hostname, username, executable, pid, start_time, end_time, "
+            "duration_seconds, state) VALUES ('PC', 'ana', ?, 1, ?, ?, "
+            "CAST(strftime('%s', ?) - strftime('%s', ?) AS INTEGER), ?)",
+            [(exe, start, end, end, start, state) for exe, start, end, state in events])
+        conn.commit()
+
+
+def _job(backend, max_seconds=None):
+    """Uma pausa de 1 s (relógio falso) por lote: ``max_seconds=1`` para depois do primeiro lote"""
+    clock = [0.0]
+
+    def sleep(seconds):
+        clock[0] += seconds
+    return RetentionJob(backend, days=30, batch_size=2, pause=1, duty=1, max_seconds=max_seconds,
+                        clock=lambda: clock[0], sleep=sleep, now=lambda: NOW)
+
+
+def _totals(backend):
+    """O que a união preserva: atividades, tempo e tempo por aplicativo (a maior sessão vem só das brutas)"""
+    stats = Analysis(load_sqlite(backend.path)).user_stats('ana')
+    general = stats['general']
+    return (general['total_activities'], general['total_time_seconds'],
+            {app['executable']: (app['total_seconds'], app['access_count']) for app in stats['top_apps']})
+
+
+def test_interrupted_run_resumes_with_the_same_cutoff_and_max_id(tmp_path):
+    backend = _backend(tmp_path)
+    first = _job(backend, max_seconds=1).run()['activity_events']
+    progress = _job(backend).progress('activity_events')
+
+    assert (first['rows'], first['finished']) == (2, False)
+    assert (progress['status'], progress['last_id'], progress['max_id']) == ('running', 2, 5)
+
+    # Linha antiga gravada depois do início (spool atrasado): fica para a próxima execução
+    _insert(backend, [('notepad.exe', '2026-01-27 15:00:00', '2026-01-27 15:10:00', 'active')])
+    second = _job(backend).run()['activity_events']
+    progress = _job(backend).progress('activity_events')
+
+    assert (second['rows'], second['finished']) == (3, True)
+    assert (progress['status'], progress['rows_deleted'], progress['cutoff']) == ('done', 5, '2026-01-30 00:00:00')
+    remaining = backend.query_one("SELECT GROUP_CONCAT(id) FROM activity_events ORDER BY id")[0]
+    assert sorted(int(value) for value in remaining.split(',')) == [6, 7]
+    hourly = backend.query_one("SELECT SUM(active_seconds), SUM(inactive_seconds), SUM(activations) "
+                               "FROM hourly_app_summary")
+    assert hourly == (75 * 60 + 50 * 60 + 70 * 60 + 30 * 60, 15 * 60, 4)
+
+
+def test_reports_keep_the_history_after_retention(tmp_path):
+    backend = _backend(tmp_path)
+    before = _totals(backend)
+
+    _job(backend, max_seconds=1).run()
+    assert _totals(backend) == before  # No meio: parte no rollup, parte bruta, sem somar duas vezes
+    _job(backend).run()
+    assert backend.query_one("SELECT COUNT(*) FROM activity_events")[0] == 1
+    assert _totals(backend) == before
@@ -0,0 +1,137 @@
+"""DailyRollup: divisão na meia-noite, reclassificação, contagem de registros e soma por instância no servidor"""
+import json
+from datetime import datetime
+
+import pytest
+
+from collector import Collector, SQLiteBackend
+from rollup import DailyRollup
+from stand_in import StandInStore
+
+
+def _at(text):
+    return datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+
+
+def _by_date(payloads):
+    return {payload['date']: payload for payload in payloads}
+
+
+def test_interval_crossing_midnight_is_split_between_days():
+    rollup = DailyRollup()
+    rollup.add('app.exe', _at('2026-01-28 23:50:00'), _at('2026-01-29 00:20:00'), 'active')
+    days = _by_date(rollup.pending())
+
+    assert days['2026-01-28']['total_active_seconds'] == 600
+    assert days['2026-01-29']['total_active_seconds'] == 1200
+    assert days['2026-01-28']['last_activity'] == '2026-01-29 00:00:00'
+    assert days['2026-01-29']['first_activity'] == '2026-01-29 00:00:00'
+    assert days['2026-01-29']['apps'][0]['active_seconds'] == 1200
+
+
+def test_reclassify_moves_time_between_states_without_going_negative():
+    rollup = DailyRollup()
+    rollup.add('app.exe', _at('2026-01-28 10:00:00'), _at('2026-01-28 10:10:00'), 'active')
+    rollup.reclassify('app.exe', _at('2026-01-28 10:05:00'), _at('2026-01-28 10:10:00'), 'active', 'inactive')
+    rollup.reclassify('app.exe', _at('2026-01-28 09:00:00'), _at('2026-01-28 09:30:00'), 'active', 'inactive')
+    app = rollup.pending()[0]['apps'][0]
+
+    assert app['active_seconds'] == 0  # 600 - 300 - 1800, limitado a zero
+    assert app['inactive_seconds'] == 300 + 1800
+
+
+def test_pending_sends_only_changed_apps_with_absolute_values():
+    rollup = DailyRollup()
+    start = _at('2026-01-28 10:00:00')
+    rollup.add('a.exe', start, _at('2026-01-28 10:01:00'), 'active')
+    rollup.add('b.exe', start, _at('2026-01-28 10:02:00'), 'active')
+    rollup.pending()
+    assert rollup.pending() == []
+
+    rollup.add('a.exe', start, _at('2026-01-28 10:01:00'), 'active')
+    (payload,) = rollup.pending()
+    assert [app['executable'] for app in payload['apps']] == ['a.exe']
+    assert payload['apps'][0]['active_seconds'] == 120
+    assert payload['total_active_seconds'] == 240
+
+
+def test_activations_and_records_are_counted_separately():
+    rollup = DailyRollup()
+    at = _at('2026-01-28 10:00:00')
+    rollup.activation('app.exe', at)
+    rollup.record('app.exe', at)
+    rollup.record('app.exe', at)
+    app = rollup.pending()[0]['apps'][0]
+    assert (app['activations'], app['events']) == (1, 2)
+
+
+def test_state_file_from_previous_version_is_upgraded(tmp_path):
+    path = tmp_path / 'rollup.json'
+    path.write_text(json.dumps({'days': {'2026-01-28': {
+        'active': 60.0, 'inactive': 0.0, 'first': None, 'last': None, 'apps': {'app.exe': [60.0, 0.0, 3]}}}}))
+    rollup = DailyRollup(str(path))
+    rollup.record('app.exe', _at('2026-01-28 10:00:00'))
+    app = rollup.pending()[0]['apps'][0]
+    assert (app['active_seconds'], app['activations'], app['events']) == (60, 3, 1)
+
+
+def test_new_state_file_starts_a_new_instance(tmp_path):
+    path = str(tmp_path / 'rollup.json')
+    rollup = DailyRollup(path)
+    rollup.add('app.exe', _at('2026-01-28 10:00:00'), _at('2026-01-28 10:01:00'), 'active')
+    rollup.save()
+    instance = rollup.pending()[0]['instance_id']
+
+    reloaded = DailyRollup(path)
+    reloaded.record('app.exe', _at('2026-01-28 10:02:00'))
+    assert reloaded.pending()[0]['instance_id'] == instance
+    lost = DailyRollup(str(tmp_path / 'outro.json'))
+    lost.add('app.exe', _at('2026-01-28 11:00:00'), _at('2026-01-28 11:01:00'), 'active')
+    assert lost.pending()[0]['instance_id'] not in ('', instance)
+
+
+def _stand_in_writer():
+    store = StandInStore()
+
+    def write(payload):
+        with store.conn:
+            store.save_daily_rollup(payload)
+    return store.conn.execute, write
+
+
+def _collector_writer():
+    collector = Collector(SQLiteBackend())
+
+    def write(payload):
+        collector.submit([(None, 'daily_rollup', payload)])
+        collector.flush()
+
+    def execute(sql):
+        with collector.backend.pool.connection() as conn:
+            return conn.execute(sql)
+    return execute, write
+
+
+def _payload(instance, active, events):
+    return {'hostname': 'pc', 'username': 'ana', 'date': '2026-01-28', 'instance_id': instance,
+            'total_active_seconds': active, 'total_inactive_seconds': 0,
+            'first_activity': '2026-01-28 08:00:00', 'last_activity': '2026-01-28 12:00:00',
+            'apps': [{'executable': 'app.exe', 'active_seconds': active, 'inactive_seconds': 0,
+                      'activations': 1, 'events': events}]}
+
+
+@pytest.mark.parametrize('writer', [_stand_in_writer, _collector_writer], ids=['stand_in', 'collector'])
+def test_server_sums_instances_and_merges_resends_within_one(writer):
+    execute, write = writer()
+    write(_payload('', 5000, 40))      # Totais antigos (backfill/migração)
+    write(_payload('a1', 600, 5))
+    write(_payload('a1', 300, 2))      # Reenvio atrasado: não reduz nem duplica
+    write(_payload('a1', 900, 7))
+    write(_payload('b2', 120, 1))      # rollup.json perdido: recomeça do zero e soma
+
+    totals = [tuple(row) for row in execute(
+        "SELECT total_active_seconds, first_activity FROM daily_activity_summary")]
+    assert totals == [(5000 + 900 + 120, '2026-01-28 08:00:00')]
+    apps = [tuple(row) for row in execute(
+        "SELECT executable, active_seconds, activations, events FROM daily_app_summary")]
+    assert apps == [('app.exe', 5000 + 900 + 120, 3, 40 + 7 + 1)]
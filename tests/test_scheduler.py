@@ -0,0 +1,121 @@
+"""Scheduler: grade nominal, execuções puladas, jitter e estatísticas de atraso"""
+import random
+
+import pytest
+
+from scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def _scheduler(rng=None):
+    clock = FakeClock()
+    return Scheduler(clock=clock, sleep=clock.sleep, rng=rng), clock
+
+
+def test_lateness_does_not_accumulate_on_the_nominal_grid():
+    scheduler, clock = _scheduler()
+    runs = []
+    scheduler.add('task', lambda: runs.append(clock.now), period=10)
+
+    for now in (0.0, 13.0, 20.0, 31.5, 40.0):
+        clock.now = now
+        scheduler.run_pending()
+
+    assert runs == [0.0, 13.0, 20.0, 31.5, 40.0]
+    stats = scheduler.stats()['task']
+    assert (stats['runs'], stats['skipped'], stats['lateness_max']) == (5, 0, 3.0)
+    assert stats['lateness_avg'] == pytest.approx((3.0 + 1.5) / 5)
+
+
+def test_missed_runs_are_skipped_instead_of_bursting():
+    scheduler, clock = _scheduler()
+    runs = []
+    scheduler.add('task', lambda: runs.append(clock.now), period=10)
+    scheduler.run_pending()
+
+    clock.now = 55.0  # Computador suspenso de 0 a 55 s: prazos 10-50 perdidos
+    assert scheduler.run_pending() == pytest.approx(5.0)
+    assert runs == [0.0, 55.0]
+    assert scheduler.stats()['task']['skipped'] == 4  # 20, 30, 40 e 50
+    assert scheduler.tasks['task'].deadline == 60.0
+
+
+def test_slow_callback_skips_the_deadlines_it_covered():
+    scheduler, clock = _scheduler()
+    scheduler.add('slow', lambda: clock.sleep(25), period=10)
+    scheduler.run_pending()
+
+    task = scheduler.tasks['slow']
+    assert (task.skipped, task.deadline) == (2, 30.0)  # 10 e 20 caíram durante a execução
+    assert scheduler.stats()['slow']['run_time_avg'] == 25.0
+
+
+def test_jitter_stays_within_bounds_around_the_grid():
+    scheduler, clock = _scheduler(random.Random(7))
+    scheduler.add('task', lambda: None, period=10, jitter=2)
+
+    deadlines = []
+    for _ in range(200):
+        clock.now = scheduler.tasks['task'].deadline
+        scheduler.run_pending()
+        deadlines.append(scheduler.tasks['task'].deadline)
+
+    offsets = [deadline - 10 * (number + 1) for number, deadline in enumerate(deadlines)]
+    assert all(-2 <= offset <= 2 for offset in offsets)
+    assert len({round(offset, 6) for offset in offsets}) > 100
+    # Rodando no prazo com jitter não há atraso nem execuções puladas
+    stats = scheduler.stats()['task']
+    assert (stats['runs'], stats['skipped'], stats['lateness_max']) == (200, 0, 0.0)
+
+
+def test_errors_are_counted_and_the_task_keeps_running():
+    scheduler, clock = _scheduler()
+
+    def fail():
+        raise RuntimeError('falha')
+    scheduler.add('task', fail, period=5)
+    for now in (0.0, 5.0, 10.0):
+        clock.now = now
+        scheduler.run_pending()
+
+    stats = scheduler.stats()['task']
+    assert (stats['runs'], stats['errors']) == (3, 3)
+
+
+def test_reschedule_and_cancel_drop_stale_heap_entries():
+    scheduler, clock = _scheduler()
+    runs = []
+    scheduler.add('a', lambda: runs.append('a'), period=10, initial_delay=10)
+    scheduler.add('b', lambda: runs.append('b'), period=10, initial_delay=10)
+    scheduler.reschedule('a', delay=2, period=30)
+    scheduler.cancel('b')
+
+    clock.now = 10.0
+    scheduler.run_pending()
+    assert runs == ['a']
+    assert scheduler.tasks['a'].deadline == 32.0
+    assert 'b' not in scheduler.stats()
+
+
+def test_run_sleeps_exactly_until_the_next_deadline():
+    scheduler, clock = _scheduler()
+    runs = []
+
+    def task():
+        runs.append(clock.now)
+        if len(runs) == 3:
+            scheduler.stop()
+    scheduler.add('task', task, period=7, initial_delay=3)
+    scheduler.run()
+
+    assert runs == [3.0, 10.0, 17.0]
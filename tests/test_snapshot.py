@@ -0,0 +1,92 @@
+"""SnapshotEncoder (agent) contra applyWindowsSnapshot (regra do PHP, no stand-in)"""
+from snapshot import SnapshotEncoder
+from stand_in import StandInStore
+
+
+def _window(hwnd, title, active=False, executable='app.exe'):
+    return {'window_id': hwnd, 'executable': executable, 'pid': hwnd, 'window_title': title, 'is_active': active}
+
+
+class Link:
+    """Encoder -> servidor, com o resync devolvido ao encoder como faz o monitor"""
+
+    def __init__(self):
+        self.now = [0.0]
+        self.encoder = SnapshotEncoder(full_interval=600, keepalive_interval=60, clock=lambda: self.now[0])
+        self.store = StandInStore()
+
+    def send(self, windows, deliver=True):
+        payload = self.encoder.encode(windows)
+        if payload is None or not deliver:
+            return payload
+        result = self.store.save_windows_snapshot(
+            dict(payload, hostname='pc', username='ana', timestamp='2026-01-28 10:00:00'))
+        if result.get('resync'):
+            self.encoder.request_resync()
+        return payload, result
+
+    def server_windows(self):
+        return sorted((w['window_title'], w['is_active']) for w in self.store.get_windows('pc', 'ana'))
+
+
+def test_full_then_deltas_rebuild_the_same_list():
+    link = Link()
+    payload, _ = link.send([_window(1, 'a', True), _window(2, 'b')])
+    assert payload['mode'] == 'full'
+
+    link.now[0] = 10
+    payload, result = link.send([_window(1, 'a'), _window(2, 'b2', True), _window(3, 'c')])
+    assert payload['mode'] == 'delta' and payload['base_seq'] == 1
+    assert [w['window_id'] for w in payload['added']] == ['3']
+    assert result == {'seq': 2, 'windows_count': 3}
+    assert link.server_windows() == [('a', False), ('b2', True), ('c', False)]
+
+    link.now[0] = 20
+    link.send([_window(2, 'b2', True)])
+    assert link.server_windows() == [('b2', True)]
+
+
+def test_no_change_sends_nothing_until_keepalive():
+    link = Link()
+    link.send([_window(1, 'a', True)])
+    link.now[0] = 30
+    assert link.encoder.encode([_window(1, 'a', True)]) is None
+    link.now[0] = 61
+    payload, result = link.send([_window(1, 'a', True)])
+    assert payload['mode'] == 'delta' and not payload['added'] and 'active' not in payload
+    assert result == {'seq': 2}
+
+
+def test_lost_delta_triggers_resync_and_full_snapshot():
+    link = Link()
+    link.send([_window(1, 'a', True)])
+    link.now[0] = 10
+    link.send([_window(1, 'a', True), _window(2, 'b')], deliver=False)  # Perdido
+    link.now[0] = 20
+    payload, result = link.send([_window(1, 'a', True), _window(2, 'b'), _window(3, 'c')])
+    assert payload['mode'] == 'delta'
+    assert result['resync'] and result['seq'] == 1
+    assert link.server_windows() == [('a', True)]  # Delta fora de sequência não é aplicado
+
+    link.now[0] = 30
+    payload, _ = link.send([_window(1, 'a', True), _window(2, 'b'), _window(3, 'c')])
+    assert payload['mode'] == 'full'
+    assert link.server_windows() == [('a', True), ('b', False), ('c', False)]
+
+
+def test_full_snapshot_again_after_full_interval():
+    link = Link()
+    link.send([_window(1, 'a', True)])
+    link.now[0] = 601
+    payload, _ = link.send([_window(1, 'a', True), _window(2, 'b')])
+    assert payload['mode'] == 'full'
+
+
+def test_keepalive_without_baseline_or_during_resync():
+    link = Link()
+    assert link.encoder.keepalive() is None
+    link.send([_window(1, 'a', True)])
+    payload = link.encoder.keepalive()
+    assert payload['base_seq'] == 1 and payload['seq'] == 2
+    link.encoder.request_resync()
+    assert link.encoder.keepalive() is None
@@ -0,0 +1,80 @@
+from spool import Spool
+
+
+def _event(index, event_type='window_activity', **data):
+    return {'id': f"s-{index}", 'type': event_type, 'data': data, 'timestamp': 1000.0 + index}
+
+
+def _snapshot(n, seq, mode='delta'):
+    data = {'mode': mode, 'seq': seq}
+    if mode == 'delta':
+        data['base_seq'] = seq - 1
+    return _event(n, 'windows_snapshot', **data)
+
+
+def _contents(spool):
+    return [(event['type'], event['data'].get('seq')) for event in spool.peek(1000)]
+
+
+def test_append_peek_remove_in_order(tmp_path):
+    spool = Spool(str(tmp_path / 'spool.db'))
+    spool.append([_event(i, n=i) for i in range(5)])
+    events = spool.peek(3)
+    assert [event['data']['n'] for event in events] == [0, 1, 2]
+    spool.remove(events)
+    assert len(spool) == 2
+    assert [event['data']['n'] for event in spool.peek(10)] == [3, 4]
+
+
+def test_survives_reopen(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    spool = Spool(path)
+    spool.append([_event(1, n=1)])
+    spool.close()
+    assert len(Spool(path)) == 1
+
+
+def test_compaction_keeps_last_mouse_and_snapshot_chain(tmp_path):
+    spool = Spool(str(tmp_path / 'spool.db'))
+    spool.append([
+        _snapshot(0, 1, 'full'), _snapshot(1, 2), _event(2, 'mouse_activity'),
+        _snapshot(3, 3, 'full'), _snapshot(4, 4), _snapshot(5, 5),
+        _event(6, 'mouse_activity'), _event(7, seq=None),
+    ])
+    spool.compact()
+    assert _contents(spool) == [
+        ('windows_snapshot', 3), ('windows_snapshot', 4), ('windows_snapshot', 5),
+        ('mouse_activity', None), ('window_activity', None),
+    ]
+    assert spool.dropped == 0
+
+
+def test_compaction_without_full_snapshot_keeps_deltas(tmp_path):
+    spool = Spool(str(tmp_path / 'spool.db'))
+    spool.append([_snapshot(0, 7), _snapshot(1, 8)])
+    spool.compact()
+    assert _contents(spool) == [('windows_snapshot', 7), ('windows_snapshot', 8)]
+
+
+def test_legacy_snapshot_without_mode_counts_as_full(tmp_path):
+    spool = Spool(str(tmp_path / 'spool.db'))
+    spool.append([_event(0, 'windows_snapshot', windows=[]), _event(1, 'windows_snapshot', windows=[])])
+    spool.compact()
+    assert len(spool) == 1
+
+
+def test_overflow_drops_deltas_whose_full_snapshot_was_dropped(tmp_path):
+    spool = Spool(str(tmp_path / 'spool.db'), max_events=4)
+    # O completo é o mais antigo: sai no descarte por limite, e os deltas junto
+    spool.append([_snapshot(0, 1, 'full'), _event(1), _snapshot(2, 2), _event(3), _snapshot(4, 3)])
+    assert _contents(spool) == [('window_activity', None), ('window_activity', None)]
+    assert spool.dropped == 3
+
+
+def test_overflow_keeps_deltas_after_a_newer_full_snapshot(tmp_path):
+    spool = Spool(str(tmp_path / 'spool.db'), max_events=5)
+    spool.append([_event(0), _event(1), _event(2), _snapshot(3, 1, 'full'), _snapshot(4, 2), _event(5)])
+    assert _contents(spool) == [
+        ('window_activity', None), ('window_activity', None), ('windows_snapshot', 1),
+        ('windows_snapshot', 2), ('window_activity', None),
+    ]
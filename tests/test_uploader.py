@@ -0,0 +1,104 @@
+"""BatchUploader: resolução do ref dos checkpoints entre lotes e reinícios"""
+import json
+
+from requests.exceptions import ConnectionError
+
+from spool import Spool
+from stand_in import StandInStore, handle_batch
+from uploader import BatchUploader
+
+ACTIVITY = {'hostname': 'pc', 'username': 'ana', 'executable': 'app.exe', 'pid': 1,
+            'window_title': 'Doc', 'start_time': '2026-01-28 10:00:00'}
+
+
+class Response:
+    def __init__(self, status, body):
+        self.status_code = status
+        self.headers = {}
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class StandInTransport:
+    """POST /api/batch direto no stand-in; ``online = False`` simula a API fora do ar"""
+
+    def __init__(self, store):
+        self.store = store
+        self.online = True
+        self.sent = []
+
+    def post(self, path, payload):
+        if not self.online:
+            raise ConnectionError('API fora do ar')
+        payload = json.loads(json.dumps(payload))
+        self.sent.append(payload)
+        return Response(*handle_batch(self.store, payload))
+
+    def retry_in(self):
+        return 0.0
+
+
+def _uploader(transport, spool, now):
+    return BatchUploader(transport, 'pc', 'ana', max_batch_size=1, spool=spool, replay_rate=1000.0,
+                         retry_interval=1.0, clock=lambda: now[0], config_interval=0)
+
+
+def _sent_updates(transport):
+    return [event['data'] for payload in transport.sent for event in payload['events']
+            if event['type'] == 'window_activity_update']
+
+
+def test_spooled_checkpoint_resolves_its_insert_after_restart(tmp_path):
+    store, now, path = StandInStore(), [0.0], str(tmp_path / 'spool.db')
+    transport = StandInTransport(store)
+    transport.online = False
+    uploader = _uploader(transport, Spool(path), now)
+    ref = uploader.enqueue('window_activity', dict(ACTIVITY))
+    uploader.enqueue('window_activity_update', dict(ACTIVITY, ref=ref, activity_id=None,
+                                                    end_time='2026-01-28 10:05:00', duration_seconds=300))
+    uploader.flush()
+    assert len(uploader.spool) == 2
+
+    # A API volta: só o insert é reenviado antes de o agent reiniciar
+    transport.online = True
+    now[0] = 100.0
+    batch = uploader.spool.peek(1)
+    assert uploader._send_batch(batch)
+    uploader.spool.remove(batch)
+    uploader.spool.close()
+
+    restarted = _uploader(transport, Spool(path), now)
+    assert restarted.replay() is None
+    update = _sent_updates(transport)[-1]
+    assert update['activity_id'] == uploader.resolve(ref)
+    assert store.count('activity_events') == 1
+    assert store.conn.execute("SELECT duration_seconds FROM activity_events").fetchone()[0] == 300
+
+
+def test_checkpoint_spooled_after_ack_carries_the_id(tmp_path):
+    store, now = StandInStore(), [0.0]
+    transport = StandInTransport(store)
+    uploader = _uploader(transport, Spool(str(tmp_path / 'spool.db')), now)
+    ref = uploader.enqueue('window_activity', dict(ACTIVITY))
+    uploader.flush()
+
+    transport.online = False
+    uploader.enqueue('window_activity_update', dict(ACTIVITY, ref=ref, activity_id=None,
+                                                    end_time='2026-01-28 10:05:00', duration_seconds=300))
+    uploader.flush()
+    assert uploader.spool.peek(1)[0]['data']['activity_id'] == uploader.resolve(ref)
+
+
+def test_acked_ids_are_cleared_with_the_spool(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    spool = Spool(path)
+    spool.append([{'id': 'e-2', 'type': 'window_activity_update', 'data': {'ref': 'e-1'}}])
+    spool.remember('e-1', 7)
+    spool.close()
+
+    spool = Spool(path)
+    assert spool.resolve('e-1') == 7
+    spool.remove(spool.peek(1))
+    assert spool.resolve('e-1') is None
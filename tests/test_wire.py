@@ -0,0 +1,80 @@
+"""WireEncoder (agent) x WireDecoder (servidor): dicionário por sessão, reenvio e resync"""
+import threading
+
+import pytest
+
+import wire
+import wire_decoder
+from collector import Collector, SQLiteBackend, create_server
+from transport import Transport
+
+pytestmark = pytest.mark.skipif(not wire.available(), reason='msgpack não instalado')
+
+
+def _batch(title):
+    return {'hostname': 'pc-01', 'username': 'ana', 'events': [
+        {'id': 'e1', 'type': 'window_activity',
+         'data': {'executable': 'chrome.exe', 'pid': 10, 'window_title': title,
+                  'start_time': '2026-01-28 10:00:00'}},
+    ]}
+
+
+def test_round_trip_sends_each_string_once():
+    encoder, decoder = wire.WireEncoder(), wire_decoder.WireDecoder()
+    first = encoder.encode(_batch('Inbox'))
+    assert decoder.decode(first) == _batch('Inbox')
+    encoder.commit()
+
+    second = encoder.encode(_batch('Inbox'))
+    assert len(second) < len(first) and b'chrome.exe' not in second
+    assert decoder.decode(second) == _batch('Inbox')
+
+
+def test_resend_after_lost_response_is_accepted():
+    encoder, decoder = wire.WireEncoder(), wire_decoder.WireDecoder()
+    decoder.decode(encoder.encode(_batch('a')))
+    encoder.commit()
+
+    # O servidor aplicou o envio, mas a resposta se perdeu: o agent reenvia as mesmas strings
+    body = encoder.encode(_batch('b'))
+    assert decoder.decode(body) == _batch('b')
+    encoder.rollback()
+    assert decoder.decode(encoder.encode(_batch('b'))) == _batch('b')
+
+
+def test_unknown_session_or_base_mismatch_requires_resync():
+    encoder = wire.WireEncoder()
+    encoder.encode(_batch('a'))
+    encoder.commit()
+    with pytest.raises(wire_decoder.WireResync):
+        wire_decoder.WireDecoder().decode(encoder.encode(_batch('b')))
+
+
+@pytest.fixture
+def collector_url():
+    collector = Collector(SQLiteBackend())
+    collector.start()
+    server = create_server(collector, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", collector, server
+    server.shutdown()
+    server.server_close()
+    collector.stop()
+
+
+def test_collector_negotiates_msgpack_and_resyncs_after_restart(collector_url):
+    url, collector, server = collector_url
+    transport = Transport(url, wire_format='msgpack', max_retries=0)
+
+    assert transport.post('/api/batch', _batch('a')).status_code == 200
+    assert transport.wire_enabled  # Accept-Post anunciado na primeira resposta
+    response = transport.post('/api/batch', _batch('b'))
+    assert response.status_code == 200 and response.json()['results'][0]['success']
+
+    # Collector reiniciado: sessões perdidas, 409 e reenvio com dicionário novo
+    server.RequestHandlerClass.wire = wire_decoder.WireDecoder()
+    response = transport.post('/api/batch', _batch('c'))
+    assert response.status_code == 200
+    assert transport.counters['wire_resyncs'] == 1
+    assert collector.backend.query_one("SELECT COUNT(*) FROM activity_events")[0] == 3